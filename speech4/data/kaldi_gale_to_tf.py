@@ -14,9 +14,11 @@ import re
 import sys
 import tensorflow as tf
 import tensorflow.core.framework.token_model_pb2 as token_model_pb2
+import utterance_record
 
 def main():
   parser = argparse.ArgumentParser(description='SPEECH3 (C) 2015 William Chan <williamchan@cmu.edu>')
+  parser.add_argument('--features_encoding', type=str, default='float32', choices=utterance_record.FEATURES_ENCODINGS)
   parser.add_argument('--kaldi_cmvn_scp', type=str)
   parser.add_argument('--kaldi_scp', type=str)
   parser.add_argument('--kaldi_txt', type=str)
@@ -31,12 +33,12 @@ def main():
   convert(
       args['kaldi_scp'], args['kaldi_txt'], args['tf_records'],
       args['token_model_pbtxt'], args['tokens_max'], args['remove_space'],
-      args['sort'])
+      args['sort'], args['features_encoding'])
 
 
 def convert(
     kaldi_scp, kaldi_txt, tf_records, token_model_pbtxt, tokens_max_filter,
-    remove_space, sort):
+    remove_space, sort, features_encoding='float32'):
   # Load the token model.
   token_model_proto = token_model_pb2.TokenModelProto()
 
@@ -101,12 +103,8 @@ def convert(
 
       text = text.encode("utf8")
       uttid = uttid.encode("ascii", "ignore")
-      example = tf.train.Example(features=tf.train.Features(feature={
-          'features_len': tf.train.Feature(int64_list=tf.train.Int64List(value=[feats.shape[0]])),
-          'features': tf.train.Feature(float_list=tf.train.FloatList(value=feats.flatten('C').tolist())),
-          'tokens': tf.train.Feature(int64_list=tf.train.Int64List(value=tokens)),
-          'uttid': tf.train.Feature(bytes_list=tf.train.BytesList(value=[str(uttid)])),
-          'text': tf.train.Feature(bytes_list=tf.train.BytesList(value=[text]))}))
+      example = utterance_record.make_example(
+          uttid, feats, text, tokens, features_encoding)
       utterance_count = utterance_count + 1
       if sort:
         if tokens_count not in sorted_protos:
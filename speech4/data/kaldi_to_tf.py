@@ -14,9 +14,11 @@ import os
 import sys
 import tensorflow as tf
 import tensorflow.core.framework.token_model_pb2 as token_model_pb2
+import utterance_record
 
 def main():
   parser = argparse.ArgumentParser(description='SPEECH3 (C) 2015 William Chan <williamchan@cmu.edu>')
+  parser.add_argument('--features_encoding', type=str, default='float32', choices=utterance_record.FEATURES_ENCODINGS)
   parser.add_argument('--kaldi_cmvn_scp', type=str)
   parser.add_argument('--kaldi_scp', type=str)
   parser.add_argument('--kaldi_txt', type=str)
@@ -30,12 +32,13 @@ def main():
   convert(
       args['kaldi_scp'], args['kaldi_txt'], args['tf_records'],
       args['token_model_pbtxt'], args['type'], args['kaldi_cmvn_scp'],
-      args['kaldi_utt2spk'], args['sort'])
+      args['kaldi_utt2spk'], args['sort'], args['features_encoding'])
 
 
 def convert(
     kaldi_scp, kaldi_txt, tf_records, token_model_pbtxt, normalize_text,
-    kaldi_cmvn_scp=None, kaldi_utt2spk=None, sort=False):
+    kaldi_cmvn_scp=None, kaldi_utt2spk=None, sort=False,
+    features_encoding='float32'):
   # Load the token model.
   token_model_proto = token_model_pb2.TokenModelProto()
 
@@ -107,12 +110,8 @@ def convert(
       tokens = [token_model_proto.token_sos] * 2 + [character_to_token_map[c] for c in text] + [token_model_proto.token_eos]
       assert len(tokens)
 
-      example = tf.train.Example(features=tf.train.Features(feature={
-          'features_len': tf.train.Feature(int64_list=tf.train.Int64List(value=[feats_normalized.shape[0]])),
-          'features': tf.train.Feature(float_list=tf.train.FloatList(value=feats_normalized.flatten('C').tolist())),
-          'tokens': tf.train.Feature(int64_list=tf.train.Int64List(value=tokens)),
-          'uttid': tf.train.Feature(bytes_list=tf.train.BytesList(value=[str(uttid)])),
-          'text': tf.train.Feature(bytes_list=tf.train.BytesList(value=[text]))}))
+      example = utterance_record.make_example(
+          uttid, feats_normalized, text, tokens, features_encoding)
       tf_record_writer.write(example.SerializeToString())
 
       utt_count = utt_count + 1
@@ -145,12 +144,8 @@ def convert(
       tokens = [token_model_proto.token_sos] * 2 + [character_to_token_map[c] for c in text] + [token_model_proto.token_eos]
       assert len(tokens)
 
-      example = tf.train.Example(features=tf.train.Features(feature={
-          'features_len': tf.train.Feature(int64_list=tf.train.Int64List(value=[feats_normalized.shape[0]])),
-          'features': tf.train.Feature(float_list=tf.train.FloatList(value=feats_normalized.flatten('C').tolist())),
-          'tokens': tf.train.Feature(int64_list=tf.train.Int64List(value=tokens)),
-          'uttid': tf.train.Feature(bytes_list=tf.train.BytesList(value=[str(uttid)])),
-          'text': tf.train.Feature(bytes_list=tf.train.BytesList(value=[text]))}))
+      example = utterance_record.make_example(
+          uttid, feats_normalized, text, tokens, features_encoding)
       tf_record_writer.write(example.SerializeToString())
 
       utt_count = utt_count + 1
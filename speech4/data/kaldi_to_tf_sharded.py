@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+################################################################################
+# Copyright 2015 William Chan <williamchan@cmu.edu>.
+################################################################################
+
+# Sharded, resumable Kaldi to TFRecord conversion.
+#
+# The feats.scp is split into --shards contiguous pieces which are converted
+# by a process pool into <tf_records>-?????-of-?????.tfrecords (.zlib or .gz
+# appended for a --compression, the readers go by the suffix). Every finished
+# shard leaves a .manifest (DatasetShardProto) next to it, shards that already
+# have one are skipped on restart. With --sort the utterances are sorted by
+# text length across the whole dataset before they are split into shards. The <tf_records>.manifest
+# (DatasetManifestProto) covering all shards is written at the end.
+
+import argparse
+import codecs
+import google
+import kaldi_io
+import kaldi_to_tf
+import multiprocessing
+import numpy as np
+import os
+import tensorflow as tf
+import tensorflow.core.framework.speech4_pb2 as speech4_pb2
+import tensorflow.core.framework.token_model_pb2 as token_model_pb2
+import utterance_record
+
+def main():
+  parser = argparse.ArgumentParser(description='SPEECH4 (C) 2015 William Chan <williamchan@cmu.edu>')
+  parser.add_argument('--compression', type=str, default='', choices=sorted(utterance_record.COMPRESSIONS))
+  parser.add_argument('--features_encoding', type=str, default='float32', choices=utterance_record.FEATURES_ENCODINGS)
+  parser.add_argument('--kaldi_cmvn_scp', type=str)
+  parser.add_argument('--kaldi_scp', type=str, required=True)
+  parser.add_argument('--kaldi_txt', type=str, required=True)
+  parser.add_argument('--kaldi_utt2spk', type=str)
+  parser.add_argument('--name', type=str, default='')
+  parser.add_argument('--processes', type=int, default=0)
+  parser.add_argument('--remove_space', dest='remove_space', action='store_true')
+  parser.add_argument('--shards', type=int, default=16)
+  parser.add_argument('--sort', dest='sort', action='store_true', help='Sort the utterances of the whole dataset by text length, shard 0 holds the shortest.')
+  parser.add_argument('--tf_records', type=str, required=True)
+  parser.add_argument('--token_model_pbtxt', type=str, default='speech4/conf/token_model_character_simple.pbtxt')
+  parser.add_argument('--tokens_max', type=int, default=0)
+  parser.add_argument('--type', type=str, default='wsj')
+  args   = vars(parser.parse_args())
+
+  convert(
+      args['kaldi_scp'], args['kaldi_txt'], args['tf_records'],
+      args['token_model_pbtxt'], args['type'], args['kaldi_cmvn_scp'],
+      args['kaldi_utt2spk'], args['shards'], args['processes'], args['sort'],
+      args['tokens_max'], args['remove_space'], args['features_encoding'],
+      args['name'], args['compression'])
+
+
+def convert(
+    kaldi_scp, kaldi_txt, tf_records, token_model_pbtxt, normalize_text,
+    kaldi_cmvn_scp=None, kaldi_utt2spk=None, shards=16, processes=0,
+    sort=False, tokens_max=0, remove_space=False, features_encoding='float32',
+    name='', compression=''):
+  utterance_map = read_text(kaldi_txt, normalize_text, remove_space)
+
+  utt2spk_map = {}
+  if kaldi_utt2spk:
+    for line in open(kaldi_utt2spk, 'r'):
+      [uttid, spkid] = line.strip().split(' ')
+      utt2spk_map[uttid] = spkid
+  cmvn_map = {}
+  if kaldi_cmvn_scp and utt2spk_map:
+    cmvn_map = read_cmvn(kaldi_cmvn_scp)
+
+  # Split the scp into contiguous shards, this keeps the utterances of a
+  # speaker together (unless they are sorted by length).
+  if kaldi_scp.startswith('scp:'):
+    kaldi_scp = kaldi_scp[len('scp:'):]
+  assert os.path.isfile(kaldi_scp), 'kaldi_scp must be a plain scp: %s' % kaldi_scp
+  scp_lines = [line for line in open(kaldi_scp, 'r') if line.strip()]
+  if sort:
+    scp_lines.sort(key=lambda line: len(utterance_map.get(line.split(' ', 1)[0], '')))
+  shards = max(1, min(shards, len(scp_lines)))
+
+  tasks = []
+  for shard in range(shards):
+    shard_path = make_shard_path(tf_records, shard, shards, compression)
+    if os.path.isfile(shard_path + '.manifest'):
+      continue
+    lines = scp_lines[shard * len(scp_lines) / shards:(shard + 1) * len(scp_lines) / shards]
+    shard_scp = shard_path + '.scp'
+    with open(shard_scp, 'w') as scp_file:
+      scp_file.write(''.join(lines))
+
+    uttids = [line.split(' ', 1)[0] for line in lines]
+    tasks.append({
+        'shard_scp': shard_scp,
+        'shard_path': shard_path,
+        'utterance_map': dict((uttid, utterance_map[uttid]) for uttid in uttids if uttid in utterance_map),
+        'cmvn': bool(cmvn_map),
+        'cmvn_map': dict((uttid, cmvn_map[utt2spk_map[uttid]]) for uttid in uttids if utt2spk_map.get(uttid) in cmvn_map),
+        'token_model_pbtxt': token_model_pbtxt,
+        'tokens_max': tokens_max,
+        'features_encoding': features_encoding})
+  print 'converting %d out of %d shards' % (len(tasks), shards)
+
+  if tasks:
+    pool = multiprocessing.Pool(processes if processes > 0 else None)
+    for shard_path in pool.imap_unordered(convert_shard, tasks):
+      print 'finished %s' % shard_path
+    pool.close()
+    pool.join()
+
+  # Gather the shard manifests.
+  manifest = speech4_pb2.DatasetManifestProto()
+  manifest.name = name or os.path.basename(tf_records)
+  manifest.features_encoding = features_encoding
+  for shard in range(shards):
+    shard_path = make_shard_path(tf_records, shard, shards, compression)
+    shard_manifest = manifest.shards.add()
+    with open(shard_path + '.manifest', 'r') as proto_file:
+      google.protobuf.text_format.Merge(proto_file.read(), shard_manifest)
+    manifest.size += shard_manifest.size
+    manifest.features_width = max(manifest.features_width, shard_manifest.features_width)
+    manifest.features_len_max = max(manifest.features_len_max, shard_manifest.features_len_max)
+    manifest.tokens_len_max = max(manifest.tokens_len_max, shard_manifest.tokens_len_max)
+  write_proto(tf_records + '.manifest', manifest)
+  print 'utterances: %d' % manifest.size
+
+
+def make_shard_path(tf_records, shard, shards, compression=''):
+  return '%s-%05d-of-%05d.tfrecords%s' % (
+      tf_records, shard, shards, utterance_record.COMPRESSIONS[compression])
+
+
+# Converts the utterances of one shard. The records are written to a
+# temporary file first so a killed conversion never leaves a shard that looks
+# complete.
+def convert_shard(task):
+  token_model_proto = token_model_pb2.TokenModelProto()
+  with open(task['token_model_pbtxt'], 'r') as proto_file:
+    google.protobuf.text_format.Merge(proto_file.read(), token_model_proto)
+  character_to_token_map = {}
+  for token in token_model_proto.tokens:
+    character_to_token_map[token.token_string] = token.token_id
+
+  utterance_map = task['utterance_map']
+  cmvn_map = task['cmvn_map']
+
+  shard_manifest = speech4_pb2.DatasetShardProto()
+  shard_manifest.path = task['shard_path']
+  tf_record_writer = tf.python_io.TFRecordWriter(
+      task['shard_path'] + '.tmp',
+      options=utterance_record.record_options(task['shard_path']))
+  kaldi_feat_reader = kaldi_io.SequentialBaseFloatMatrixReader('scp:' + task['shard_scp'])
+  for uttid, feats in kaldi_feat_reader:
+    if uttid not in utterance_map:
+      continue
+    text = utterance_map[uttid]
+    if task['tokens_max'] and len(text) > task['tokens_max']:
+      continue
+
+    feats = np.asarray(feats, dtype=np.float32)
+    if task['cmvn']:
+      if uttid not in cmvn_map:
+        print 'skipping %s: no speaker cmvn stats in utt2spk / cmvn_scp' % uttid
+        continue
+      scale, offset = cmvn_map[uttid]
+      feats = feats * scale + offset
+
+    tokens = [token_model_proto.token_sos] * 2 + [character_to_token_map[c] for c in text] + [token_model_proto.token_eos]
+    example = utterance_record.make_example(
+        uttid, feats, text.encode('utf8'), tokens, task['features_encoding'])
+    tf_record_writer.write(example.SerializeToString())
+    shard_manifest.features_len.append(feats.shape[0])
+    shard_manifest.tokens_len.append(len(tokens))
+    shard_manifest.features_width = feats.shape[1]
+  tf_record_writer.close()
+  shard_manifest.size = len(shard_manifest.features_len)
+  shard_manifest.features_len_max = max(shard_manifest.features_len or [0])
+  shard_manifest.tokens_len_max = max(shard_manifest.tokens_len or [0])
+
+  os.rename(task['shard_path'] + '.tmp', task['shard_path'])
+  write_proto(task['shard_path'] + '.manifest', shard_manifest)
+  os.remove(task['shard_scp'])
+  return task['shard_path']
+
+
+# Reads the transcripts into a map of uttid to (unicode) text.
+def read_text(kaldi_txt, normalize_text, remove_space):
+  utterance_map = {}
+  for line in codecs.open(kaldi_txt, 'r', 'utf-8'):
+    line = line.strip()
+    if normalize_text == 'wsj':
+      [uttid, utt] = kaldi_to_tf.normalize_text_wsj(line)
+    elif normalize_text == 'eval2000':
+      [uttid, utt] = kaldi_to_tf.normalize_text_eval2000(line)
+    elif normalize_text == 'swbd':
+      [uttid, utt] = kaldi_to_tf.normalize_text_swbd(line)
+    elif normalize_text == 'gale':
+      [uttid, utt] = line.split(' ', 1)
+    else:
+      raise Exception('Unknown normalize_text: %s' % normalize_text)
+    # Remove the space -- only do this for chinese!
+    if remove_space:
+      utt = ''.join(utt.split(' '))
+    utterance_map[str(uttid)] = utt
+  return utterance_map
+
+
+# Reads the speaker CMVN stats, the scale and offset of all the speakers are
+# computed at once.
+def read_cmvn(kaldi_cmvn_scp):
+  spkids = []
+  mean_vars = []
+  kaldi_cmvn_reader = kaldi_io.SequentialBaseFloatMatrixReader(kaldi_cmvn_scp)
+  for [spkid, mean_var] in kaldi_cmvn_reader:
+    spkids.append(spkid)
+    mean_vars.append(np.array(mean_var, dtype=np.float64))
+  if not spkids:
+    return {}
+  mean_vars = np.stack(mean_vars)
+
+  count = mean_vars[:, 0, -1:]
+  mean = mean_vars[:, 0, :-1] / count
+  var = (mean_vars[:, 1, :-1] / count) - mean * mean
+
+  scale = 1.0 / np.sqrt(var)
+  offset = - mean * scale
+  return dict(zip(spkids, zip(scale.astype(np.float32), offset.astype(np.float32))))
+
+
+def write_proto(path, proto):
+  with open(path + '.tmp', 'w') as proto_file:
+    proto_file.write(str(proto))
+  os.rename(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+################################################################################
+# Copyright 2015 William Chan <williamchan@cmu.edu>.
+################################################################################
+
+# Compact utterance records.
+#
+# The features are stored as the raw little-endian bytes of the
+# [features_len, width] matrix ("features_raw", float32 or float16 according
+# to "features_encoding") rather than as a float_list, everything else
+# (features_len, tokens, uttid, text, ...) stays as is. S4ParseUtterance reads
+# both layouts.
+
+import argparse
+import numpy as np
+import tensorflow as tf
+
+FEATURES_ENCODINGS = ['float_list', 'float32', 'float16']
+
+# TFRecord compressions and the suffix of the files written with them, the
+# readers (models/input_utils.py) tell the compression of a file by its name.
+COMPRESSIONS = {'': '', 'ZLIB': '.zlib', 'GZIP': '.gz'}
+
+_DTYPES = {'float32': '<f4', 'float16': '<f2'}
+
+
+def main():
+  parser = argparse.ArgumentParser(description='SPEECH4 (C) 2015 William Chan <williamchan@cmu.edu>')
+  parser.add_argument('--features_encoding', type=str, default='float32', choices=FEATURES_ENCODINGS)
+  parser.add_argument('--input_tf_records', type=str, required=True)
+  parser.add_argument('--output_tf_records', type=str, required=True)
+  args   = vars(parser.parse_args())
+
+  convert(args['input_tf_records'], args['output_tf_records'], args['features_encoding'])
+
+
+# The tf.python_io.TFRecordOptions of a TFRecord file from its name, None if
+# it is not compressed.
+def record_options(path):
+  for compression, suffix in COMPRESSIONS.items():
+    if suffix and path.endswith(suffix):
+      return tf.python_io.TFRecordOptions(
+          getattr(tf.python_io.TFRecordCompressionType, compression))
+  return None
+
+
+# Rewrites a TFRecord file of utterances with the given features encoding,
+# both files are compressed as their names say.
+def convert(input_tf_records, output_tf_records, features_encoding):
+  tf_record_writer = tf.python_io.TFRecordWriter(
+      output_tf_records, options=record_options(output_tf_records))
+  utt_count = 0
+  for serialized in tf.python_io.tf_record_iterator(
+      input_tf_records, options=record_options(input_tf_records)):
+    example = tf.train.Example()
+    example.ParseFromString(serialized)
+    tf_record_writer.write(reencode_example(example, features_encoding).SerializeToString())
+
+    utt_count = utt_count + 1
+    if utt_count % 1000 == 0:
+      print 'processed %d' % utt_count
+  tf_record_writer.close()
+  print 'processed %d' % utt_count
+
+
+# The features of an Example as a [features_len, width] float32 matrix.
+def example_features(example):
+  feature = example.features.feature
+  features_len = feature['features_len'].int64_list.value[0]
+  if 'features_raw' in feature:
+    encoding = 'float32'
+    if 'features_encoding' in feature:
+      encoding = feature['features_encoding'].bytes_list.value[0]
+    feats = np.frombuffer(
+        feature['features_raw'].bytes_list.value[0], dtype=_DTYPES[encoding])
+  else:
+    feats = np.array(feature['features'].float_list.value, dtype=np.float32)
+  return feats.astype(np.float32).reshape((features_len, -1))
+
+
+# Replaces the features of an Example with the given encoding.
+def reencode_example(example, features_encoding):
+  feats = example_features(example)
+  result = tf.train.Example()
+  for key, value in example.features.feature.iteritems():
+    if key not in ['features', 'features_raw', 'features_encoding']:
+      result.features.feature[key].CopyFrom(value)
+  set_features(result, feats, features_encoding)
+  return result
+
+
+# Sets the features (and features_len) of an Example.
+def set_features(example, feats, features_encoding='float32'):
+  feature = example.features.feature
+  feature['features_len'].int64_list.value[:] = [feats.shape[0]]
+  if features_encoding == 'float_list':
+    feature['features'].float_list.value.extend(feats.flatten('C').tolist())
+  elif features_encoding in _DTYPES:
+    feature['features_raw'].bytes_list.value.append(
+        np.ascontiguousarray(feats, dtype=_DTYPES[features_encoding]).tostring())
+    feature['features_encoding'].bytes_list.value.append(features_encoding)
+  else:
+    raise Exception('Unknown features_encoding: %s' % features_encoding)
+
+
+# Builds the Example of an utterance.
+def make_example(uttid, feats, text, tokens, features_encoding='float32'):
+  example = tf.train.Example(features=tf.train.Features(feature={
+      'tokens': tf.train.Feature(int64_list=tf.train.Int64List(value=tokens)),
+      'uttid': tf.train.Feature(bytes_list=tf.train.BytesList(value=[str(uttid)])),
+      'text': tf.train.Feature(bytes_list=tf.train.BytesList(value=[text]))}))
+  set_features(example, feats, features_encoding)
+  return example
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,122 @@
+import os.path
+import Queue
+import threading
+
+import tensorflow as tf
+from tensorflow.python.ops import io_ops
+
+
+# Writes checkpoints from a background thread. save() only snapshots the
+# variable values (one sess.run of the variables) into numpy arrays and queues
+# the snapshot, the thread feeds it to a save op under the names of the
+# original variables, so the checkpoints restore like the ones of a
+# tf.train.Saver. The writer owns the snapshot and drops it once it is
+# written, there are no shadow variables: the extra host memory is one copy
+# of the parameters per snapshot that is queued or being written, at most
+# max_pending + 1 of them. At most max_pending snapshots wait in the queue,
+# save() blocks once the writer falls that far behind. The last max_to_keep
+# checkpoints are kept and the checkpoint state file is replaced atomically,
+# it never names a checkpoint that is still being written.
+class AsyncSaver(object):
+  def __init__(self, var_list, max_to_keep=5, max_pending=1):
+    self.variables = list(var_list)
+    self.max_to_keep = max_to_keep
+    self.checkpoints = []
+
+    self.placeholders = []
+    with tf.device('/cpu:0'), tf.name_scope('async_saver'):
+      for variable in self.variables:
+        self.placeholders.append(tf.placeholder(
+            variable.dtype.base_dtype, shape=variable.get_shape()))
+      self.filename = tf.placeholder(tf.string, shape=[])
+      self.save_op = io_ops._save(
+          self.filename, [variable.op.name for variable in self.variables],
+          self.placeholders)
+
+    self.error = None
+    self.queue = Queue.Queue(maxsize=max(max_pending, 1))
+    self.thread = threading.Thread(target=self.write_loop)
+    self.thread.daemon = True
+    self.thread.start()
+
+  # Same arguments as tf.train.Saver.save (global_step must be an integer).
+  # Returns the path the checkpoint will be written to.
+  def save(self, sess, save_path, global_step=None):
+    assert self.thread is not None, 'AsyncSaver is closed'
+    self.check()
+    if global_step is not None:
+      save_path = '%s-%d' % (save_path, global_step)
+    values = sess.run(self.variables)
+    self.queue.put((sess, save_path, values))
+    return save_path
+
+  # Waits for the queued checkpoints to be written.
+  def flush(self):
+    self.queue.join()
+    self.check()
+
+  # Writes the queued checkpoints and stops the writer thread.
+  def close(self):
+    if self.thread is None:
+      return
+    self.flush()
+    self.queue.put(None)
+    self.thread.join()
+    self.thread = None
+
+  def check(self):
+    if self.error is not None:
+      raise self.error
+
+  def write_loop(self):
+    while True:
+      item = self.queue.get()
+      try:
+        if item is not None and self.error is None:
+          self.write(*item)
+      except Exception as e:
+        self.error = e
+      finally:
+        self.queue.task_done()
+      if item is None:
+        return
+      # Free the snapshot before waiting for the next one.
+      item = None
+
+  def write(self, sess, save_path, values):
+    feed_dict = dict(zip(self.placeholders, values))
+    feed_dict[self.filename] = save_path
+    sess.run(self.save_op, feed_dict=feed_dict)
+
+    if save_path in self.checkpoints:
+      self.checkpoints.remove(save_path)
+    self.checkpoints.append(save_path)
+    while self.max_to_keep and len(self.checkpoints) > self.max_to_keep:
+      old_path = self.checkpoints.pop(0)
+      if os.path.exists(old_path):
+        os.remove(old_path)
+
+    save_dir = os.path.dirname(save_path)
+    tf.train.update_checkpoint_state(
+        save_dir, save_path, self.checkpoints,
+        latest_filename='checkpoint.tmp')
+    os.rename(os.path.join(save_dir, 'checkpoint.tmp'),
+              os.path.join(save_dir, 'checkpoint'))
+
+
+# A tf.train.Saver of var_list, or an AsyncSaver if the optimization_params
+# ask for background checkpointing.
+def CreateSaver(var_list, optimization_params=None):
+  max_to_keep = 5
+  if optimization_params and optimization_params.checkpoint_keep:
+    max_to_keep = optimization_params.checkpoint_keep
+  if optimization_params and optimization_params.checkpoint_async:
+    return AsyncSaver(var_list, max_to_keep=max_to_keep)
+  return tf.train.Saver(var_list, max_to_keep=max_to_keep)
+
+
+# Waits for the checkpoints of saver (if it is an AsyncSaver) to be written
+# and stops its writer thread, the session must stay open until then.
+def CloseSaver(saver):
+  if isinstance(saver, AsyncSaver):
+    saver.close()
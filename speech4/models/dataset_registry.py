@@ -0,0 +1,131 @@
+import google
+import numpy as np
+import os.path
+
+from tensorflow.core.framework import speech4_pb2
+
+
+# Datasets are described by the DatasetManifestProto written at conversion time
+# (speech4/data/kaldi_to_tf_sharded.py), a dataset name resolves to
+# <data_dir>/<name>.tfrecords.manifest (or <data_dir>/<name>.manifest).
+# Datasets converted before there were manifests are a single .tfrecords
+# file of a known size.
+DATA_DIR = 'speech4/data'
+
+_LEGACY_SIZES = {
+    'train_si284': 37416,
+    'test_dev93': 503,
+    'test_eval92': 333,
+    'swbd': 263775,
+    'eval2000': 4458,
+    'gale_mandarin_train': 58058,
+    'gale_mandarin_pinyin_train': 49364,
+    'gale_mandarin_sp_train': 58058,
+    'gale_mandarin_sp_train_space': 58058,
+    'gale_mandarin_sp_dev': 5191,
+    'gale_mandarin_sp_dev_space': 5191,
+    'gale_mandarin_10_train': 9568,
+    'gale_mandarin_sorted_train': 58058,
+    'gale_mandarin_dev': 5191,
+    'gale_mandarin_pinyin_dev': 4332,
+    'gale_mandarin_sorted_dev': 5191,
+    'gale_arabic_train': 146228,
+    'gale_arabic_test': 4151,
+    'gale_arabic_200_train': 135755,
+    'gale_arabic_200_test': 3869,
+    'ptb_train': 42068,
+    'ptb_valid': 3370,
+    'ptb_test': 3761,
+}
+
+
+def load_manifest(name, data_dir=DATA_DIR):
+  candidates = [name]
+  if not name.endswith('.manifest'):
+    candidates = [
+        os.path.join(data_dir, name + '.tfrecords.manifest'),
+        os.path.join(data_dir, name + '.manifest')]
+  for path in candidates:
+    if os.path.isfile(path):
+      manifest = speech4_pb2.DatasetManifestProto()
+      with open(path, 'r') as proto_file:
+        google.protobuf.text_format.Merge(proto_file.read(), manifest)
+      return manifest
+
+  if name in _LEGACY_SIZES:
+    manifest = speech4_pb2.DatasetManifestProto()
+    manifest.name = name
+    manifest.size = _LEGACY_SIZES[name]
+    shard = manifest.shards.add()
+    shard.path = os.path.join(data_dir, name + '.tfrecords')
+    shard.size = manifest.size
+    return manifest
+
+  raise Exception('Unknown dataset %s' % name)
+
+
+def dataset_paths(manifest):
+  return [shard.path for shard in manifest.shards]
+
+
+# The per-utterance (features_len, tokens_len) of the dataset, empty for
+# legacy datasets.
+def dataset_lengths(manifest):
+  features_len = []
+  tokens_len = []
+  for shard in manifest.shards:
+    features_len.extend(shard.features_len)
+    tokens_len.extend(shard.tokens_len)
+  return (np.array(features_len, dtype=np.int64),
+          np.array(tokens_len, dtype=np.int64))
+
+
+# Buckets holding roughly the same number of utterances each. Lengths are in
+# ModelParamsProto units: frames after frame_skip, tokens without the extra
+# sos the parser adds.
+def bucket_params(manifest, buckets, frame_skip=1):
+  features_len, tokens_len = dataset_lengths(manifest)
+  if buckets <= 1 or not len(features_len):
+    return []
+  features_len = (features_len + frame_skip - 1) // frame_skip
+  tokens_len = np.maximum(tokens_len - 1, 0)
+
+  order = np.argsort(features_len, kind='mergesort')
+  params = []
+  tokens_len_max = 0
+  for group in np.array_split(order, buckets):
+    if not len(group):
+      continue
+    # BucketId wants both lengths ascending.
+    tokens_len_max = max(tokens_len_max, tokens_len[group].max())
+    bucket = speech4_pb2.BucketParamsProto()
+    bucket.features_len_max = int(features_len[group].max())
+    bucket.tokens_len_max = int(tokens_len_max)
+    if params and params[-1].features_len_max == bucket.features_len_max:
+      params[-1].tokens_len_max = bucket.tokens_len_max
+    else:
+      params.append(bucket)
+  if len(params) <= 1:
+    return []
+  return params
+
+
+# Fills in the unrolled lengths of model_params the dataset needs (if they
+# are unset) and derives the buckets (unless model_params has its own).
+def update_model_params(model_params, manifest, buckets=0):
+  frame_skip = max(model_params.frame_skip, 1)
+  if not model_params.features_len_max:
+    model_params.features_len_max = int(
+        (manifest.features_len_max + frame_skip - 1) // frame_skip)
+  if not model_params.tokens_len_max:
+    model_params.tokens_len_max = int(max(manifest.tokens_len_max - 1, 0))
+  assert model_params.features_len_max and model_params.tokens_len_max
+
+  if not model_params.buckets:
+    model_params.buckets.extend(bucket_params(manifest, buckets, frame_skip))
+  for bucket in model_params.buckets:
+    bucket.features_len_max = min(
+        bucket.features_len_max, model_params.features_len_max)
+    bucket.tokens_len_max = min(
+        bucket.tokens_len_max, model_params.tokens_len_max)
+  return model_params
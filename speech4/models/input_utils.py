@@ -0,0 +1,189 @@
+import os.path
+
+import tensorflow as tf
+from tensorflow.python.ops import variable_scope as vs
+from tensorflow.python.training.input import shuffle_bucket_batch
+
+
+# The files of a dataset, either a path or a list of (shard) paths.
+def DatasetFiles(dataset):
+  if not isinstance(dataset, (list, tuple)):
+    dataset = [dataset]
+  for path in dataset:
+    assert os.path.isfile(path), 'Missing dataset file: %s' % path
+  return list(dataset)
+
+
+# The compression of a TFRecord file from its name, the suffixes are the ones
+# of the converters (data/utterance_record.py COMPRESSIONS).
+def FileCompression(path):
+  if path.endswith('.zlib'):
+    return 'ZLIB'
+  if path.endswith('.gz'):
+    return 'GZIP'
+  return ''
+
+
+# Most shards a parallel DatasetReader reads at once.
+PARALLEL_READERS = 4
+
+# A TFRecordReader for the files of a dataset, which must all be compressed
+# the same way. Compressed files are inflated by the reader op in the input
+# queue runner threads, off the training step. With parallel, the shards of a
+# sharded dataset are read by up to PARALLEL_READERS readers at once (see
+# tf.train.ParallelReader), their records come out interleaved.
+def DatasetReader(dataset, parallel=False):
+  files = DatasetFiles(dataset)
+  compressions = set(FileCompression(path) for path in files)
+  assert len(compressions) == 1, 'Mixed dataset compressions: %s' % dataset
+  compression = compressions.pop()
+  options = None
+  if compression:
+    options = tf.python_io.TFRecordOptions(
+        getattr(tf.python_io.TFRecordCompressionType, compression))
+  if parallel and len(files) > 1:
+    return tf.train.ParallelReader(
+        tf.TFRecordReader, num_readers=min(len(files), PARALLEL_READERS),
+        reader_kwargs={'options': options})
+  return tf.TFRecordReader(options=options)
+
+
+# The graph collection of the EvalInputs.
+EVAL_INPUTS = 'eval_inputs'
+
+# The batches of an evaluation pass over a dataset. The files are queued by
+# start() once per pass instead of by a string_input_producer, and finish()
+# drops the records of the incomplete last batch, so every pass scores the
+# same records even when the input outlives the pass (a persistent graph).
+# The records are read by a single reader and thread, in file order.
+class EvalInput(object):
+  def __init__(self, dataset, batch_size, size):
+    self.files = DatasetFiles(dataset)
+    self.size = size
+    self.batch_size = batch_size
+
+    filename_queue = tf.FIFOQueue(
+        len(self.files), [tf.string], shapes=[[]], name='eval_filename_queue')
+    self.enqueue_files = filename_queue.enqueue_many(
+        [tf.constant(self.files)])
+    self.close_files = filename_queue.close()
+    tf.add_to_collection(EVAL_INPUTS, self)
+
+    _, serialized = DatasetReader(self.files).read(filename_queue)
+    queue = tf.FIFOQueue(
+        batch_size * 4 + 512, [tf.string], shapes=[[]], name='eval_queue')
+    tf.train.add_queue_runner(
+        tf.train.QueueRunner(queue, [queue.enqueue([serialized])]))
+    self.serialized = queue.dequeue_many(batch_size)
+    self.drop_size = tf.placeholder(tf.int32, shape=[], name='eval_drop_size')
+    self.drop = queue.dequeue_many(self.drop_size)
+
+  def start(self, sess):
+    sess.run(self.enqueue_files)
+
+  def finish(self, sess):
+    drop_size = self.size % self.batch_size
+    if drop_size:
+      sess.run(self.drop, feed_dict={self.drop_size: drop_size})
+
+
+# Closes the filename queues of the EvalInputs of the graph, their reader
+# threads would otherwise wait for the next pass forever. Call it before the
+# coordinator of the queue runners is stopped.
+def CloseEvalInputs(sess):
+  for eval_input in tf.get_collection(EVAL_INPUTS):
+    sess.run(eval_input.close_files)
+
+
+# The bucket of a serialized utterance, the first of the (ascending) buckets
+# whose features_len_max and tokens_len_max both fit it. Utterances longer
+# than the last bucket go to the last bucket (and get truncated by the parser
+# as before).
+def BucketId(serialized, buckets, frame_skip=1):
+  lengths = tf.parse_single_example(serialized, features={
+      'features_len': tf.FixedLenFeature([], tf.int64),
+      'tokens': tf.VarLenFeature(tf.int64)})
+  # The parser keeps a partial last group of frame_skip frames.
+  features_len = tf.to_int32(tf.div(
+      lengths['features_len'] + frame_skip - 1, frame_skip))
+  tokens_len = tf.shape(lengths['tokens'].values)[0]
+
+  # The parser is given tokens_len_max + 1 (the extra sos).
+  features_bucket = tf.reduce_sum(tf.to_int32(tf.greater(
+      features_len, [bucket.features_len_max for bucket in buckets])))
+  tokens_bucket = tf.reduce_sum(tf.to_int32(tf.greater(
+      tokens_len, [bucket.tokens_len_max + 1 for bucket in buckets])))
+  return tf.maximum(features_bucket, tokens_bucket)
+
+
+# Batches the serialized utterances by bucket, every batch holds utterances of
+# a single bucket. The batches stay in the graph: a queue runner routes each
+# batch to the queue of its bucket, then queues its bucket id in order.
+# Returns the per bucket queues of [batch_size] serialized strings and the
+# dequeue of the bucket id of the next batch.
+def BucketBatch(serialized, buckets, batch_size, shuffle=True, seed=None,
+                frame_skip=1):
+  assert len(buckets) > 1
+  bucket_id = BucketId(serialized, buckets, frame_skip=frame_skip)
+  # Every bucket may hold an incomplete batch.
+  capacity = batch_size * (len(buckets) + 4) + 512
+  bucket_ids, batch = shuffle_bucket_batch(
+      [bucket_id, serialized], batch_size=batch_size, buckets=len(buckets),
+      capacity=capacity, min_after_dequeue=512 if shuffle else 0,
+      num_threads=2, seed=seed)
+  bucket = tf.minimum(bucket_ids[0], len(buckets) - 1)
+
+  # A bucket queue never holds more batches than there are bucket ids queued
+  # (plus the one of the step in flight), so routing only ever waits on the
+  # order queue, which the queue runner closes.
+  order_capacity = 4
+  bucket_queues = [
+      tf.FIFOQueue(order_capacity + 2, [tf.string], shapes=[[batch_size]],
+                   name='bucket_queue_%d' % idx)
+      for idx in range(len(buckets))]
+  order = tf.FIFOQueue(
+      order_capacity, [tf.int32], shapes=[[]], name='bucket_order')
+  enqueue = tf.QueueBase.from_list(bucket, bucket_queues).enqueue([batch])
+  with tf.control_dependencies([enqueue]):
+    route = order.enqueue([bucket])
+  tf.train.add_queue_runner(tf.train.QueueRunner(order, [route]))
+  return bucket_queues, order.dequeue()
+
+
+# Calls create_graph() once per bucket of model.model_params with the
+# features_len_max / tokens_len_max set to the bucket's and model.serialized
+# to the dequeue of the bucket's batch, all the graphs share their variables.
+# Returns for each bucket the model attributes its graph set, UseBucket swaps
+# them back in.
+def CreateBucketGraphs(model, create_graph):
+  model_params = model.model_params
+  features_len_max = model_params.features_len_max
+  tokens_len_max = model_params.tokens_len_max
+
+  graphs = []
+  for idx, bucket in enumerate(model_params.buckets):
+    model_params.features_len_max = bucket.features_len_max
+    model_params.tokens_len_max = bucket.tokens_len_max
+
+    attributes = dict(model.__dict__)
+    with vs.variable_scope(vs.get_variable_scope(), reuse=True if idx else None):
+      with tf.name_scope('bucket_%d' % idx):
+        model.serialized = model.bucket_queues[idx].dequeue()
+        create_graph()
+    graphs.append(dict(
+        (name, value) for name, value in model.__dict__.iteritems()
+        if name not in attributes or attributes[name] is not value))
+
+  model_params.features_len_max = features_len_max
+  model_params.tokens_len_max = tokens_len_max
+  return graphs
+
+
+# Swaps in the graph of the bucket of the next batch, its batch is dequeued by
+# the graph itself. step() fetches the bucket of the following batch
+# (model.bucket_order) along with every step into model.bucket_next, only the
+# first step looks it up on its own.
+def UseBucket(sess, model):
+  if model.bucket_next is None:
+    model.bucket_next = sess.run(model.bucket_order)
+  model.__dict__.update(model.bucket_graphs[model.bucket_next])
@@ -29,9 +29,14 @@ from tensorflow.python.ops import seq2seq
 from tensorflow.python.ops import sparse_ops
 from tensorflow.python.ops import variable_scope as vs
 from tensorflow.python.platform import gfile
+from speech4.models import checkpoint_utils
+from speech4.models import dataset_registry
+from speech4.models import input_utils
 from speech4.models import las_decoder
 from speech4.models import las_decoder2
+from speech4.models import las_streaming
 from speech4.models import las_model
+from speech4.models import profile_utils
 
 
 FLAGS = tf.app.flags.FLAGS
@@ -63,6 +68,8 @@ tf.app.flags.DEFINE_integer('global_epochs', 0,
                             """Global epochs.""")
 tf.app.flags.DEFINE_integer('global_epochs_max', 20,
                             """Global epochs max.""")
+tf.app.flags.DEFINE_boolean('persistent', False,
+                            """Keep one graph and session across the epochs.""")
 
 tf.app.flags.DEFINE_integer('features_width', 123,
                             """Size of each feature.""")
@@ -71,6 +78,8 @@ tf.app.flags.DEFINE_integer('features_len_max', 2560,
                             """Maximum number of features in an utterance.""")
 tf.app.flags.DEFINE_integer('tokens_len_max', 256,
                             """Maximum number of tokens in an utterance.""")
+tf.app.flags.DEFINE_integer('buckets', 0,
+                            """Number of length buckets derived from the dataset manifest.""")
 
 tf.app.flags.DEFINE_integer('vocab_size', 64,
                             """Token vocabulary size.""")
@@ -137,6 +146,14 @@ tf.app.flags.DEFINE_float('optimization_params_encoder_lm_loss_weight', 0.01,
 tf.app.flags.DEFINE_float('optimization_params_gaussian_noise_stddev', 0.0,
                            """Noise on the gradients.""")
 
+tf.app.flags.DEFINE_boolean('optimization_params_checkpoint_async', False,
+                            """Write the checkpoints from a background thread, uses up to 2 extra host copies of the parameters.""")
+tf.app.flags.DEFINE_integer('optimization_params_checkpoint_keep', 0,
+                            """Number of recent checkpoints to keep.""")
+
+tf.app.flags.DEFINE_integer('profile_steps', 0,
+                            """Trace every profile_steps-th step (0 disables profiling).""")
+
 tf.app.flags.DEFINE_string("visualization_params", "", """VisualizationParamsProto""")
 
 tf.app.flags.DEFINE_string('logdir', '',
@@ -207,6 +224,8 @@ def create_optimization_params(global_epochs):
 
   optimization_params.encoder_lm_loss_weight = FLAGS.optimization_params_encoder_lm_loss_weight
   optimization_params.gaussian_noise_stddev = FLAGS.optimization_params_gaussian_noise_stddev
+  optimization_params.checkpoint_async = FLAGS.optimization_params_checkpoint_async
+  optimization_params.checkpoint_keep = FLAGS.optimization_params_checkpoint_keep
 
   if os.path.isfile(FLAGS.optimization_params):
     with open(FLAGS.optimization_params, "r") as proto_file:
@@ -224,7 +243,7 @@ def create_visualization_params():
 
 def create_model(
     sess, ckpt, dataset, dataset_size, forward_only, global_epochs, model_params=None,
-    optimization_params=None):
+    optimization_params=None, reuse=False):
   start_time = time.time()
 
   initializer = tf.random_uniform_initializer(-0.1, 0.1)
@@ -240,11 +259,19 @@ def create_model(
   with open(os.path.join(FLAGS.logdir, "optimization_params.pbtxt"), "w") as proto_file:
     proto_file.write(str(optimization_params))
 
-  with tf.variable_scope("model", initializer=initializer):
+  queue_runners = len(tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS))
+  with tf.variable_scope("model", initializer=initializer, reuse=reuse or None):
     model = las_model.LASModel(
         sess, dataset, FLAGS.logdir, ckpt, forward_only, FLAGS.batch_size,
         model_params, optimization_params=optimization_params,
-        visualization_params=visualization_params, dataset_size=dataset_size)
+        visualization_params=visualization_params, dataset_size=dataset_size,
+        reuse=reuse)
+
+  if FLAGS.profile_steps:
+    model.profiler = profile_utils.StepProfiler(
+        FLAGS.profile_steps,
+        tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS)[queue_runners:],
+        logdir=FLAGS.logdir, name='valid' if forward_only else 'train')
 
   tf.train.write_graph(sess.graph_def, FLAGS.logdir, "graph_def.pbtxt")
 
@@ -261,69 +288,14 @@ def run(mode, dataset, global_epochs, model_params=None, optimization_params=Non
   if not ckpt:
     ckpt = FLAGS.ckpt
 
-  # Dataset alias.
-  if dataset == 'train_si284':
-    dataset = 'speech4/data/train_si284.tfrecords'
-    dataset_size = 37416
-  elif dataset == 'test_dev93':
-    dataset = 'speech4/data/test_dev93.tfrecords'
-    dataset_size = 503
-  elif dataset == 'test_eval92':
-    dataset = 'speech4/data/test_eval92.tfrecords'
-    dataset_size = 333
-  elif dataset == "swbd":
-    dataset = "speech4/data/swbd.tfrecords"
-    dataset_size = 263775
-  elif dataset == "eval2000":
-    dataset = "speech4/data/eval2000.tfrecords"
-    dataset_size = 4458
-  elif dataset == "gale_mandarin_train":
-    dataset = "speech4/data/gale_mandarin_train.tfrecords"
-    dataset_size = 58058
-  elif dataset == "gale_mandarin_pinyin_train":
-    dataset = "speech4/data/gale_mandarin_pinyin_train.tfrecords"
-    dataset_size = 49364
-  elif dataset == "gale_mandarin_sp_train":
-    dataset = "speech4/data/gale_mandarin_sp_train.tfrecords"
-    dataset_size = 58058
-  elif dataset == "gale_mandarin_sp_train_space":
-    dataset = "speech4/data/gale_mandarin_sp_train_space.tfrecords"
-    dataset_size = 58058
-  elif dataset == "gale_mandarin_sp_dev":
-    dataset = "speech4/data/gale_mandarin_sp_dev.tfrecords"
-    dataset_size = 5191
-  elif dataset == "gale_mandarin_sp_dev_space":
-    dataset = "speech4/data/gale_mandarin_sp_dev_space.tfrecords"
-    dataset_size = 5191
-  elif dataset == "gale_mandarin_10_train":
-    dataset = "speech4/data/gale_mandarin_10_train.tfrecords"
-    dataset_size = 9568
-  elif dataset == "gale_mandarin_sorted_train":
-    dataset = "speech4/data/gale_mandarin_sorted_train.tfrecords"
-    dataset_size = 58058
-  elif dataset == "gale_mandarin_dev":
-    dataset = "speech4/data/gale_mandarin_dev.tfrecords"
-    dataset_size = 5191
-  elif dataset == "gale_mandarin_pinyin_dev":
-    dataset = "speech4/data/gale_mandarin_pinyin_dev.tfrecords"
-    dataset_size = 4332
-  elif dataset == "gale_mandarin_sorted_dev":
-    dataset = "speech4/data/gale_mandarin_sorted_dev.tfrecords"
-    dataset_size = 5191
-  elif dataset == "gale_arabic_train":
-    dataset = "speech4/data/gale_arabic_train.tfrecords"
-    dataset_size = 146228
-  elif dataset == "gale_arabic_test":
-    dataset = "speech4/data/gale_arabic_test.tfrecords"
-    dataset_size = 4151
-  elif dataset == "gale_arabic_200_train":
-    dataset = "speech4/data/gale_arabic_200_train.tfrecords"
-    dataset_size = 135755
-  elif dataset == "gale_arabic_200_test":
-    dataset = "speech4/data/gale_arabic_200_test.tfrecords"
-    dataset_size = 3869
-  else:
-    raise Exception("Unknown dataset %s" % dataset)
+  # Dataset paths and sizes come from the manifest.
+  manifest = dataset_registry.load_manifest(dataset)
+  dataset = dataset_registry.dataset_paths(manifest)
+  dataset_size = manifest.size
+  if mode == 'train' or mode == 'valid':
+    if not model_params:
+      model_params = create_model_params()
+    dataset_registry.update_model_params(model_params, manifest, FLAGS.buckets)
 
   # Create our graph.
   with tf.device(device):
@@ -348,10 +320,12 @@ def run(mode, dataset, global_epochs, model_params=None, optimization_params=Non
         summary_writer.flush()
 
         model.step_epoch(sess, forward_only=(mode != 'train'))
+        checkpoint_utils.CloseSaver(model.saver)
 
         summary_writer = tf.train.SummaryWriter(FLAGS.logdir, sess.graph_def)
         summary_writer.flush()
 
+        input_utils.CloseEvalInputs(sess)
         coord.request_stop()
         coord.join(threads, stop_grace_period_secs=10)
       elif mode == 'test':
@@ -370,8 +344,12 @@ def run(mode, dataset, global_epochs, model_params=None, optimization_params=Non
           with open(FLAGS.decoder_params, "r") as proto_file:
             google.protobuf.text_format.Merge(proto_file.read(), decoder_params)
 
-        decoder = las_decoder2.Decoder2(
-            sess, dataset, dataset_size, FLAGS.logdir, ckpt, decoder_params, model_params)
+        if decoder_params.streaming_chunk_len:
+          decoder = las_streaming.StreamingDecoder(
+              sess, dataset, dataset_size, FLAGS.logdir, ckpt, decoder_params, model_params)
+        else:
+          decoder = las_decoder2.Decoder2(
+              sess, dataset, dataset_size, FLAGS.logdir, ckpt, decoder_params, model_params)
 
         threads = []
         for qr in tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS):
@@ -382,6 +360,85 @@ def run(mode, dataset, global_epochs, model_params=None, optimization_params=Non
         coord.request_stop()
         coord.join(threads, stop_grace_period_secs=10)
 
+# Trains and validates in one long-lived graph and session. The train and
+# valid models are built once and share their variables: the train model
+# initializes them and restores the checkpoint, the valid model reuses them,
+# so an epoch is a step_epoch of each with no graph rebuild, initialization
+# or checkpoint restore in between. The train input queue cycles through its
+# dataset (string_input_producer without num_epochs), the valid input is an
+# EvalInput which reads its dataset once per epoch. The graph is only rebuilt, from the latest
+# checkpoint, when the params of an epoch differ from the ones it was built
+# with (the sample_prob and optimizer reset of global epoch 0).
+class Runner(object):
+  def __init__(self, dataset_train, dataset_valid):
+    self.datasets = [('train', dataset_train), ('valid', dataset_valid)]
+    self.params = None
+    self.sess = None
+
+  # Rebuilds the graph if the params of the epoch changed.
+  def start(self, global_epochs):
+    params = (str(create_model_params()),
+              str(create_optimization_params(global_epochs)))
+    if self.sess and self.params == params:
+      return
+    self.close()
+    self.params = params
+
+    ckpt = tf.train.latest_checkpoint(FLAGS.logdir)
+    if not ckpt:
+      ckpt = FLAGS.ckpt
+    device = '/gpu:%d' % FLAGS.device if FLAGS.device >= 0 else '/cpu:0'
+
+    self.graph = tf.Graph()
+    self.sess = tf.Session(
+        graph=self.graph, config=tf.ConfigProto(allow_soft_placement=True))
+    self.models = {}
+    with self.graph.as_default(), tf.device(device):
+      for mode, dataset in self.datasets:
+        manifest = dataset_registry.load_manifest(dataset)
+        model_params = create_model_params()
+        dataset_registry.update_model_params(
+            model_params, manifest, FLAGS.buckets)
+        # The passes of an EvalInput are not bucketed.
+        if mode != 'train':
+          del model_params.buckets[:]
+        # The valid model zeroes the sample_prob of its own copy.
+        optimization_params = create_optimization_params(global_epochs)
+
+        model = create_model(
+            self.sess, ckpt, dataset_registry.dataset_paths(manifest),
+            manifest.size, mode != 'train', global_epochs=global_epochs,
+            model_params=model_params, optimization_params=optimization_params,
+            reuse=mode != 'train')
+        # The epochs of a model count up from the epoch it was built at.
+        model.global_epochs = global_epochs
+        self.models[mode] = model
+
+      self.coord = tf.train.Coordinator()
+      self.threads = []
+      for qr in tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS):
+        self.threads.extend(qr.create_threads(
+            self.sess, coord=self.coord, daemon=True, start=True))
+
+      summary_writer = tf.train.SummaryWriter(FLAGS.logdir, self.sess.graph_def)
+      summary_writer.flush()
+
+  def close(self):
+    if not self.sess:
+      return
+    for model in self.models.values():
+      checkpoint_utils.CloseSaver(model.saver)
+    input_utils.CloseEvalInputs(self.sess)
+    self.coord.request_stop()
+    self.coord.join(self.threads, stop_grace_period_secs=10)
+    self.sess.close()
+    self.sess = None
+
+  def run(self, mode):
+    with self.graph.as_default():
+      self.models[mode].step_epoch(self.sess, forward_only=(mode != 'train'))
+
+
 def main(_):
   if not FLAGS.logdir:
     # FLAGS.logdir = tempfile.mkdtemp()
@@ -425,6 +482,15 @@ def main(_):
     FLAGS.datsaet_valid = "gale_arabic_200_test"
     FLAGS.dataset_test = "gale_arabic_200_test"
 
+  if FLAGS.persistent:
+    runner = Runner(FLAGS.dataset_train, FLAGS.dataset_valid)
+    for global_epochs in range(FLAGS.global_epochs, FLAGS.global_epochs_max):
+      runner.start(global_epochs)
+      runner.run('train')
+      runner.run('valid')
+    runner.close()
+    return
+
   for global_epochs in range(FLAGS.global_epochs, FLAGS.global_epochs_max):
     run('train', FLAGS.dataset_train, global_epochs)
     run('valid', FLAGS.dataset_valid, global_epochs)
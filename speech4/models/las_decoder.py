@@ -25,6 +25,7 @@ from tensorflow.python.ops import sparse_ops
 from tensorflow.python.ops import variable_scope as vs
 from tensorflow.python.ops.gen_user_ops import s4_parse_utterance
 from tensorflow.python.platform import gfile
+from speech4.models import input_utils
 from speech4.models import las_model
 from speech4.models import token_model
 from speech4.models import utterance
@@ -55,22 +56,35 @@ class Decoder(object):
 
     self.logdir = logdir
 
+    # Hypotheses of up to utterance_batch_size utterances share one decoder
+    # batch, so the graph is built for beam_width rows per utterance.
+    self.utterance_batch_size = max(1, self.decoder_params.utterance_batch_size)
+    batch_size = self.decoder_params.beam_width * self.utterance_batch_size
+
+    # The encoder outputs live in a session-side cache with one slot per
+    # utterance; a group may be encoded while the previous one is decoding.
+    encoder_cache_size = 2 * self.utterance_batch_size
+    self.encoder_cache_slots_free = range(encoder_cache_size)
+    self.decoder_step = None
+
     with tf.variable_scope("model"):
       self.model = las_model.LASModel(
-          sess, dataset, logdir, ckpt, True, self.decoder_params.beam_width,
-          self.model_params)
+          sess, dataset, logdir, ckpt, True, batch_size, self.model_params,
+          encoder_cache_size=encoder_cache_size)
 
     # Graph to read 1 utterance.
-    tf.train.string_input_producer([dataset])
-    reader = tf.TFRecordReader()
-    filename_queue = tf.train.string_input_producer([self.dataset])
+    reader = input_utils.DatasetReader(self.dataset)
+    filename_queue = tf.train.string_input_producer(
+        input_utils.DatasetFiles(self.dataset), shuffle=False)
     _, serialized = reader.read(filename_queue)
     serialized = tf.train.batch(
         [serialized], batch_size=1, num_threads=2, capacity=2)
 
-    self.features, _, self.features_len, _, _, self.text, _, _, _, _, self.uttid = s4_parse_utterance(
+    self.features, _, _, _, self.features_len, _, _, _, _, self.text, _, _, _, _, _, self.uttid, _ = s4_parse_utterance(
         serialized, features_len_max=self.model_params.features_len_max,
-        tokens_len_max=1)
+        alignment_len_max=1, tokens_len_max=1,
+        frame_stack=self.model_params.frame_stack,
+        frame_skip=self.model_params.frame_skip)
 
   # We read one utterance and return it in a dict.
   def read_utterance(self, sess):
@@ -94,17 +108,9 @@ class Decoder(object):
     cer = speech4_pb2.EditDistanceResultsProto()
     wer = speech4_pb2.EditDistanceResultsProto()
     utts = []
-    for idx in range(self.dataset_size):
-      utt = self.read_utterance(sess)
-      self.decode_utterance(sess, utt)
-
-      cer.edit_distance += utt.proto.cer.edit_distance
-      cer.ref_length += utt.proto.cer.ref_length
-      cer.error_rate = float(cer.edit_distance) / float(cer.ref_length)
-
-      wer.edit_distance += utt.proto.wer.edit_distance
-      wer.ref_length += utt.proto.wer.ref_length
-      wer.error_rate = float(wer.edit_distance) / float(wer.ref_length)
+    for idx, utt in enumerate(self.decode_utterances(sess)):
+      self.accumulate_edit_distance(cer, utt.proto.cer)
+      self.accumulate_edit_distance(wer, utt.proto.wer)
 
       print("accum wer: %f (%d / %d); cer: %f; (%d / %d)" % (wer.error_rate, wer.edit_distance, wer.ref_length, cer.error_rate, idx, self.dataset_size))
       utts.append(utt)
@@ -118,65 +124,109 @@ class Decoder(object):
       for utt in utts:
         proto_file.write(str(utt.proto))
 
+  def accumulate_edit_distance(self, total, proto):
+    total.sub += proto.sub
+    total.ins += proto.ins
+    setattr(total, "del", getattr(total, "del") + getattr(proto, "del"))
+    total.edit_distance += proto.edit_distance
+    total.ref_length += proto.ref_length
+    total.hyp_length += proto.hyp_length
+    total.error_rate = float(total.edit_distance) / float(total.ref_length)
+
+  # Decodes the whole dataset, yielding each utterance as its beam search
+  # finishes. Up to utterance_batch_size utterances are active at once and the
+  # live hypotheses of all of them are packed into the same decoder batch.
+  def decode_utterances(self, sess):
+    utts_read = 0
+    pending = []
+    active = []
+    while utts_read < self.dataset_size or pending or active:
+      # Read and encode the next group of utterances in a single encoder run.
+      if not pending and utts_read < self.dataset_size:
+        group_size = min(
+            self.utterance_batch_size, self.dataset_size - utts_read)
+        pending = [self.read_utterance(sess) for _ in range(group_size)]
+        utts_read += group_size
+        self.run_encoder(sess, pending)
+
+      # Fill the free slots, the <sos> step of new utterances is batched too.
+      admitted = pending[:self.utterance_batch_size - len(active)]
+      pending = pending[len(admitted):]
+      if admitted:
+        self.start_utterances(sess, admitted)
+        active.extend(admitted)
+
+      self.step_utterances(sess, active)
+
+      for utt in active:
+        if not utt.beam.size:
+          self.finish_utterance(utt)
+          yield utt
+      active = [utt for utt in active if utt.beam.size]
+
   def decode_utterance(self, sess, utt):
-    # Run the encoder.
-    self.run_encoder(sess, utt)
+    self.run_encoder(sess, [utt])
+    self.start_utterances(sess, [utt])
+    while utt.beam.size:
+      self.step_utterances(sess, [utt])
+    self.finish_utterance(utt)
 
+  def start_utterances(self, sess, utts):
     # Create the empty hypothesis.
-    hyp = utterance.Hypothesis()
-    hyp.state_prev = self.create_decoder_states_zero()
-    hyp.alignment_prev = self.create_decoder_alignments_zero()
-    hyp.attention_prev = self.create_decoder_attentions_zero()
+    for utt in utts:
+      utt.beam = utterance.Beam(
+          self.token_model, self.decoder_params.beam_width,
+          self.create_decoder_states_zero(),
+          self.create_decoder_alignments_zero(),
+          self.create_decoder_attentions_zero())
 
     # Run the decoder for 1 step (needed because we have <sos> <sos> utterance <eos>.
-    self.run_decoder_step(sess, utt, [hyp])
-    hyp.state_prev = hyp.state_next
-    hyp.alignment_prev = hyp.alignment_next
-    hyp.attention_prev = hyp.attention_next
-    hyp.state_next = None
-    hyp.alignment_next = None
-    hyp.attention_next = None
-    hyp.logprobs = None
-    hyp.text = ""
-    utt.hypothesis_partial.append(hyp)
-
-    while utt.hypothesis_partial:
-      hypothesis_partial_next = []
-
-      for start_idx in range(0, len(utt.hypothesis_partial), self.model.batch_size):
-        hyps = utt.hypothesis_partial[start_idx:start_idx + self.model.batch_size]
-
-        self.run_decoder_step(sess, utt, hyps)
-
-        for hyp in hyps:
-          partials, completed = hyp.expand(
-              self.token_model, self.decoder_params.beam_width)
-          hypothesis_partial_next.extend(partials)
-          utt.hypothesis_complete.append(completed)
-
-      hypothesis_partial_next = sorted(
-          hypothesis_partial_next, key=lambda hyp: hyp.logprob, reverse=True)
-      hypothesis_partial_next = hypothesis_partial_next[:self.decoder_params.beam_width]
-      utt.hypothesis_partial = hypothesis_partial_next
-
-    # Sort the completed hypothesis.
-    utt.hypothesis_complete = sorted(
-        utt.hypothesis_complete, key=lambda hyp: hyp.logprob / len(hyp.text), reverse=True)
-    utt.hypothesis_complete = utt.hypothesis_complete[:self.decoder_params.beam_width]
+    self.run_decoder_step(sess, utts)
+    for utt in utts:
+      utt.beam.advance()
+
+  def step_utterances(self, sess, utts):
+    self.run_decoder_step(sess, utts)
+    for utt in utts:
+      utt.beam.expand()
+
+  def finish_utterance(self, utt):
+    utt.hypothesis_complete = utt.beam.hypothesis_complete(
+        self.decoder_params.beam_width)
+    # The encoder cache slot and beam are no longer needed once the search is
+    # done.
+    self.encoder_cache_slots_free.append(utt.encoder_slot)
+    utt.encoder_slot = None
+    utt.beam = None
     print 'ground_truth: %s' % utt.text
     print 'top hyp     : %s' % utt.hypothesis_complete[0].text
     utt.create_proto(self.token_model)
     print 'wer         : %f' % utt.proto.wer.error_rate
 
-  def run_encoder(self, sess, utt):
+  # Runs the encoder once for a group of utterances, each utterance occupies
+  # one row of the batch (the remaining rows are zero padding). The outputs are
+  # stored in the encoder cache rather than fetched.
+  def run_encoder(self, sess, utts):
+    assert len(utts) <= self.model.batch_size
+    features_width = self.model.features[0].get_shape()[1].value
+    features = np.zeros(
+        [len(self.model.features), self.model.batch_size, features_width],
+        dtype=np.float32)
+    features_len = np.zeros([self.model.batch_size], dtype=np.int64)
+    for row, utt in enumerate(utts):
+      utt_features = np.concatenate(utt.features)
+      features[:utt_features.shape[0], row, :] = utt_features
+      features_len[row] = utt.features_len[0]
+      utt.encoder_slot = self.encoder_cache_slots_free.pop(0)
+
     feed_dict = {}
-    for idx in range(len(self.model.features)):
-      feed_dict[self.model.features[idx]] = np.tile(
-          utt.features[idx][0], [self.model.batch_size, 1])
-    feed_dict[self.model.features_len] = np.array(
-        np.tile(utt.features_len, self.model.batch_size), dtype=np.int64)
+    feed_dict[tuple(self.model.features)] = features
+    feed_dict[self.model.features_len] = features_len
+    feed_dict[self.model.encoder_cache_rows] = np.arange(len(utts), dtype=np.int32)
+    feed_dict[self.model.encoder_cache_slots] = np.array(
+        [utt.encoder_slot for utt in utts], dtype=np.int32)
 
-    utt.encoder_states = sess.run(self.model.encoder_states[-1][0], feed_dict=feed_dict)
+    sess.run(self.model.encoder_cache_update, feed_dict=feed_dict)
 
   def create_decoder_states_zero(self):
     initial_state = []
@@ -204,53 +254,74 @@ class Decoder(object):
       initial_state.append(np.zeros(shape, dtype=np.float32))
     return initial_state
 
-  def run_decoder_step(self, sess, utt, hyps):
-    pad_length = self.model.batch_size - len(hyps)
-    feed_dict = {}
-
-    # Encoder states.
-    for idx in range(len(self.model.encoder_states[-1][0])):
-      feed_dict[self.model.encoder_states[-1][0][idx]] = utt.encoder_states[idx]
-    feed_dict[self.model.features_len] = np.array(
-        np.tile(utt.features_len, self.model.batch_size), dtype=np.int64)
+  # The decoder step as a session callable, built on first use. It is run
+  # hundreds of times per utterance with the same fetches and several hundred
+  # feeds, so the fetches and feeds are resolved once rather than on every
+  # sess.run. The feeds are the decoder slots, the tokens, the tokens length
+  # and the decoder states, attentions and alignments.
+  def create_decoder_step(self, sess):
+    self.decoder_step_feeds = (
+        [self.model.decoder_slots, self.model.tokens[0],
+         self.model.tokens_len] +
+        list(self.model.decoder_states_initial) +
+        list(self.model.decoder_attentions_initial) +
+        list(self.model.decoder_alignments_initial))
+    self.decoder_step_fetches = [
+        self.model.decoder_state_last, self.model.decoder_alignment_last,
+        self.model.decoder_attention_last, self.model.logprob]
+    self.decoder_step = sess.make_callable(
+        [fetch for fetches in self.decoder_step_fetches for fetch in fetches],
+        self.decoder_step_feeds)
+
+  # Runs one decoder step for the live hypotheses of the given utterances,
+  # each utterance's beam occupies a contiguous block of rows in the batch.
+  def run_decoder_step(self, sess, utts):
+    if self.decoder_step is None:
+      self.create_decoder_step(sess)
+
+    offsets = np.cumsum([0] + [utt.beam.size for utt in utts])
+    rows = offsets[-1]
+    assert rows <= self.model.batch_size
+    feeds = []
+
+    # Each row reads the encoder outputs from its utterance's cache slot, the
+    # padding rows point at the first utterance.
+    decoder_slots = np.empty([self.model.batch_size], dtype=np.int32)
+    decoder_slots.fill(utts[0].encoder_slot)
+    for utt, start, end in zip(utts, offsets[:-1], offsets[1:]):
+      decoder_slots[start:end] = utt.encoder_slot
+    feeds.append(decoder_slots)
 
     # Feed token.
-    feed_dict[self.model.tokens[0]] = np.array(
-        [hyp.feed_token(self.token_model) for hyp in hyps] + [0] * pad_length, dtype=np.int32)
-    feed_dict[self.model.tokens_len] = np.array(
-        [1] * self.model.batch_size, dtype=np.int64)
-
-    # Decoder states.
-    for idx in range(len(self.model.decoder_states_initial)):
-      state_padding = [np.zeros([
-          pad_length, hyps[0].state_prev[idx].shape[1]], dtype=np.float32)]
-      feed_dict[self.model.decoder_states_initial[idx]] = np.vstack(
-          [hyp.state_prev[idx] for hyp in hyps] + state_padding)
-
-    # Attention context states.
-    for idx in range(len(self.model.decoder_attentions_initial)):
-      state_padding = [np.zeros([
-          pad_length, hyps[0].attention_prev[idx].shape[1]], dtype=np.float32)]
-      feed_dict[self.model.decoder_attentions_initial[idx]] = np.vstack(
-          [hyp.attention_prev[idx] for hyp in hyps] + state_padding)
-
-    for idx in range(len(self.model.decoder_alignments_initial)):
-      state_padding = [np.zeros([
-          pad_length, hyps[0].alignment_prev[idx].shape[1]], dtype=np.float32)]
-      feed_dict[self.model.decoder_alignments_initial[idx]] = np.vstack(
-          [hyp.alignment_prev[idx] for hyp in hyps] + state_padding)
+    tokens = np.zeros([self.model.batch_size], dtype=np.int32)
+    for utt, start, end in zip(utts, offsets[:-1], offsets[1:]):
+      tokens[start:end] = utt.beam.feed_tokens()
+    feeds.append(tokens)
+    feeds.append(np.ones([self.model.batch_size], dtype=np.int64))
+
+    # Decoder states, attention context states and alignments.
+    def feed_states(placeholders, beam_states):
+      for idx, placeholder in enumerate(placeholders):
+        state = np.zeros(
+            [self.model.batch_size] + placeholder.get_shape().as_list()[1:],
+            dtype=np.float32)
+        for utt, start, end in zip(utts, offsets[:-1], offsets[1:]):
+          state[start:end] = beam_states(utt.beam)[idx][:utt.beam.size]
+        feeds.append(state)
+    feed_states(self.model.decoder_states_initial, lambda beam: beam.state_prev)
+    feed_states(self.model.decoder_attentions_initial, lambda beam: beam.attention_prev)
+    feed_states(self.model.decoder_alignments_initial, lambda beam: beam.alignment_prev)
 
     # Fetch the next state and the log prob.
-    fetches = {}
-    fetches["decoder_state_last"] = self.model.decoder_state_last
-    fetches["decoder_alignments_last"] = self.model.decoder_alignment_last
-    fetches["decoder_attentions_last"] = self.model.decoder_attention_last
-    fetches["logprob"] = self.model.logprob
-
-    fetches = self.model.run_graph(sess, fetches, feed_dict=feed_dict)
-
-    for idx in range(len(hyps)):
-      hyps[idx].state_next = [state[idx:idx+1,:] for state in fetches['decoder_state_last']]
-      hyps[idx].alignment_next = [state[idx:idx+1,:] for state in fetches['decoder_alignments_last']]
-      hyps[idx].attention_next = [state[idx:idx+1,:] for state in fetches['decoder_attentions_last']]
-      hyps[idx].logprobs = [logprob[idx,:] for logprob in fetches['logprob']][0]
+    r = self.decoder_step(*feeds)
+    fetched = []
+    for fetches in self.decoder_step_fetches:
+      fetched.append(r[:len(fetches)])
+      r = r[len(fetches):]
+    states, alignments, attentions, logprob = fetched
+
+    for utt, start, end in zip(utts, offsets[:-1], offsets[1:]):
+      utt.beam.state_next = [state[start:end] for state in states]
+      utt.beam.alignment_next = [state[start:end] for state in alignments]
+      utt.beam.attention_next = [state[start:end] for state in attentions]
+      utt.beam.logprobs = logprob[0][start:end]
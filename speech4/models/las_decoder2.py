@@ -25,6 +25,7 @@ from tensorflow.python.ops import sparse_ops
 from tensorflow.python.ops import variable_scope as vs
 from tensorflow.python.ops.gen_user_ops import s4_parse_utterance
 from tensorflow.python.platform import gfile
+from speech4.models import input_utils
 from speech4.models import las_model
 from speech4.models import token_model
 from speech4.models import utterance
@@ -60,9 +61,9 @@ class Decoder2(object):
           self.model_params)
 
     # Graph to read 1 utterance.
-    tf.train.string_input_producer([dataset])
-    reader = tf.TFRecordReader()
-    filename_queue = tf.train.string_input_producer([self.dataset])
+    reader = input_utils.DatasetReader(self.dataset)
+    filename_queue = tf.train.string_input_producer(
+        input_utils.DatasetFiles(self.dataset), shuffle=False)
     _, serialized = reader.read(filename_queue)
     serialized = tf.train.batch(
         [serialized], batch_size=1, num_threads=2, capacity=2)
@@ -70,8 +71,9 @@ class Decoder2(object):
     #self.features, _, self.features_len, _, _, self.text, _, _, _, _, self.uttid = s4_parse_utterance(
     #    serialized, features_len_max=self.model_params.features_len_max,
     #    tokens_len_max=1)
-    self.features, self.features_fbank, self.features_len, _, self.features_weight, self.text, self.tokens, self.tokens_pinyin, self.tokens_len, self.tokens_weights, self.tokens_pinyin_weights, self.uttid = s4_parse_utterance(
+    self.features, _, _, self.features_fbank, self.features_len, _, self.features_weight, _, _, self.text, self.tokens, self.tokens_pinyin, self.tokens_len, self.tokens_weights, self.tokens_pinyin_weights, self.uttid, _ = s4_parse_utterance(
         serialized, features_len_max=self.model_params.features_len_max,
+        alignment_len_max=1,
         tokens_len_max=self.model_params.tokens_len_max + 1,
         frame_stack=self.model_params.frame_stack,
         frame_skip=self.model_params.frame_skip)
@@ -137,10 +139,10 @@ class Decoder2(object):
   def run_model(self, sess, utt):
     feed_dict = {}
 
-    # Encoder features (i.e., fbanks).
-    for idx in range(len(self.model.features)):
-      feed_dict[self.model.features[idx]] = np.tile(
-          utt.features[idx][0], [self.model.batch_size, 1])
+    # Encoder features (i.e., fbanks), every row of the batch is the utterance.
+    features = np.concatenate(utt.features)
+    feed_dict[tuple(self.model.features)] = np.tile(
+        features[:, np.newaxis, :], [1, self.model.batch_size, 1])
     feed_dict[self.model.features_len] = np.array(
         np.tile(utt.features_len, self.model.batch_size), dtype=np.int64)
 
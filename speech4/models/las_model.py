@@ -8,6 +8,7 @@ from tensorflow.core.framework import speech4_pb2
 from tensorflow.python.ops import attention_mask_ops
 from tensorflow.python.ops import array_ops
 from tensorflow.python.ops import clip_ops
+from tensorflow.python.ops import control_flow_ops
 from tensorflow.python.ops import embedding_ops
 from tensorflow.python.ops import gradients
 from tensorflow.python.ops import gru_ops
@@ -17,19 +18,26 @@ from tensorflow.python.ops import rnn
 from tensorflow.python.ops import rnn_cell
 from tensorflow.python.ops import seq2seq
 from tensorflow.python.ops import sparse_ops
+from tensorflow.python.ops import tensor_array_ops
 from tensorflow.python.ops import variable_scope as vs
 from tensorflow.python.ops.gen_user_ops import s4_parse_utterance
 from tensorflow.python.platform import gfile
 
+from speech4.models import checkpoint_utils
+from speech4.models import input_utils
+from speech4.models import metric_utils
+
 
 class LASModel(object):
   def __init__(self, sess, dataset, logdir, ckpt, forward_only, batch_size,
-      model_params, optimization_params=None, visualization_params=None, dataset_size=None):
+      model_params, optimization_params=None, visualization_params=None, dataset_size=None,
+      encoder_cache_size=0, reuse=False):
     self.dataset = dataset
     self.dataset_size = dataset_size
     self.logdir = logdir
 
     self.batch_size = batch_size
+    self.encoder_cache_size = encoder_cache_size
 
     self.model_params = model_params
     if not self.model_params.encoder_prefix:
@@ -54,27 +62,41 @@ class LASModel(object):
     self.global_epochs = 0
 
     self.epoch_accuracy = 0.0
-
+    self.metrics = metric_utils.Accumulators(['correct', 'count', 'logperp'])
+    self.metrics_update = None
+    # A profile_utils.StepProfiler timing the session runs of the steps.
+    self.profiler = None
+
+    # A model reusing the variables of another model of the graph (created
+    # under a reuse variable scope) neither initializes nor restores them.
+    shared_variables = set(tf.all_variables())
     self.global_step = tf.Variable(0, trainable=False)
+    self.optimizer = None
+    # The input of a forward_only model (see input_utils.EvalInput).
+    self.eval_input = None
+
+    self.bucket_graphs = []
+    if self.model_params.buckets and not self.model_params.input_layer:
+      self.create_bucket_input_layer(forward_only)
+      self.bucket_graphs = input_utils.CreateBucketGraphs(
+          self, lambda: self.create_graph(forward_only))
+    else:
+      self.create_graph(forward_only)
 
-    # Create the inputs.
-    self.create_input_layer(forward_only)
-
-    # Create the encoder-encoder.
-    self.create_encoder()
-    if not self.model_params.encoder_only:
-      self.create_decoder()
-
-    # Create the loss.
-    if not self.model_params.input_layer:
-      self.create_loss()
-
-    if not forward_only:
-      # Create the optimizer.
-      self.create_optimizer()
+    if reuse:
+      sess.run(tf.initialize_variables(
+          [v for v in tf.all_variables() if v not in shared_variables]))
+      sess.run(self.metrics.reset)
+      if self.encoder_cache_size:
+        sess.run(tf.initialize_variables(self.encoder_cache))
+      self.saver = None
+      return
 
     variables = tf.all_variables()
     sess.run(tf.initialize_all_variables())
+    sess.run(self.metrics.reset)
+    if self.encoder_cache_size:
+      sess.run(tf.initialize_variables(self.encoder_cache))
 
     if optimization_params:
       if optimization_params.adam.reset:
@@ -113,7 +135,43 @@ class LASModel(object):
     if gfile.Exists(ckpt):
       print("Reading model parameters from %s" % ckpt)
       self.saver.restore(sess, ckpt)
-    self.saver = tf.train.Saver(tf.all_variables())
+    self.saver = checkpoint_utils.CreateSaver(
+        tf.all_variables(), optimization_params)
+
+  def create_graph(self, forward_only):
+    # Create the inputs.
+    self.create_input_layer(forward_only)
+
+    # Create the encoder-encoder.
+    self.create_encoder()
+    if not self.model_params.encoder_only:
+      self.create_decoder()
+
+    # Create the loss.
+    if not self.model_params.input_layer:
+      self.create_loss()
+      if not self.model_params.encoder_only:
+        self.create_metrics()
+
+    if not forward_only:
+      # Create the optimizer.
+      self.create_optimizer()
+
+  # Batches of a single length bucket, each dequeued by the graph of its
+  # bucket.
+  def create_bucket_input_layer(self, forward_only):
+    print("Dataset: %s" % self.dataset)
+    filename_queue = tf.train.string_input_producer(
+        input_utils.DatasetFiles(self.dataset))
+
+    reader = input_utils.DatasetReader(self.dataset, parallel=True)
+    _, serialized = reader.read(filename_queue)
+
+    self.bucket_next = None
+    self.bucket_queues, self.bucket_order = input_utils.BucketBatch(
+        serialized, self.model_params.buckets, self.batch_size,
+        shuffle=not forward_only and self.optimization_params.shuffle,
+        seed=self.global_epochs, frame_skip=self.model_params.frame_skip)
 
   def create_input_layer(self, forward_only):
     self.features = []
@@ -154,15 +212,22 @@ class LASModel(object):
 
       self.tokens_len = tf.placeholder(
           tf.int64, shape=(self.batch_size), name="tokens_len")
+    elif self.model_params.buckets:
+      self.create_parse_layer(self.serialized)
+    elif forward_only:
+      print("Dataset: %s" % self.dataset)
+      self.eval_input = input_utils.EvalInput(
+          self.dataset, self.batch_size, self.dataset_size)
+      self.create_parse_layer(self.eval_input.serialized)
     else:
       print("Dataset: %s" % self.dataset)
-      assert os.path.isfile(self.dataset)
-      filename_queue = tf.train.string_input_producer([self.dataset])
+      filename_queue = tf.train.string_input_producer(
+          input_utils.DatasetFiles(self.dataset))
 
-      reader = tf.TFRecordReader()
+      reader = input_utils.DatasetReader(self.dataset, parallel=True)
       _, serialized = reader.read(filename_queue)
 
-      if forward_only or self.optimization_params.shuffle == False:
+      if self.optimization_params.shuffle == False:
         serialized = tf.train.batch(
             [serialized], batch_size=self.batch_size, num_threads=2,
             capacity=self.batch_size * 4 + 512)
@@ -170,19 +235,7 @@ class LASModel(object):
         serialized = tf.train.shuffle_batch(
             [serialized], batch_size=self.batch_size, num_threads=2,
             capacity=self.batch_size * 4 + 512, min_after_dequeue=512, seed=self.global_epochs)
-
-      # Parse the batched of serialized strings into the relevant utterance features.
-      self.features, self.features_fbank, self.features_len, _, self.features_weight, self.text, self.tokens, self.tokens_pinyin, self.tokens_len, self.tokens_weights, self.tokens_pinyin_weights, self.uttid = s4_parse_utterance(
-          serialized, features_len_max=self.model_params.features_len_max,
-          tokens_len_max=self.model_params.tokens_len_max + 1,
-          frame_stack=self.model_params.frame_stack,
-          frame_skip=self.model_params.frame_skip)
-      assert len(self.tokens) == len(self.tokens_weights)
-      if self.model_params.pinyin_ext:
-        assert len(self.tokens) == len(self.tokens_pinyin)
-        assert len(self.tokens) == len(self.tokens_pinyin_weights)
-      for feature_fbank in self.features_fbank:
-        feature_fbank.set_shape([self.batch_size, 40])
+      self.create_parse_layer(serialized)
 
     # Add the shape to the features.
     for feature in self.features:
@@ -191,6 +244,21 @@ class LASModel(object):
       if token:
         token.set_shape([self.batch_size])
 
+  def create_parse_layer(self, serialized):
+    # Parse the batched of serialized strings into the relevant utterance features.
+    self.features, _, _, self.features_fbank, self.features_len, _, self.features_weight, _, _, self.text, self.tokens, self.tokens_pinyin, self.tokens_len, self.tokens_weights, self.tokens_pinyin_weights, self.uttid, _ = s4_parse_utterance(
+        serialized, features_len_max=self.model_params.features_len_max,
+        alignment_len_max=1,
+        tokens_len_max=self.model_params.tokens_len_max + 1,
+        frame_stack=self.model_params.frame_stack,
+        frame_skip=self.model_params.frame_skip)
+    assert len(self.tokens) == len(self.tokens_weights)
+    if self.model_params.pinyin_ext:
+      assert len(self.tokens) == len(self.tokens_pinyin)
+      assert len(self.tokens) == len(self.tokens_pinyin_weights)
+    for feature_fbank in self.features_fbank:
+      feature_fbank.set_shape([self.batch_size, 40])
+
   def create_encoder(self):
     start_time = time.time()
 
@@ -218,9 +286,16 @@ class LASModel(object):
         #   xs = [xs[i:i + subsample_input] for i in range(0, len(xs), subsample_input)]
         #   xs = [array_ops.concat(1, x) for x in xs]
         xs = self.encoder_states[-1][0][0::subsample_input]
-        self.encoder_states.append([gru_ops.gru(
-            cell_size=self.model_params.encoder_cell_size,
-            sequence_len=sequence_len, xs=xs)[-1], sequence_len])
+        if self.model_params.gru_recompute_segment_len:
+          hs = gru_ops.gru_lean(
+              cell_size=self.model_params.encoder_cell_size,
+              sequence_len=sequence_len, xs=xs,
+              segment_len=self.model_params.gru_recompute_segment_len)
+        else:
+          hs = gru_ops.gru(
+              cell_size=self.model_params.encoder_cell_size,
+              sequence_len=sequence_len, xs=xs)[-1]
+        self.encoder_states.append([hs, sequence_len])
       else:
         self.encoder_states.append([rnn.rnn(
             rnn_cell.GRUCell(self.model_params.encoder_cell_size),
@@ -256,9 +331,15 @@ class LASModel(object):
         attention_states, [batch_size, attn_length, 1, attn_size])
     with vs.variable_scope(self.model_params.encoder_embedding):
       k = vs.get_variable("W", [1, 1, attn_size, self.model_params.attention_embedding_size])
+    self.encoder_embedding_kernel = k
     encoder_embedding = nn_ops.conv2d(encoder_states, k, [1, 1, 1, 1], "SAME")
     #encoder_embedding = tf.nn.relu(encoder_embedding)
 
+    self.attention_len = self.encoder_states[-1][1]
+    if self.encoder_cache_size:
+      encoder_states, encoder_embedding = self.create_encoder_cache(
+          encoder_states, encoder_embedding)
+
     #self.create_decoder_layer(attention_states=attention_states)
     self.create_decoder_sequence(
         attention_states=attention_states, encoder_states=encoder_states,
@@ -266,9 +347,58 @@ class LASModel(object):
 
     print('create_decoder graph time %f' % (time.time() - start_time))
 
+  # During decoding the encoder outputs of each utterance are kept in variables
+  # (one slot per utterance), so a beam step reads them from the session
+  # instead of having them fed back in. encoder_cache_update stores the given
+  # rows of an encoder run into the given slots; the decoder then gathers its
+  # rows from decoder_slots. las_streaming fills the cache itself, from the
+  # encoder outputs of each chunk and encoder_embedding_kernel.
+  def create_encoder_cache(self, encoder_states, encoder_embedding):
+    def create_cache(name, value, dtype=tf.float32):
+      shape = [self.encoder_cache_size] + value.get_shape().as_list()[1:]
+      return tf.Variable(
+          tf.zeros(shape, dtype=dtype), trainable=False, collections=[],
+          name=name)
+
+    with vs.variable_scope("encoder_cache"):
+      states_cache = create_cache("states", encoder_states)
+      embedding_cache = create_cache("embedding", encoder_embedding)
+      with tf.device("/cpu:0"):
+        len_cache = create_cache("len", self.attention_len, dtype=tf.int64)
+      self.encoder_cache = [states_cache, embedding_cache, len_cache]
+
+      self.encoder_cache_rows = tf.placeholder(
+          tf.int32, shape=[None], name="encoder_cache_rows")
+      self.encoder_cache_slots = tf.placeholder(
+          tf.int32, shape=[None], name="encoder_cache_slots")
+      self.encoder_cache_update = tf.group(*[
+          tf.scatter_update(
+              cache, self.encoder_cache_slots,
+              array_ops.gather(value, self.encoder_cache_rows))
+          for cache, value in zip(self.encoder_cache, [
+              encoder_states, encoder_embedding, self.attention_len])])
+
+      self.decoder_slots = tf.placeholder(
+          tf.int32, shape=[self.batch_size], name="decoder_slots")
+      encoder_states_rows = array_ops.gather(states_cache, self.decoder_slots)
+      encoder_states_rows.set_shape(encoder_states.get_shape())
+      encoder_embedding_rows = array_ops.gather(
+          embedding_cache, self.decoder_slots)
+      encoder_embedding_rows.set_shape(encoder_embedding.get_shape())
+      with tf.device("/cpu:0"):
+        self.attention_len = array_ops.gather(len_cache, self.decoder_slots)
+      self.attention_len.set_shape([self.batch_size])
+
+    return encoder_states_rows, encoder_embedding_rows
+
   def create_decoder_sequence(
       self, attention_states, encoder_states, encoder_embedding, scope=None):
     with vs.variable_scope(self.model_params.decoder_prefix or scope):
+      if (self.model_params.decoder_while_loop and
+          not self.model_params.input_layer):
+        self.create_decoder_while_loop(encoder_states, encoder_embedding)
+        return
+
       self.decoder_states = []
       self.logits_pinyin = []
       self.prob = []
@@ -287,16 +417,13 @@ class LASModel(object):
             encoder_embedding, prev_logit)
  
         # Logit.
-        with vs.variable_scope("Logit"):
-          logit = nn_ops.xw_plus_b(
-              outputs[-1],
-              vs.get_variable("Matrix", [outputs[-1].get_shape()[1].value, self.model_params.vocab_size]),
-              vs.get_variable("Bias", [self.model_params.vocab_size]), name="Logit_%d" % decoder_time_idx)
-          prev_logit = logit
-          self.decoder_states.append(logit)
-          prob = tf.nn.softmax(logit, name="Softmax_%d" % decoder_time_idx)
-          self.prob.append(prob)
-          self.logprob.append(tf.log(prob, name="LogProb_%d" % decoder_time_idx))
+        logit = self.create_decoder_logit(
+            outputs[-1], name="Logit_%d" % decoder_time_idx)
+        prev_logit = logit
+        self.decoder_states.append(logit)
+        prob = tf.nn.softmax(logit, name="Softmax_%d" % decoder_time_idx)
+        self.prob.append(prob)
+        self.logprob.append(tf.log(prob, name="LogProb_%d" % decoder_time_idx))
 
         # Pinyin Logits.
         if self.model_params.pinyin_ext:
@@ -313,9 +440,108 @@ class LASModel(object):
       self.decoder_alignment_last = filter(None, alignments)
       self.decoder_attention_last = filter(None, attentions)
 
+  def create_decoder_logit(self, output, name=None):
+    with vs.variable_scope("Logit"):
+      return nn_ops.xw_plus_b(
+          output,
+          vs.get_variable("Matrix", [output.get_shape()[1].value, self.model_params.vocab_size]),
+          vs.get_variable("Bias", [self.model_params.vocab_size]), name=name)
+
+  # The teacher forced decoder as a While loop over the batch's longest
+  # tokens_len - 1 steps. The first step is created outside of the loop (it
+  # has no previous alignment and creates the variables), the graph holds two
+  # decoder steps whatever tokens_len_max is. The logits are padded back to
+  # len(self.tokens) - 1 steps (with zero weights) for the loss.
+  def create_decoder_while_loop(self, encoder_states, encoder_embedding):
+    assert not self.model_params.pinyin_ext
+    if self.model_params.attention_params.type == "window":
+      raise Exception("The window attention mask needs the unrolled decoder.")
+
+    decoder_steps_max = len(self.tokens) - 1
+    decoder_steps = math_ops.to_int32(math_ops.minimum(
+        math_ops.reduce_max(self.tokens_len) - 1, decoder_steps_max))
+    decoder_steps = math_ops.maximum(decoder_steps, 1)
+
+    tokens_ta = tensor_array_ops.TensorArray(
+        dtype=tf.int32, size=len(self.tokens),
+        tensor_array_name="decoder_tokens")
+    tokens_ta = tokens_ta.unpack(array_ops.pack(self.tokens))
+    logits_ta = tensor_array_ops.TensorArray(
+        dtype=tf.float32, size=decoder_steps,
+        tensor_array_name="decoder_logits")
+
+    (outputs, states, attentions, alignments) = self.create_decoder_cell(
+        0, [], [], None, encoder_states, encoder_embedding, None)
+    logit = self.create_decoder_logit(outputs[-1], name="Logit_0")
+    logits_ta = logits_ta.write(0, logit)
+    vs.get_variable_scope().reuse_variables()
+
+    # The loop carries the states of every layer, and the attention and
+    # alignment of the attention layers.
+    attention_layers = [attention is not None for attention in attentions[1:]]
+    layers = len(attention_layers)
+    attention_layers_count = sum(attention_layers)
+
+    def unflatten(tensors):
+      tensors = iter(tensors)
+      return [None] + [
+          next(tensors) if attention else None
+          for attention in attention_layers]
+
+    def body(time, prev_logit, logits_ta, *loop_states):
+      states = [None] + list(loop_states[:layers])
+      attentions = unflatten(
+          loop_states[layers:layers + attention_layers_count])
+      alignments = unflatten(loop_states[layers + attention_layers_count:])
+      for state in states[1:]:
+        state.set_shape([self.batch_size, self.model_params.decoder_cell_size])
+      for attention in filter(None, attentions):
+        attention.set_shape(
+            [self.batch_size, self.model_params.encoder_cell_size])
+
+      token = tokens_ta.read(time)
+      token.set_shape([self.batch_size])
+      with tf.device("/cpu:0"):
+        token = gru_ops.token_sample(
+            token, tf.nn.softmax(prev_logit),
+            sample_prob=self.optimization_params.sample_prob, seed=time)
+      (outputs, states, attentions, alignments) = self.create_decoder_cell(
+          None, states, attentions, alignments, encoder_states,
+          encoder_embedding, prev_logit, token=token)
+      logit = self.create_decoder_logit(outputs[-1])
+      return ([time + 1, logit, logits_ta.write(time, logit)] + states[1:] +
+              filter(None, attentions) + filter(None, alignments))
+
+    loop_vars = ([tf.constant(1, dtype=tf.int32), logit, logits_ta] +
+                 states[1:] + filter(None, attentions) +
+                 filter(None, alignments))
+    loop_vars = control_flow_ops.While(
+        lambda time, *_: time < decoder_steps, body, loop_vars)
+
+    logits = loop_vars[2].pack()
+    logits = array_ops.pad(
+        logits, array_ops.pack([
+            array_ops.pack([0, decoder_steps_max - decoder_steps]), [0, 0],
+            [0, 0]]))
+    logits.set_shape(
+        [decoder_steps_max, self.batch_size, self.model_params.vocab_size])
+    self.decoder_states = array_ops.unpack(logits, num=decoder_steps_max)
+    self.logits_pinyin = []
+    self.prob = [tf.nn.softmax(logit) for logit in self.decoder_states]
+    self.logprob = [tf.log(prob) for prob in self.prob]
+
+    loop_states = loop_vars[3:]
+    self.decoder_state_last = list(loop_states[:layers])
+    self.decoder_attention_last = list(
+        loop_states[layers:layers + attention_layers_count])
+    self.decoder_alignment_last = list(
+        loop_states[layers + attention_layers_count:])
+
+  # decoder_time_idx is None in the body of the While loop decoder, which
+  # gives the step's input token.
   def create_decoder_cell(
       self, decoder_time_idx, states, attentions, prev_alignments, encoder_states,
-      encoder_embedding, prev_logit, scope=None):
+      encoder_embedding, prev_logit, token=None, scope=None):
     batch_size = self.batch_size
     attention_embedding_size = self.model_params.attention_embedding_size
     decoder_cell_size = self.model_params.decoder_cell_size
@@ -327,7 +553,9 @@ class LASModel(object):
           "embedding", [self.model_params.vocab_size, self.model_params.embedding_size],
           initializer=tf.random_uniform_initializer(-sqrt3, sqrt3))
 
-      if decoder_time_idx == 0 or self.model_params.input_layer == 'placeholder':
+      if token is not None:
+        emb = embedding_ops.embedding_lookup(embedding, token)
+      elif decoder_time_idx == 0 or self.model_params.input_layer == 'placeholder':
         emb = embedding_ops.embedding_lookup(
             embedding, self.tokens[decoder_time_idx])
       elif self.model_params.input_layer == "decoder":
@@ -342,6 +570,10 @@ class LASModel(object):
             seed=len(self.prob)))
       emb.set_shape([batch_size, self.model_params.embedding_size])
 
+    alignment_name = "alignment"
+    if decoder_time_idx is not None:
+      alignment_name = "alignment_%d" % decoder_time_idx
+
     def create_attention(decoder_state, prev_alignment):
       with vs.variable_scope("attention"):
         U = vs.get_variable("U", [decoder_cell_size, attention_embedding_size])
@@ -351,6 +583,19 @@ class LASModel(object):
         # Decoder embedding.
         decoder_state.set_shape([batch_size, decoder_cell_size])
         d = nn_ops.xw_plus_b(decoder_state, U, b)
+        if self.model_params.attention_params.fused:
+          attention_mask_type = "none"
+          if self.model_params.attention_params.type in ["window", "median"]:
+            attention_mask_type = self.model_params.attention_params.type
+          a, c = attention_mask_ops.attention_step(
+              self.attention_len, encoder_embedding, encoder_states, d, v,
+              prev=prev_alignment,
+              mask=attention_mask_type,
+              index=decoder_time_idx or 0,
+              window_l=self.model_params.attention_params.median_window_l,
+              window_r=self.model_params.attention_params.median_window_r,
+              name=alignment_name)
+          return a, c
         d = array_ops.reshape(d, [batch_size, 1, 1, attention_embedding_size])
 
         # Energies.
@@ -358,18 +603,18 @@ class LASModel(object):
             v * math_ops.tanh(encoder_embedding + d), [2, 3])
         if self.model_params.attention_params.type == "window":
           e = attention_mask_ops.attention_mask_window(
-              self.encoder_states[-1][1], decoder_time_idx, e)
+              self.attention_len, decoder_time_idx, e)
         elif prev_alignment and self.model_params.attention_params.type == "median":
           window_l = self.model_params.attention_params.median_window_l
           window_r = self.model_params.attention_params.median_window_r
           e = attention_mask_ops.attention_mask_median(
-              self.encoder_states[-1][1], e, prev_alignment, window_l=window_l,
+              self.attention_len, e, prev_alignment, window_l=window_l,
               window_r=window_r)
         else:
-          e = attention_mask_ops.attention_mask(self.encoder_states[-1][1], e)
+          e = attention_mask_ops.attention_mask(self.attention_len, e)
 
         # Alignment.
-        a = nn_ops.softmax(e, name="alignment_%d" % (decoder_time_idx))
+        a = nn_ops.softmax(e, name=alignment_name)
 
         # Context.
         c = math_ops.reduce_sum(
@@ -480,6 +725,26 @@ class LASModel(object):
 
     print('create_loss graph time %f' % (time.time() - start_time))
 
+  # The sums of a batch added to the metrics accumulators: the weight of the
+  # tokens whose logits argmax is right, the weight of all the tokens and the
+  # weighted log-perplexity.
+  def create_metrics(self):
+    targets = self.tokens[1:]
+    weights = self.tokens_weights[1:]
+
+    correct = []
+    for logit, target, weight in zip(self.logits, targets, weights):
+      correct.append(tf.reduce_sum(weight * tf.to_float(tf.equal(
+          tf.to_int32(math_ops.argmax(logit, 1)), tf.to_int32(target)))))
+    logperps = seq2seq.sequence_loss_by_example(
+        self.logits, targets, weights, average_across_timesteps=False)
+
+    self.metrics_step = {
+        'correct': tf.add_n(correct),
+        'count': tf.add_n([tf.reduce_sum(weight) for weight in weights]),
+        'logperp': tf.reduce_sum(logperps)}
+    self.metrics_update = self.metrics.update(self.metrics_step)
+
   def create_loss_sequence_regression(self, state, labels, state_ws, pred_ws, weight):
     assert len(labels) == len(state_ws)
     assert len(labels) == len(pred_ws)
@@ -652,7 +917,10 @@ class LASModel(object):
           grads, self.optimization_params.max_gradient_norm, name="clip_gradients")
       self.gradient_norm = norm
 
-    if self.optimization_params.type == "adagrad":
+    # The bucket graphs share one optimizer (and its slots).
+    if self.optimizer:
+      opt = self.optimizer
+    elif self.optimization_params.type == "adagrad":
       opt = tf.train.AdagradOptimizer(
           learning_rate=self.optimization_params.adagrad.learning_rate,
           initial_accumulator_value=self.optimization_params.adagrad.initial_accumulator_value)
@@ -673,6 +941,7 @@ class LASModel(object):
     else:
       raise ValueError(
           "Unknown optimization type: %s" % str(self.optimization_params))
+    self.optimizer = opt
 
     self.updates.append(opt.apply_gradients(
         zip(cgrads, params), global_step=self.global_step))
@@ -687,7 +956,10 @@ class LASModel(object):
         fetches.extend(target)
       else:
         fetches.append(target)
-    r = sess.run(fetches, feed_dict)
+    if self.profiler:
+      r = self.profiler.run(sess, fetches, feed_dict)
+    else:
+      r = sess.run(fetches, feed_dict)
 
     f = {}
     start = 0
@@ -704,31 +976,32 @@ class LASModel(object):
     return f
 
 
-  def compute_accuracy(self, logits, targets, weights):
-    assert len(logits) == len(targets)
-    assert len(logits) == len(weights)
-    correct = 0.0
-    count = 0.0
-    for logit, target, weight in zip(logits, targets, weights):
-      correct = correct + (np.equal(logit.argmax(axis=1), np.array(target)).astype(float) * weight).sum()
-      count = count + weight.sum()
-
-    self.epoch_correct = self.epoch_correct + correct
-    self.epoch_count = self.epoch_count + count
-    self.epoch_accuracy = self.epoch_correct / self.epoch_count
-
-    return correct / count
+  # Reads the epoch's sums of the metrics accumulators.
+  def read_metrics(self, sess):
+    metrics = self.metrics.read(sess)
+    self.epoch_correct = metrics['correct']
+    self.epoch_count = metrics['count']
+    self.epoch_accuracy = metric_utils.Ratio(
+        self.epoch_correct, self.epoch_count)
+    self.epoch_logperp = metric_utils.Ratio(
+        metrics['logperp'], self.epoch_count)
 
 
   def step_epoch(self, sess, forward_only):
     steps_per_epoch = int(math.ceil(self.dataset_size // self.batch_size))
 
-    self.epoch_correct = 0
-    self.epoch_count = 0
-
+    sess.run(self.metrics.reset)
+    if self.profiler:
+      self.profiler.reset()
+    step_time_total = self.step_time_total
+    if self.eval_input:
+      self.eval_input.start(sess)
     for s in range(steps_per_epoch):
       self.step(sess, forward_only)
+    if self.eval_input:
+      self.eval_input.finish(sess)
     self.epochs = self.step_total / steps_per_epoch
+    self.read_metrics(sess)
 
     if not forward_only:
       print("logdir: %s" % self.logdir)
@@ -740,19 +1013,34 @@ class LASModel(object):
     acc_proto = results_proto.acc
     acc_proto.pos = int(self.epoch_correct)
     acc_proto.count = int(self.epoch_count)
+    results_proto.log_perplexity = self.epoch_logperp
 
     with open(os.path.join(self.logdir, 'results_%d.pbtxt' % self.epochs), 'w') as proto_file:
       proto_file.write(str(results_proto))
 
+    if self.profiler:
+      profile_proto = speech4_pb2.ProfileProto()
+      profile_proto.secs = self.step_time_total - step_time_total
+      profile_proto.steps = steps_per_epoch
+      self.profiler.fill(profile_proto)
+      with open(os.path.join(self.logdir, 'profile_%s_%d.pbtxt' % (
+          self.profiler.name, self.epochs)), 'w') as proto_file:
+        proto_file.write(str(profile_proto))
+      print(self.profiler.summary())
+
     print("*** epoch done %d ***" % (self.epochs + self.global_epochs))
-    print("step_total %d, avg_step_time: %f, accuracy %f" % (
-        self.step_total, self.avg_step_time, self.epoch_accuracy))
+    print("step_total %d, avg_step_time: %f, accuracy %f, perplexity %f" % (
+        self.step_total, self.avg_step_time, self.epoch_accuracy,
+        np.exp(self.epoch_logperp)))
     print("*** epoch done %d ***" % self.epochs)
 
 
   def step(self, sess, forward_only):
     start_time = time.time()
 
+    if self.bucket_graphs:
+      input_utils.UseBucket(sess, self)
+
     steps_per_report = 100
     report = forward_only or (self.step_total % steps_per_report == 0)
 
@@ -761,11 +1049,10 @@ class LASModel(object):
       #targets['features_fbank'] = self.features_fbank
       targets['uttid'] = self.uttid
       targets['text'] = self.text
-      targets['tokens'] = self.tokens
-      targets['tokens_weights'] = self.tokens_weights
       if not self.model_params.encoder_only:
         targets['logperp'] = self.logperp
-        targets['logits'] = self.logits
+        targets['correct'] = self.metrics_step['correct']
+        targets['count'] = self.metrics_step['count']
 
       if self.model_params.encoder_lm:
         targets['encoder_lm_loss'] = self.loss_encoder_lm_loss
@@ -781,8 +1068,14 @@ class LASModel(object):
 
     if not forward_only:
       targets['updates'] = self.updates
+    if self.metrics_update is not None:
+      targets['metrics_update'] = self.metrics_update
+    if self.bucket_graphs:
+      targets['bucket_next'] = self.bucket_order
 
     fetches = self.run_graph(sess, targets)
+    if self.bucket_graphs:
+      self.bucket_next = fetches['bucket_next']
 
     step_time = time.time() - start_time
     self.step_total += 1
@@ -825,9 +1118,8 @@ class LASModel(object):
         gradient_norm = fetches['gradient_norm']
       
       accuracy = 0.0
-      if 'logits' in fetches:
-        accuracy = self.compute_accuracy(
-            fetches['logits'], fetches['tokens'][1:], fetches['tokens_weights'][1:])
+      if 'correct' in fetches:
+        accuracy = metric_utils.Ratio(fetches['correct'], fetches['count'])
 
       if not forward_only:
         self.saver.save(
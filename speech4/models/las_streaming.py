@@ -0,0 +1,289 @@
+###############################################################################
+# Copyright 2015 William Chan <williamchan@cmu.edu>.
+###############################################################################
+
+
+import numpy as np
+
+import tensorflow as tf
+from tensorflow.python.ops import array_ops
+from tensorflow.python.ops import gru_ops
+from tensorflow.python.ops import variable_scope as vs
+from speech4.models import las_decoder
+from speech4.models import utterance
+
+
+# The median of each row of a [batch, length] alignment, the index at which
+# its cumulative sum exceeds 0.5 (see ComputeMedian in attention_mask_op).
+# A row that never does is past the end, except an all zero (or empty) row:
+# the decoder starts attending at frame 0.
+def AlignmentMedians(alignment):
+  if not alignment.shape[1]:
+    return np.zeros([alignment.shape[0]], dtype=np.int64)
+  above = np.cumsum(alignment, axis=1) > 0.5
+  medians = np.where(
+      above.any(axis=1), above.argmax(axis=1), alignment.shape[1])
+  medians[~alignment.any(axis=1)] = 0
+  return medians
+
+
+# The state of one utterance being decoded online: the carried encoder GRU
+# states, the encoder outputs so far (the first encoder_cache_len of them are
+# in the encoder cache slot) and the frames not yet encoded.
+class Stream(utterance.Utterance):
+  def __init__(self):
+    super(Stream, self).__init__()
+
+    self.encoder_h = []
+    self.encoder_outputs = None
+    self.encoder_len = 0
+    self.encoder_cache_len = 0
+
+    self.frames = None
+    self.frames_total = 0
+    self.final = False
+
+
+# Streaming (online) LAS decoding. The features arrive in chunks of
+# decoder_params.streaming_chunk_len frames; each chunk is run through the
+# encoder pyramid with the GRU states carried over from the previous chunk,
+# and its outputs are appended to the utterance's encoder cache slot. The
+# decoder advances the beam only while the median attention window of every
+# live hypothesis lies inside the encoder outputs seen so far, so the partial
+# hypotheses match the ones of decoding the whole utterance.
+class StreamingDecoder(las_decoder.Decoder):
+  def __init__(
+      self, sess, dataset, dataset_size, logdir, ckpt, decoder_params,
+      model_params):
+    super(StreamingDecoder, self).__init__(
+        sess, dataset, dataset_size, logdir, ckpt, decoder_params,
+        model_params)
+
+    if self.model_params.encoder_layer:
+      self.strides = [int(s) for s in self.model_params.encoder_layer]
+    else:
+      self.strides = [1, 1, 2, 2]
+    # The chunks must be aligned to the pyramid, so every subsampled layer
+    # keeps the same frames as on the whole utterance.
+    self.stride = int(np.prod(self.strides))
+    self.chunk_len = self.decoder_params.streaming_chunk_len
+    assert self.chunk_len > 0 and self.chunk_len % self.stride == 0, (
+        'streaming_chunk_len %d must be a multiple of %d' % (
+            self.chunk_len, self.stride))
+
+    self.window_r = self.model_params.attention_params.median_window_r
+    self.attention_len_max = self.model.encoder_cache[0].get_shape()[1].value
+
+    with tf.variable_scope("model", reuse=True):
+      self.create_chunk_encoder()
+    self.create_encoder_cache_append()
+
+  # The encoder of one chunk (batch of 1), sharing the variables of the
+  # model's encoder. The Gru op always starts from a zero state, so the chunk
+  # is unrolled with GruCell ops on the same "Gru" weights instead.
+  def create_chunk_encoder(self):
+    features_width = self.model.features[0].get_shape()[1].value
+    cell_size = self.model_params.encoder_cell_size
+
+    self.chunk_features = [
+        tf.placeholder(
+            tf.float32, shape=[1, features_width],
+            name="chunk_features_%d" % idx)
+        for idx in range(self.chunk_len)]
+    sequence_len = tf.constant(self.chunk_len, shape=[1], dtype=tf.int64)
+
+    self.chunk_states_initial = []
+    self.chunk_states_last = []
+    xs = self.chunk_features
+    for layer_idx, stride in enumerate(self.strides):
+      with vs.variable_scope(
+          '%s_%d' % (self.model_params.encoder_prefix, layer_idx + 1)):
+        h = tf.placeholder(
+            tf.float32, shape=[1, cell_size], name="chunk_state_initial")
+        self.chunk_states_initial.append(h)
+
+        hs = []
+        for x in xs[0::stride]:
+          _, _, _, _, h = gru_ops.gru_cell(
+              cell_size, sequence_len, h, x, scope="Gru")
+          h.set_shape([1, cell_size])
+          hs.append(h)
+        self.chunk_states_last.append(h)
+        xs = hs
+    self.chunk_outputs = array_ops.concat(0, xs)
+
+  # Appends encoder outputs to one slot of the model's encoder cache. Only the
+  # new outputs are fed; the states and embedding rows of the slot are updated
+  # in the graph, keeping the outputs before the offset and zeroing the ones
+  # after the new outputs (left over from the slot's previous utterance).
+  def create_encoder_cache_append(self):
+    states_cache, embedding_cache, len_cache = self.model.encoder_cache
+    cell_size = self.model_params.encoder_cell_size
+    length = self.attention_len_max
+
+    self.cache_append_slot = tf.placeholder(
+        tf.int32, shape=[1], name="cache_append_slot")
+    self.cache_append_offset = tf.placeholder(
+        tf.int32, shape=[], name="cache_append_offset")
+    self.cache_append_outputs = tf.placeholder(
+        tf.float32, shape=[None, cell_size], name="cache_append_outputs")
+    self.cache_append_len = tf.placeholder(
+        tf.int64, shape=[1], name="cache_append_len")
+
+    outputs_len = tf.shape(self.cache_append_outputs)[0]
+    paddings = tf.pack([
+        tf.pack([self.cache_append_offset,
+                 length - self.cache_append_offset - outputs_len]),
+        tf.constant([0, 0])])
+    keep = tf.reshape(tf.cast(
+        tf.less(tf.range(0, length), self.cache_append_offset), tf.float32),
+        [1, length, 1, 1])
+
+    def append(cache, values):
+      width = values.get_shape()[1].value
+      row = array_ops.gather(cache, self.cache_append_slot)
+      values = tf.reshape(tf.pad(values, paddings), [1, length, 1, width])
+      return tf.scatter_update(
+          cache, self.cache_append_slot, row * keep + values)
+
+    embedding = tf.nn.conv2d(
+        tf.reshape(self.cache_append_outputs, [1, -1, 1, cell_size]),
+        self.model.encoder_embedding_kernel, [1, 1, 1, 1], "SAME")
+    embedding_size = embedding.get_shape()[3].value
+    with tf.device("/cpu:0"):
+      len_update = tf.scatter_update(
+          len_cache, self.cache_append_slot, self.cache_append_len)
+    self.cache_append = tf.group(
+        append(states_cache, self.cache_append_outputs),
+        append(embedding_cache, tf.reshape(embedding, [-1, embedding_size])),
+        len_update)
+
+  def start_stream(self, utt=None):
+    stream = Stream()
+    if utt:
+      stream.text = utt.text
+      stream.uttid = utt.uttid
+    stream.encoder_slot = self.encoder_cache_slots_free.pop(0)
+
+    cell_size = self.model_params.encoder_cell_size
+    stream.encoder_h = [
+        np.zeros([1, cell_size], dtype=np.float32) for _ in self.strides]
+    stream.encoder_outputs = np.zeros(
+        [self.attention_len_max, cell_size], dtype=np.float32)
+
+    features_width = self.model.features[0].get_shape()[1].value
+    stream.frames = np.zeros([0, features_width], dtype=np.float32)
+    return stream
+
+  # Adds [n, features_width] frames (after frame_stack / frame_skip) to the
+  # stream, encodes the complete chunks and advances the beam as far as the
+  # encoder outputs allow. Returns the best partial hypothesis.
+  def feed(self, sess, stream, features):
+    assert not stream.final
+    stream.frames = np.concatenate([stream.frames, features])
+    stream.frames_total += features.shape[0]
+
+    encoder_len = stream.encoder_len
+    while stream.frames.shape[0] >= self.chunk_len:
+      self.run_chunk(sess, stream, stream.frames[:self.chunk_len])
+      stream.frames = stream.frames[self.chunk_len:]
+    if stream.encoder_len != encoder_len:
+      self.update_encoder_cache(sess, stream)
+
+    self.step_stream(sess, stream)
+    return self.partial_hypothesis(stream)
+
+  # Encodes the remaining frames and runs the beam search to the end.
+  def finish(self, sess, stream):
+    stream.final = True
+    if stream.frames.shape[0]:
+      chunk = np.zeros(
+          [self.chunk_len, stream.frames.shape[1]], dtype=np.float32)
+      chunk[:stream.frames.shape[0]] = stream.frames
+      self.run_chunk(sess, stream, chunk)
+      stream.frames = stream.frames[:0]
+    # As in the model, a layer of stride s keeps len / s of its input frames.
+    stream.encoder_len = min(
+        stream.encoder_len, stream.frames_total // self.stride)
+    self.update_encoder_cache(sess, stream)
+
+    self.step_stream(sess, stream)
+    self.finish_utterance(stream)
+    return stream
+
+  def run_chunk(self, sess, stream, chunk):
+    feed_dict = {}
+    feed_dict[tuple(self.chunk_features)] = chunk[:, np.newaxis, :]
+    for placeholder, h in zip(self.chunk_states_initial, stream.encoder_h):
+      feed_dict[placeholder] = h
+
+    fetches = {}
+    fetches['outputs'] = self.chunk_outputs
+    fetches['states_last'] = self.chunk_states_last
+    fetches = self.model.run_graph(sess, fetches, feed_dict=feed_dict)
+
+    stream.encoder_h = fetches['states_last']
+    outputs = fetches['outputs'][:self.attention_len_max - stream.encoder_len]
+    stream.encoder_outputs[
+        stream.encoder_len:stream.encoder_len + outputs.shape[0]] = outputs
+    stream.encoder_len += outputs.shape[0]
+
+  # Appends the encoder outputs not yet in the stream's cache slot, so the
+  # cost of an update grows with the chunk rather than the utterance.
+  def update_encoder_cache(self, sess, stream):
+    offset = min(stream.encoder_cache_len, stream.encoder_len)
+
+    feed_dict = {}
+    feed_dict[self.cache_append_slot] = np.array(
+        [stream.encoder_slot], dtype=np.int32)
+    feed_dict[self.cache_append_offset] = offset
+    feed_dict[self.cache_append_outputs] = stream.encoder_outputs[
+        offset:stream.encoder_len]
+    feed_dict[self.cache_append_len] = np.array(
+        [stream.encoder_len], dtype=np.int64)
+    sess.run(self.cache_append, feed_dict=feed_dict)
+    stream.encoder_cache_len = stream.encoder_len
+
+  def step_stream(self, sess, stream):
+    if stream.beam is None:
+      if not stream.encoder_len or not self.window_ready(stream):
+        return
+      self.start_utterances(sess, [stream])
+    while stream.beam.size and self.window_ready(stream):
+      self.step_utterances(sess, [stream])
+
+  # Whether the next decoder step sees the same attention window as it would
+  # on the whole utterance: the window ends window_r frames right of the
+  # median of the previous alignment (see AttentionMaskMedian).
+  def window_ready(self, stream):
+    if stream.final:
+      return True
+    if stream.beam is None:
+      alignments = self.create_decoder_alignments_zero()
+    else:
+      alignments = [
+          alignment[:stream.beam.size]
+          for alignment in stream.beam.alignment_prev]
+
+    median = 0
+    for alignment in alignments:
+      if alignment.shape[0]:
+        median = max(median, AlignmentMedians(alignment).max())
+    return median + self.window_r < stream.encoder_len
+
+  def partial_hypothesis(self, stream):
+    if stream.beam is None or not stream.beam.size:
+      return ''
+    return stream.beam.backtrack(len(stream.beam.tokens_history), 0)
+
+  # Decodes the dataset as if each utterance arrived chunk by chunk.
+  def decode_utterances(self, sess):
+    for _ in range(self.dataset_size):
+      utt = self.read_utterance(sess)
+      features = np.concatenate(utt.features)[:utt.features_len[0]]
+
+      stream = self.start_stream(utt)
+      for start in range(0, features.shape[0], self.chunk_len):
+        partial = self.feed(sess, stream, features[start:start + self.chunk_len])
+        print 'partial hyp : %s' % partial
+      yield self.finish(sess, stream)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import os.path
+import sys
+
+SPEECH4_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../')
+sys.path.append(os.path.join(SPEECH4_ROOT))
+
+import numpy as np
+import tensorflow as tf
+from speech4.models import las_streaming
+
+
+# A beam of one hypothesis whose attention moves one frame right per step.
+class FakeBeam(object):
+  def __init__(self, attention_len):
+    self.size = 1
+    self.tokens_history = []
+    self.alignment_prev = [np.zeros([1, attention_len], dtype=np.float32)]
+
+  def step(self):
+    position = len(self.tokens_history)
+    self.tokens_history.append('a')
+    self.alignment_prev[0][:] = 0.0
+    self.alignment_prev[0][0, position] = 1.0
+
+  def backtrack(self, length, idx):
+    return ''.join(self.tokens_history[:length])
+
+
+# A StreamingDecoder without a model: a chunk yields chunk_len encoder
+# outputs and the beam search steps a FakeBeam.
+class FakeStreamingDecoder(las_streaming.StreamingDecoder):
+  def __init__(self):
+    self.chunk_len = 4
+    self.window_r = 2
+    self.attention_len_max = 32
+
+  def create_decoder_alignments_zero(self):
+    return [np.zeros([1, self.attention_len_max], dtype=np.float32)]
+
+  def run_chunk(self, sess, stream, chunk):
+    stream.encoder_len += chunk.shape[0]
+
+  def update_encoder_cache(self, sess, stream):
+    stream.encoder_cache_len = stream.encoder_len
+
+  def start_utterances(self, sess, streams):
+    for stream in streams:
+      stream.beam = FakeBeam(self.attention_len_max)
+
+  def step_utterances(self, sess, streams):
+    for stream in streams:
+      stream.beam.step()
+
+
+class LasStreamingTest(tf.test.TestCase):
+  def testAlignmentMedians(self):
+    alignment = np.array([[0.0, 0.2, 0.4, 0.4],
+                          [0.0, 0.0, 0.0, 0.0],
+                          [0.1, 0.1, 0.1, 0.1],
+                          [0.6, 0.4, 0.0, 0.0]])
+    self.assertAllEqual(las_streaming.AlignmentMedians(alignment),
+                        [2, 0, 4, 0])
+    self.assertAllEqual(las_streaming.AlignmentMedians(np.zeros([2, 0])),
+                        [0, 0])
+
+  def testWindowReadyBeforeFirstStep(self):
+    decoder = FakeStreamingDecoder()
+    stream = las_streaming.Stream()
+    for encoder_len in range(decoder.window_r + 1):
+      stream.encoder_len = encoder_len
+      self.assertFalse(decoder.window_ready(stream))
+    stream.encoder_len = decoder.window_r + 1
+    self.assertTrue(decoder.window_ready(stream))
+
+  def testPartialHypothesisBeforeFinish(self):
+    decoder = FakeStreamingDecoder()
+    stream = las_streaming.Stream()
+    stream.frames = np.zeros([0, 3], dtype=np.float32)
+
+    partial = decoder.feed(None, stream, np.zeros([4, 3], dtype=np.float32))
+    # The steps whose previous median + window_r is inside the 4 outputs: the
+    # first one attends from frame 0, the next ones at medians 0 and 1.
+    self.assertEqual(partial, 'aaa')
+    self.assertFalse(stream.final)
+
+    partial = decoder.feed(None, stream, np.zeros([4, 3], dtype=np.float32))
+    self.assertEqual(partial, 'aaaaaaa')
+
+
+if __name__ == '__main__':
+  tf.test.main()
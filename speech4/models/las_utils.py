@@ -1,28 +1,128 @@
 import numpy as np
 
 
+# Maps the tokens (characters, words, ids) of a batch of sequences to padded
+# int32 arrays, padding uses `pad` which never matches a real token.
+def _ToIds(sequences, vocab, pad):
+  ids = np.empty([len(sequences), max([len(s) for s in sequences] + [0])],
+                 dtype=np.int32)
+  ids.fill(pad)
+  for b, sequence in enumerate(sequences):
+    ids[b, :len(sequence)] = [vocab.setdefault(x, len(vocab)) for x in sequence]
+  return ids
+
+
+# Computes the Levenshtein DP matrices d[b, j, i] (hyp position j, ref position
+# i) of a batch of pairs. Each hyp row is computed for the whole batch at once:
+# the within-row insertion chain d[j, i] = min(d[j, i - 1] + 1, ...) is
+# resolved with a running minimum of d[j, i] - i.
+def _EditDistanceMatrix(ref, hyp):
+  batch_size, ref_len_max = ref.shape
+  hyp_len_max = hyp.shape[1]
+
+  offset = np.arange(ref_len_max + 1, dtype=np.int32)
+  d = np.empty([batch_size, hyp_len_max + 1, ref_len_max + 1], dtype=np.int32)
+  d[:, 0, :] = offset
+
+  row = np.empty([batch_size, ref_len_max + 1], dtype=np.int32)
+  for j in range(1, hyp_len_max + 1):
+    cost = (ref != hyp[:, j - 1:j]).astype(np.int32)
+    row[:, 0] = j
+    np.minimum(d[:, j - 1, 1:] + 1, d[:, j - 1, :-1] + cost, out=row[:, 1:])
+    row -= offset
+    np.minimum.accumulate(row, axis=1, out=d[:, j, :])
+    d[:, j, :] += offset
+  return d
+
+
+# Walks back from d[hyp_len, ref_len] and counts the edits on the best path.
+def _Backtrace(d, ref, hyp, ref_len, hyp_len):
+  d = d.tolist()
+  sub = ins = dele = 0
+  j, i = hyp_len, ref_len
+  while i > 0 or j > 0:
+    if i > 0 and j > 0 and d[j][i] == d[j - 1][i - 1] + (ref[i - 1] != hyp[j - 1]):
+      sub += int(ref[i - 1] != hyp[j - 1])
+      i -= 1
+      j -= 1
+    elif i > 0 and d[j][i] == d[j][i - 1] + 1:
+      dele += 1
+      i -= 1
+    else:
+      ins += 1
+      j -= 1
+  return sub, ins, dele
+
+
+# Returns an int64 [len(refs), 3] array of (substitutions, insertions,
+# deletions) for each (ref, hyp) pair. The pairs are scored batch_size at a
+# time so the DP matrices stay small.
+def EditDistanceBreakdown(refs, hyps, batch_size=64):
+  assert len(refs) == len(hyps)
+  results = np.zeros([len(refs), 3], dtype=np.int64)
+  vocab = {}
+  for start in range(0, len(refs), batch_size):
+    refs_batch = refs[start:start + batch_size]
+    hyps_batch = hyps[start:start + batch_size]
+    ref = _ToIds(refs_batch, vocab, -1)
+    hyp = _ToIds(hyps_batch, vocab, -2)
+
+    d = _EditDistanceMatrix(ref, hyp)
+    for b in range(len(refs_batch)):
+      ref_len = len(refs_batch[b])
+      hyp_len = len(hyps_batch[b])
+      results[start + b] = _Backtrace(
+          d[b, :hyp_len + 1, :ref_len + 1], ref[b].tolist(), hyp[b].tolist(),
+          ref_len, hyp_len)
+  return results
+
+
 def LevensteinDistance(ref, hyp):
-  d = np.zeros([len(hyp) + 1, len(ref) + 1], dtype=np.int64)
-
-  for i in range(1, len(ref) + 1):
-    d[0, i] = i
-  for j in range(1, len(hyp) + 1):
-    d[j, 0] = j
-
-  for j in range(1, len(hyp) + 1):
-    for i in range(1, len(ref) + 1):
-      if ref[i - 1] == hyp[j - 1]:
-        d[j, i] = d[j - 1, i - 1]
-      else:
-        deletion     = d[j, i - 1] + 1
-        insertion    = d[j - 1, i] + 1
-        substitution = d[j - 1, i - 1] + 1
-
-        if deletion < insertion and deletion < substitution:
-          d[j, i] = deletion
-        elif insertion < substitution:
-          d[j, i] = insertion
-        else:
-          d[j, i] = substitution
-
-  return d[len(hyp), len(ref)]
+  return int(EditDistanceBreakdown([ref], [hyp])[0].sum())
+
+
+# Splits a time-major [time, batch] array into the sequences of its batch
+# entries: the first lengths[b] steps of entry b (all of them if lengths is
+# None), without the steps equal to drop.
+def TimeMajorToSequences(x, lengths=None, drop=None):
+  x = np.asarray(x)
+  sequences = []
+  for b in range(x.shape[1]):
+    sequence = x[:, b] if lengths is None else x[:int(lengths[b]), b]
+    if drop is not None:
+      sequence = sequence[sequence != drop]
+    sequences.append(sequence.tolist())
+  return sequences
+
+
+# Adds the edit distances of the (ref, hyp) pairs to the running totals of an
+# EditDistanceResultsProto (without updating its error_rate) and returns the
+# per pair breakdown.
+def AddEditDistanceResults(refs, hyps, proto):
+  breakdown = EditDistanceBreakdown(refs, hyps)
+
+  proto.sub += int(breakdown[:, 0].sum())
+  proto.ins += int(breakdown[:, 1].sum())
+  # "del" is a python keyword.
+  setattr(proto, "del", getattr(proto, "del") + int(breakdown[:, 2].sum()))
+  proto.edit_distance += int(breakdown.sum())
+  proto.ref_length += sum(len(ref) for ref in refs)
+  proto.hyp_length += sum(len(hyp) for hyp in hyps)
+  return breakdown
+
+
+# Fills an EditDistanceResultsProto with the corpus totals of all the
+# (ref, hyp) pairs and returns the per pair breakdown.
+def ComputeEditDistanceResults(refs, hyps, proto):
+  breakdown = EditDistanceBreakdown(refs, hyps)
+
+  proto.sub = int(breakdown[:, 0].sum())
+  proto.ins = int(breakdown[:, 1].sum())
+  # "del" is a python keyword.
+  setattr(proto, "del", int(breakdown[:, 2].sum()))
+  proto.edit_distance = int(breakdown.sum())
+  proto.ref_length = sum(len(ref) for ref in refs)
+  proto.hyp_length = sum(len(hyp) for hyp in hyps)
+  if proto.ref_length:
+    proto.error_rate = float(proto.edit_distance) / float(proto.ref_length)
+  return breakdown
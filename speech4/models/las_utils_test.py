@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import os.path
+import sys
+
+SPEECH4_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../')
+sys.path.append(os.path.join(SPEECH4_ROOT))
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.core.framework import speech4_pb2
+from speech4.models import las_utils
+
+
+class LasUtilsTest(tf.test.TestCase):
+  def testTimeMajorToSequences(self):
+    # [time, batch] with a batch of 3.
+    x = np.array([[1, 5, 4],
+                  [4, 6, 2],
+                  [3, 0, 4],
+                  [0, 0, 7]])
+    self.assertEqual(las_utils.TimeMajorToSequences(x),
+                     [[1, 4, 3, 0], [5, 6, 0, 0], [4, 2, 4, 7]])
+    self.assertEqual(las_utils.TimeMajorToSequences(x, drop=0),
+                     [[1, 4, 3], [5, 6], [4, 2, 4, 7]])
+    self.assertEqual(las_utils.TimeMajorToSequences(x, [3, 1, 4], drop=4),
+                     [[1, 3], [5], [2, 7]])
+
+  def testAddEditDistanceResultsBatch(self):
+    refs = las_utils.TimeMajorToSequences(
+        np.array([[1, 1], [2, 2], [3, 3], [0, 4]]), drop=0)
+    hyps = las_utils.TimeMajorToSequences(
+        np.array([[1, 1], [9, 2], [3, 4], [4, 4]]), [4, 2], drop=4)
+    # refs [1 2 3] and [1 2 3 4], hyps [1 9 3] and [1 2].
+    self.assertEqual(hyps, [[1, 9, 3], [1, 2]])
+
+    proto = speech4_pb2.EditDistanceResultsProto()
+    breakdown = las_utils.AddEditDistanceResults(refs, hyps, proto)
+    self.assertAllEqual(breakdown, [[1, 0, 0], [0, 0, 2]])
+    las_utils.AddEditDistanceResults([[5, 6]], [[5, 6, 7]], proto)
+
+    self.assertEqual(proto.sub, 1)
+    self.assertEqual(proto.ins, 1)
+    self.assertEqual(getattr(proto, "del"), 2)
+    self.assertEqual(proto.edit_distance, 4)
+    self.assertEqual(proto.ref_length, 9)
+    self.assertEqual(proto.hyp_length, 8)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -3,6 +3,11 @@
 import google
 import numpy as np
 import os.path
+import sys
+
+SPEECH4_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../')
+sys.path.append(os.path.join(SPEECH4_ROOT))
+
 import tensorflow as tf
 from tensorflow.python.ops import array_ops
 from tensorflow.python.ops import embedding_ops
@@ -17,6 +22,8 @@ from tensorflow.python.ops import variable_scope as vs
 from tensorflow.python.ops.gen_user_ops import s4_parse_utterance
 import tensorflow.core.framework.token_model_pb2 as token_model_pb2
 import time
+from speech4.models import dataset_registry
+from speech4.models import input_utils
 
 
 FLAGS = tf.app.flags.FLAGS
@@ -98,28 +105,12 @@ class LASModel(object):
 
 
   def create_graph_inputs(self):
-    dataset_map = {}
-    if self.dataset == 'train_si284':
-      self.dataset = 'speech4/data/train_si284.tfrecords'
-      self.dataset_size = 37416
-    elif self.dataset == 'test_dev93':
-      self.dataset = 'speech4/data/test_dev93.tfrecords'
-      self.dataset_size = 503
-    elif self.dataset == 'test_eval92':
-      self.dataset = 'speech4/data/test_eval92.tfrecords'
-      self.dataset_size = 333
-    elif self.dataset == 'ptb_train':
-      self.dataset = 'speech4/data/ptb_train.tfrecords'
-      self.dataset_size = 42068
-    elif self.dataset == 'ptb_valid':
-      self.dataset = 'speech4/data/ptb_valid.tfrecords'
-      self.dataset_size = 3370
-    elif self.dataset == 'ptb_test':
-      self.dataset = 'speech4/data/ptb_test.tfrecords'
-      self.dataset_size = 3761
-    filename_queue = tf.train.string_input_producer([self.dataset])
-
-    reader = tf.TFRecordReader()
+    manifest = dataset_registry.load_manifest(self.dataset)
+    self.dataset = dataset_registry.dataset_paths(manifest)
+    self.dataset_size = manifest.size
+    filename_queue = tf.train.string_input_producer(self.dataset)
+
+    reader = input_utils.DatasetReader(self.dataset, parallel=True)
     _, serialized = reader.read(filename_queue)
 
     serialized = tf.train.shuffle_batch(
@@ -0,0 +1,42 @@
+import tensorflow as tf
+
+
+# Streaming sums kept in the graph, one float64 variable per name on the CPU.
+# Every step adds the scalars of its batch with an update() op, so reporting
+# the running metrics of an epoch only fetches the few sums instead of the
+# logits. The variables are left out of the variable collections (they are
+# not checkpointed nor shared between models), reset also initializes them.
+class Accumulators(object):
+  def __init__(self, names, name='accumulators'):
+    self.names = sorted(names)
+    self.variables = []
+    with tf.device('/cpu:0'), tf.name_scope(name):
+      for key in self.names:
+        self.variables.append(tf.Variable(
+            tf.constant(0.0, dtype=tf.float64), trainable=False,
+            collections=[], name=key))
+      self.reset = tf.group(*[
+          variable.assign(tf.constant(0.0, dtype=tf.float64))
+          for variable in self.variables])
+
+  # Returns the op adding values (a dict of name to scalar tensor) to the sums,
+  # names without a value are left as they are.
+  def update(self, values):
+    updates = []
+    with tf.device('/cpu:0'):
+      for key, variable in zip(self.names, self.variables):
+        if key in values:
+          updates.append(
+              variable.assign_add(tf.cast(values[key], tf.float64)))
+    return tf.group(*updates)
+
+  # The current sums as a dict of name to float.
+  def read(self, sess):
+    return dict(zip(self.names, sess.run(self.variables)))
+
+
+# Ratio of two sums, 0 while the denominator is.
+def Ratio(numerator, denominator):
+  if not denominator:
+    return 0.0
+  return float(numerator) / float(denominator)
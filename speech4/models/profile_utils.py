@@ -0,0 +1,149 @@
+import collections
+import os.path
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.core.protobuf import config_pb2
+from tensorflow.python.client import timeline
+
+
+# The op type of a traced node, its timeline label reads "name = Op(inputs)".
+def _OpType(node_stats):
+  label = node_stats.timeline_label
+  if ' = ' not in label:
+    return node_stats.node_name
+  return label.split(' = ', 1)[1].split('(', 1)[0]
+
+
+# Times the session runs of a model's steps. Every every_steps-th step is run
+# with a full trace: its step stats are aggregated by op type, the sizes of the
+# model's input queues are read right before it and its queue dequeue ops are
+# counted as input wait, so an epoch can be told input bound (starved queues,
+# most of the step in dequeues) from compute bound. The last traced step is
+# written as a chrome trace (timeline_<name>.json) and the traced steps as
+# TensorBoard scalars to logdir.
+class StepProfiler(object):
+  def __init__(self, every_steps, queue_runners, logdir=None, name='model'):
+    self.every_steps = every_steps
+    self.logdir = logdir
+    self.name = name
+
+    self.queue_names = [qr.queue.name for qr in queue_runners]
+    self.queue_sizes = [qr.queue.size() for qr in queue_runners]
+    self.summary_writer = None
+    if self.logdir:
+      self.summary_writer = tf.train.SummaryWriter(self.logdir)
+    self.summary_step = 0
+    self.reset()
+
+  def reset(self):
+    self.steps = 0
+    self.traced_steps = 0
+    self.traced_secs = 0.0
+    self.input_wait_secs = 0.0
+    self.starved_steps = 0
+    self.op_secs = collections.defaultdict(float)
+    self.op_counts = collections.defaultdict(int)
+    self.sizes = [[] for _ in self.queue_names]
+
+  # sess.run(fetches, feed_dict), traced if it is a profiled step.
+  def run(self, sess, fetches, feed_dict=None):
+    self.steps += 1
+    if self.every_steps <= 0 or self.steps % self.every_steps:
+      return sess.run(fetches, feed_dict)
+
+    sizes = sess.run(self.queue_sizes) if self.queue_sizes else []
+    options = config_pb2.RunOptions(
+        trace_level=config_pb2.RunOptions.FULL_TRACE)
+    run_metadata = config_pb2.RunMetadata()
+    start_time = time.time()
+    r = sess.run(fetches, feed_dict, options=options, run_metadata=run_metadata)
+    step_secs = time.time() - start_time
+
+    self.summary_step += self.every_steps
+    self.add_trace(run_metadata.step_stats, step_secs, sizes)
+    return r
+
+  def add_trace(self, step_stats, step_secs, sizes):
+    self.traced_steps += 1
+    self.traced_secs += step_secs
+    for queue_sizes, size in zip(self.sizes, sizes):
+      queue_sizes.append(size)
+    if any(size == 0 for size in sizes):
+      self.starved_steps += 1
+
+    input_wait_secs = 0.0
+    for dev_stats in step_stats.dev_stats:
+      # The GPU tracer's stream devices repeat the kernels of the GPU device.
+      if '/stream:' in dev_stats.device or '/memcpy' in dev_stats.device:
+        continue
+      for node_stats in dev_stats.node_stats:
+        op_type = _OpType(node_stats)
+        secs = node_stats.all_end_rel_micros * 1e-6
+        self.op_secs[op_type] += secs
+        self.op_counts[op_type] += 1
+        if op_type.startswith('QueueDequeue'):
+          input_wait_secs += secs
+    # Dequeues of parallel queues overlap, the wait is at most the step.
+    input_wait_secs = min(input_wait_secs, step_secs)
+    self.input_wait_secs += input_wait_secs
+
+    if self.logdir:
+      trace = timeline.Timeline(step_stats).generate_chrome_trace_format()
+      with open(os.path.join(
+          self.logdir, 'timeline_%s.json' % self.name), 'w') as trace_file:
+        trace_file.write(trace)
+
+      values = [
+          tf.Summary.Value(
+              tag='%s/step_secs' % self.name, simple_value=step_secs),
+          tf.Summary.Value(
+              tag='%s/input_wait_secs' % self.name,
+              simple_value=input_wait_secs)]
+      for queue_name, size in zip(self.queue_names, sizes):
+        values.append(tf.Summary.Value(
+            tag='%s/queue_size/%s' % (self.name, queue_name),
+            simple_value=float(size)))
+      self.summary_writer.add_summary(
+          tf.Summary(value=values), global_step=self.summary_step)
+      self.summary_writer.flush()
+
+  # Fills the traced step fields of profile_proto (secs and steps are the
+  # caller's), the op types by descending time.
+  def fill(self, profile_proto):
+    profile_proto.traced_steps = self.traced_steps
+    profile_proto.traced_secs = self.traced_secs
+    profile_proto.input_wait_secs = self.input_wait_secs
+    profile_proto.starved_steps = self.starved_steps
+
+    del profile_proto.ops[:]
+    for op_type in sorted(
+        self.op_secs, key=lambda op_type: -self.op_secs[op_type]):
+      op_proto = profile_proto.ops.add()
+      op_proto.type = op_type
+      op_proto.secs = self.op_secs[op_type]
+      op_proto.count = self.op_counts[op_type]
+
+    del profile_proto.queues[:]
+    for queue_name, sizes in zip(self.queue_names, self.sizes):
+      if not sizes:
+        continue
+      queue_proto = profile_proto.queues.add()
+      queue_proto.name = queue_name
+      queue_proto.size_mean = float(np.mean(sizes))
+      queue_proto.size_min = int(np.min(sizes))
+      queue_proto.empty_steps = sum(1 for size in sizes if size == 0)
+    return profile_proto
+
+  # A one line summary of the traced steps.
+  def summary(self):
+    if not self.traced_steps:
+      return 'profile %s: no traced steps' % self.name
+    input_wait = self.input_wait_secs / self.traced_secs
+    string = 'profile %s: step_time %f, input_wait %.2f, starved %d/%d' % (
+        self.name, self.traced_secs / self.traced_steps, input_wait,
+        self.starved_steps, self.traced_steps)
+    if input_wait > 0.5 or self.starved_steps * 2 > self.traced_steps:
+      string += ' (input bound)'
+    return string
@@ -39,7 +39,11 @@ from tensorflow.python.platform import gfile
 
 SPEECH4_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../')
 sys.path.append(os.path.join(SPEECH4_ROOT))
+from speech4.models import checkpoint_utils
+from speech4.models import input_utils
 from speech4.models import las_utils
+from speech4.models import metric_utils
+from speech4.models import profile_utils
 
 
 FLAGS = tf.app.flags.FLAGS
@@ -71,6 +75,12 @@ tf.app.flags.DEFINE_integer("epochs", 20,
 tf.app.flags.DEFINE_boolean("test_only", False,
                             """Test only.""")
 
+tf.app.flags.DEFINE_integer("profile_steps", 0,
+                            """Trace every profile_steps-th step (0 disables profiling).""")
+
+tf.app.flags.DEFINE_boolean("persistent", False,
+                            """Keep one graph and session across the epochs.""")
+
 tf.app.flags.DEFINE_string("logdir", "",
                            """Path to our outputs and logs.""")
 
@@ -156,7 +166,7 @@ class Wsj(object):
 
 
 class SpeechModel(object):
-  def __init__(self, sess, mode, dataset_params, model_params, optimization_params, batch_size=16, epoch=0, seed=1):
+  def __init__(self, sess, mode, dataset_params, model_params, optimization_params, batch_size=16, epoch=0, seed=1, reuse=False):
     dataset_params = try_load_proto(dataset_params, dataset_params)
     model_params = try_load_proto(model_params, model_params)
     optimization_params = try_load_proto(optimization_params, optimization_params)
@@ -174,8 +184,13 @@ class SpeechModel(object):
     if mode == "test":
       self.batch_size = 1
     self.mode = mode
+    # The input of the valid / test passes (see input_utils.EvalInput).
+    self.eval_input = None
     self.epoch = epoch
     self.seed = seed
+    self.reuse = reuse
+    # A profile_utils.StepProfiler timing the session runs of the steps.
+    self.profiler = None
     tf.set_random_seed(self.seed)
 
     if self.model_params.type == "cctc":
@@ -188,52 +203,131 @@ class SpeechModel(object):
     print("creating attention model...")
 
     initializer = tf.random_uniform_initializer(-0.1, 0.1)
-    with tf.variable_scope("model", initializer=initializer):
+    self.create_metrics_accumulators()
+    variables = set(tf.all_variables())
+    with tf.variable_scope("model", initializer=initializer, reuse=self.reuse or None):
       self.global_step = tf.Variable(0, trainable=False)
 
-      self.create_input()
-      self.create_encoder()
-      self.create_decoder(mode)
-      self.create_loss()
-      if mode == "train": self.create_optimizer()
-
-    print("initializing model...")
-    sess.run(tf.initialize_all_variables())
+      self.create_graphs(lambda: self.create_graph_attention(mode))
 
-    if gfile.Exists(self.model_params.ckpt):
-      self.restore(sess)
-    self.saver = tf.train.Saver(tf.all_variables())
+    self.initialize(sess, variables)
 
 
   def create_model_cctc(self, sess, mode):
     print("creating cctc model...")
     initializer = tf.random_uniform_initializer(-0.1, 0.1)
-    with tf.variable_scope("model", initializer=initializer):
+    self.create_metrics_accumulators()
+    variables = set(tf.all_variables())
+    with tf.variable_scope("model", initializer=initializer, reuse=self.reuse or None):
       self.global_step = tf.Variable(0, trainable=False)
 
-      self.create_input()
-      self.create_encoder_cctc(bidirectional=self.model_params.encoder_bidirectional)
-      self.create_decoder_cctc(mode)
-      self.create_loss_cctc()
-      if mode == "train": self.create_optimizer()
+      self.create_graphs(lambda: self.create_graph_cctc(mode))
+
+    self.initialize(sess, variables)
+
+
+  # The epoch's sums of the batch metrics the graph computes (metrics_step),
+  # every step adds its batch with metrics_update.
+  def create_metrics_accumulators(self):
+    self.metrics = metric_utils.Accumulators(
+        ["correct", "count", "logperp", "edit_distance", "ref_length"])
+    self.metrics_step = {}
+    self.metrics_update = None
+
+
+  # A model reusing the variables of another model of the graph only
+  # initializes the variables it created itself (its global_step), the shared
+  # ones already hold the trained values.
+  def initialize(self, sess, variables):
+    sess.run(self.metrics.reset)
+    if self.reuse:
+      sess.run(tf.initialize_variables(
+          [v for v in tf.all_variables() if v not in variables]))
+      return
 
     print("initializing model...")
     sess.run(tf.initialize_all_variables())
 
     if gfile.Exists(self.model_params.ckpt):
       self.restore(sess)
-    self.saver = tf.train.Saver(tf.all_variables())
+    self.saver = checkpoint_utils.CreateSaver(
+        tf.all_variables(), self.optimization_params)
 
+    if hasattr(self, "sync_init_tokens"):
+      sess.run(self.sync_init_tokens)
 
-  def create_input(self):
+
+  # Without buckets this is just create_graph(), otherwise every length
+  # bucket gets its own graph (see input_utils.CreateBucketGraphs).
+  def create_graphs(self, create_graph):
+    self.optimizer = None
+    self.bucket_graphs = []
+    if self.model_params.buckets:
+      self.create_bucket_input()
+      self.bucket_graphs = input_utils.CreateBucketGraphs(self, create_graph)
+    else:
+      create_graph()
+
+
+  def create_graph_attention(self, mode):
+    def create_tower():
+      self.create_encoder()
+      self.create_decoder(mode)
+      self.create_loss()
+    self.create_towers(create_tower)
+    self.metrics_update = self.metrics.update(self.metrics_step)
+    if mode == "train": self.create_optimizer()
+
+
+  def create_graph_cctc(self, mode):
+    # The cctc edit distance is scored on the host from a single tower.
+    assert self.model_params.towers <= 1
+    self.create_input()
+    self.tower_losses = None
+    self.create_encoder_cctc(bidirectional=self.model_params.encoder_bidirectional)
+    self.create_decoder_cctc(mode)
+    self.create_loss_cctc()
+    self.metrics_update = self.metrics.update(self.metrics_step)
+    if mode == "train": self.create_optimizer()
+
+
+  def create_reader(self):
     if not os.path.isfile(self.dataset_params.path):
       raise Exception("Invalid dataset: " % str(self.dataset_params))
     assert os.path.isfile(self.dataset_params.path)
     filename_queue = tf.train.string_input_producer([self.dataset_params.path])
 
-    reader = tf.TFRecordReader()
+    reader = input_utils.DatasetReader(self.dataset_params.path)
     _, serialized = reader.read(filename_queue)
+    return serialized
+
+
+  # Batches of a single length bucket, each dequeued by the graph of its
+  # bucket.
+  def create_bucket_input(self):
+    self.bucket_next = None
+    self.bucket_queues, self.bucket_order = input_utils.BucketBatch(
+        self.create_reader(), self.model_params.buckets, self.batch_size,
+        shuffle=bool(self.optimization_params and self.optimization_params.shuffle),
+        seed=self.seed, frame_skip=self.model_params.frame_skip)
+
+
+  def create_input(self):
+    self.create_parse(self.create_serialized())
+
+
+  # The [batch_size] serialized utterances of a step, with buckets the batch
+  # of the bucket (see input_utils.CreateBucketGraphs).
+  def create_serialized(self):
+    if self.model_params.buckets:
+      return self.serialized
 
+    if self.mode != "train":
+      self.eval_input = input_utils.EvalInput(
+          self.dataset_params.path, self.batch_size, self.dataset_params.size)
+      return self.eval_input.serialized
+
+    serialized = self.create_reader()
     if not self.optimization_params or self.optimization_params.shuffle == False:
       serialized = tf.train.batch(
           [serialized], batch_size=self.batch_size, num_threads=2,
@@ -242,10 +336,59 @@ class SpeechModel(object):
       serialized = tf.train.shuffle_batch(
           [serialized], batch_size=self.batch_size, num_threads=2,
           capacity=self.batch_size * 4 + 512, min_after_dequeue=512, seed=self.seed)
+    return serialized
+
+
+  def tower_device(self, idx):
+    if self.model_params.tower_devices:
+      return self.model_params.tower_devices[idx]
+    return "/cpu:%d" % idx
+
+
+  # Calls create_tower() once per data-parallel tower: the batch is split
+  # evenly, every tower parses its slice and builds the model on its device,
+  # sharing the variables. The losses of the towers are kept for
+  # create_gradient and their batch metrics summed.
+  def create_towers(self, create_tower):
+    towers = max(self.model_params.towers, 1)
+    # The test model decodes one utterance at a time.
+    if self.batch_size < towers:
+      towers = 1
+    if towers == 1:
+      self.create_input()
+      create_tower()
+      self.tower_losses = [self.losses]
+      return
 
+    assert self.batch_size % towers == 0, (
+        "batch_size %d must be a multiple of towers %d" % (self.batch_size, towers))
+    serialized = self.create_serialized()
+    batch_size = self.batch_size
+    self.batch_size = batch_size / towers
+
+    tower_losses = []
+    metrics_step = {}
+    for idx in range(towers):
+      with vs.variable_scope(vs.get_variable_scope(), reuse=True if idx else None):
+        with tf.device(self.tower_device(idx)), tf.name_scope("tower_%d" % idx):
+          self.create_parse(tf.slice(
+              serialized, [idx * self.batch_size], [self.batch_size]))
+          create_tower()
+      tower_losses.append(self.losses)
+      for key, value in self.metrics_step.iteritems():
+        if key in metrics_step:
+          value = metrics_step[key] + value
+        metrics_step[key] = value
+
+    self.batch_size = batch_size
+    self.tower_losses = tower_losses
+    self.metrics_step = metrics_step
+
+
+  def create_parse(self, serialized):
     assert self.model_params.features_width
     assert self.model_params.frame_stack
-    self.features, self.alignment, self.alignment_weight, _, self.features_len, _, _, self.s_min, self.s_max, self.text, self.tokens, self.tokens_pinyin, self.tokens_len, self.tokens_weights, self.tokens_pinyin_weights, self.uttid = s4_parse_utterance(
+    self.features, self.alignment, self.alignment_weight, _, self.features_len, _, _, self.s_min, self.s_max, self.text, self.tokens, self.tokens_pinyin, self.tokens_len, self.tokens_weights, self.tokens_pinyin_weights, self.uttid, _ = s4_parse_utterance(
         serialized, features_len_max=self.model_params.features_len_max,
         alignment_len_max=self.model_params.features_len_max / 4,
         tokens_len_max=self.model_params.tokens_len_max + 1,
@@ -462,36 +605,52 @@ class SpeechModel(object):
     #xs = []
     #for idx in range(input_time_stride - 1, len(self.encoder_states[-1][0]), input_time_stride):
     #  xs.append(self.encoder_states[-1][0][idx])
-    if bidirectional:
+    if (bidirectional and self.model_params.rnn_cell_type == "gru" and
+        self.model_params.gru_recompute_segment_len):
+      # Both directions, the per example reversal and the concat in one op,
+      # its gradient recomputes the gates like gru_lean.
+      self.encoder_states.append([gru_ops.gru_bidirectional(
+          cell_size=self.model_params.encoder_cell_size,
+          sequence_len=sequence_len, xs=xs,
+          segment_len=self.model_params.gru_recompute_segment_len),
+          sequence_len])
+    elif bidirectional and self.model_params.rnn_cell_type == "gru":
       with vs.variable_scope("fwd"):
-        if self.model_params.rnn_cell_type == "gru":
-          fwd = gru_ops.gru(
-              cell_size=self.model_params.encoder_cell_size,
-              sequence_len=sequence_len, xs=xs)[-1]
-        else:
-          fwd, _ = rnn.lstm_block(
-              xs, cell_size=self.model_params.encoder_cell_size,
-              sequence_length=sequence_len, xs=xs)
+        fwd = self.create_gru(sequence_len, xs)
       with vs.variable_scope("bwd"):
-        if self.model_params.rnn_cell_type == "gru":
-          bwd = rnn._reverse_seq(gru_ops.gru(
-              cell_size=self.model_params.encoder_cell_size,
-              sequence_len=sequence_len, xs=rnn._reverse_seq(xs, sequence_len))[-1], sequence_len)
-        else:
-          raise Exception("finish me")
+        bwd = rnn._reverse_seq(self.create_gru(
+            sequence_len, rnn._reverse_seq(xs, sequence_len)), sequence_len)
       self.encoder_states.append([[array_ops.concat(1, [fw, bw])
                                    for fw, bw in zip(fwd, bwd)], sequence_len])
+    elif bidirectional:
+      with vs.variable_scope("fwd"):
+        fwd, _ = rnn.lstm_block(
+            xs, cell_size=self.model_params.encoder_cell_size,
+            sequence_length=sequence_len, xs=xs)
+      with vs.variable_scope("bwd"):
+        raise Exception("finish me")
     else:
       if self.model_params.rnn_cell_type == "gru":
-        self.encoder_states.append([gru_ops.gru(
-            cell_size=self.model_params.encoder_cell_size,
-            sequence_len=sequence_len, xs=xs)[-1], sequence_len])
+        self.encoder_states.append(
+            [self.create_gru(sequence_len, xs), sequence_len])
       else:
         outputs, _ = rnn.lstm_block(
             xs, cell_size=self.model_params.encoder_cell_size,
             sequence_length=sequence_len)
         self.encoder_states.append([outputs, sequence_len])
 
+  # The outputs of a GRU over xs, the gates are recomputed in the backward
+  # pass if gru_recompute_segment_len is set.
+  def create_gru(self, sequence_len, xs):
+    if self.model_params.gru_recompute_segment_len:
+      return gru_ops.gru_lean(
+          cell_size=self.model_params.encoder_cell_size,
+          sequence_len=sequence_len, xs=xs,
+          segment_len=self.model_params.gru_recompute_segment_len)
+    return gru_ops.gru(
+        cell_size=self.model_params.encoder_cell_size,
+        sequence_len=sequence_len, xs=xs)[-1]
+
   def create_dynamic_encoder(self):
     print("creating dynamic encoder...")
 
@@ -751,6 +910,19 @@ class SpeechModel(object):
         # Decoder embedding.
         decoder_state.set_shape([batch_size, decoder_cell_size])
         d = nn_ops.xw_plus_b(decoder_state, U, b)
+        if self.model_params.attention_params.fused:
+          attention_mask_type = "none"
+          if self.model_params.attention_params.type in ["window", "median"]:
+            attention_mask_type = self.model_params.attention_params.type
+          a, c = attention_mask_ops.attention_step(
+              self.encoder_states[-1][1], encoder_embedding, self.encoder_state_legacy, d, v,
+              prev=prev_alignment,
+              mask=attention_mask_type,
+              index=decoder_time_idx,
+              window_l=self.model_params.attention_params.median_window_l,
+              window_r=self.model_params.attention_params.median_window_r,
+              name="alignment_%d" % (decoder_time_idx))
+          return a, c
         d = array_ops.reshape(d, [batch_size, 1, 1, attention_embedding_size])
 
         # Energies.
@@ -856,6 +1028,7 @@ class SpeechModel(object):
   def create_loss(self):
     print("creating loss...")
     self.losses = []
+    self.metrics_step = {}
     if self.model_params.loss.log_prob:
       self.create_loss_log_prob()
     if self.model_params.loss.edit_distance:
@@ -865,6 +1038,7 @@ class SpeechModel(object):
   def create_loss_cctc(self):
     print("creating loss...")
     self.losses = []
+    self.metrics_step = {}
     if self.model_params.cctc.xent:
       self.create_loss_cctc_xent()
     if self.model_params.cctc.weakly_supervised:
@@ -903,11 +1077,16 @@ class SpeechModel(object):
     self.log_perplexity = log_perplexity
     self.losses.append(log_perplexity)
 
-    # Warning, this doesn't take into account the weight!
     correct = []
-    for idx, logit in enumerate(self.logits):
-      correct.append(tf.nn.in_top_k(logit, targets[idx], 1))
-    self.correct = correct
+    for logit, target, weight in zip(self.logits, targets, weights):
+      correct.append(tf.reduce_sum(
+          weight * tf.to_float(tf.nn.in_top_k(logit, target, 1))))
+    logperps = seq2seq.sequence_loss_by_example(
+        self.logits, targets, weights, average_across_timesteps=False)
+    self.metrics_step["correct"] = tf.add_n(correct)
+    self.metrics_step["count"] = tf.add_n(
+        [tf.reduce_sum(weight) for weight in weights])
+    self.metrics_step["logperp"] = tf.reduce_sum(logperps)
 
 
   def create_loss_edit_distance(self):
@@ -916,6 +1095,8 @@ class SpeechModel(object):
 
     self.edit_distance = gen_array_ops.edit_distance_list(
         ref, hyp, collapse_eow=self.dataset_params.collapse_eow)
+    self.metrics_step["edit_distance"] = tf.reduce_sum(self.edit_distance[0])
+    self.metrics_step["ref_length"] = tf.reduce_sum(self.edit_distance[1])
 
 
   def create_optimizer(self):
@@ -931,7 +1112,10 @@ class SpeechModel(object):
       if isinstance(grad, tf.Tensor):
         grad.set_shape(grad.get_shape().merge_with(params[idx].get_shape()))
 
-    if self.optimization_params.type == "adagrad":
+    # The bucket graphs share one optimizer (and its slots).
+    if self.optimizer:
+      opt = self.optimizer
+    elif self.optimization_params.type == "adagrad":
       opt = tf.train.AdagradOptimizer(
           learning_rate=self.optimization_params.adagrad.learning_rate,
           initial_accumulator_value=self.optimization_params.adagrad.initial_accumulator_value)
@@ -961,14 +1145,33 @@ class SpeechModel(object):
       raise ValueError(
           "Unknown optimization type: %s" % str(self.optimization_params))
 
+    if self.optimization_params.sync_replicas:
+      # apply_gradients may only be called once.
+      assert not self.model_params.buckets
+      opt = tf.train.SyncReplicasOptimizer(
+          opt, replicas_to_aggregate=self.optimization_params.sync_replicas,
+          replica_id=0, total_num_replicas=1)
+    self.optimizer = opt
+
     self.updates = []
     self.updates.append(opt.apply_gradients(
         zip(self.grads, params), global_step=self.global_step))
 
+    if self.optimization_params.sync_replicas:
+      tf.train.add_queue_runner(opt.get_chief_queue_runner())
+      self.sync_init_tokens = opt.get_init_tokens_op()
+
 
   def create_gradient(self, params):
     print("creating gradient...")
-    self.grads = tf.gradients(self.losses, params)
+    if not self.tower_losses or len(self.tower_losses) == 1:
+      self.grads = tf.gradients(self.losses, params)
+    else:
+      tower_grads = []
+      for idx, losses in enumerate(self.tower_losses):
+        with tf.device(self.tower_device(idx)):
+          tower_grads.append(tf.gradients(losses, params))
+      self.grads = self.average_gradients(tower_grads)
 
     if self.optimization_params.max_gradient_norm:
       cgrads, norm = clip_ops.clip_by_global_norm(
@@ -978,19 +1181,59 @@ class SpeechModel(object):
       self.grads_norm = norm
 
 
+  # The mean of the towers' gradients of every param, sparse (embedding)
+  # gradients are made dense first.
+  def average_gradients(self, tower_grads):
+    grads = []
+    for param_grads in zip(*tower_grads):
+      param_grads = [grad for grad in param_grads if grad is not None]
+      if not param_grads:
+        grads.append(None)
+        continue
+      param_grads = [tf.convert_to_tensor(grad) for grad in param_grads]
+      grads.append(tf.add_n(param_grads) / float(len(tower_grads)))
+    return grads
+
+
   def step_epoch(self, sess, update, results_proto, profile_proto):
     steps_per_report = 10
     if update == False:
       steps_per_report = 1
+    sess.run(self.metrics.reset)
+    if self.profiler:
+      self.profiler.reset()
+    if self.eval_input:
+      self.eval_input.start(sess)
     for idx in range(self.dataset_params.size / self.batch_size):
       self.step(sess, update, results_proto, profile_proto)
 
       if (idx % steps_per_report) == 0:
+        self.read_metrics(sess, results_proto)
         percentage = np.float64(idx) / np.float64(self.dataset_params.size) * np.float64(self.batch_size)
         accuracy = np.float64(results_proto.acc.pos) / np.float64(results_proto.acc.count)
         edit_distance = np.float64(results_proto.edit_distance.edit_distance) / np.float64(results_proto.edit_distance.ref_length)
         step_time = profile_proto.secs / profile_proto.steps
         print "step: %.2f, step_time: %.2f, accuracy %.4f, edit_distance %.4f" % (percentage, step_time, accuracy, edit_distance)
+    if self.eval_input:
+      self.eval_input.finish(sess)
+    self.read_metrics(sess, results_proto)
+    if self.profiler:
+      self.profiler.fill(profile_proto)
+      print self.profiler.summary()
+
+
+  # Copies the sums of the metrics accumulators to results_proto. The cctc
+  # edit distance is scored on the host (see compute_edit_distance_ctcc) and
+  # stays as step() accumulated it.
+  def read_metrics(self, sess, results_proto):
+    metrics = self.metrics.read(sess)
+    results_proto.acc.pos = int(metrics["correct"])
+    results_proto.acc.count = int(metrics["count"])
+    results_proto.log_perplexity = metric_utils.Ratio(
+        metrics["logperp"], metrics["count"])
+    if "ref_length" in self.metrics_step:
+      results_proto.edit_distance.edit_distance = int(metrics["edit_distance"])
+      results_proto.edit_distance.ref_length = int(metrics["ref_length"])
 
 
   def restore(self, sess):
@@ -1035,45 +1278,37 @@ class SpeechModel(object):
   def step(self, sess, update, results_proto, profile_proto):
     start_time = time.time()
 
+    if self.bucket_graphs:
+      input_utils.UseBucket(sess, self)
+
+    # The accuracy, log-perplexity and (attention) edit distance are summed in
+    # the graph, only the cctc decode results need the batch on the host.
     targets = {}
     targets["uttid"] = self.uttid
     targets["text"] = self.text
+    targets["metrics_update"] = self.metrics_update
 
-    targets["tokens"] = self.tokens[:-1]
-    targets["features"] = self.features
-    targets["features_len"] = self.features_len
-    targets["encoder_len"] = self.encoder_states[-1][1]
-    if self.model_params.type == "cctc" and self.model_params.cctc.xent:
-      targets["tokens_weights"] = self.labels_weight
-    elif self.model_params.type == "cctc" and self.model_params.cctc.weakly_supervised:
-      targets["tokens_weights"] = self.labels_weight
-    elif self.model_params.type == "cctc" and self.model_params.cctc.wsj_greedy_supervised:
-      targets["tokens_weights"] = self.labels_weight
-    else:
-      targets["tokens_weights"] = self.tokens_weights[:-1]
-    if hasattr(self, "correct"):
-      targets["correct"] = self.correct
-    if hasattr(self, "edit_distance"):
+    if self.model_params.type == "cctc":
+      targets["tokens"] = self.tokens[:-1]
+      targets["features"] = self.features
+      targets["features_len"] = self.features_len
+      targets["encoder_len"] = self.encoder_states[-1][1]
       targets["edit_distance"] = self.edit_distance
+      targets["hyp"] = self.hyp
     if hasattr(self, "labels"):
       targets["labels"] = self.labels
       targets["labels_weight"] = self.labels_weight
 
     if update:
       targets["updates"] = self.updates
-
-    if self.model_params.type == "cctc":
-      targets["hyp"] = self.hyp
+    if self.bucket_graphs:
+      targets["bucket_next"] = self.bucket_order
 
     fetches = self.run_graph(sess, targets)
-    if hasattr(self, "correct"):
-      self.compute_accuracy(fetches, results_proto.acc)
-    if hasattr(self, "edit_distance"):
-      if self.model_params.type == "cctc":
-        # self.compute_edit_distance(fetches, results_proto.edit_distance)
-        self.compute_edit_distance_ctcc(fetches, results_proto.edit_distance)
-      else:
-        self.compute_edit_distance(fetches, results_proto.edit_distance)
+    if self.bucket_graphs:
+      self.bucket_next = fetches["bucket_next"]
+    if self.model_params.type == "cctc":
+      self.compute_edit_distance_ctcc(fetches, results_proto.edit_distance)
     if hasattr(self, "labels"):
       self.print_labels_ctcc(fetches)
     #self.visualize_alignment(fetches)
@@ -1083,29 +1318,6 @@ class SpeechModel(object):
     profile_proto.steps = profile_proto.steps + 1
 
 
-  def compute_accuracy(self, fetches, acc_proto):
-    assert "tokens_weights" in fetches
-    assert "correct" in fetches
-
-    assert len(fetches["tokens_weights"]) == len(fetches["correct"])
-    for token_weight, correct in zip(fetches["tokens_weights"], fetches["correct"]):
-      count = token_weight.astype(int).sum()
-      weighted_correct = np.multiply(token_weight.astype(int), correct).sum()
-
-      acc_proto.pos += weighted_correct
-      acc_proto.count += count
-
-
-  def compute_edit_distance(self, fetches, edit_distance_proto):
-    assert "edit_distance" in fetches
-
-    edit_distance = fetches["edit_distance"][0].sum()
-    ref_length = fetches["edit_distance"][1].sum()
-
-    edit_distance_proto.edit_distance += edit_distance
-    edit_distance_proto.ref_length += ref_length
-
-
   def visualize_feats_alignment(self, feats, alignment):
     text = alignment.replace("~", "")
 
@@ -1137,12 +1349,17 @@ class SpeechModel(object):
 
       #feats = np.stack(fetches["features"])
       feats_len = fetches["features_len"]
+      hyps_len = [feats_len[b] / time_factor for b in range(self.batch_size)]
+      ref_list = las_utils.TimeMajorToSequences(refs, drop=0)
+      hyp_list = las_utils.TimeMajorToSequences(hyps, hyps_len, drop=4)
+      hyp_uncollapsed_list = las_utils.TimeMajorToSequences(hyps, hyps_len)
+      lab_list = las_utils.TimeMajorToSequences(labs, hyps_len)
       for b in range(self.batch_size):
         uttid = uttids[b]
-        ref_b = filter(lambda a: a != 0, [x[b] for x in refs])
-        hyp_uncollapsed_b = [x[b] for x in hyps[:(feats_len[b] / time_factor)]]
-        hyp_b = filter(lambda a: a != 4, hyp_uncollapsed_b)
-        lab_b = [x[b] for x in labs[:(feats_len[b] / time_factor)]]
+        ref_b = ref_list[b]
+        hyp_uncollapsed_b = hyp_uncollapsed_list[b]
+        hyp_b = hyp_list[b]
+        lab_b = lab_list[b]
 
         #feats_b = np.array([x[b] for x in feats[:feats_len[b]]])
         #feats_b = feats_b.transpose()[:40,:]
@@ -1167,10 +1384,8 @@ class SpeechModel(object):
 
           #self.visualize_feats_alignment(feats_b, alignment_b)
 
-        edit_distance = las_utils.LevensteinDistance(ref_b, hyp_b)
-
-        edit_distance_proto.edit_distance += edit_distance
-        edit_distance_proto.ref_length += len(ref_b)
+    # Score the whole batch in one call.
+    las_utils.AddEditDistanceResults(ref_list, hyp_list, edit_distance_proto)
     # raise Exception("DONE!")
 
   def print_labels_ctcc(self, fetches):
@@ -1214,7 +1429,10 @@ class SpeechModel(object):
         fetches.extend(target)
       else:
         fetches.append(target)
-    r = sess.run(fetches, feed_dict)
+    if self.profiler:
+      r = self.profiler.run(sess, fetches, feed_dict)
+    else:
+      r = sess.run(fetches, feed_dict)
 
     f = {}
     start = 0
@@ -1349,21 +1567,45 @@ def load_params(mode, epoch):
   return dataset_params, model_params, optimization_params
 
 
+# A many-core host gets a CPU device per data-parallel tower.
+def create_session_config(model_params):
+  config = tf.ConfigProto(allow_soft_placement=True)
+  if model_params.towers > 1 and not model_params.tower_devices:
+    config.device_count["CPU"] = int(model_params.towers)
+  return config
+
+
+# The SpeechModel of mode, with a profiler of its input queues if
+# --profile_steps.
+def create_model(
+    sess, mode, dataset_params, model_params, optimization_params, epoch,
+    reuse=False):
+  queue_runners = len(tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS))
+  speech_model = SpeechModel(
+      sess, mode, dataset_params, model_params, optimization_params,
+      batch_size=FLAGS.batch_size, epoch=epoch, seed=epoch, reuse=reuse)
+  if FLAGS.profile_steps:
+    speech_model.profiler = profile_utils.StepProfiler(
+        FLAGS.profile_steps,
+        tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS)[queue_runners:],
+        logdir=FLAGS.logdir, name=mode)
+  return speech_model
+
+
 def run(mode, epoch, ckpt=None):
   if not os.path.isdir(FLAGS.logdir):
     os.makedirs(FLAGS.logdir)
 
   ckpt_filepath = None
   with tf.device("/gpu:%d" % FLAGS.device):
-    with tf.Graph().as_default(), tf.Session(config=tf.ConfigProto(allow_soft_placement=True)) as sess:
-      dataset_params, model_params, optimization_params = load_params(mode, epoch)
+    dataset_params, model_params, optimization_params = load_params(mode, epoch)
+    with tf.Graph().as_default(), tf.Session(config=create_session_config(model_params)) as sess:
 
       if ckpt:
         model_params.ckpt = ckpt
 
-      speech_model = SpeechModel(
-          sess, mode, dataset_params, model_params, optimization_params,
-          batch_size=FLAGS.batch_size, epoch=epoch, seed=epoch)
+      speech_model = create_model(
+          sess, mode, dataset_params, model_params, optimization_params, epoch)
 
       coord = tf.train.Coordinator()
       threads = []
@@ -1379,12 +1621,97 @@ def run(mode, epoch, ckpt=None):
       if mode == "train":
         prefix = os.path.join(FLAGS.logdir, "%d" % (epoch + 1))
         ckpt_filepath = speech_model.save(sess, prefix, results_proto)
+      checkpoint_utils.CloseSaver(speech_model.saver)
 
+      input_utils.CloseEvalInputs(sess)
       coord.request_stop()
       coord.join(threads, stop_grace_period_secs=10)
   return ckpt_filepath
 
 
+# Runs the epochs of all the modes in one long-lived graph and session. The
+# model of every mode is built once: the first mode's model owns the
+# variables (initialized and restored from the checkpoint once) and the
+# others reuse them, so the valid and test runs see the trained variables in
+# memory instead of a new graph restoring the checkpoint train just saved.
+# The train input queue cycles through its dataset (string_input_producer
+# without num_epochs), the valid and test inputs are EvalInputs which read
+# their datasets once per epoch. The graph is only
+# rebuilt, from the latest checkpoint, when the params of an epoch differ
+# from the ones it was built with (e.g. the cctc xent of epoch 0).
+class Runner(object):
+  def __init__(self, modes):
+    self.modes = modes
+    self.params = None
+    self.sess = None
+
+  # Rebuilds the graph if the params of the epoch changed.
+  def start(self, epoch, ckpt=None):
+    params = dict((mode, load_params(mode, epoch)) for mode in self.modes)
+    params_str = dict(
+        (mode, [str(proto) for proto in params[mode]]) for mode in self.modes)
+    if self.sess and self.params == params_str:
+      return
+    self.close()
+    self.params = params_str
+
+    start_time = time.time()
+    self.graph = tf.Graph()
+    self.sess = tf.Session(
+        graph=self.graph,
+        config=create_session_config(params[self.modes[0]][1]))
+    self.models = {}
+    with self.graph.as_default(), tf.device("/gpu:%d" % FLAGS.device):
+      for idx, mode in enumerate(self.modes):
+        dataset_params, model_params, optimization_params = params[mode]
+        if ckpt:
+          model_params.ckpt = ckpt
+        # The passes of an EvalInput are not bucketed.
+        if mode != "train":
+          del model_params.buckets[:]
+        self.models[mode] = create_model(
+            self.sess, mode, dataset_params, model_params, optimization_params,
+            epoch, reuse=idx > 0)
+
+      self.coord = tf.train.Coordinator()
+      self.threads = []
+      for qr in tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS):
+        self.threads.extend(qr.create_threads(
+            self.sess, coord=self.coord, daemon=True, start=True))
+    print("graph time %f" % (time.time() - start_time))
+
+  def close(self):
+    if not self.sess:
+      return
+    for speech_model in self.models.values():
+      checkpoint_utils.CloseSaver(getattr(speech_model, "saver", None))
+    input_utils.CloseEvalInputs(self.sess)
+    self.coord.request_stop()
+    self.coord.join(self.threads, stop_grace_period_secs=10)
+    self.sess.close()
+    self.sess = None
+
+  def run(self, mode, epoch):
+    if not os.path.isdir(FLAGS.logdir):
+      os.makedirs(FLAGS.logdir)
+
+    speech_model = self.models[mode]
+    speech_model.epoch = epoch
+
+    ckpt_filepath = None
+    with self.graph.as_default():
+      results_proto = speech4_pb2.ResultsProto()
+      profile_proto = speech4_pb2.ProfileProto()
+      print("%s epoch: %d" % (mode, epoch))
+      speech_model.step_epoch(self.sess, mode == "train", results_proto, profile_proto)
+      print str(results_proto)
+
+      if mode == "train":
+        prefix = os.path.join(FLAGS.logdir, "%d" % (epoch + 1))
+        ckpt_filepath = speech_model.save(self.sess, prefix, results_proto)
+    return ckpt_filepath
+
+
 def main(_):
   if not FLAGS.logdir:
     FLAGS.logdir = os.path.join(
@@ -1394,6 +1721,20 @@ def main(_):
   print "logdir: %s" % FLAGS.logdir
 
   ckpt_filepath = FLAGS.ckpt
+  if FLAGS.persistent:
+    modes = ["valid", "test"]
+    if not FLAGS.test_only:
+      modes.insert(0, "train")
+    runner = Runner(modes)
+    for epoch in range(FLAGS.epochs_start, FLAGS.epochs_start + FLAGS.epochs):
+      runner.start(epoch, ckpt_filepath)
+      if not FLAGS.test_only:
+        ckpt_filepath = runner.run("train", epoch)
+      runner.run("valid", epoch)
+      runner.run("test", epoch)
+    runner.close()
+    return
+
   for epoch in range(FLAGS.epochs_start, FLAGS.epochs_start + FLAGS.epochs):
     if not FLAGS.test_only:
       ckpt_filepath = run("train", epoch, ckpt_filepath)
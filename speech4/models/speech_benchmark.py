@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# Measures the training throughput of SpeechModel with 1, 2, 4, ... up to
+# --towers_max data-parallel towers, one CPU device per tower, on the train
+# dataset of --dataset. Meant for a many-core CPU host: every tower count
+# builds a fresh graph and times --benchmark_steps train steps after
+# --benchmark_warmup_steps, the speedup is relative to a single tower.
+
+import os.path
+import sys
+import time
+
+SPEECH4_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../')
+sys.path.append(os.path.join(SPEECH4_ROOT))
+
+import tensorflow as tf
+from tensorflow.core.framework import speech4_pb2
+from speech4.models import speech
+
+
+FLAGS = tf.app.flags.FLAGS
+
+tf.app.flags.DEFINE_integer("towers_max", 8,
+                            """Largest number of towers to benchmark.""")
+tf.app.flags.DEFINE_integer("benchmark_steps", 20,
+                            """Timed steps per tower count.""")
+tf.app.flags.DEFINE_integer("benchmark_warmup_steps", 2,
+                            """Untimed steps per tower count.""")
+
+
+# Returns the utterances per second of training with towers towers.
+def benchmark(towers):
+  dataset_params, model_params, optimization_params = speech.load_params("train", 0)
+  model_params.towers = towers
+  del model_params.tower_devices[:]
+
+  with tf.Graph().as_default(), tf.Session(config=speech.create_session_config(model_params)) as sess:
+    with tf.device("/cpu:0"):
+      speech_model = speech.SpeechModel(
+          sess, "train", dataset_params, model_params, optimization_params,
+          batch_size=FLAGS.batch_size)
+
+    coord = tf.train.Coordinator()
+    threads = []
+    for qr in tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS):
+      threads.extend(qr.create_threads(sess, coord=coord, daemon=True, start=True))
+
+    results_proto = speech4_pb2.ResultsProto()
+    profile_proto = speech4_pb2.ProfileProto()
+    for _ in range(FLAGS.benchmark_warmup_steps):
+      speech_model.step(sess, True, results_proto, profile_proto)
+    start_time = time.time()
+    for _ in range(FLAGS.benchmark_steps):
+      speech_model.step(sess, True, results_proto, profile_proto)
+    secs = time.time() - start_time
+
+    coord.request_stop()
+    coord.join(threads, stop_grace_period_secs=10)
+  return FLAGS.benchmark_steps * FLAGS.batch_size / secs
+
+
+def main(_):
+  if not FLAGS.logdir:
+    FLAGS.logdir = os.path.abspath(os.path.join("exp", "speech4_benchmark"))
+  if not os.path.isdir(FLAGS.logdir):
+    os.makedirs(FLAGS.logdir)
+
+  towers = 1
+  utterances_per_sec = {}
+  while towers <= FLAGS.towers_max:
+    if FLAGS.batch_size % towers == 0:
+      utterances_per_sec[towers] = benchmark(towers)
+      print "towers: %d, utterances/sec: %.2f, speedup: %.2f" % (
+          towers, utterances_per_sec[towers],
+          utterances_per_sec[towers] / utterances_per_sec[1])
+    towers *= 2
+
+if __name__ == '__main__':
+  tf.app.run()
@@ -10,44 +10,138 @@ from speech4.models import las_utils
 
 
 class Hypothesis(object):
-  def __init__(self, text=""):
+  def __init__(self, text="", logprob=0.0):
     self.text = text
-    self.logprob = 0.0
-    self.state_prev = None
-    self.state_next = None
-    self.attention_prev = None
-    self.attention_next = None
-    self.alignment_prev = None
-    self.alignment_next = None
-    self.logprobs = None
+    self.logprob = logprob
+
 
-  def feed_token(self, token_model):
-    if self.text == "":
-      return token_model.proto.token_sos
-    return token_model.string_to_token[self.text[-1]]
+# Hypotheses longer than this (in characters) are no longer extended.
+TEXT_LEN_MAX = 256
 
-  def expand(self, token_model, beam_width):
-    completed = Hypothesis(completed.text)
-    completed.logprob = self.logprob + self.logprobs[token_model.proto.token_eos]
 
-    candidates = zip(range(self.logprobs.size), self.logprobs.tolist())
-    candidates = sorted(candidates, key=lambda x: x[1], reverse=True)
-    candidates = candidates[:beam_width]
+# The live hypotheses of one utterance, stored as arrays. Row i of every
+# array is hypothesis i; the text is only kept as per-step token ids and
+# backpointers and is recovered by backtracking once the search is done.
+class Beam(object):
+  def __init__(self, token_model, beam_width, states, alignments, attentions):
+    self.token_model = token_model
+    self.beam_width = beam_width
+    self.size = 1
 
-    partials = []
-    if len(self.text) < 256:
-      for token, logprob in candidates:
-        if token != token_model.proto.token_eos and token in token_model.token_to_string:
-          partial = Hypothesis()
-          partial.text = self.text + token_model.token_to_string[token]
-          partial.logprob = self.logprob + logprob
-          partial.state_prev = self.state_next
-          partial.alignment_prev = self.alignment_next
-          partial.attention_prev = self.attention_next
+    self.logprob = np.zeros([beam_width], dtype=np.float64)
+    self.text_len = np.zeros([beam_width], dtype=np.int64)
+    self.tokens = np.zeros([beam_width], dtype=np.int32)
+    self.tokens[0] = token_model.proto.token_sos
 
-          partials.append(partial)
+    # The recurrent state of the decoder, one [beam_width, n] array per layer.
+    self.state_prev = [self.allocate(state) for state in states]
+    self.alignment_prev = [self.allocate(state) for state in alignments]
+    self.attention_prev = [self.allocate(state) for state in attentions]
+
+    # Filled in by the decoder step, these are [size, n] slices of the fetches.
+    self.state_next = None
+    self.alignment_next = None
+    self.attention_next = None
+    self.logprobs = None
+
+    self.tokens_history = []
+    self.parents_history = []
+
+    self.complete_logprob = []
+    self.complete_text_len = []
+    self.complete_step = []
+    self.complete_row = []
+
+    self.token_valid = None
+    self.token_text_len = None
+
+  def allocate(self, state):
+    prealloc = np.zeros([self.beam_width] + list(state.shape[1:]), dtype=state.dtype)
+    prealloc[:state.shape[0]] = state
+    return prealloc
+
+  def create_token_arrays(self, vocab_size):
+    eos = self.token_model.proto.token_eos
+    self.token_valid = np.zeros([vocab_size], dtype=bool)
+    self.token_text_len = np.zeros([vocab_size], dtype=np.int64)
+    for token, token_string in self.token_model.token_to_string.iteritems():
+      if token < vocab_size and token != eos:
+        self.token_valid[token] = True
+        self.token_text_len[token] = len(token_string)
+
+  def feed_tokens(self):
+    return self.tokens[:self.size]
+
+  # Adopts the decoder output as the current state without expanding (used for
+  # the initial <sos> step).
+  def advance(self):
+    for prev, cur in zip(self.state_prev, self.state_next):
+      prev[:self.size] = cur
+    for prev, cur in zip(self.alignment_prev, self.alignment_next):
+      prev[:self.size] = cur
+    for prev, cur in zip(self.attention_prev, self.attention_next):
+      prev[:self.size] = cur
+
+  # Extends every live hypothesis by one token: a single top-k over the
+  # [size, vocab] matrix of accumulated log probs picks the next beam.
+  def expand(self):
+    size = self.size
+    scores = self.logprob[:size, np.newaxis] + self.logprobs
+    vocab_size = scores.shape[1]
+    if self.token_valid is None:
+      self.create_token_arrays(vocab_size)
+
+    # Every live hypothesis may be completed with <eos>.
+    self.complete_logprob.append(scores[:, self.token_model.proto.token_eos].copy())
+    self.complete_text_len.append(self.text_len[:size].copy())
+    self.complete_step.append(np.repeat(len(self.tokens_history), size))
+    self.complete_row.append(np.arange(size))
+
+    scores[:, ~self.token_valid] = -np.inf
+    scores[self.text_len[:size] >= TEXT_LEN_MAX] = -np.inf
+    scores = scores.ravel()
+
+    k = min(self.beam_width, int(np.isfinite(scores).sum()))
+    if k == 0:
+      self.size = 0
+      return
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    parents, tokens = np.divmod(top, vocab_size)
+
+    self.tokens_history.append(tokens.astype(np.int32))
+    self.parents_history.append(parents)
+
+    self.logprob[:k] = scores[top]
+    self.text_len[:k] = self.text_len[parents] + self.token_text_len[tokens]
+    self.tokens[:k] = tokens
+    for prev, cur in zip(self.state_prev, self.state_next):
+      np.take(cur, parents, axis=0, out=prev[:k])
+    for prev, cur in zip(self.alignment_prev, self.alignment_next):
+      np.take(cur, parents, axis=0, out=prev[:k])
+    for prev, cur in zip(self.attention_prev, self.attention_next):
+      np.take(cur, parents, axis=0, out=prev[:k])
+    self.size = k
+
+  def backtrack(self, step, row):
+    tokens = []
+    for s in range(step - 1, -1, -1):
+      tokens.append(self.tokens_history[s][row])
+      row = self.parents_history[s][row]
+    return "".join(
+        self.token_model.token_to_string[token] for token in reversed(tokens))
+
+  # Returns the n best completed hypotheses, normalized by their length.
+  def hypothesis_complete(self, n):
+    logprob = np.concatenate(self.complete_logprob)
+    text_len = np.concatenate(self.complete_text_len)
+    step = np.concatenate(self.complete_step)
+    row = np.concatenate(self.complete_row)
+
+    order = np.argsort(-(logprob / np.maximum(text_len, 1)))[:n]
+    return [Hypothesis(self.backtrack(step[idx], row[idx]), float(logprob[idx]))
+            for idx in order]
 
-    return partials, completed
 
 class Utterance(object):
   def __init__(self):
@@ -56,37 +150,32 @@ class Utterance(object):
     self.text = None
     self.uttid = None
 
-    self.encoder_states = []
-    self.feed_dict = {}
+    self.encoder_slot = None
 
-    self.hypothesis_partial = []
+    self.beam = None
     self.hypothesis_complete = []
 
-  def compute_word_distance(self, proto):
-    ref = proto.ref.split(' ')
-    hyp = proto.hyp.split(' ')
+  def compute_distance(self, ref, hyp, proto):
+    sub, ins, dele = las_utils.EditDistanceBreakdown([ref], [hyp])[0]
 
-    proto.wer.edit_distance = las_utils.LevensteinDistance(ref, hyp)
-    proto.wer.ref_length = len(ref)
-    proto.wer.hyp_length = len(hyp)
+    proto.sub = int(sub)
+    proto.ins = int(ins)
+    # "del" is a python keyword.
+    setattr(proto, "del", int(dele))
+    proto.edit_distance = int(sub + ins + dele)
+    proto.ref_length = len(ref)
+    proto.hyp_length = len(hyp)
 
     try:
-      proto.wer.error_rate = float(proto.wer.edit_distance) / float(proto.wer.ref_length)
+      proto.error_rate = float(proto.edit_distance) / float(proto.ref_length)
     except:
       pass
 
-  def compute_character_distance(self, proto):
-    ref = list(proto.ref)
-    hyp = list(proto.hyp)
-
-    proto.cer.edit_distance = las_utils.LevensteinDistance(ref, hyp)
-    proto.cer.ref_length = len(ref)
-    proto.cer.hyp_length = len(hyp)
+  def compute_word_distance(self, proto):
+    self.compute_distance(proto.ref.split(' '), proto.hyp.split(' '), proto.wer)
 
-    try:
-      proto.cer.error_rate = float(proto.cer.edit_distance) / float(proto.cer.ref_length)
-    except:
-      pass
+  def compute_character_distance(self, proto):
+    self.compute_distance(list(proto.ref), list(proto.hyp), proto.cer)
 
   def create_proto(self, token_model):
     proto = speech4_pb2.UtteranceResultsProto()
@@ -18,6 +18,7 @@ limitations under the License.
 
 #include <memory>
 #include <string>
+#include <vector>
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/resource_mgr.h"
 #include "tensorflow/core/framework/tensor.h"
@@ -51,6 +52,16 @@ class ReaderInterface : public ResourceBase {
   virtual void Read(QueueInterface* queue, string* key, string* value,
                     OpKernelContext* context) = 0;
 
+  // Read up to num_records records into *keys / *values, which must
+  // be empty.  Gets more work from *queue like Read(), but returns the
+  // records already read instead of waiting for the next work item,
+  // so fewer than num_records may be returned at the end of a work
+  // item (and at least one unless the status on *context is set).
+  // This method may block.
+  virtual void ReadUpTo(int64 num_records, QueueInterface* queue,
+                        std::vector<string>* keys, std::vector<string>* values,
+                        OpKernelContext* context) = 0;
+
   // Restore this reader to its newly-constructed state.
   virtual Status Reset() = 0;
 
@@ -6,6 +6,7 @@
 
 #include "tensorflow/core/kernels/attention_mask_op.h"
 
+#include <limits>
 #include <random>
 
 #include "tensorflow/core/framework/numeric_op.h"
@@ -36,6 +37,19 @@ struct AttentionMask<GPUDevice> {
   }
 };
 
+template <>
+struct AttentionMaskMedian<CPUDevice> {
+  void operator()(
+      const CPUDevice& d, float fill_value, int64 window_l, int64 window_r,
+      const Tensor& sequence_len, const Tensor& input, const Tensor& median,
+      Tensor* output) {
+    generator::AttentionMaskMedianGenerator generator(
+        fill_value, window_l, window_r, sequence_len.vec<int64>(),
+        median.vec<int>(), input.matrix<float>());
+    output->matrix<float>().device(d) = input.matrix<float>().generate(generator);
+  }
+};
+
 template <>
 struct AttentionMaskMedian<GPUDevice> {
   void operator()(
@@ -47,6 +61,19 @@ struct AttentionMaskMedian<GPUDevice> {
   }
 };
 
+template <>
+struct AttentionMaskWindow<CPUDevice> {
+  void operator()(
+      const CPUDevice& d, float fill_value, int64 s_min, int64 s_max,
+      float v_min, float v_max, int64 index, const Tensor& sequence_len,
+      const Tensor& input, Tensor* output) {
+    generator::AttentionMaskWindowGenerator generator(
+        fill_value, s_min, s_max, v_min, v_max, index,
+        sequence_len.vec<int64>(), input.matrix<float>());
+    output->matrix<float>().device(d) = input.matrix<float>().generate(generator);
+  }
+};
+
 template <>
 struct AttentionMaskWindow<GPUDevice> {
   void operator()(
@@ -59,6 +86,26 @@ struct AttentionMaskWindow<GPUDevice> {
   }
 };
 
+template <>
+struct ComputeMedian<CPUDevice> {
+  void operator()(
+      const CPUDevice& d, const Tensor& input, Tensor* median) {
+    auto input_t = input.matrix<float>();
+    auto median_t = median->vec<int>();
+    for (int64 b = 0; b < input.dim_size(0); ++b) {
+      float sum = 0.0f;
+      int median_idx = 0;
+      for (; median_idx < input.dim_size(1); ++median_idx) {
+        sum += input_t(b, median_idx);
+        if (sum > 0.5f) {
+          break;
+        }
+      }
+      median_t(b) = median_idx;
+    }
+  }
+};
+
 template <>
 struct ComputeMedian<GPUDevice> {
   void operator()(
@@ -81,6 +128,74 @@ struct SetZero<GPUDevice> {
   }
 };
 
+template <>
+struct AttentionStep<CPUDevice> {
+  void operator()(
+      const CPUDevice& d, const Tensor& encoder_embedding,
+      const Tensor& decoder_embedding, const Tensor& v, Tensor* alignment) {
+    AttentionEnergy(d, encoder_embedding, decoder_embedding, v, alignment);
+  }
+};
+
+template <>
+struct AttentionStep<GPUDevice> {
+  void operator()(
+      const GPUDevice& d, const Tensor& encoder_embedding,
+      const Tensor& decoder_embedding, const Tensor& v, Tensor* alignment) {
+    AttentionStepGPU(d, encoder_embedding, decoder_embedding, v, alignment);
+  }
+};
+
+template <>
+struct AttentionStepContext<CPUDevice> {
+  void operator()(
+      const CPUDevice& d, const Tensor& encoder_states, Tensor* scratch,
+      Tensor* alignment, Tensor* context) {
+    AttentionSoftmaxContext(d, encoder_states, scratch, alignment, context);
+  }
+};
+
+template <>
+struct AttentionStepContext<GPUDevice> {
+  void operator()(
+      const GPUDevice& d, const Tensor& encoder_states, Tensor* scratch,
+      Tensor* alignment, Tensor* context) {
+    AttentionStepContextGPU(d, encoder_states, scratch, alignment, context);
+  }
+};
+
+template <>
+struct AttentionStepGrad<CPUDevice> {
+  void operator()(
+      const CPUDevice& d, const Tensor& encoder_embedding,
+      const Tensor& encoder_states, const Tensor& decoder_embedding,
+      const Tensor& v, const Tensor& alignment, const Tensor& dalignment,
+      const Tensor& dcontext, Tensor* scratch, Tensor* scratch_sum,
+      Tensor* dencoder_embedding, Tensor* dencoder_states,
+      Tensor* ddecoder_embedding, Tensor* dv) {
+    AttentionStepGradient(
+        d, encoder_embedding, encoder_states, decoder_embedding, v, alignment,
+        dalignment, dcontext, scratch, scratch_sum, dencoder_embedding,
+        dencoder_states, ddecoder_embedding, dv);
+  }
+};
+
+template <>
+struct AttentionStepGrad<GPUDevice> {
+  void operator()(
+      const GPUDevice& d, const Tensor& encoder_embedding,
+      const Tensor& encoder_states, const Tensor& decoder_embedding,
+      const Tensor& v, const Tensor& alignment, const Tensor& dalignment,
+      const Tensor& dcontext, Tensor* scratch, Tensor* scratch_sum,
+      Tensor* dencoder_embedding, Tensor* dencoder_states,
+      Tensor* ddecoder_embedding, Tensor* dv) {
+    AttentionStepGradGPU(
+        d, encoder_embedding, encoder_states, decoder_embedding, v, alignment,
+        dalignment, dcontext, scratch, scratch_sum, dencoder_embedding,
+        dencoder_states, ddecoder_embedding, dv);
+  }
+};
+
 template <typename Device>
 class AttentionMaskOp : public OpKernel {
  public:
@@ -156,9 +271,9 @@ class AttentionMaskMedianOp : public OpKernel {
   int64 window_r_;
 };
 
-// REGISTER_KERNEL_BUILDER(Name("AttentionMaskMedian")
-//                              .Device(DEVICE_CPU),
-//                         AttentionMaskMedianOp<CPUDevice>);
+REGISTER_KERNEL_BUILDER(Name("AttentionMaskMedian")
+                             .Device(DEVICE_CPU),
+                        AttentionMaskMedianOp<CPUDevice>);
 
 #if GOOGLE_CUDA
 REGISTER_KERNEL_BUILDER(Name("AttentionMaskMedian")
@@ -198,13 +313,157 @@ class AttentionMaskWindowOp : public OpKernel {
   int64 index_;
 };
 
-// REGISTER_KERNEL_BUILDER(Name("AttentionMaskWindow")
-//                              .Device(DEVICE_CPU),
-//                         AttentionMaskWindowOp<CPUDevice>);
+REGISTER_KERNEL_BUILDER(Name("AttentionMaskWindow")
+                             .Device(DEVICE_CPU),
+                        AttentionMaskWindowOp<CPUDevice>);
 
 #if GOOGLE_CUDA
 REGISTER_KERNEL_BUILDER(Name("AttentionMaskWindow")
                              .Device(DEVICE_GPU),
                         AttentionMaskWindowOp<GPUDevice>);
 #endif  // GOOGLE_CUDA
+
+// The content attention of one decoder step (energies, mask, softmax and
+// context) without the [batch_size, attention_len, 1, embedding_size]
+// temporaries of the unfused graph.
+template <typename Device>
+class AttentionStepOp : public OpKernel {
+ public:
+  explicit AttentionStepOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("mask", &mask_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("window_l", &window_l_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("window_r", &window_r_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("s_min", &s_min_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("s_max", &s_max_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("v_min", &v_min_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("v_max", &v_max_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("index", &index_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    INPUT_TENSOR(attention_states_sequence_len);
+    INPUT_TENSOR(encoder_embedding);
+    INPUT_TENSOR(encoder_states);
+    INPUT_TENSOR(decoder_embedding);
+    INPUT_TENSOR(v);
+    INPUT_TENSOR(prev);
+
+    const int64 batch_size = encoder_embedding->dim_size(0);
+    const int64 attention_len = encoder_embedding->dim_size(1);
+    const int64 cell_size = encoder_states->dim_size(3);
+    OP_REQUIRES(ctx, encoder_states->dim_size(1) == attention_len,
+                errors::InvalidArgument(
+                    "encoder_states and encoder_embedding lengths differ: ",
+                    encoder_states->dim_size(1), " vs. ", attention_len));
+
+    OUTPUT_TENSOR(alignment, TensorShape({batch_size, attention_len}));
+    OUTPUT_TENSOR(context, TensorShape({batch_size, cell_size}));
+
+    Tensor energy;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+        DT_FLOAT, TensorShape({batch_size, attention_len}), &energy));
+    Tensor scratch;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+        DT_FLOAT, TensorShape({batch_size}), &scratch));
+
+    const float fill_value = -std::numeric_limits<float>::max();
+    AttentionStep<Device>()(
+        ctx->eigen_device<Device>(), *encoder_embedding, *decoder_embedding,
+        *v, &energy);
+    if (mask_ == "median") {
+      Tensor median;
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+          DT_INT32, TensorShape({batch_size}), &median));
+      ComputeMedian<Device>()(ctx->eigen_device<Device>(), *prev, &median);
+      AttentionMaskMedian<Device>()(
+          ctx->eigen_device<Device>(), fill_value, window_l_, window_r_,
+          *attention_states_sequence_len, energy, median, alignment);
+    } else if (mask_ == "window") {
+      AttentionMaskWindow<Device>()(
+          ctx->eigen_device<Device>(), fill_value, s_min_, s_max_, v_min_,
+          v_max_, index_, *attention_states_sequence_len, energy, alignment);
+    } else {
+      AttentionMask<Device>()(
+          ctx->eigen_device<Device>(), fill_value,
+          *attention_states_sequence_len, energy, alignment);
+    }
+    AttentionStepContext<Device>()(
+        ctx->eigen_device<Device>(), *encoder_states, &scratch, alignment,
+        context);
+  }
+
+ private:
+  string mask_;
+  int64 window_l_;
+  int64 window_r_;
+  int64 s_min_;
+  int64 s_max_;
+  float v_min_;
+  float v_max_;
+  int64 index_;
+};
+
+REGISTER_KERNEL_BUILDER(Name("AttentionStep")
+                             .Device(DEVICE_CPU),
+                        AttentionStepOp<CPUDevice>);
+
+#if GOOGLE_CUDA
+REGISTER_KERNEL_BUILDER(Name("AttentionStep")
+                             .Device(DEVICE_GPU),
+                        AttentionStepOp<GPUDevice>);
+#endif  // GOOGLE_CUDA
+
+template <typename Device>
+class AttentionStepGradOp : public OpKernel {
+ public:
+  explicit AttentionStepGradOp(OpKernelConstruction* ctx) : OpKernel(ctx) {}
+
+  void Compute(OpKernelContext* ctx) override {
+    INPUT_TENSOR(encoder_embedding);
+    INPUT_TENSOR(encoder_states);
+    INPUT_TENSOR(decoder_embedding);
+    INPUT_TENSOR(v);
+    INPUT_TENSOR(alignment);
+    INPUT_TENSOR(dalignment);
+    INPUT_TENSOR(dcontext);
+
+    // Every gradient is written in full, they are not zeroed first (and are
+    // not all matrices).
+    Tensor* dencoder_embedding = nullptr;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output(
+        "dencoder_embedding", encoder_embedding->shape(),
+        &dencoder_embedding));
+    Tensor* dencoder_states = nullptr;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output(
+        "dencoder_states", encoder_states->shape(), &dencoder_states));
+    Tensor* ddecoder_embedding = nullptr;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output(
+        "ddecoder_embedding", decoder_embedding->shape(), &ddecoder_embedding));
+    Tensor* dv = nullptr;
+    OP_REQUIRES_OK(ctx, ctx->allocate_output("dv", v->shape(), &dv));
+
+    Tensor scratch;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+        DT_FLOAT, alignment->shape(), &scratch));
+    Tensor scratch_sum;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+        DT_FLOAT, TensorShape({alignment->dim_size(0)}), &scratch_sum));
+
+    AttentionStepGrad<Device>()(
+        ctx->eigen_device<Device>(), *encoder_embedding, *encoder_states,
+        *decoder_embedding, *v, *alignment, *dalignment, *dcontext, &scratch,
+        &scratch_sum, dencoder_embedding, dencoder_states, ddecoder_embedding,
+        dv);
+  }
+};
+
+REGISTER_KERNEL_BUILDER(Name("AttentionStepGrad")
+                             .Device(DEVICE_CPU),
+                        AttentionStepGradOp<CPUDevice>);
+
+#if GOOGLE_CUDA
+REGISTER_KERNEL_BUILDER(Name("AttentionStepGrad")
+                             .Device(DEVICE_GPU),
+                        AttentionStepGradOp<GPUDevice>);
+#endif  // GOOGLE_CUDA
 }  // namespace tensorflow
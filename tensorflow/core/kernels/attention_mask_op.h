@@ -136,6 +136,138 @@ struct SetZero {
   void operator()(const Device& d, Tensor* x);
 };
 
+// The content attention of one decoder step, fused:
+//   e[b, t] = sum_k v[k] tanh(encoder_embedding[b, t, 0, k] +
+//                             decoder_embedding[b, k])
+//   alignment[b, :] = softmax(masked e[b, :])
+//   context[b, :] = sum_t alignment[b, t] encoder_states[b, t, 0, :]
+// The energies are written to alignment, the caller masks them in place
+// between AttentionEnergy and AttentionSoftmaxContext.
+template <typename Device>
+void AttentionEnergy(
+    const Device& d, const Tensor& encoder_embedding,
+    const Tensor& decoder_embedding, const Tensor& v, Tensor* alignment) {
+  const int batch_size = encoder_embedding.dim_size(0);
+  const int attention_len = encoder_embedding.dim_size(1);
+  const int embedding_size = encoder_embedding.dim_size(3);
+
+  auto h = encoder_embedding.shaped<float, 3>(
+      {batch_size, attention_len, embedding_size});
+  auto s = decoder_embedding.shaped<float, 3>({batch_size, 1, embedding_size})
+      .broadcast(Eigen::array<int, 3>({1, attention_len, 1}));
+  auto vs = v.shaped<float, 3>({1, 1, embedding_size})
+      .broadcast(Eigen::array<int, 3>({batch_size, attention_len, 1}));
+  alignment->matrix<float>().device(d) =
+      ((h + s).tanh() * vs).sum(Eigen::array<int, 1>({2}));
+}
+
+// scratch is [batch_size] for the softmax max and sum.
+template <typename Device>
+void AttentionSoftmaxContext(
+    const Device& d, const Tensor& encoder_states, Tensor* scratch,
+    Tensor* alignment, Tensor* context) {
+  const int batch_size = encoder_states.dim_size(0);
+  const int attention_len = encoder_states.dim_size(1);
+  const int cell_size = encoder_states.dim_size(3);
+  const Eigen::array<int, 2> by_batch({1, attention_len});
+  const Eigen::array<Eigen::DenseIndex, 2> batch_by_one({batch_size, 1});
+
+  auto a = alignment->matrix<float>();
+  auto m = scratch->vec<float>();
+  m.device(d) = a.maximum(Eigen::array<int, 1>({1}));
+  a.device(d) = (a - m.reshape(batch_by_one).broadcast(by_batch)).exp();
+  m.device(d) = a.sum(Eigen::array<int, 1>({1}));
+  a.device(d) = a / m.reshape(batch_by_one).broadcast(by_batch);
+
+  auto states = encoder_states.shaped<float, 3>(
+      {batch_size, attention_len, cell_size});
+  context->matrix<float>().device(d) =
+      (a.reshape(Eigen::array<Eigen::DenseIndex, 3>(
+          {batch_size, attention_len, 1}))
+       .broadcast(Eigen::array<int, 3>({1, 1, cell_size})) * states)
+      .sum(Eigen::array<int, 1>({1}));
+}
+
+// The gradient of the fused attention step. The masked energies have a zero
+// alignment, so the mask is not needed. The tanh is recomputed into
+// dencoder_embedding, which is then overwritten with its gradient.
+// scratch is [batch_size, attention_len] and scratch_sum [batch_size].
+template <typename Device>
+void AttentionStepGradient(
+    const Device& d, const Tensor& encoder_embedding,
+    const Tensor& encoder_states, const Tensor& decoder_embedding,
+    const Tensor& v, const Tensor& alignment, const Tensor& dalignment,
+    const Tensor& dcontext, Tensor* scratch, Tensor* scratch_sum,
+    Tensor* dencoder_embedding, Tensor* dencoder_states,
+    Tensor* ddecoder_embedding, Tensor* dv) {
+  const int batch_size = encoder_embedding.dim_size(0);
+  const int attention_len = encoder_embedding.dim_size(1);
+  const int embedding_size = encoder_embedding.dim_size(3);
+  const int cell_size = encoder_states.dim_size(3);
+  const Eigen::array<Eigen::DenseIndex, 3> batch_by_time(
+      {batch_size, attention_len, 1});
+
+  auto a = alignment.matrix<float>();
+  auto dc = dcontext.shaped<float, 3>({batch_size, 1, cell_size})
+      .broadcast(Eigen::array<int, 3>({1, attention_len, 1}));
+  auto states = encoder_states.shaped<float, 3>(
+      {batch_size, attention_len, cell_size});
+  dencoder_states->shaped<float, 3>({batch_size, attention_len, cell_size})
+      .device(d) = a.reshape(batch_by_time)
+          .broadcast(Eigen::array<int, 3>({1, 1, cell_size})) * dc;
+
+  // de = a .* (da - sum_t a .* da), da includes the context's gradient.
+  auto de = scratch->matrix<float>();
+  auto de_sum = scratch_sum->vec<float>();
+  de.device(d) = dalignment.matrix<float>() +
+      (dc * states).sum(Eigen::array<int, 1>({2}));
+  de_sum.device(d) = (a * de).sum(Eigen::array<int, 1>({1}));
+  de.device(d) = a * (de - de_sum
+      .reshape(Eigen::array<Eigen::DenseIndex, 2>({batch_size, 1}))
+      .broadcast(Eigen::array<int, 2>({1, attention_len})));
+
+  auto h = encoder_embedding.shaped<float, 3>(
+      {batch_size, attention_len, embedding_size});
+  auto s = decoder_embedding.shaped<float, 3>({batch_size, 1, embedding_size})
+      .broadcast(Eigen::array<int, 3>({1, attention_len, 1}));
+  auto vs = v.shaped<float, 3>({1, 1, embedding_size})
+      .broadcast(Eigen::array<int, 3>({batch_size, attention_len, 1}));
+  auto des = de.reshape(batch_by_time)
+      .broadcast(Eigen::array<int, 3>({1, 1, embedding_size}));
+  auto dh = dencoder_embedding->shaped<float, 3>(
+      {batch_size, attention_len, embedding_size});
+  dh.device(d) = (h + s).tanh();
+  dv->vec<float>().device(d) = (des * dh).sum(Eigen::array<int, 2>({0, 1}));
+  dh.device(d) = des * vs * (dh.constant(1.0f) - dh * dh);
+  ddecoder_embedding->matrix<float>().device(d) =
+      dh.sum(Eigen::array<int, 1>({1}));
+}
+
+template <typename Device>
+struct AttentionStep {
+  void operator()(
+      const Device& d, const Tensor& encoder_embedding,
+      const Tensor& decoder_embedding, const Tensor& v, Tensor* alignment);
+};
+
+template <typename Device>
+struct AttentionStepContext {
+  void operator()(
+      const Device& d, const Tensor& encoder_states, Tensor* scratch,
+      Tensor* alignment, Tensor* context);
+};
+
+template <typename Device>
+struct AttentionStepGrad {
+  void operator()(
+      const Device& d, const Tensor& encoder_embedding,
+      const Tensor& encoder_states, const Tensor& decoder_embedding,
+      const Tensor& v, const Tensor& alignment, const Tensor& dalignment,
+      const Tensor& dcontext, Tensor* scratch, Tensor* scratch_sum,
+      Tensor* dencoder_embedding, Tensor* dencoder_states,
+      Tensor* ddecoder_embedding, Tensor* dv);
+};
+
 void AttentionMaskGPU(
     const GPUDevice& d, float fill_value, const Tensor& sequence_len,
     const Tensor& input, Tensor* output);
@@ -154,6 +286,22 @@ void ComputeMedianGPU(
     const GPUDevice& d, const Tensor& input, Tensor* median);
 
 void SetZeroGPU(const GPUDevice& d, Tensor* x);
+
+void AttentionStepGPU(
+    const GPUDevice& d, const Tensor& encoder_embedding,
+    const Tensor& decoder_embedding, const Tensor& v, Tensor* alignment);
+
+void AttentionStepContextGPU(
+    const GPUDevice& d, const Tensor& encoder_states, Tensor* scratch,
+    Tensor* alignment, Tensor* context);
+
+void AttentionStepGradGPU(
+    const GPUDevice& d, const Tensor& encoder_embedding,
+    const Tensor& encoder_states, const Tensor& decoder_embedding,
+    const Tensor& v, const Tensor& alignment, const Tensor& dalignment,
+    const Tensor& dcontext, Tensor* scratch, Tensor* scratch_sum,
+    Tensor* dencoder_embedding, Tensor* dencoder_states,
+    Tensor* ddecoder_embedding, Tensor* dv);
 }  // end namespace tensorflow
 
 #endif  // TENSORFLOW_KERNELS_ATTENTION_MASK_OP_H_
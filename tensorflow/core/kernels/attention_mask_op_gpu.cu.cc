@@ -39,6 +39,31 @@ void AttentionMaskWindowGPU(
   output->matrix<float>().device(d) = input.matrix<float>().generate(generator);
 }
 
+void AttentionStepGPU(
+    const GPUDevice& d, const Tensor& encoder_embedding,
+    const Tensor& decoder_embedding, const Tensor& v, Tensor* alignment) {
+  AttentionEnergy(d, encoder_embedding, decoder_embedding, v, alignment);
+}
+
+void AttentionStepContextGPU(
+    const GPUDevice& d, const Tensor& encoder_states, Tensor* scratch,
+    Tensor* alignment, Tensor* context) {
+  AttentionSoftmaxContext(d, encoder_states, scratch, alignment, context);
+}
+
+void AttentionStepGradGPU(
+    const GPUDevice& d, const Tensor& encoder_embedding,
+    const Tensor& encoder_states, const Tensor& decoder_embedding,
+    const Tensor& v, const Tensor& alignment, const Tensor& dalignment,
+    const Tensor& dcontext, Tensor* scratch, Tensor* scratch_sum,
+    Tensor* dencoder_embedding, Tensor* dencoder_states,
+    Tensor* ddecoder_embedding, Tensor* dv) {
+  AttentionStepGradient(
+      d, encoder_embedding, encoder_states, decoder_embedding, v, alignment,
+      dalignment, dcontext, scratch, scratch_sum, dencoder_embedding,
+      dencoder_states, ddecoder_embedding, dv);
+}
+
 __global__
 void ComputeMedianGPU_kernel(
     const int batch_size, const int dist_size, const float* input,
@@ -52,5 +52,44 @@ TEST_F(AttentionMaskOpTest, AttentionMask_02) {
   test::ExpectTensorEqual<float>(expected, *params_tensor);
 }
 
+class AttentionStepOpTest : public OpsTestBase {
+ protected:
+  void MakeOp() {
+    RequireDefaultOps();
+    ASSERT_OK(NodeDefBuilder("myop", "AttentionStep")
+                  .Input(FakeInput())
+                  .Input(FakeInput())
+                  .Input(FakeInput())
+                  .Input(FakeInput())
+                  .Input(FakeInput())
+                  .Input(FakeInput())
+                  .Finalize(node_def()));
+    ASSERT_OK(InitOp());
+  }
+};
+
+TEST_F(AttentionStepOpTest, AttentionStep_Mask) {
+  MakeOp();
+
+  // The energies are equal, the second timestep is masked.
+  AddInputFromArray<int64>(TensorShape({1}), {1});
+  AddInputFromArray<float>(TensorShape({1, 2, 1, 1}), {0.5f, 0.5f});
+  AddInputFromArray<float>(TensorShape({1, 2, 1, 2}),
+                           {2.0f, 4.0f, 3.0f, 5.0f});
+  AddInputFromArray<float>(TensorShape({1, 1}), {0.0f});
+  AddInputFromArray<float>(TensorShape({1}), {1.0f});
+  AddInputFromArray<float>(TensorShape({1, 2}), {0.0f, 0.0f});
+
+  ASSERT_OK(RunOpKernel());
+
+  Tensor expected_alignment(allocator(), DT_FLOAT, TensorShape({1, 2}));
+  test::FillValues<float>(&expected_alignment, {1.0f, 0.0f});
+  test::ExpectTensorNear<float>(expected_alignment, *GetOutput(0), 1e-5);
+
+  Tensor expected_context(allocator(), DT_FLOAT, TensorShape({1, 2}));
+  test::FillValues<float>(&expected_context, {2.0f, 4.0f});
+  test::ExpectTensorNear<float>(expected_context, *GetOutput(1), 1e-5);
+}
+
 }  // end namespace
 }  // end namespace tensorflow
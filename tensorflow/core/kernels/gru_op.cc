@@ -6,13 +6,16 @@
 
 #include "tensorflow/core/kernels/gru_op.h"
 
+#include <memory>
 #include <random>
+#include <unordered_map>
 
 #include "tensorflow/core/framework/numeric_op.h"
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/register_types.h"
 #include "tensorflow/core/lib/random/random_distributions.h"
 #include "tensorflow/core/util/guarded_philox_random.h"
+#include "tensorflow/core/util/work_sharder.h"
 
 #if GOOGLE_CUDA
 #include "tensorflow/stream_executor/stream.h"
@@ -122,6 +125,103 @@ void GruMatMul(OpKernelContext* ctx, bool a_trans, const Tensor& a,
   LaunchGruMatMul<Device>::launch(ctx, a, b, dim_pair, beta, out);
 }
 
+// Copies rows [src_row, src_row + rows) of src to dst starting at dst_row,
+// both matrices have the same width. The rows are contiguous, so this is a
+// plain device memcpy (and needs no alignment of the row offsets).
+template <typename Device>
+void GruCopyRows(const Device& d, const Tensor& src, int64 src_row, Tensor* dst,
+    int64 dst_row, int64 rows) {
+  const int64 width = src.dim_size(1);
+  CHECK_EQ(width, dst->dim_size(1));
+  d.memcpy(dst->flat<float>().data() + dst_row * width,
+           src.flat<float>().data() + src_row * width,
+           sizeof(float) * rows * width);
+}
+
+// The input projection of timesteps [t_begin, t_end) does not depend on
+// h[t - 1], so it is done up front as one large GEMM per weight instead of
+// one small GEMM per timestep:
+//   xrz = [x Wxr, x Wxz] and xg = x Wxh,
+// where rows [(t - t_begin) * batch_size, (t - t_begin + 1) * batch_size)
+// belong to timestep t.
+template <typename Device>
+void GruInputProjection(
+    OpKernelContext* ctx, const OpInputList& xs, int64 t_begin, int64 t_end,
+    const Tensor& wxrz, const Tensor& wxh, Tensor* xrz, Tensor* xg) {
+  if (t_end <= t_begin) return;
+  const int64 batch_size = xs[t_begin].dim_size(0);
+  const int64 input_size = xs[t_begin].dim_size(1);
+
+  Tensor x;
+  OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+      DT_FLOAT, TensorShape({(t_end - t_begin) * batch_size, input_size}), &x));
+  for (int64 t = t_begin; t < t_end; ++t) {
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), xs[t], 0, &x, (t - t_begin) * batch_size,
+        batch_size);
+  }
+
+  GruMatMul<Device>(ctx, false, x, false, wxrz, 0.0f, xrz);
+  GruMatMul<Device>(ctx, false, x, false, wxh, 0.0f, xg);
+}
+
+// The timestep of example b that a recurrence in the given direction visits
+// at its step tau, -1 if there is none. The backward recurrence runs over
+// each example's own sequence_len frames in reverse.
+inline int64 GruDirectionTime(
+    const std::vector<int64>& seq_lens, bool reverse, int64 tau, int64 b) {
+  if (!reverse) return tau;
+  return tau < seq_lens[b] ? seq_lens[b] - 1 - tau : -1;
+}
+
+// dst rows [dst_row, dst_row + batch_size) = columns [src_col, src_col +
+// width) of the src rows visited at step tau, rows without a timestep are
+// zeroed.
+template <typename Device>
+void GruGatherStep(
+    const Device& d, const OpInputList& src, int64 src_col, int64 width,
+    const std::vector<int64>& seq_lens, bool reverse, int64 tau, Tensor* dst,
+    int64 dst_row) {
+  const int64 batch_size = seq_lens.size();
+  const int64 dst_width = dst->dim_size(1);
+  float* dst_data = dst->flat<float>().data() + dst_row * dst_width;
+  if (!reverse && src_col == 0 && width == dst_width &&
+      width == src[tau].dim_size(1)) {
+    d.memcpy(dst_data, src[tau].flat<float>().data(),
+             sizeof(float) * batch_size * width);
+    return;
+  }
+  for (int64 b = 0; b < batch_size; ++b) {
+    const int64 t = GruDirectionTime(seq_lens, reverse, tau, b);
+    if (t >= 0 && t < src.size()) {
+      const int64 src_width = src[t].dim_size(1);
+      d.memcpy(dst_data + b * dst_width,
+               src[t].flat<float>().data() + b * src_width + src_col,
+               sizeof(float) * width);
+    } else {
+      d.memset(dst_data + b * dst_width, 0, sizeof(float) * width);
+    }
+  }
+}
+
+// The inverse of GruGatherStep: the rows of src go to columns [dst_col,
+// dst_col + width) of the dst rows visited at step tau.
+template <typename Device>
+void GruScatterStep(
+    const Device& d, const Tensor& src, const std::vector<Tensor*>& dst,
+    int64 dst_col, const std::vector<int64>& seq_lens, bool reverse,
+    int64 tau) {
+  const int64 batch_size = seq_lens.size();
+  const int64 width = src.dim_size(1);
+  for (int64 b = 0; b < batch_size; ++b) {
+    const int64 t = GruDirectionTime(seq_lens, reverse, tau, b);
+    if (t < 0 || t >= static_cast<int64>(dst.size())) continue;
+    const int64 dst_width = dst[t]->dim_size(1);
+    d.memcpy(dst[t]->flat<float>().data() + b * dst_width + dst_col,
+             src.flat<float>().data() + b * width, sizeof(float) * width);
+  }
+}
+
 template <>
 struct GruDeviceSynchronize<CPUDevice> {
   void operator()(const CPUDevice& d) {}
@@ -455,6 +555,64 @@ struct GruDg<GPUDevice> {
   }
 };
 
+// Replaces each ground_truth token with one sampled from its row of
+// token_distribution with probability sample_prob.
+template <typename Device>
+void SampleTokens(OpKernelContext* ctx, float sample_prob,
+                  GuardedPhiloxRandom* generator) {
+  #define INPUT_TENSOR(T)                                                      \
+    const Tensor* T = nullptr;                                                 \
+    OP_REQUIRES_OK(ctx, ctx->input(#T, &T));
+
+  INPUT_TENSOR(ground_truth);
+  INPUT_TENSOR(token_distribution);
+
+  Tensor* token = nullptr;
+  OP_REQUIRES_OK(ctx, ctx->allocate_output("token", ground_truth->shape(), &token));
+  token->vec<int32>().device(ctx->eigen_device<Device>()) =
+      ground_truth->vec<int32>();
+
+  const int64 batch_size = token->dim_size(0);
+  const int64 vocab_size = token_distribution->dim_size(1);
+
+  typedef random::UniformDistribution<random::PhiloxRandom, float>
+      Distribution;
+  Distribution dist;
+
+  // First determine whether we want to sample or not sample from our
+  // distribution. The samples come in groups, the vectors are rounded up.
+  const int kGroupSize = Distribution::kResultElementCount;
+  const int64 samples_size =
+      (batch_size + kGroupSize - 1) / kGroupSize * kGroupSize;
+  std::vector<float> sample_prab(samples_size);
+  std::vector<float> sample_token_prob(samples_size);
+
+  // Sample our random numbers.
+  auto local_generator = generator->ReserveSamples32(batch_size * 2);
+  for (int64 i = 0; i < batch_size; i += kGroupSize) {
+    auto samples = dist(&local_generator);
+    std::copy(&samples[0], &samples[0] + kGroupSize, &sample_prab[i]);
+    samples = dist(&local_generator);
+    std::copy(&samples[0], &samples[0] + kGroupSize, &sample_token_prob[i]);
+  }
+
+  if (sample_prob > 0.0f) {
+    for (int64 b = 0; b < batch_size; ++b) {
+      if (sample_prab[b] < sample_prob) {
+        float prob = 0.0f;
+        int64 v = 0;
+        for (; v < vocab_size; ++v) {
+          prob += token_distribution->matrix<float>()(b, v);
+          if (prob >= sample_token_prob[b]) break;
+        }
+        if (v >= vocab_size) v = vocab_size - 1;
+
+        token->vec<int32>()(b) = v;
+      }
+    }
+  }
+}
+
 template <typename Device>
 class TokenSampleOp : public OpKernel {
  public:
@@ -464,59 +622,50 @@ class TokenSampleOp : public OpKernel {
   }
 
   void Compute(OpKernelContext* ctx) override {
-    #define INPUT_TENSOR(T)                                                      \
-      const Tensor* T = nullptr;                                                 \
-      OP_REQUIRES_OK(ctx, ctx->input(#T, &T));
-
-    INPUT_TENSOR(ground_truth);
-    INPUT_TENSOR(token_distribution);
-
-    Tensor* token = nullptr;
-    ctx->allocate_output("token", ground_truth->shape(), &token);
-    token->vec<int32>().device(ctx->eigen_device<Device>()) =
-        ground_truth->vec<int32>();
-
-    const int64 batch_size = token->dim_size(0);
-    const int64 vocab_size = token_distribution->dim_size(1);
-
-    typedef random::UniformDistribution<random::PhiloxRandom, float>
-        Distribution;
-    Distribution dist;
+    SampleTokens<Device>(ctx, sample_prob_, &generator_);
+  }
 
-    // First determine whether we want to sample or not sample from our distribution.
-    std::vector<float> sample_prab(batch_size);
-    std::vector<float> sample_token_prob(batch_size);
+ private:
+  float sample_prob_;
+  GuardedPhiloxRandom generator_;
+};
 
-    // Sample our random numbers.
-    const int kGroupSize = Distribution::kResultElementCount;
-    auto local_generator = generator_.ReserveSamples32(batch_size * 2);
-    for (int64 i = 0; i < batch_size; i += kGroupSize) {
-      auto samples = dist(&local_generator);
-      std::copy(&samples[0], &samples[0] + kGroupSize, &sample_prab[i]);
-      samples = dist(&local_generator);
-      std::copy(&samples[0], &samples[0] + kGroupSize, &sample_token_prob[i]);
-    }
+// TokenSample seeded by the step input: every step has its own generator,
+// seeded (step, seed2), which carries over across runs. A While loop decoder
+// thus samples like an unrolled one with a TokenSample of seed t at step t.
+template <typename Device>
+class TokenSampleStepOp : public OpKernel {
+ public:
+  explicit TokenSampleStepOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("seed2", &seed2_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("sample_prob", &sample_prob_));
+  }
 
-    if (sample_prob_ > 0.0f) {
-      for (int64 b = 0; b < batch_size; ++b) {
-        if (sample_prab[b] < sample_prob_) {
-          float prob = 0.0f;
-          int64 v = 0;
-          for (; v < vocab_size; ++v) {
-            prob += token_distribution->matrix<float>()(b, v);
-            if (prob >= sample_token_prob[b]) break;
-          }
-          if (v >= vocab_size) v = vocab_size - 1;
+  void Compute(OpKernelContext* ctx) override {
+    const Tensor* step = nullptr;
+    OP_REQUIRES_OK(ctx, ctx->input("step", &step));
+    OP_REQUIRES(ctx, TensorShapeUtils::IsScalar(step->shape()),
+                errors::InvalidArgument("step must be a scalar: ",
+                                        step->shape().DebugString()));
+    SampleTokens<Device>(ctx, sample_prob_, Generator(step->scalar<int32>()()));
+  }
 
-          token->vec<int32>()(b) = v;
-        }
-      }
+ private:
+  GuardedPhiloxRandom* Generator(int64 step) {
+    mutex_lock lock(mu_);
+    std::unique_ptr<GuardedPhiloxRandom>& generator = generators_[step];
+    if (!generator) {
+      generator.reset(new GuardedPhiloxRandom);
+      generator->Init(step, seed2_);
     }
+    return generator.get();
   }
 
- private:
   float sample_prob_;
-  GuardedPhiloxRandom generator_;
+  int64 seed2_;
+  mutex mu_;
+  std::unordered_map<int64, std::unique_ptr<GuardedPhiloxRandom>> generators_
+      GUARDED_BY(mu_);
 };
 
 
@@ -571,6 +720,67 @@ REGISTER_KERNEL_BUILDER(Name("UniformDistributionSampler")
                              .Device(DEVICE_CPU),
                         UniformDistributionSamplerOp);
 
+// One GRU step on top of the hoisted input projection, row is the first row of
+// the timestep in xrz / xg. h_prev is null at t = 0 and h may be null when
+// only the gates are needed.
+template <typename Device>
+void GruStep(
+    OpKernelContext* ctx, const Tensor& xrz, const Tensor& xg, int64 row,
+    const Tensor* h_prev, const Tensor& whrz, const Tensor& whh,
+    const Tensor& br, const Tensor& bz, const Tensor& bh, Tensor* rz,
+    Tensor* r, Tensor* z, Tensor* rh, Tensor* g, Tensor* h) {
+  const Device& d = ctx->eigen_device<Device>();
+  const int64 batch_size = rz->dim_size(0);
+
+  // r[t] = sigm(x[t] Wxr + h[t - 1] Whr)
+  // z[t] = sigm(x[t] Wxz + h[t - 1] Whz)
+  GruCopyRows<Device>(d, xrz, row, rz, 0, batch_size);
+  if (h_prev) GruMatMul<Device>(ctx, false, *h_prev, false, whrz, 1.0f, rz);
+  GruRZ<Device>()(d, *rz, r, z);
+  GruBias<Device>()(d, br, r);
+  GruActivationSigmoid<Device>()(d, r);
+  GruBias<Device>()(d, bz, z);
+  GruActivationSigmoid<Device>()(d, z);
+
+  // rh[t] = r[t] .* h_prev[t]
+  // g[t] = tanh(x[t] Wxh + rh[t] Whh)
+  if (h_prev) {
+    GruCWiseMult<Device>()(d, *r, *h_prev, 0.0f, rh);
+  } else {
+    GruSetZero<Device>()(d, rh);
+  }
+  GruCopyRows<Device>(d, xg, row, g, 0, batch_size);
+  if (h_prev) GruMatMul<Device>(ctx, false, *rh, false, whh, 1.0f, g);
+  GruBias<Device>()(d, bh, g);
+  GruActivationTanh<Device>()(d, g);
+
+  // h[t] = z[t] .* h[t - 1] + (1 - z[t]) .* g[t]
+  if (h) GruH<Device>()(d, *z, h_prev, *g, h);
+}
+
+// Runs fn(0) (forward) and fn(1) (backward). On the CPU the two directions
+// run concurrently, one of them on the intra op thread pool.
+template <typename Device>
+struct GruRunDirections {
+  void operator()(OpKernelContext* ctx, std::function<void(int64)> fn) {
+    fn(0);
+    fn(1);
+  }
+};
+
+template <>
+struct GruRunDirections<CPUDevice> {
+  void operator()(OpKernelContext* ctx, std::function<void(int64)> fn) {
+    auto worker_threads = ctx->device()->tensorflow_cpu_worker_threads();
+    // A direction is always worth its own thread.
+    const int64 cost_per_direction = 1LL << 30;
+    Shard(worker_threads->num_threads, worker_threads->workers, 2,
+          cost_per_direction, [&fn](int64 start, int64 limit) {
+            for (int64 dir = start; dir < limit; ++dir) fn(dir);
+          });
+  }
+};
+
 template <typename Device>
 class GruCellOp : public OpKernel {
  public:
@@ -820,16 +1030,23 @@ class GruOp : public OpKernel {
     INPUT_TENSOR(bz);
     INPUT_TENSOR(bh);
 
-    // Fused matrix mult is faster.
+    // Fused matrix mult is faster. The input rows of wxhrz ([Wxr, Wxz]) are
+    // used for the input projection, the recurrent rows ([Whr, Whz]) per step.
     const int64 input_size = wxr->dim_size(0);
     ALLOCATE_TEMP(
         wxhrz, TensorShape({cell_size_ + input_size, cell_size_ * 2}));
     ALLOCATE_TEMP(
-        xh, TensorShape({batch_size, input_size + cell_size_}));
+        wxrz, TensorShape({input_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(
+        whrz, TensorShape({cell_size_, cell_size_ * 2}));
     ALLOCATE_TEMP(
         rz, TensorShape({batch_size, cell_size_ * 2}));
     GruWxhrz<Device>()(
         ctx->eigen_device<Device>(), *wxr, *whr, *wxz, *whz, &wxhrz);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, 0, &wxrz, 0, input_size);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, input_size, &whrz, 0, cell_size_);
 
   #define OUTPUT_LIST(T)                                                       \
     OpOutputList T;                                                            \
@@ -857,8 +1074,18 @@ class GruOp : public OpKernel {
     if (sequence_len_max >= sequence_len_max_) {
       sequence_len_max = sequence_len_max_;
     }
+
+    Tensor xrz;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+        TensorShape({sequence_len_max * batch_size, cell_size_ * 2}), &xrz));
+    Tensor xg;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+        TensorShape({sequence_len_max * batch_size, cell_size_}), &xg));
+    GruInputProjection<Device>(
+        ctx, xs, 0, sequence_len_max, wxrz, *wxh, &xrz, &xg);
+    if (!ctx->status().ok()) return;
+
     for (int64 t = 0; t < sequence_len_max; ++t) {
-      const Tensor x = xs[t];
       const Tensor* h_prev = t <= 0 ? nullptr : hs[t - 1];
 
       Tensor* r = rs[t];
@@ -867,8 +1094,9 @@ class GruOp : public OpKernel {
       Tensor* g = gs[t];
       Tensor* h = hs[t];
 
-      GruXH<Device>()(ctx->eigen_device<Device>(), x, h_prev, &xh);
-      GruMatMul<Device>(ctx, false, xh, false, wxhrz, 0.0f, &rz);
+      GruCopyRows<Device>(
+          ctx->eigen_device<Device>(), xrz, t * batch_size, &rz, 0, batch_size);
+      if (t > 0) GruMatMul<Device>(ctx, false, *h_prev, false, whrz, 1.0f, &rz);
       GruRZ<Device>()(ctx->eigen_device<Device>(), rz, r, z);
 
       // r[t] = sigm(x[t] Wxr + h[t - 1] Whr)
@@ -890,7 +1118,8 @@ class GruOp : public OpKernel {
       } else {
         GruSetZero<Device>()(ctx->eigen_device<Device>(), rh);
       }
-      GruMatMul<Device>(ctx, false, x, false, *wxh, 0.0f, g);
+      GruCopyRows<Device>(
+          ctx->eigen_device<Device>(), xg, t * batch_size, g, 0, batch_size);
       if (t > 0) GruMatMul<Device>(ctx, false, *rh, false, *whh, 1.0f, g);
       GruBias<Device>()(ctx->eigen_device<Device>(), *bh, g);
       GruActivationTanh<Device>()(ctx->eigen_device<Device>(), g);
@@ -944,18 +1173,25 @@ class GruFusedOp : public OpKernel {
     INPUT_TENSOR(wxh);
     INPUT_TENSOR(whh);
 
-    // Fused matrix mult is faster.
+    // Fused matrix mult is faster. The input rows of wxhrz ([Wxr, Wxz]) are
+    // used for the input projection, the recurrent rows ([Whr, Whz]) per step.
     const int64 input_size = wxr->dim_size(0);
     ALLOCATE_TEMP(
         wxhrz, TensorShape({cell_size_ + input_size, cell_size_ * 2}));
     ALLOCATE_TEMP(
-        xh, TensorShape({batch_size, input_size + cell_size_}));
+        wxrz, TensorShape({input_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(
+        whrz, TensorShape({cell_size_, cell_size_ * 2}));
     ALLOCATE_TEMP(
         r, TensorShape({batch_size, cell_size_}));
     ALLOCATE_TEMP(
         z, TensorShape({batch_size, cell_size_}));
     GruWxhrz<Device>()(
         ctx->eigen_device<Device>(), *wxr, *whr, *wxz, *whz, &wxhrz);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, 0, &wxrz, 0, input_size);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, input_size, &whrz, 0, cell_size_);
 
   #define OUTPUT_LIST(T)                                                       \
     OpOutputList T;                                                            \
@@ -981,8 +1217,18 @@ class GruFusedOp : public OpKernel {
     if (sequence_len_max >= sequence_len_max_) {
       sequence_len_max = sequence_len_max_;
     }
+
+    Tensor xrz;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+        TensorShape({sequence_len_max * batch_size, cell_size_ * 2}), &xrz));
+    Tensor xg;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+        TensorShape({sequence_len_max * batch_size, cell_size_}), &xg));
+    GruInputProjection<Device>(
+        ctx, xs, 0, sequence_len_max, wxrz, *wxh, &xrz, &xg);
+    if (!ctx->status().ok()) return;
+
     for (int64 t = 0; t < sequence_len_max; ++t) {
-      const Tensor x = xs[t];
       const Tensor* h_prev = t <= 0 ? nullptr : hs[t - 1];
 
       Tensor* rz = rzs[t];
@@ -992,8 +1238,9 @@ class GruFusedOp : public OpKernel {
 
       // r[t] = sigm(x[t] Wxr + h[t - 1] Whr)
       // z[t] = sigm(x[t] Wxz + h[t - 1] Whz)
-      GruXH<Device>()(ctx->eigen_device<Device>(), x, h_prev, &xh);
-      GruMatMul<Device>(ctx, false, xh, false, wxhrz, 0.0f, rz);
+      GruCopyRows<Device>(
+          ctx->eigen_device<Device>(), xrz, t * batch_size, rz, 0, batch_size);
+      if (t > 0) GruMatMul<Device>(ctx, false, *h_prev, false, whrz, 1.0f, rz);
       GruActivationSigmoid<Device>()(ctx->eigen_device<Device>(), rz);
       GruRZ<Device>()(ctx->eigen_device<Device>(), *rz, &r, &z);
 
@@ -1004,7 +1251,8 @@ class GruFusedOp : public OpKernel {
       } else {
         GruSetZero<Device>()(ctx->eigen_device<Device>(), rh);
       }
-      GruMatMul<Device>(ctx, false, x, false, *wxh, 0.0f, g);
+      GruCopyRows<Device>(
+          ctx->eigen_device<Device>(), xg, t * batch_size, g, 0, batch_size);
       if (t > 0) GruMatMul<Device>(ctx, false, *rh, false, *whh, 1.0f, g);
       GruActivationTanh<Device>()(ctx->eigen_device<Device>(), g);
 
@@ -1020,6 +1268,101 @@ class GruFusedOp : public OpKernel {
   int64 sequence_len_max_;
 };
 
+// Gru that only outputs hs, the gates are recomputed by GruLeanGrad.
+template <typename Device>
+class GruLeanOp : public OpKernel {
+ public:
+  explicit GruLeanOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("cell_size", &cell_size_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("sequence_len_max", &sequence_len_max_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    INPUT_TENSOR(sequence_len);
+
+    // Get the sequence length in CPU memory.
+    auto sequence_len_t = sequence_len->vec<int64>();
+    std::vector<int64> seq_lens_vector(sequence_len_t.size());
+    ctx->eigen_device<Device>().memcpyDeviceToHost(
+        seq_lens_vector.data(), sequence_len_t.data(),
+        sizeof(int64) * sequence_len_t.size());
+    GruDeviceSynchronize<Device>()(ctx->eigen_device<Device>());
+
+    // Maximum number of compute unrolls.
+    int64 sequence_len_max =
+        *std::max_element(seq_lens_vector.begin(), seq_lens_vector.end());
+    const int64 batch_size = seq_lens_vector.size();
+
+    INPUT_LIST(xs);
+
+    INPUT_TENSOR(wxr);
+    INPUT_TENSOR(whr);
+    INPUT_TENSOR(wxz);
+    INPUT_TENSOR(whz);
+    INPUT_TENSOR(wxh);
+    INPUT_TENSOR(whh);
+
+    INPUT_TENSOR(br);
+    INPUT_TENSOR(bz);
+    INPUT_TENSOR(bh);
+
+    const int64 input_size = wxr->dim_size(0);
+    ALLOCATE_TEMP(
+        wxhrz, TensorShape({cell_size_ + input_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(
+        wxrz, TensorShape({input_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(
+        whrz, TensorShape({cell_size_, cell_size_ * 2}));
+    GruWxhrz<Device>()(
+        ctx->eigen_device<Device>(), *wxr, *whr, *wxz, *whz, &wxhrz);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, 0, &wxrz, 0, input_size);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, input_size, &whrz, 0, cell_size_);
+
+    // The gates of a single timestep.
+    ALLOCATE_TEMP(rz, TensorShape({batch_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(r, TensorShape({batch_size, cell_size_}));
+    ALLOCATE_TEMP(z, r.shape());
+    ALLOCATE_TEMP(rh, r.shape());
+    ALLOCATE_TEMP(g, r.shape());
+
+    OUTPUT_LIST(hs);
+    for (int64 t = 0; t < sequence_len_max_; ++t) {
+      OUTPUT_LIST_ALLOCATE(hs, h, TensorShape({batch_size, cell_size_}));
+    }
+
+    if (sequence_len_max >= sequence_len_max_) {
+      sequence_len_max = sequence_len_max_;
+    }
+
+    Tensor xrz;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+        TensorShape({sequence_len_max * batch_size, cell_size_ * 2}), &xrz));
+    Tensor xg;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+        TensorShape({sequence_len_max * batch_size, cell_size_}), &xg));
+    GruInputProjection<Device>(
+        ctx, xs, 0, sequence_len_max, wxrz, *wxh, &xrz, &xg);
+    if (!ctx->status().ok()) return;
+
+    for (int64 t = 0; t < sequence_len_max; ++t) {
+      const Tensor* h_prev = t <= 0 ? nullptr : hs[t - 1];
+      Tensor* h = hs[t];
+
+      GruStep<Device>(
+          ctx, xrz, xg, t * batch_size, h_prev, whrz, *whh, *br, *bz, *bh,
+          &rz, &r, &z, &rh, &g, h);
+
+      GruPadTime<Device>()(ctx->eigen_device<Device>(), *sequence_len, t, 0.0f, h);
+    }
+  }
+
+ protected:
+  int64 cell_size_;
+  int64 sequence_len_max_;
+};
+
 REGISTER_KERNEL_BUILDER(Name("GruCell")
                              .Device(DEVICE_CPU),
                         GruCellOp<CPUDevice>);
@@ -1050,6 +1393,16 @@ REGISTER_KERNEL_BUILDER(Name("GruFused")
                         GruFusedOp<GPUDevice>);
 #endif  // GOOGLE_CUDA
 
+REGISTER_KERNEL_BUILDER(Name("GruLean")
+                             .Device(DEVICE_CPU),
+                        GruLeanOp<CPUDevice>);
+
+#if GOOGLE_CUDA
+REGISTER_KERNEL_BUILDER(Name("GruLean")
+                             .Device(DEVICE_GPU),
+                        GruLeanOp<GPUDevice>);
+#endif  // GOOGLE_CUDA
+
 template <typename Device>
 class GruGradOp : public OpKernel {
  public:
@@ -1344,6 +1697,209 @@ class GruFusedGradOp : public OpKernel {
   int64 sequence_len_max_;
 };
 
+// Gradient of GruLean. The gates are recomputed from xs and hs one segment of
+// segment_len timesteps at a time (last segment first), so only one segment
+// of gates is alive at any time.
+template <typename Device>
+class GruLeanGradOp : public OpKernel {
+ public:
+  explicit GruLeanGradOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("cell_size", &cell_size_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("sequence_len_max", &sequence_len_max_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("segment_len", &segment_len_));
+    OP_REQUIRES(ctx, segment_len_ > 0,
+                errors::InvalidArgument("segment_len must be positive: ",
+                                        segment_len_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    const Tensor* sequence_len = nullptr;
+    OP_REQUIRES_OK(ctx, ctx->input("sequence_len", &sequence_len));
+
+    // Get the sequence length in CPU memory.
+    auto sequence_len_t = sequence_len->vec<int64>();
+    std::vector<int64> seq_lens_vector(sequence_len_t.size());
+    ctx->eigen_device<Device>().memcpyDeviceToHost(
+        seq_lens_vector.data(), sequence_len_t.data(),
+        sizeof(int64) * sequence_len_t.size());
+    GruDeviceSynchronize<Device>()(ctx->eigen_device<Device>());
+
+    // Get the batch size.
+    const int64 batch_size = sequence_len->NumElements();
+
+    // Maximum number of compute unrolls.
+    int64 sequence_len_max =
+        *std::max_element(seq_lens_vector.begin(), seq_lens_vector.end());
+
+    INPUT_TENSOR(wxr);
+    INPUT_TENSOR(whr);
+    INPUT_TENSOR(wxz);
+    INPUT_TENSOR(whz);
+    INPUT_TENSOR(wxh);
+    INPUT_TENSOR(whh);
+
+    INPUT_TENSOR(br);
+    INPUT_TENSOR(bz);
+    INPUT_TENSOR(bh);
+
+    INPUT_LIST(xs);
+    INPUT_LIST(hs);
+
+    // Gradients.
+    INPUT_LIST(dhs);
+
+    const int64 input_size = wxr->dim_size(0);
+    ALLOCATE_TEMP(
+        wxhrz, TensorShape({cell_size_ + input_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(
+        wxrz, TensorShape({input_size, cell_size_ * 2}));
+    ALLOCATE_TEMP(
+        whrz, TensorShape({cell_size_, cell_size_ * 2}));
+    GruWxhrz<Device>()(
+        ctx->eigen_device<Device>(), *wxr, *whr, *wxz, *whz, &wxhrz);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, 0, &wxrz, 0, input_size);
+    GruCopyRows<Device>(
+        ctx->eigen_device<Device>(), wxhrz, input_size, &whrz, 0, cell_size_);
+
+    ALLOCATE_TEMP(dh, TensorShape({batch_size, cell_size_}));
+    ALLOCATE_TEMP(dh_prev, dh.shape());
+    ALLOCATE_TEMP(dr, dh.shape());
+    ALLOCATE_TEMP(dz, dh.shape());
+    ALLOCATE_TEMP(drh, dh.shape());
+    ALLOCATE_TEMP(dg, dh.shape());
+    ALLOCATE_TEMP(rz, TensorShape({batch_size, cell_size_ * 2}));
+
+    // The recomputed gates of one segment.
+    std::vector<Tensor> rs(segment_len_);
+    std::vector<Tensor> zs(segment_len_);
+    std::vector<Tensor> rhs(segment_len_);
+    std::vector<Tensor> gs(segment_len_);
+    for (int64 i = 0; i < segment_len_; ++i) {
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT, dh.shape(), &rs[i]));
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT, dh.shape(), &zs[i]));
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT, dh.shape(), &rhs[i]));
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT, dh.shape(), &gs[i]));
+    }
+
+    OUTPUT_TENSOR(dwxr, wxr->shape());
+    OUTPUT_TENSOR(dwhr, whr->shape());
+    OUTPUT_TENSOR(dwxz, wxz->shape());
+    OUTPUT_TENSOR(dwhz, whz->shape());
+    OUTPUT_TENSOR(dwxh, wxh->shape());
+    OUTPUT_TENSOR(dwhh, whh->shape());
+
+    OUTPUT_TENSOR(dbr, br->shape());
+    OUTPUT_TENSOR(dbz, bz->shape());
+    OUTPUT_TENSOR(dbh, bh->shape());
+
+    OUTPUT_LIST(dxs);
+
+    CHECK_EQ(xs.size(), sequence_len_max_);
+    for (int64 t = 0; t < sequence_len_max_; ++t) {
+      const Tensor x = xs[t];
+      OUTPUT_LIST_ALLOCATE(dxs, dx, x.shape());
+    }
+
+    if (sequence_len_max >= sequence_len_max_) {
+      sequence_len_max = sequence_len_max_;
+    }
+    for (int64 t_end = sequence_len_max; t_end > 0; t_end -= segment_len_) {
+      const int64 t_begin = std::max<int64>(t_end - segment_len_, 0);
+
+      // Recompute the gates of the segment, starting from hs[t_begin - 1].
+      Tensor xrz;
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+          TensorShape({(t_end - t_begin) * batch_size, cell_size_ * 2}), &xrz));
+      Tensor xg;
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT,
+          TensorShape({(t_end - t_begin) * batch_size, cell_size_}), &xg));
+      GruInputProjection<Device>(
+          ctx, xs, t_begin, t_end, wxrz, *wxh, &xrz, &xg);
+      if (!ctx->status().ok()) return;
+
+      for (int64 t = t_begin; t < t_end; ++t) {
+        const int64 i = t - t_begin;
+        const Tensor* h_prev = t <= 0 ? nullptr : &hs[t - 1];
+        GruStep<Device>(
+            ctx, xrz, xg, i * batch_size, h_prev, whrz, *whh, *br, *bz, *bh,
+            &rz, &rs[i], &zs[i], &rhs[i], &gs[i], nullptr);
+      }
+
+      for (int64 t = t_end - 1; t >= t_begin; --t) {
+        const int64 i = t - t_begin;
+        const Tensor x = xs[t];
+        const Tensor& r = rs[i];
+        const Tensor& z = zs[i];
+        const Tensor& rh = rhs[i];
+        const Tensor& g = gs[i];
+        GruAdd<Device>()(ctx->eigen_device<Device>(), dhs[t], dh_prev, &dh);
+
+        const Tensor* h_prev = t <= 0 ? nullptr : &hs[t - 1];
+
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &dh_prev);
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &dr);
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &dz);
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &drh);
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &dg);
+
+        Tensor* dx = dxs[t];
+
+        // h[t] = z[t] .* h[t - 1] + (1 - z[t]) .* g[t]
+        GruDz<Device>()(ctx->eigen_device<Device>(), dh, h_prev, g, &dz);
+        if (t > 0) {
+          GruCWiseMult<Device>()(ctx->eigen_device<Device>(), dh, z, 1.0f, &dh_prev);
+        }
+        GruDg<Device>()(ctx->eigen_device<Device>(), dh, z, &dg);
+
+        // g[t] = tanh(x[t] Wxh + rh[t] Whh)
+        GruActivationTanhGradient<Device>()(ctx->eigen_device<Device>(), g, &dg);
+        GruMatMul<Device>(ctx, false, dg, true, *wxh, 0.0f, dx);
+        GruMatMul<Device>(ctx, false, dg, true, *whh, 0.0f, &drh);
+
+        if (t > 0) {
+          GruCWiseMult<Device>()(ctx->eigen_device<Device>(), drh, *h_prev, 0.0f, &dr);
+          GruCWiseMult<Device>()(ctx->eigen_device<Device>(), drh, r, 1.0f, &dh_prev);
+        } else {
+          GruSetZero<Device>()(ctx->eigen_device<Device>(), &dr);
+        }
+
+        // z[t] = sigm(x[t] Wxz + h[t - 1] Whz)
+        GruActivationSigmoidGradient<Device>()(ctx->eigen_device<Device>(), z, &dz);
+        GruMatMul<Device>(ctx, false, dz, true, *wxz, 1.0f, dx);
+        if (t > 0) GruMatMul<Device>(ctx, false, dz, true, *whz, 1.0f, &dh_prev);
+
+        // r[t] = sigm(x[t] Wxr + h[t - 1] Whr)
+        if (t > 0) {
+          GruActivationSigmoidGradient<Device>()(ctx->eigen_device<Device>(), r, &dr);
+          GruMatMul<Device>(ctx, false, dr, true, *wxr, 1.0f, dx);
+          GruMatMul<Device>(ctx, false, dr, true, *whr, 1.0f, &dh_prev);
+        }
+
+        // Gradient wrt to the weights.
+        GruMatMul<Device>(ctx, true, x, false, dr, 1.0f, dwxr);
+        GruMatMul<Device>(ctx, true, x, false, dz, 1.0f, dwxz);
+        GruMatMul<Device>(ctx, true, x, false, dg, 1.0f, dwxh);
+
+        if (t > 0) {
+          GruMatMul<Device>(ctx, true, *h_prev, false, dr, 1.0f, dwhr);
+          GruMatMul<Device>(ctx, true, *h_prev, false, dz, 1.0f, dwhz);
+          GruMatMul<Device>(ctx, true, rh, false, dg, 1.0f, dwhh);
+        }
+
+        GruBiasGrad<Device>()(ctx->eigen_device<Device>(), dr, dbr);
+        GruBiasGrad<Device>()(ctx->eigen_device<Device>(), dz, dbz);
+        GruBiasGrad<Device>()(ctx->eigen_device<Device>(), dg, dbh);
+      }
+    }
+  }
+
+ protected:
+  int64 cell_size_;
+  int64 sequence_len_max_;
+  int64 segment_len_;
+};
+
 REGISTER_KERNEL_BUILDER(Name("GruCellGrad")
                              .Device(DEVICE_CPU),
                         GruCellGradOp<CPUDevice>);
@@ -1374,8 +1930,501 @@ REGISTER_KERNEL_BUILDER(Name("GruFusedGrad")
                         GruFusedGradOp<GPUDevice>);
 #endif  // GOOGLE_CUDA
 
+REGISTER_KERNEL_BUILDER(Name("GruLeanGrad")
+                             .Device(DEVICE_CPU),
+                        GruLeanGradOp<CPUDevice>);
+
+#if GOOGLE_CUDA
+REGISTER_KERNEL_BUILDER(Name("GruLeanGrad")
+                             .Device(DEVICE_GPU),
+                        GruLeanGradOp<GPUDevice>);
+#endif  // GOOGLE_CUDA
+
+// The weights of one direction of GruBidirectional, in input order.
+enum { kGruWxr, kGruWhr, kGruWxz, kGruWhz, kGruWxh, kGruWhh, kGruBr, kGruBz,
+       kGruBh, kGruWeights };
+
+// Bidirectional GRU, hs[t] = [fwd h[t], bwd h[t]]. The backward recurrence
+// reverses every example over its own sequence_len. Like GruLean only hs is
+// kept, GruBidirectionalGrad recomputes the gates.
+template <typename Device>
+class GruBidirectionalOp : public OpKernel {
+ public:
+  explicit GruBidirectionalOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("cell_size", &cell_size_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("sequence_len_max", &sequence_len_max_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    INPUT_TENSOR(sequence_len);
+
+    // Get the sequence length in CPU memory.
+    auto sequence_len_t = sequence_len->vec<int64>();
+    std::vector<int64> seq_lens_vector(sequence_len_t.size());
+    ctx->eigen_device<Device>().memcpyDeviceToHost(
+        seq_lens_vector.data(), sequence_len_t.data(),
+        sizeof(int64) * sequence_len_t.size());
+    GruDeviceSynchronize<Device>()(ctx->eigen_device<Device>());
+
+    // Maximum number of compute unrolls.
+    int64 sequence_len_max =
+        *std::max_element(seq_lens_vector.begin(), seq_lens_vector.end());
+    const int64 batch_size = seq_lens_vector.size();
+    if (sequence_len_max >= sequence_len_max_) {
+      sequence_len_max = sequence_len_max_;
+    }
+    for (int64& len : seq_lens_vector) {
+      len = std::min(len, sequence_len_max);
+    }
+
+    INPUT_LIST(xs);
+
+    INPUT_TENSOR(fwd_wxr);
+    INPUT_TENSOR(fwd_whr);
+    INPUT_TENSOR(fwd_wxz);
+    INPUT_TENSOR(fwd_whz);
+    INPUT_TENSOR(fwd_wxh);
+    INPUT_TENSOR(fwd_whh);
+
+    INPUT_TENSOR(fwd_br);
+    INPUT_TENSOR(fwd_bz);
+    INPUT_TENSOR(fwd_bh);
+
+    INPUT_TENSOR(bwd_wxr);
+    INPUT_TENSOR(bwd_whr);
+    INPUT_TENSOR(bwd_wxz);
+    INPUT_TENSOR(bwd_whz);
+    INPUT_TENSOR(bwd_wxh);
+    INPUT_TENSOR(bwd_whh);
+
+    INPUT_TENSOR(bwd_br);
+    INPUT_TENSOR(bwd_bz);
+    INPUT_TENSOR(bwd_bh);
+
+    const Tensor* weights[2][kGruWeights] = {
+        {fwd_wxr, fwd_whr, fwd_wxz, fwd_whz, fwd_wxh, fwd_whh, fwd_br, fwd_bz,
+         fwd_bh},
+        {bwd_wxr, bwd_whr, bwd_wxz, bwd_whz, bwd_wxh, bwd_whh, bwd_br, bwd_bz,
+         bwd_bh}};
+
+    OUTPUT_LIST(hs);
+    std::vector<Tensor*> hs_vector;
+    for (int64 t = 0; t < sequence_len_max_; ++t) {
+      OUTPUT_LIST_ALLOCATE(
+          hs, h, TensorShape({batch_size, cell_size_ * 2}));
+      hs_vector.push_back(h);
+    }
+    if (sequence_len_max <= 0) return;
+
+    // Everything a direction needs is allocated up front, the directions
+    // may run concurrently.
+    const int64 input_size = fwd_wxr->dim_size(0);
+    std::vector<std::vector<Tensor>> temps(2);
+    enum { kWxhrz, kWxrz, kWhrz, kX, kXrz, kXg, kRz, kR, kZ, kRh, kG, kH0,
+           kH1, kTemps };
+    const TensorShape shapes[kTemps] = {
+        TensorShape({cell_size_ + input_size, cell_size_ * 2}),
+        TensorShape({input_size, cell_size_ * 2}),
+        TensorShape({cell_size_, cell_size_ * 2}),
+        TensorShape({sequence_len_max * batch_size, input_size}),
+        TensorShape({sequence_len_max * batch_size, cell_size_ * 2}),
+        TensorShape({sequence_len_max * batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_ * 2}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_})};
+    for (int64 dir = 0; dir < 2; ++dir) {
+      temps[dir].resize(kTemps);
+      for (int i = 0; i < kTemps; ++i) {
+        OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+            DT_FLOAT, shapes[i], &temps[dir][i]));
+      }
+    }
+
+    auto run_direction = [&](int64 dir) {
+      const Device& d = ctx->eigen_device<Device>();
+      const Tensor* const* w = weights[dir];
+      std::vector<Tensor>& temp = temps[dir];
+      const bool reverse = dir == 1;
+
+      GruWxhrz<Device>()(
+          d, *w[kGruWxr], *w[kGruWhr], *w[kGruWxz], *w[kGruWhz],
+          &temp[kWxhrz]);
+      GruCopyRows<Device>(d, temp[kWxhrz], 0, &temp[kWxrz], 0, input_size);
+      GruCopyRows<Device>(
+          d, temp[kWxhrz], input_size, &temp[kWhrz], 0, cell_size_);
+
+      // The input projection of the whole (reversed) sequence.
+      for (int64 tau = 0; tau < sequence_len_max; ++tau) {
+        GruGatherStep<Device>(
+            d, xs, 0, input_size, seq_lens_vector, reverse, tau, &temp[kX],
+            tau * batch_size);
+      }
+      GruMatMul<Device>(
+          ctx, false, temp[kX], false, temp[kWxrz], 0.0f, &temp[kXrz]);
+      GruMatMul<Device>(
+          ctx, false, temp[kX], false, *w[kGruWxh], 0.0f, &temp[kXg]);
+
+      for (int64 tau = 0; tau < sequence_len_max; ++tau) {
+        const Tensor* h_prev =
+            tau <= 0 ? nullptr : &temp[kH0 + (tau - 1) % 2];
+        Tensor* h = &temp[kH0 + tau % 2];
+
+        GruStep<Device>(
+            ctx, temp[kXrz], temp[kXg], tau * batch_size, h_prev,
+            temp[kWhrz], *w[kGruWhh], *w[kGruBr], *w[kGruBz], *w[kGruBh],
+            &temp[kRz], &temp[kR], &temp[kZ], &temp[kRh], &temp[kG], h);
+        GruPadTime<Device>()(d, *sequence_len, tau, 0.0f, h);
+
+        GruScatterStep<Device>(
+            d, *h, hs_vector, dir * cell_size_, seq_lens_vector, reverse, tau);
+      }
+    };
+    GruRunDirections<Device>()(ctx, run_direction);
+  }
+
+ protected:
+  int64 cell_size_;
+  int64 sequence_len_max_;
+};
+
+template <typename Device>
+class GruBidirectionalGradOp : public OpKernel {
+ public:
+  explicit GruBidirectionalGradOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("cell_size", &cell_size_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("sequence_len_max", &sequence_len_max_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("segment_len", &segment_len_));
+    OP_REQUIRES(ctx, segment_len_ > 0,
+                errors::InvalidArgument("segment_len must be positive: ",
+                                        segment_len_));
+  }
+
+  void Compute(OpKernelContext* ctx) override {
+    INPUT_TENSOR(sequence_len);
+
+    // Get the sequence length in CPU memory.
+    auto sequence_len_t = sequence_len->vec<int64>();
+    std::vector<int64> seq_lens_vector(sequence_len_t.size());
+    ctx->eigen_device<Device>().memcpyDeviceToHost(
+        seq_lens_vector.data(), sequence_len_t.data(),
+        sizeof(int64) * sequence_len_t.size());
+    GruDeviceSynchronize<Device>()(ctx->eigen_device<Device>());
+
+    // Maximum number of compute unrolls.
+    int64 sequence_len_max =
+        *std::max_element(seq_lens_vector.begin(), seq_lens_vector.end());
+    const int64 batch_size = seq_lens_vector.size();
+    if (sequence_len_max >= sequence_len_max_) {
+      sequence_len_max = sequence_len_max_;
+    }
+    for (int64& len : seq_lens_vector) {
+      len = std::min(len, sequence_len_max);
+    }
+
+    INPUT_LIST(xs);
+    INPUT_LIST(hs);
+
+    // Gradients.
+    INPUT_LIST(dhs);
+
+    INPUT_TENSOR(fwd_wxr);
+    INPUT_TENSOR(fwd_whr);
+    INPUT_TENSOR(fwd_wxz);
+    INPUT_TENSOR(fwd_whz);
+    INPUT_TENSOR(fwd_wxh);
+    INPUT_TENSOR(fwd_whh);
+
+    INPUT_TENSOR(fwd_br);
+    INPUT_TENSOR(fwd_bz);
+    INPUT_TENSOR(fwd_bh);
+
+    INPUT_TENSOR(bwd_wxr);
+    INPUT_TENSOR(bwd_whr);
+    INPUT_TENSOR(bwd_wxz);
+    INPUT_TENSOR(bwd_whz);
+    INPUT_TENSOR(bwd_wxh);
+    INPUT_TENSOR(bwd_whh);
+
+    INPUT_TENSOR(bwd_br);
+    INPUT_TENSOR(bwd_bz);
+    INPUT_TENSOR(bwd_bh);
+
+    const Tensor* weights[2][kGruWeights] = {
+        {fwd_wxr, fwd_whr, fwd_wxz, fwd_whz, fwd_wxh, fwd_whh, fwd_br, fwd_bz,
+         fwd_bh},
+        {bwd_wxr, bwd_whr, bwd_wxz, bwd_whz, bwd_wxh, bwd_whh, bwd_br, bwd_bz,
+         bwd_bh}};
+
+    OUTPUT_TENSOR(dfwd_wxr, fwd_wxr->shape());
+    OUTPUT_TENSOR(dfwd_whr, fwd_whr->shape());
+    OUTPUT_TENSOR(dfwd_wxz, fwd_wxz->shape());
+    OUTPUT_TENSOR(dfwd_whz, fwd_whz->shape());
+    OUTPUT_TENSOR(dfwd_wxh, fwd_wxh->shape());
+    OUTPUT_TENSOR(dfwd_whh, fwd_whh->shape());
+
+    OUTPUT_TENSOR(dfwd_br, fwd_br->shape());
+    OUTPUT_TENSOR(dfwd_bz, fwd_bz->shape());
+    OUTPUT_TENSOR(dfwd_bh, fwd_bh->shape());
+
+    OUTPUT_TENSOR(dbwd_wxr, bwd_wxr->shape());
+    OUTPUT_TENSOR(dbwd_whr, bwd_whr->shape());
+    OUTPUT_TENSOR(dbwd_wxz, bwd_wxz->shape());
+    OUTPUT_TENSOR(dbwd_whz, bwd_whz->shape());
+    OUTPUT_TENSOR(dbwd_wxh, bwd_wxh->shape());
+    OUTPUT_TENSOR(dbwd_whh, bwd_whh->shape());
+
+    OUTPUT_TENSOR(dbwd_br, bwd_br->shape());
+    OUTPUT_TENSOR(dbwd_bz, bwd_bz->shape());
+    OUTPUT_TENSOR(dbwd_bh, bwd_bh->shape());
+
+    Tensor* dweights[2][kGruWeights] = {
+        {dfwd_wxr, dfwd_whr, dfwd_wxz, dfwd_whz, dfwd_wxh, dfwd_whh, dfwd_br,
+         dfwd_bz, dfwd_bh},
+        {dbwd_wxr, dbwd_whr, dbwd_wxz, dbwd_whz, dbwd_wxh, dbwd_whh, dbwd_br,
+         dbwd_bz, dbwd_bh}};
+
+    // The backward direction scatters its dx into its own buffers, they are
+    // added to dxs once both directions are done.
+    OUTPUT_LIST(dxs);
+    std::vector<Tensor*> dxs_vector[2];
+    std::vector<Tensor> dxs_bwd(sequence_len_max);
+    CHECK_EQ(xs.size(), sequence_len_max_);
+    for (int64 t = 0; t < sequence_len_max_; ++t) {
+      const Tensor x = xs[t];
+      OUTPUT_LIST_ALLOCATE(dxs, dx, x.shape());
+      dxs_vector[0].push_back(dx);
+      if (t < sequence_len_max) {
+        OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+            DT_FLOAT, x.shape(), &dxs_bwd[t]));
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &dxs_bwd[t]);
+        dxs_vector[1].push_back(&dxs_bwd[t]);
+      }
+    }
+    if (sequence_len_max <= 0) return;
+
+    const int64 input_size = fwd_wxr->dim_size(0);
+    const int64 segment_len = std::min(segment_len_, sequence_len_max);
+    std::vector<std::vector<Tensor>> temps(2);
+    enum { kWxhrz, kWxrz, kWhrz, kX, kXrz, kXg, kRz, kDh, kDhPrev, kDr, kDz,
+           kDrh, kDg, kDx, kTemps };
+    const TensorShape shapes[kTemps] = {
+        TensorShape({cell_size_ + input_size, cell_size_ * 2}),
+        TensorShape({input_size, cell_size_ * 2}),
+        TensorShape({cell_size_, cell_size_ * 2}),
+        TensorShape({segment_len * batch_size, input_size}),
+        TensorShape({segment_len * batch_size, cell_size_ * 2}),
+        TensorShape({segment_len * batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_ * 2}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, cell_size_}),
+        TensorShape({batch_size, input_size})};
+    // The per step inputs, states and recomputed gates of one segment, hs[0]
+    // is the state before the segment.
+    enum { kXs, kHs, kRs, kZs, kRhs, kGs, kSegmentTemps };
+    std::vector<std::vector<std::vector<Tensor>>> segment(2);
+    for (int64 dir = 0; dir < 2; ++dir) {
+      temps[dir].resize(kTemps);
+      for (int i = 0; i < kTemps; ++i) {
+        OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+            DT_FLOAT, shapes[i], &temps[dir][i]));
+        GruSetZero<Device>()(ctx->eigen_device<Device>(), &temps[dir][i]);
+      }
+      segment[dir].resize(kSegmentTemps);
+      for (int i = 0; i < kSegmentTemps; ++i) {
+        const int64 steps = i == kHs ? segment_len + 1 : segment_len;
+        segment[dir][i].resize(steps);
+        for (int64 j = 0; j < steps; ++j) {
+          OP_REQUIRES_OK(ctx, ctx->allocate_temp(DT_FLOAT, TensorShape(
+              {batch_size, i == kXs ? input_size : cell_size_}),
+              &segment[dir][i][j]));
+        }
+      }
+    }
+
+    auto run_direction = [&](int64 dir) {
+      const Device& d = ctx->eigen_device<Device>();
+      const Tensor* const* w = weights[dir];
+      std::vector<Tensor>& temp = temps[dir];
+      std::vector<std::vector<Tensor>>& seg = segment[dir];
+      const bool reverse = dir == 1;
+      const int64 h_col = dir * cell_size_;
+
+      Tensor* const* dw = dweights[dir];
+
+      GruWxhrz<Device>()(
+          d, *w[kGruWxr], *w[kGruWhr], *w[kGruWxz], *w[kGruWhz],
+          &temp[kWxhrz]);
+      GruCopyRows<Device>(d, temp[kWxhrz], 0, &temp[kWxrz], 0, input_size);
+      GruCopyRows<Device>(
+          d, temp[kWxhrz], input_size, &temp[kWhrz], 0, cell_size_);
+
+      Tensor& dh = temp[kDh];
+      Tensor& dh_prev = temp[kDhPrev];
+      Tensor& dr = temp[kDr];
+      Tensor& dz = temp[kDz];
+      Tensor& drh = temp[kDrh];
+      Tensor& dg = temp[kDg];
+      Tensor& dx = temp[kDx];
+
+      for (int64 tau_end = sequence_len_max; tau_end > 0;
+           tau_end -= segment_len) {
+        const int64 tau_begin = std::max<int64>(tau_end - segment_len, 0);
+        const int64 steps = tau_end - tau_begin;
+
+        // Gather the segment's inputs and states in the direction's order
+        // and recompute its gates.
+        for (int64 tau = tau_begin; tau < tau_end; ++tau) {
+          const int64 i = tau - tau_begin;
+          GruGatherStep<Device>(
+              d, xs, 0, input_size, seq_lens_vector, reverse, tau,
+              &seg[kXs][i], 0);
+          GruCopyRows<Device>(
+              d, seg[kXs][i], 0, &temp[kX], i * batch_size, batch_size);
+        }
+        for (int64 tau = std::max<int64>(tau_begin - 1, 0); tau < tau_end;
+             ++tau) {
+          GruGatherStep<Device>(
+              d, hs, h_col, cell_size_, seq_lens_vector, reverse, tau,
+              &seg[kHs][tau - tau_begin + 1], 0);
+        }
+        Tensor xrz = temp[kXrz].Slice(0, steps * batch_size);
+        Tensor xg = temp[kXg].Slice(0, steps * batch_size);
+        Tensor x = temp[kX].Slice(0, steps * batch_size);
+        GruMatMul<Device>(ctx, false, x, false, temp[kWxrz], 0.0f, &xrz);
+        GruMatMul<Device>(ctx, false, x, false, *w[kGruWxh], 0.0f, &xg);
+        for (int64 tau = tau_begin; tau < tau_end; ++tau) {
+          const int64 i = tau - tau_begin;
+          const Tensor* h_prev = tau <= 0 ? nullptr : &seg[kHs][i];
+          GruStep<Device>(
+              ctx, xrz, xg, i * batch_size, h_prev, temp[kWhrz], *w[kGruWhh],
+              *w[kGruBr], *w[kGruBz], *w[kGruBh], &temp[kRz], &seg[kRs][i],
+              &seg[kZs][i], &seg[kRhs][i], &seg[kGs][i], nullptr);
+        }
+
+        for (int64 tau = tau_end - 1; tau >= tau_begin; --tau) {
+          const int64 i = tau - tau_begin;
+          const Tensor& x = seg[kXs][i];
+          const Tensor& r = seg[kRs][i];
+          const Tensor& z = seg[kZs][i];
+          const Tensor& rh = seg[kRhs][i];
+          const Tensor& g = seg[kGs][i];
+          const Tensor* h_prev = tau <= 0 ? nullptr : &seg[kHs][i];
+
+          // dh = dhs[t] + dh_prev, the rows of dhs without a timestep are zero.
+          GruGatherStep<Device>(
+              d, dhs, h_col, cell_size_, seq_lens_vector, reverse, tau,
+              &dh, 0);
+          GruAdd<Device>()(d, dh, dh_prev, &dh);
+
+          GruSetZero<Device>()(d, &dh_prev);
+          GruSetZero<Device>()(d, &dr);
+          GruSetZero<Device>()(d, &dz);
+          GruSetZero<Device>()(d, &drh);
+          GruSetZero<Device>()(d, &dg);
+
+          // h[t] = z[t] .* h[t - 1] + (1 - z[t]) .* g[t]
+          GruDz<Device>()(d, dh, h_prev, g, &dz);
+          if (tau > 0) {
+            GruCWiseMult<Device>()(d, dh, z, 1.0f, &dh_prev);
+          }
+          GruDg<Device>()(d, dh, z, &dg);
+
+          // g[t] = tanh(x[t] Wxh + rh[t] Whh)
+          GruActivationTanhGradient<Device>()(d, g, &dg);
+          GruMatMul<Device>(ctx, false, dg, true, *w[kGruWxh], 0.0f, &dx);
+          GruMatMul<Device>(ctx, false, dg, true, *w[kGruWhh], 0.0f, &drh);
+
+          if (tau > 0) {
+            GruCWiseMult<Device>()(d, drh, *h_prev, 0.0f, &dr);
+            GruCWiseMult<Device>()(d, drh, r, 1.0f, &dh_prev);
+          } else {
+            GruSetZero<Device>()(d, &dr);
+          }
+
+          // z[t] = sigm(x[t] Wxz + h[t - 1] Whz)
+          GruActivationSigmoidGradient<Device>()(d, z, &dz);
+          GruMatMul<Device>(ctx, false, dz, true, *w[kGruWxz], 1.0f, &dx);
+          if (tau > 0) {
+            GruMatMul<Device>(
+                ctx, false, dz, true, *w[kGruWhz], 1.0f, &dh_prev);
+          }
+
+          // r[t] = sigm(x[t] Wxr + h[t - 1] Whr)
+          if (tau > 0) {
+            GruActivationSigmoidGradient<Device>()(d, r, &dr);
+            GruMatMul<Device>(ctx, false, dr, true, *w[kGruWxr], 1.0f, &dx);
+            GruMatMul<Device>(
+                ctx, false, dr, true, *w[kGruWhr], 1.0f, &dh_prev);
+          }
+          GruScatterStep<Device>(
+              d, dx, dxs_vector[dir], 0, seq_lens_vector, reverse, tau);
+
+          // Gradient wrt to the weights.
+          GruMatMul<Device>(ctx, true, x, false, dr, 1.0f, dw[kGruWxr]);
+          GruMatMul<Device>(ctx, true, x, false, dz, 1.0f, dw[kGruWxz]);
+          GruMatMul<Device>(ctx, true, x, false, dg, 1.0f, dw[kGruWxh]);
+
+          if (tau > 0) {
+            GruMatMul<Device>(ctx, true, *h_prev, false, dr, 1.0f, dw[kGruWhr]);
+            GruMatMul<Device>(ctx, true, *h_prev, false, dz, 1.0f, dw[kGruWhz]);
+            GruMatMul<Device>(ctx, true, rh, false, dg, 1.0f, dw[kGruWhh]);
+          }
+
+          GruBiasGrad<Device>()(d, dr, dw[kGruBr]);
+          GruBiasGrad<Device>()(d, dz, dw[kGruBz]);
+          GruBiasGrad<Device>()(d, dg, dw[kGruBh]);
+        }
+      }
+    };
+    GruRunDirections<Device>()(ctx, run_direction);
+
+    for (int64 t = 0; t < sequence_len_max; ++t) {
+      GruAdd<Device>()(
+          ctx->eigen_device<Device>(), *dxs_vector[0][t], dxs_bwd[t],
+          dxs_vector[0][t]);
+    }
+  }
+
+ protected:
+  int64 cell_size_;
+  int64 sequence_len_max_;
+  int64 segment_len_;
+};
+
+REGISTER_KERNEL_BUILDER(Name("GruBidirectional")
+                             .Device(DEVICE_CPU),
+                        GruBidirectionalOp<CPUDevice>);
+
+#if GOOGLE_CUDA
+REGISTER_KERNEL_BUILDER(Name("GruBidirectional")
+                             .Device(DEVICE_GPU),
+                        GruBidirectionalOp<GPUDevice>);
+#endif  // GOOGLE_CUDA
+
+REGISTER_KERNEL_BUILDER(Name("GruBidirectionalGrad")
+                             .Device(DEVICE_CPU),
+                        GruBidirectionalGradOp<CPUDevice>);
+
+#if GOOGLE_CUDA
+REGISTER_KERNEL_BUILDER(Name("GruBidirectionalGrad")
+                             .Device(DEVICE_GPU),
+                        GruBidirectionalGradOp<GPUDevice>);
+#endif  // GOOGLE_CUDA
+
 REGISTER_KERNEL_BUILDER(Name("TokenSample")
                              .Device(DEVICE_CPU),
                         TokenSampleOp<CPUDevice>);
 
+REGISTER_KERNEL_BUILDER(Name("TokenSampleStep")
+                             .Device(DEVICE_CPU),
+                        TokenSampleStepOp<CPUDevice>);
+
 }  // namespace tensorflow
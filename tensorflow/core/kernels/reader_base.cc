@@ -84,34 +84,71 @@ void ReaderBase::Read(QueueInterface* queue, string* key, string* value,
     }
 
     bool produced = false;
-    bool at_end = false;
-    Status status = ReadLocked(key, value, &produced, &at_end);
-
-    if (!at_end && status.ok() && !produced) {
-      status = errors::Internal(
-          "ReadLocked() for ", name(),
-          " must set *at_end=true, *produced=true, or return an error.");
-    }
-    if (!status.ok() && produced) {
-      status = errors::Internal("ReadLocked() for ", name(),
-                                " set *produced=true *and* returned an error: ",
-                                status.ToString());
+    Status status = ReadOnceLocked(key, value, &produced);
+    if (!status.ok()) {
+      context->SetStatus(status);
+      return;
     }
-    if (status.ok() && at_end) {
-      status = OnWorkFinishedLocked();
-      work_finished_ = work_started_;
+    if (produced) return;
+  }
+}
+
+void ReaderBase::ReadUpTo(int64 num_records, QueueInterface* queue,
+                          std::vector<string>* keys,
+                          std::vector<string>* values,
+                          OpKernelContext* context) {
+  mutex_lock lock(mu_);
+  string key;
+  string value;
+  while (static_cast<int64>(keys->size()) < num_records) {
+    if (!work_in_progress()) {
+      // The queue may be closed, hand out what was read so far.
+      if (!keys->empty()) return;
+      GetNextWorkLocked(queue, context);
+      if (!context->status().ok()) return;
     }
+
+    bool produced = false;
+    Status status = ReadOnceLocked(&key, &value, &produced);
     if (!status.ok()) {
       context->SetStatus(status);
       return;
     }
     if (produced) {
-      ++num_records_produced_;
-      return;
+      keys->push_back(std::move(key));
+      values->push_back(std::move(value));
     }
   }
 }
 
+Status ReaderBase::ReadOnceLocked(string* key, string* value, bool* produced) {
+  bool at_end = false;
+  Status status = ReadLocked(key, value, produced, &at_end);
+
+  if (!at_end && status.ok() && !*produced) {
+    status = errors::Internal(
+        "ReadLocked() for ", name(),
+        " must set *at_end=true, *produced=true, or return an error.");
+  }
+  if (!status.ok() && *produced) {
+    status = errors::Internal("ReadLocked() for ", name(),
+                              " set *produced=true *and* returned an error: ",
+                              status.ToString());
+  }
+  if (status.ok() && at_end) {
+    status = OnWorkFinishedLocked();
+    work_finished_ = work_started_;
+  }
+  if (!status.ok()) {
+    *produced = false;
+    return status;
+  }
+  if (*produced) {
+    ++num_records_produced_;
+  }
+  return Status::OK();
+}
+
 void ReaderBase::GetNextWorkLocked(QueueInterface* queue,
                                    OpKernelContext* context) {
   Notification n;
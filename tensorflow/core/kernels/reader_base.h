@@ -18,6 +18,7 @@ limitations under the License.
 
 #include <memory>
 #include <string>
+#include <vector>
 #include "tensorflow/core/framework/queue_interface.h"
 #include "tensorflow/core/framework/reader_interface.h"
 #include "tensorflow/core/kernels/reader_base.pb.h"
@@ -96,6 +97,9 @@ class ReaderBase : public ReaderInterface {
   // and call the methods above to do the work.
   void Read(QueueInterface* queue, string* key, string* value,
             OpKernelContext* context) override;
+  void ReadUpTo(int64 num_records, QueueInterface* queue,
+                std::vector<string>* keys, std::vector<string>* values,
+                OpKernelContext* context) override;
   Status Reset() override;
   int64 NumRecordsProduced() override;
   int64 NumWorkUnitsCompleted() override;
@@ -108,6 +112,11 @@ class ReaderBase : public ReaderInterface {
   // OnWorkStartedLocked().  May block.
   void GetNextWorkLocked(QueueInterface* queue, OpKernelContext* context);
 
+  // For implementing Read() and ReadUpTo().  Calls ReadLocked() once
+  // on the current work item, checks what it returned and finishes
+  // the work item if it is at its end.
+  Status ReadOnceLocked(string* key, string* value, bool* produced);
+
   mutable mutex mu_;
   const string name_;
   int64 work_started_ = 0;
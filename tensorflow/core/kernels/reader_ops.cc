@@ -97,6 +97,54 @@ class ReaderReadOp : public ReaderVerbAsyncOpKernel {
 
 REGISTER_KERNEL_BUILDER(Name("ReaderRead").Device(DEVICE_CPU), ReaderReadOp);
 
+class ReaderReadUpToOp : public ReaderVerbAsyncOpKernel {
+ public:
+  using ReaderVerbAsyncOpKernel::ReaderVerbAsyncOpKernel;
+
+  void ComputeWithReader(OpKernelContext* context,
+                         ReaderInterface* reader) override {
+    QueueInterface* queue;
+    OP_REQUIRES_OK(context,
+                   GetResourceFromContext(context, "queue_handle", &queue));
+    core::ScopedUnref unref_me(queue);
+
+    const Tensor* num_records_tensor;
+    OP_REQUIRES_OK(context, context->input("num_records", &num_records_tensor));
+    OP_REQUIRES(context, TensorShapeUtils::IsScalar(num_records_tensor->shape()),
+                errors::InvalidArgument(
+                    "num_records must be a scalar, got shape ",
+                    num_records_tensor->shape().DebugString()));
+    const int64 num_records = num_records_tensor->scalar<int64>()();
+    OP_REQUIRES(context, num_records > 0,
+                errors::InvalidArgument("num_records must be positive, got ",
+                                        num_records));
+
+    std::vector<string> keys;
+    std::vector<string> values;
+    reader->ReadUpTo(num_records, queue, &keys, &values, context);
+    if (!context->status().ok()) return;
+
+    const int64 num_produced = keys.size();
+    Tensor* keys_tensor = nullptr;
+    OP_REQUIRES_OK(context, context->allocate_output(
+                                "keys", TensorShape({num_produced}),
+                                &keys_tensor));
+    Tensor* values_tensor = nullptr;
+    OP_REQUIRES_OK(context, context->allocate_output(
+                                "values", TensorShape({num_produced}),
+                                &values_tensor));
+    auto keys_flat = keys_tensor->flat<string>();
+    auto values_flat = values_tensor->flat<string>();
+    for (int64 i = 0; i < num_produced; ++i) {
+      keys_flat(i).swap(keys[i]);
+      values_flat(i).swap(values[i]);
+    }
+  }
+};
+
+REGISTER_KERNEL_BUILDER(Name("ReaderReadUpTo").Device(DEVICE_CPU),
+                        ReaderReadUpToOp);
+
 class ReaderNumRecordsProducedOp : public ReaderVerbSyncOpKernel {
  public:
   using ReaderVerbSyncOpKernel::ReaderVerbSyncOpKernel;
@@ -27,9 +27,11 @@ namespace tensorflow {
 
 class TFRecordReader : public ReaderBase {
  public:
-  TFRecordReader(const string& node_name, Env* env)
+  TFRecordReader(const string& node_name,
+                 const io::RecordReaderOptions& options, Env* env)
       : ReaderBase(strings::StrCat("TFRecordReader '", node_name, "'")),
         env_(env),
+        options_(options),
         offset_(0) {}
 
   Status OnWorkStartedLocked() override {
@@ -37,7 +39,7 @@ class TFRecordReader : public ReaderBase {
     RandomAccessFile* file = nullptr;
     TF_RETURN_IF_ERROR(env_->NewRandomAccessFile(current_work(), &file));
     file_.reset(file);
-    reader_.reset(new io::RecordReader(file));
+    reader_.reset(new io::RecordReader(file, options_));
     return Status::OK();
   }
 
@@ -71,6 +73,7 @@ class TFRecordReader : public ReaderBase {
 
  private:
   Env* const env_;
+  const io::RecordReaderOptions options_;
   uint64 offset_;
   std::unique_ptr<RandomAccessFile> file_;
   std::unique_ptr<io::RecordReader> reader_;
@@ -81,7 +84,17 @@ class TFRecordReaderOp : public ReaderOpKernel {
   explicit TFRecordReaderOp(OpKernelConstruction* context)
       : ReaderOpKernel(context) {
     Env* env = context->env();
-    SetReaderFactory([this, env]() { return new TFRecordReader(name(), env); });
+
+    string compression_type;
+    OP_REQUIRES_OK(context,
+                   context->GetAttr("compression_type", &compression_type));
+    io::RecordReaderOptions options;
+    OP_REQUIRES_OK(context, io::RecordReaderOptions::CreateRecordReaderOptions(
+                                compression_type, &options));
+
+    SetReaderFactory([this, options, env]() {
+      return new TFRecordReader(name(), options, env);
+    });
   }
 };
 
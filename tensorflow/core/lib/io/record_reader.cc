@@ -19,13 +19,39 @@ limitations under the License.
 #include "tensorflow/core/lib/core/coding.h"
 #include "tensorflow/core/lib/core/errors.h"
 #include "tensorflow/core/lib/hash/crc32c.h"
+#include "tensorflow/core/lib/io/zlib_inputbuffer.h"
 #include "tensorflow/core/platform/env.h"
 
 namespace tensorflow {
 namespace io {
 
+Status RecordReaderOptions::CreateRecordReaderOptions(
+    const string& compression_type, RecordReaderOptions* options) {
+  *options = RecordReaderOptions();
+  if (compression_type == "ZLIB") {
+    options->compression_type = ZLIB_COMPRESSION;
+    options->zlib_options = ZlibCompressionOptions::DEFAULT();
+  } else if (compression_type == "GZIP") {
+    options->compression_type = GZIP_COMPRESSION;
+    options->zlib_options = ZlibCompressionOptions::GZIP();
+  } else if (!compression_type.empty()) {
+    return errors::InvalidArgument("Unsupported compression type: ",
+                                   compression_type);
+  }
+  return Status::OK();
+}
+
 RecordReader::RecordReader(RandomAccessFile* file) : src_(file) {}
 
+RecordReader::RecordReader(RandomAccessFile* file,
+                           const RecordReaderOptions& options)
+    : src_(file) {
+  if (options.compression_type != RecordReaderOptions::NONE) {
+    zlib_src_.reset(new ZlibInputBuffer(file, options.zlib_options));
+    src_ = zlib_src_.get();
+  }
+}
+
 RecordReader::~RecordReader() {}
 
 // Read n+4 bytes from file, verify that checksum of first n bytes is
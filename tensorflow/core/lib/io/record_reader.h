@@ -16,8 +16,11 @@ limitations under the License.
 #ifndef TENSORFLOW_LIB_IO_RECORD_READER_H_
 #define TENSORFLOW_LIB_IO_RECORD_READER_H_
 
+#include <memory>
+
 #include "tensorflow/core/lib/core/status.h"
 #include "tensorflow/core/lib/core/stringpiece.h"
+#include "tensorflow/core/lib/io/zlib_compression_options.h"
 #include "tensorflow/core/platform/macros.h"
 #include "tensorflow/core/platform/types.h"
 
@@ -27,12 +30,35 @@ class RandomAccessFile;
 
 namespace io {
 
+class RecordReaderOptions {
+ public:
+  enum CompressionType {
+    NONE = 0,
+    ZLIB_COMPRESSION = 1,
+    GZIP_COMPRESSION = 2,
+  };
+  CompressionType compression_type = NONE;
+
+  // Options of the zlib stream if compression_type is not NONE.
+  ZlibCompressionOptions zlib_options;
+
+  // Sets "*options" for the compression type named "compression_type": ""
+  // (none), "ZLIB" or "GZIP".  Returns INVALID_ARGUMENT for any other name.
+  static Status CreateRecordReaderOptions(const string& compression_type,
+                                          RecordReaderOptions* options);
+};
+
 class RecordReader {
  public:
   // Create a reader that will return log records from "*file".
   // "*file" must remain live while this Reader is in use.
   explicit RecordReader(RandomAccessFile* file);
 
+  // Create a reader for the records of "*file" compressed as set in
+  // "options".  Offsets are offsets in the uncompressed records, reading
+  // them in increasing order (the common case) decompresses "*file" once.
+  RecordReader(RandomAccessFile* file, const RecordReaderOptions& options);
+
   ~RecordReader();
 
   // Read the record at "*offset" into *record and update *offset to
@@ -42,6 +68,9 @@ class RecordReader {
 
  private:
   RandomAccessFile* src_;
+  // Decompresses the file if the records are compressed, "src_" then points
+  // to it.
+  std::unique_ptr<RandomAccessFile> zlib_src_;
 
   TF_DISALLOW_COPY_AND_ASSIGN(RecordReader);
 };
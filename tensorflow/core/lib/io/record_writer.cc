@@ -16,16 +16,50 @@ limitations under the License.
 #include "tensorflow/core/lib/io/record_writer.h"
 
 #include "tensorflow/core/lib/core/coding.h"
+#include "tensorflow/core/lib/core/errors.h"
 #include "tensorflow/core/lib/hash/crc32c.h"
+#include "tensorflow/core/lib/io/zlib_outputbuffer.h"
 #include "tensorflow/core/platform/env.h"
 
 namespace tensorflow {
 namespace io {
 
+Status RecordWriterOptions::CreateRecordWriterOptions(
+    const string& compression_type, RecordWriterOptions* options) {
+  *options = RecordWriterOptions();
+  if (compression_type == "ZLIB") {
+    options->compression_type = ZLIB_COMPRESSION;
+    options->zlib_options = ZlibCompressionOptions::DEFAULT();
+  } else if (compression_type == "GZIP") {
+    options->compression_type = GZIP_COMPRESSION;
+    options->zlib_options = ZlibCompressionOptions::GZIP();
+  } else if (!compression_type.empty()) {
+    return errors::InvalidArgument("Unsupported compression type: ",
+                                   compression_type);
+  }
+  return Status::OK();
+}
+
 RecordWriter::RecordWriter(WritableFile* dest) : dest_(dest) {}
 
+RecordWriter::RecordWriter(WritableFile* dest,
+                           const RecordWriterOptions& options)
+    : dest_(dest) {
+  if (options.compression_type != RecordWriterOptions::NONE) {
+    zlib_dest_.reset(new ZlibOutputBuffer(dest, options.zlib_options));
+    dest_ = zlib_dest_.get();
+  }
+}
+
 RecordWriter::~RecordWriter() {}
 
+Status RecordWriter::Close() {
+  if (zlib_dest_ == nullptr) {
+    return Status::OK();
+  }
+  return zlib_dest_->Close();
+}
+
 static uint32 MaskedCrc(const char* data, size_t n) {
   return crc32c::Mask(crc32c::Value(data, n));
 }
@@ -16,8 +16,11 @@ limitations under the License.
 #ifndef TENSORFLOW_LIB_IO_RECORD_WRITER_H_
 #define TENSORFLOW_LIB_IO_RECORD_WRITER_H_
 
+#include <memory>
+
 #include "tensorflow/core/lib/core/status.h"
 #include "tensorflow/core/lib/core/stringpiece.h"
+#include "tensorflow/core/lib/io/zlib_compression_options.h"
 #include "tensorflow/core/platform/macros.h"
 #include "tensorflow/core/platform/types.h"
 
@@ -27,6 +30,24 @@ class WritableFile;
 
 namespace io {
 
+class RecordWriterOptions {
+ public:
+  enum CompressionType {
+    NONE = 0,
+    ZLIB_COMPRESSION = 1,
+    GZIP_COMPRESSION = 2,
+  };
+  CompressionType compression_type = NONE;
+
+  // Options of the zlib stream if compression_type is not NONE.
+  ZlibCompressionOptions zlib_options;
+
+  // Sets "*options" for the compression type named "compression_type": ""
+  // (none), "ZLIB" or "GZIP".  Returns INVALID_ARGUMENT for any other name.
+  static Status CreateRecordWriterOptions(const string& compression_type,
+                                          RecordWriterOptions* options);
+};
+
 class RecordWriter {
  public:
   // Create a writer that will append data to "*dest".
@@ -34,12 +55,24 @@ class RecordWriter {
   // "*dest" must remain live while this Writer is in use.
   explicit RecordWriter(WritableFile* dest);
 
+  // Create a writer that will compress the records appended to "*dest" as
+  // set in "options".  The compressed stream is ended by Close() or the
+  // destructor, before "*dest" is closed.
+  RecordWriter(WritableFile* dest, const RecordWriterOptions& options);
+
   ~RecordWriter();
 
   Status WriteRecord(StringPiece slice);
 
+  // Ends the compressed stream, a no-op for uncompressed records.  Does not
+  // close "*dest".
+  Status Close();
+
  private:
-  WritableFile* const dest_;
+  WritableFile* dest_;
+  // Compresses into the file if the records are compressed, "dest_" then
+  // points to it.
+  std::unique_ptr<WritableFile> zlib_dest_;
 
   TF_DISALLOW_COPY_AND_ASSIGN(RecordWriter);
 };
@@ -13,6 +13,8 @@ See the License for the specific language governing permissions and
 limitations under the License.
 ==============================================================================*/
 
+#include <vector>
+
 #include "tensorflow/core/lib/core/coding.h"
 #include "tensorflow/core/lib/core/errors.h"
 #include "tensorflow/core/lib/core/status_test_util.h"
@@ -256,5 +258,132 @@ TEST_F(RecordioTest, ReadEnd) { CheckOffsetPastEndReturnsNoRecords(0); }
 
 TEST_F(RecordioTest, ReadPastEnd) { CheckOffsetPastEndReturnsNoRecords(5); }
 
+// A WritableFile and a RandomAccessFile over the same string.
+class StringFile : public WritableFile, public RandomAccessFile {
+ public:
+  string contents_;
+
+  Status Close() override { return Status::OK(); }
+  Status Flush() override { return Status::OK(); }
+  Status Sync() override { return Status::OK(); }
+  Status Append(const StringPiece& slice) override {
+    contents_.append(slice.data(), slice.size());
+    return Status::OK();
+  }
+
+  Status Read(uint64 offset, size_t n, StringPiece* result,
+              char* scratch) const override {
+    if (offset >= contents_.size()) {
+      *result = StringPiece();
+      return errors::OutOfRange("end of file");
+    }
+    Status s;
+    if (contents_.size() < offset + n) {
+      n = contents_.size() - offset;
+      s = errors::OutOfRange("end of file");
+    }
+    memcpy(scratch, contents_.data() + offset, n);
+    *result = StringPiece(scratch, n);
+    return s;
+  }
+};
+
+static void CheckCompressedRecords(const string& compression_type,
+                                   size_t buffer_size) {
+  RecordWriterOptions writer_options;
+  TF_ASSERT_OK(RecordWriterOptions::CreateRecordWriterOptions(
+      compression_type, &writer_options));
+  writer_options.zlib_options.input_buffer_size = buffer_size;
+  writer_options.zlib_options.output_buffer_size = buffer_size;
+  RecordReaderOptions reader_options;
+  TF_ASSERT_OK(RecordReaderOptions::CreateRecordReaderOptions(
+      compression_type, &reader_options));
+  reader_options.zlib_options.input_buffer_size = buffer_size;
+  reader_options.zlib_options.output_buffer_size = buffer_size;
+
+  random::PhiloxRandom philox(301, 17);
+  random::SimplePhilox rnd(&philox);
+  std::vector<string> records;
+  for (int i = 0; i < 200; i++) {
+    records.push_back(RandomSkewedString(i, &rnd));
+  }
+
+  StringFile file;
+  {
+    RecordWriter writer(&file, writer_options);
+    for (const string& record : records) {
+      TF_ASSERT_OK(writer.WriteRecord(record));
+    }
+    TF_ASSERT_OK(writer.Close());
+  }
+
+  RecordReader reader(&file, reader_options);
+  uint64 offset = 0;
+  std::vector<uint64> offsets;
+  string record;
+  for (const string& expected : records) {
+    offsets.push_back(offset);
+    TF_ASSERT_OK(reader.ReadRecord(&offset, &record));
+    ASSERT_EQ(expected, record);
+  }
+  ASSERT_TRUE(errors::IsOutOfRange(reader.ReadRecord(&offset, &record)));
+
+  // Reading backwards restarts the stream.
+  for (int i = 10; i >= 0; i--) {
+    offset = offsets[i];
+    TF_ASSERT_OK(reader.ReadRecord(&offset, &record));
+    ASSERT_EQ(records[i], record);
+  }
+}
+
+TEST(CompressedRecordioTest, Zlib) { CheckCompressedRecords("ZLIB", 1 << 18); }
+
+TEST(CompressedRecordioTest, Gzip) { CheckCompressedRecords("GZIP", 1 << 18); }
+
+TEST(CompressedRecordioTest, SmallBuffers) {
+  CheckCompressedRecords("ZLIB", 7);
+  CheckCompressedRecords("GZIP", 7);
+}
+
+TEST(CompressedRecordioTest, Empty) {
+  for (const string compression_type : {"ZLIB", "GZIP"}) {
+    StringFile file;
+    RecordReaderOptions options;
+    TF_ASSERT_OK(RecordReaderOptions::CreateRecordReaderOptions(
+        compression_type, &options));
+    RecordReader reader(&file, options);
+    uint64 offset = 0;
+    string record;
+    ASSERT_TRUE(errors::IsOutOfRange(reader.ReadRecord(&offset, &record)));
+  }
+}
+
+TEST(CompressedRecordioTest, Truncated) {
+  StringFile file;
+  RecordWriterOptions writer_options;
+  TF_ASSERT_OK(
+      RecordWriterOptions::CreateRecordWriterOptions("ZLIB", &writer_options));
+  {
+    RecordWriter writer(&file, writer_options);
+    TF_ASSERT_OK(writer.WriteRecord(BigString("foo", 10000)));
+  }
+  file.contents_.resize(file.contents_.size() / 2);
+
+  RecordReaderOptions reader_options;
+  TF_ASSERT_OK(
+      RecordReaderOptions::CreateRecordReaderOptions("ZLIB", &reader_options));
+  RecordReader reader(&file, reader_options);
+  uint64 offset = 0;
+  string record;
+  AssertHasSubstr(reader.ReadRecord(&offset, &record).ToString(),
+                  "Data loss");
+}
+
+TEST(CompressedRecordioTest, UnknownCompressionType) {
+  RecordReaderOptions options;
+  ASSERT_TRUE(errors::IsInvalidArgument(
+      RecordReaderOptions::CreateRecordReaderOptions("LZMA", &options)));
+}
+
 }  // namespace io
 }  // namespace tensorflow
@@ -0,0 +1,62 @@
+/* Copyright 2016 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+#ifndef TENSORFLOW_LIB_IO_ZLIB_COMPRESSION_OPTIONS_H_
+#define TENSORFLOW_LIB_IO_ZLIB_COMPRESSION_OPTIONS_H_
+
+#include "tensorflow/core/platform/types.h"
+
+namespace tensorflow {
+namespace io {
+
+// Options of the zlib streams written by a ZlibOutputBuffer and read by a
+// ZlibInputBuffer.
+struct ZlibCompressionOptions {
+  // A zlib (RFC 1950) stream.
+  static ZlibCompressionOptions DEFAULT();
+
+  // A gzip (RFC 1952) stream.
+  static ZlibCompressionOptions GZIP();
+
+  // Size of the buffer of compressed bytes read from or written to the
+  // underlying file at a time.
+  size_t input_buffer_size = 256 << 10;
+
+  // Size of the buffer of uncompressed bytes produced or consumed by one call
+  // into zlib.
+  size_t output_buffer_size = 256 << 10;
+
+  // Base two logarithm of the window size, plus 16 for a gzip header and
+  // trailer instead of the zlib ones (see deflateInit2 in zlib.h).
+  int8 window_bits = 15;
+
+  // 0 (no compression) to 9 (best compression), -1 for the zlib default.
+  int8 compression_level = -1;
+};
+
+inline ZlibCompressionOptions ZlibCompressionOptions::DEFAULT() {
+  return ZlibCompressionOptions();
+}
+
+inline ZlibCompressionOptions ZlibCompressionOptions::GZIP() {
+  ZlibCompressionOptions options;
+  options.window_bits = options.window_bits + 16;
+  return options;
+}
+
+}  // namespace io
+}  // namespace tensorflow
+
+#endif  // TENSORFLOW_LIB_IO_ZLIB_COMPRESSION_OPTIONS_H_
@@ -0,0 +1,136 @@
+/* Copyright 2016 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+#include "tensorflow/core/lib/io/zlib_inputbuffer.h"
+
+#include <zlib.h>
+#include <string.h>
+#include <algorithm>
+#include "tensorflow/core/lib/core/errors.h"
+
+namespace tensorflow {
+namespace io {
+
+ZlibInputBuffer::ZlibInputBuffer(RandomAccessFile* file,
+                                 const ZlibCompressionOptions& options)
+    : file_(file),
+      options_(options),
+      z_stream_(new z_stream),
+      z_stream_initialized_(false),
+      input_(new char[options.input_buffer_size]),
+      file_offset_(0),
+      output_offset_(0),
+      eof_(false) {}
+
+ZlibInputBuffer::~ZlibInputBuffer() {
+  if (z_stream_initialized_) {
+    inflateEnd(z_stream_.get());
+  }
+}
+
+Status ZlibInputBuffer::Reset() const {
+  if (z_stream_initialized_) {
+    inflateEnd(z_stream_.get());
+    z_stream_initialized_ = false;
+  }
+  z_stream_->zalloc = Z_NULL;
+  z_stream_->zfree = Z_NULL;
+  z_stream_->opaque = Z_NULL;
+  z_stream_->next_in = Z_NULL;
+  z_stream_->avail_in = 0;
+  if (inflateInit2(z_stream_.get(), options_.window_bits) != Z_OK) {
+    return errors::Internal("inflateInit2 failed");
+  }
+  z_stream_initialized_ = true;
+  file_offset_ = 0;
+  output_.clear();
+  output_offset_ = 0;
+  eof_ = false;
+  return Status::OK();
+}
+
+Status ZlibInputBuffer::Inflate() const {
+  if (z_stream_->avail_in == 0) {
+    StringPiece data;
+    Status s = file_->Read(file_offset_, options_.input_buffer_size, &data,
+                           input_.get());
+    if (!s.ok() && !errors::IsOutOfRange(s)) {
+      return s;
+    }
+    if (data.empty()) {
+      if (file_offset_ == 0) {
+        // An empty file holds an empty stream.
+        eof_ = true;
+        return Status::OK();
+      }
+      return errors::DataLoss("truncated compressed stream at ",
+                              file_offset_);
+    }
+    if (data.data() != input_.get()) {
+      memmove(input_.get(), data.data(), data.size());
+    }
+    file_offset_ += data.size();
+    z_stream_->next_in = reinterpret_cast<Bytef*>(input_.get());
+    z_stream_->avail_in = data.size();
+  }
+
+  const size_t size = output_.size();
+  output_.resize(size + options_.output_buffer_size);
+  z_stream_->next_out = reinterpret_cast<Bytef*>(&output_[size]);
+  z_stream_->avail_out = options_.output_buffer_size;
+  const int error = inflate(z_stream_.get(), Z_NO_FLUSH);
+  output_.resize(size + options_.output_buffer_size - z_stream_->avail_out);
+  if (error == Z_STREAM_END) {
+    eof_ = true;
+  } else if (error != Z_OK && error != Z_BUF_ERROR) {
+    return errors::DataLoss("corrupted compressed stream: ",
+                            z_stream_->msg ? z_stream_->msg : "inflate failed");
+  }
+  return Status::OK();
+}
+
+Status ZlibInputBuffer::Read(uint64 offset, size_t n, StringPiece* result,
+                             char* scratch) const {
+  mutex_lock l(mu_);
+  *result = StringPiece();
+  if (!z_stream_initialized_ || offset < output_offset_) {
+    TF_RETURN_IF_ERROR(Reset());
+  }
+
+  // Inflate up to offset + n, dropping the bytes before offset first so that
+  // the buffer holds at most n bytes plus one inflated block.
+  while (!eof_ && output_offset_ + output_.size() < offset + n) {
+    const size_t skip =
+        std::min<uint64>(offset - output_offset_, output_.size());
+    output_.erase(0, skip);
+    output_offset_ += skip;
+    TF_RETURN_IF_ERROR(Inflate());
+  }
+
+  if (offset > output_offset_ + output_.size()) {
+    return errors::OutOfRange("read past the end of the compressed stream");
+  }
+  const size_t start = offset - output_offset_;
+  const size_t size = std::min(n, output_.size() - start);
+  memcpy(scratch, output_.data() + start, size);
+  *result = StringPiece(scratch, size);
+  if (size < n) {
+    return errors::OutOfRange("Read less bytes than requested");
+  }
+  return Status::OK();
+}
+
+}  // namespace io
+}  // namespace tensorflow
@@ -0,0 +1,87 @@
+/* Copyright 2016 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+#ifndef TENSORFLOW_LIB_IO_ZLIB_INPUTBUFFER_H_
+#define TENSORFLOW_LIB_IO_ZLIB_INPUTBUFFER_H_
+
+#include <memory>
+#include <string>
+#include "tensorflow/core/lib/core/status.h"
+#include "tensorflow/core/lib/io/zlib_compression_options.h"
+#include "tensorflow/core/platform/file_system.h"
+#include "tensorflow/core/platform/macros.h"
+#include "tensorflow/core/platform/mutex.h"
+#include "tensorflow/core/platform/thread_annotations.h"
+#include "tensorflow/core/platform/types.h"
+
+struct z_stream_s;
+
+namespace tensorflow {
+namespace io {
+
+// A ZlibInputBuffer is a RandomAccessFile over the uncompressed contents of
+// the zlib or gzip stream stored in "file": Read(offset, ...) takes offsets
+// in the uncompressed stream.
+//
+// The stream is inflated sequentially, "input_buffer_size" compressed bytes
+// at a time, and only the uncompressed bytes from the last read offset on are
+// kept, so forward reads (as done by a RecordReader) cost one pass over the
+// file. A read before the last read offset inflates the stream again from
+// its beginning.
+//
+// Reads are serialized by a mutex, which makes the buffer safe for
+// concurrent use but not for concurrent speedup.
+class ZlibInputBuffer : public RandomAccessFile {
+ public:
+  // Create a ZlibInputBuffer for "file", which must remain live while the
+  // buffer is in use.  Does not take ownership of "file".
+  ZlibInputBuffer(RandomAccessFile* file,
+                  const ZlibCompressionOptions& options);
+  ~ZlibInputBuffer() override;
+
+  // Returns OUT_OF_RANGE past the end of the uncompressed stream and
+  // DATA_LOSS if the compressed stream is corrupted or truncated.
+  Status Read(uint64 offset, size_t n, StringPiece* result,
+              char* scratch) const override;
+
+ private:
+  // Restart inflating at the beginning of the file.
+  Status Reset() const EXCLUSIVE_LOCKS_REQUIRED(mu_);
+
+  // Inflate the next block of the stream onto the end of "output_".
+  Status Inflate() const EXCLUSIVE_LOCKS_REQUIRED(mu_);
+
+  RandomAccessFile* const file_;  // Not owned
+  const ZlibCompressionOptions options_;
+
+  mutable mutex mu_;
+  mutable std::unique_ptr<z_stream_s> z_stream_ GUARDED_BY(mu_);
+  mutable bool z_stream_initialized_ GUARDED_BY(mu_);
+  mutable std::unique_ptr<char[]> input_ GUARDED_BY(mu_);
+  // Offset in "file_" of the next compressed bytes to read.
+  mutable uint64 file_offset_ GUARDED_BY(mu_);
+  // The uncompressed bytes [output_offset_, output_offset_ + output_.size()).
+  mutable string output_ GUARDED_BY(mu_);
+  mutable uint64 output_offset_ GUARDED_BY(mu_);
+  // Whether the end of the stream was inflated.
+  mutable bool eof_ GUARDED_BY(mu_);
+
+  TF_DISALLOW_COPY_AND_ASSIGN(ZlibInputBuffer);
+};
+
+}  // namespace io
+}  // namespace tensorflow
+
+#endif  // TENSORFLOW_LIB_IO_ZLIB_INPUTBUFFER_H_
@@ -0,0 +1,135 @@
+/* Copyright 2016 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+#include "tensorflow/core/lib/io/zlib_outputbuffer.h"
+
+#include <zlib.h>
+#include <algorithm>
+#include "tensorflow/core/lib/core/errors.h"
+#include "tensorflow/core/platform/logging.h"
+
+namespace tensorflow {
+namespace io {
+
+ZlibOutputBuffer::ZlibOutputBuffer(WritableFile* file,
+                                   const ZlibCompressionOptions& options)
+    : file_(file),
+      options_(options),
+      z_stream_(new z_stream),
+      output_(new char[options.input_buffer_size]),
+      closed_(false) {
+  z_stream_->zalloc = Z_NULL;
+  z_stream_->zfree = Z_NULL;
+  z_stream_->opaque = Z_NULL;
+  z_stream_->next_in = Z_NULL;
+  z_stream_->avail_in = 0;
+  z_stream_->next_out = reinterpret_cast<Bytef*>(output_.get());
+  z_stream_->avail_out = options_.input_buffer_size;
+  if (deflateInit2(z_stream_.get(), options_.compression_level, Z_DEFLATED,
+                   options_.window_bits, 8, Z_DEFAULT_STRATEGY) != Z_OK) {
+    status_ = errors::Internal("deflateInit2 failed");
+    closed_ = true;
+  }
+}
+
+ZlibOutputBuffer::~ZlibOutputBuffer() {
+  if (!closed_) {
+    Status s = Close();
+    if (!s.ok()) {
+      LOG(ERROR) << "Failed to end the compressed stream: " << s;
+    }
+  }
+}
+
+Status ZlibOutputBuffer::WriteOutput() {
+  const size_t size = options_.input_buffer_size - z_stream_->avail_out;
+  if (size > 0) {
+    TF_RETURN_IF_ERROR(file_->Append(StringPiece(output_.get(), size)));
+  }
+  z_stream_->next_out = reinterpret_cast<Bytef*>(output_.get());
+  z_stream_->avail_out = options_.input_buffer_size;
+  return Status::OK();
+}
+
+Status ZlibOutputBuffer::Deflate(int flush) {
+  while (true) {
+    const int error = deflate(z_stream_.get(), flush);
+    if (error == Z_STREAM_ERROR) {
+      return errors::Internal("deflate failed");
+    }
+    if (z_stream_->avail_out == 0) {
+      // The output buffer is full, there may be more to come.
+      TF_RETURN_IF_ERROR(WriteOutput());
+      continue;
+    }
+    // With room left in the output buffer deflate consumed all the input and
+    // did the flush.
+    return Status::OK();
+  }
+}
+
+Status ZlibOutputBuffer::Append(const StringPiece& data) {
+  if (closed_) {
+    return status_.ok() ? errors::FailedPrecondition("buffer is closed")
+                        : status_;
+  }
+  // Deflate keeps the bytes it cannot compress yet, so large appends are fed
+  // to it at most "output_buffer_size" bytes at a time.
+  StringPiece input = data;
+  while (!input.empty()) {
+    const size_t size = std::min(input.size(), options_.output_buffer_size);
+    z_stream_->next_in =
+        reinterpret_cast<Bytef*>(const_cast<char*>(input.data()));
+    z_stream_->avail_in = size;
+    status_ = Deflate(Z_NO_FLUSH);
+    if (!status_.ok()) {
+      return status_;
+    }
+    input.remove_prefix(size);
+  }
+  return Status::OK();
+}
+
+Status ZlibOutputBuffer::Close() {
+  if (closed_) {
+    return status_;
+  }
+  closed_ = true;
+  if (status_.ok()) {
+    status_ = Deflate(Z_FINISH);
+  }
+  if (status_.ok()) {
+    status_ = WriteOutput();
+  }
+  deflateEnd(z_stream_.get());
+  return status_;
+}
+
+Status ZlibOutputBuffer::Flush() {
+  if (closed_) {
+    return status_;
+  }
+  TF_RETURN_IF_ERROR(Deflate(Z_SYNC_FLUSH));
+  TF_RETURN_IF_ERROR(WriteOutput());
+  return file_->Flush();
+}
+
+Status ZlibOutputBuffer::Sync() {
+  TF_RETURN_IF_ERROR(Flush());
+  return file_->Sync();
+}
+
+}  // namespace io
+}  // namespace tensorflow
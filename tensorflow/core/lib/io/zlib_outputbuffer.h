@@ -0,0 +1,80 @@
+/* Copyright 2016 Google Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================*/
+
+#ifndef TENSORFLOW_LIB_IO_ZLIB_OUTPUTBUFFER_H_
+#define TENSORFLOW_LIB_IO_ZLIB_OUTPUTBUFFER_H_
+
+#include <memory>
+#include "tensorflow/core/lib/core/status.h"
+#include "tensorflow/core/lib/core/stringpiece.h"
+#include "tensorflow/core/lib/io/zlib_compression_options.h"
+#include "tensorflow/core/platform/file_system.h"
+#include "tensorflow/core/platform/macros.h"
+#include "tensorflow/core/platform/types.h"
+
+struct z_stream_s;
+
+namespace tensorflow {
+namespace io {
+
+// A ZlibOutputBuffer is a WritableFile that deflates the data appended to it
+// into a zlib or gzip stream written to "file".  Compressed bytes are
+// appended to "file" "input_buffer_size" bytes at a time.
+//
+// Close() ends the stream but does not close "file": the caller closes it
+// after closing the buffer.  Flush() and Sync() end a deflate block, which
+// costs some compression, so they should not be called per record.
+//
+// An instance of this class is not safe for concurrent access by multiple
+// threads.
+class ZlibOutputBuffer : public WritableFile {
+ public:
+  // Create a ZlibOutputBuffer for "file", which must be initially empty and
+  // remain live while the buffer is in use.  Does not take ownership of
+  // "file".
+  ZlibOutputBuffer(WritableFile* file, const ZlibCompressionOptions& options);
+
+  // Ends the stream if it was not closed.
+  ~ZlibOutputBuffer() override;
+
+  Status Append(const StringPiece& data) override;
+  Status Close() override;
+  Status Flush() override;
+  Status Sync() override;
+
+ private:
+  // Run deflate until it consumed its input and, for "flush", produced all
+  // its output.
+  Status Deflate(int flush);
+
+  // Append the compressed bytes of "output_" to "file_".
+  Status WriteOutput();
+
+  WritableFile* const file_;  // Not owned
+  const ZlibCompressionOptions options_;
+
+  std::unique_ptr<z_stream_s> z_stream_;
+  std::unique_ptr<char[]> output_;
+  // Status of the deflateInit2, or the first failure of the stream.
+  Status status_;
+  bool closed_;
+
+  TF_DISALLOW_COPY_AND_ASSIGN(ZlibOutputBuffer);
+};
+
+}  // namespace io
+}  // namespace tensorflow
+
+#endif  // TENSORFLOW_LIB_IO_ZLIB_OUTPUTBUFFER_H_
@@ -39,4 +39,51 @@ REGISTER_OP("AttentionMaskWindow")
 AttentionMaskMedian
 )doc");
 
+REGISTER_OP("AttentionStep")
+    .Attr("mask: {'none', 'window', 'median'} = 'none'")
+    .Attr("window_l: int = 10")
+    .Attr("window_r: int = 200")
+    .Attr("s_min: int = 0")
+    .Attr("s_max: int = 40")
+    .Attr("v_min: float = 1.2")
+    .Attr("v_max: float = 2.2")
+    .Attr("index: int = 0")
+    .Input("attention_states_sequence_len: int64")
+    .Input("encoder_embedding: float")
+    .Input("encoder_states: float")
+    .Input("decoder_embedding: float")
+    .Input("v: float")
+    .Input("prev: float")
+    .Output("alignment: float")
+    .Output("context: float")
+    .Doc(R"doc(
+The content attention of one decoder step:
+  e[b, t] = sum(v * tanh(encoder_embedding[b, t, 0, :] + decoder_embedding[b, :]))
+  alignment = softmax(mask(e))
+  context[b, :] = sum_t alignment[b, t] * encoder_states[b, t, 0, :]
+mask is AttentionMask, AttentionMaskWindow (index, s_min, s_max, v_min, v_max)
+or AttentionMaskMedian of prev (window_l, window_r).
+
+encoder_embedding: [batch_size, attention_len, 1, embedding_size].
+encoder_states: [batch_size, attention_len, 1, cell_size].
+decoder_embedding: [batch_size, embedding_size].
+prev: [batch_size, attention_len], the previous alignment (median only).
+)doc");
+
+REGISTER_OP("AttentionStepGrad")
+    .Input("encoder_embedding: float")
+    .Input("encoder_states: float")
+    .Input("decoder_embedding: float")
+    .Input("v: float")
+    .Input("alignment: float")
+    .Input("dalignment: float")
+    .Input("dcontext: float")
+    .Output("dencoder_embedding: float")
+    .Output("dencoder_states: float")
+    .Output("ddecoder_embedding: float")
+    .Output("dv: float")
+    .Doc(R"doc(
+AttentionStepGrad
+)doc");
+
 }  // namespace tensorflow
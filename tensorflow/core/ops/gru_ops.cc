@@ -23,6 +23,19 @@ REGISTER_OP("TokenSample")
 AttentionMask
 )doc");
 
+REGISTER_OP("TokenSampleStep")
+    .Attr("sample_prob: float")
+    .Attr("seed2: int = 0")
+    .Input("ground_truth: int32")
+    .Input("token_distribution: float")
+    .Input("step: int32")
+    .Output("token: int32")
+    .Doc(R"doc(
+TokenSample whose seed is the step input, for a decoder in a While loop. Step
+t samples like a TokenSample of seed t (and seed2), every step keeps its own
+generator across runs.
+)doc");
+
 REGISTER_OP("GruCell")
     .Attr("cell_size: int")
     .Attr("time_idx: int = -1")
@@ -186,6 +199,139 @@ REGISTER_OP("GruFusedGrad")
 GRU Gradient
 )doc");
 
+REGISTER_OP("GruLean")
+    .Attr("cell_size: int")
+    .Attr("sequence_len_max: int")
+    .Attr("segment_len: int = 32")
+    .Input("sequence_len: int64")
+    .Input("wxr: float")
+    .Input("whr: float")
+    .Input("wxz: float")
+    .Input("whz: float")
+    .Input("wxh: float")
+    .Input("whh: float")
+    .Input("br: float")
+    .Input("bz: float")
+    .Input("bh: float")
+    .Input("xs: sequence_len_max * float")
+    .Output("hs: sequence_len_max * float")
+    .Doc(R"doc(
+GRU that only keeps hs, GruLeanGrad recomputes the gates segment_len timesteps
+at a time instead of reading them from the forward pass.
+)doc");
+
+REGISTER_OP("GruLeanGrad")
+    .Attr("cell_size: int")
+    .Attr("sequence_len_max: int")
+    .Attr("segment_len: int = 32")
+    .Input("sequence_len: int64")
+    .Input("wxr: float")
+    .Input("whr: float")
+    .Input("wxz: float")
+    .Input("whz: float")
+    .Input("wxh: float")
+    .Input("whh: float")
+    .Input("br: float")
+    .Input("bz: float")
+    .Input("bh: float")
+    .Input("xs: sequence_len_max * float")
+    .Input("hs: sequence_len_max * float")
+    .Input("dhs: sequence_len_max * float")
+    .Output("dwxr: float")
+    .Output("dwhr: float")
+    .Output("dwxz: float")
+    .Output("dwhz: float")
+    .Output("dwxh: float")
+    .Output("dwhh: float")
+    .Output("dbr: float")
+    .Output("dbz: float")
+    .Output("dbh: float")
+    .Output("dxs: sequence_len_max * float")
+    .Doc(R"doc(
+GRU Lean Gradient
+)doc");
+
+REGISTER_OP("GruBidirectional")
+    .Attr("cell_size: int")
+    .Attr("sequence_len_max: int")
+    .Attr("segment_len: int = 32")
+    .Input("sequence_len: int64")
+    .Input("fwd_wxr: float")
+    .Input("fwd_whr: float")
+    .Input("fwd_wxz: float")
+    .Input("fwd_whz: float")
+    .Input("fwd_wxh: float")
+    .Input("fwd_whh: float")
+    .Input("fwd_br: float")
+    .Input("fwd_bz: float")
+    .Input("fwd_bh: float")
+    .Input("bwd_wxr: float")
+    .Input("bwd_whr: float")
+    .Input("bwd_wxz: float")
+    .Input("bwd_whz: float")
+    .Input("bwd_wxh: float")
+    .Input("bwd_whh: float")
+    .Input("bwd_br: float")
+    .Input("bwd_bz: float")
+    .Input("bwd_bh: float")
+    .Input("xs: sequence_len_max * float")
+    .Output("hs: sequence_len_max * float")
+    .Doc(R"doc(
+Bidirectional GRU, hs[t] is [batch_size, 2 * cell_size], the forward GRU's h[t]
+followed by the backward GRU's h[t]. The backward GRU runs over each example's
+first sequence_len[b] timesteps in reverse. Only hs is kept, like GruLean the
+gradient recomputes the gates segment_len timesteps at a time.
+)doc");
+
+REGISTER_OP("GruBidirectionalGrad")
+    .Attr("cell_size: int")
+    .Attr("sequence_len_max: int")
+    .Attr("segment_len: int = 32")
+    .Input("sequence_len: int64")
+    .Input("fwd_wxr: float")
+    .Input("fwd_whr: float")
+    .Input("fwd_wxz: float")
+    .Input("fwd_whz: float")
+    .Input("fwd_wxh: float")
+    .Input("fwd_whh: float")
+    .Input("fwd_br: float")
+    .Input("fwd_bz: float")
+    .Input("fwd_bh: float")
+    .Input("bwd_wxr: float")
+    .Input("bwd_whr: float")
+    .Input("bwd_wxz: float")
+    .Input("bwd_whz: float")
+    .Input("bwd_wxh: float")
+    .Input("bwd_whh: float")
+    .Input("bwd_br: float")
+    .Input("bwd_bz: float")
+    .Input("bwd_bh: float")
+    .Input("xs: sequence_len_max * float")
+    .Input("hs: sequence_len_max * float")
+    .Input("dhs: sequence_len_max * float")
+    .Output("dfwd_wxr: float")
+    .Output("dfwd_whr: float")
+    .Output("dfwd_wxz: float")
+    .Output("dfwd_whz: float")
+    .Output("dfwd_wxh: float")
+    .Output("dfwd_whh: float")
+    .Output("dfwd_br: float")
+    .Output("dfwd_bz: float")
+    .Output("dfwd_bh: float")
+    .Output("dbwd_wxr: float")
+    .Output("dbwd_whr: float")
+    .Output("dbwd_wxz: float")
+    .Output("dbwd_whz: float")
+    .Output("dbwd_wxh: float")
+    .Output("dbwd_whh: float")
+    .Output("dbwd_br: float")
+    .Output("dbwd_bz: float")
+    .Output("dbwd_bh: float")
+    .Output("dxs: sequence_len_max * float")
+    .Doc(R"doc(
+GRU Bidirectional Gradient
+)doc");
+
 REGISTER_OP("Sink")
     .Attr("sinks: int")
     .Input("input: sinks * float")
@@ -217,6 +217,7 @@ REGISTER_OP("TFRecordReader")
     .Output("reader_handle: Ref(string)")
     .Attr("container: string = ''")
     .Attr("shared_name: string = ''")
+    .Attr("compression_type: string = ''")
     .SetIsStateful()
     .Doc(R"doc(
 A Reader that outputs the records from a TensorFlow Records file.
@@ -226,6 +227,7 @@ container: If non-empty, this reader is placed in the given container.
         Otherwise, a default container is used.
 shared_name: If non-empty, this reader is named in the given bucket
              with this shared_name. Otherwise, the node name is used instead.
+compression_type: The compression of the files: "" (none), "ZLIB" or "GZIP".
 )doc");
 
 REGISTER_OP("IdentityReader")
@@ -266,6 +268,28 @@ key: A scalar.
 value: A scalar.
 )doc");
 
+REGISTER_OP("ReaderReadUpTo")
+    .Input("reader_handle: Ref(string)")
+    .Input("queue_handle: Ref(string)")
+    .Input("num_records: int64")
+    .Output("keys: string")
+    .Output("values: string")
+    .Doc(R"doc(
+Returns up to `num_records` (key, value pairs) produced by a Reader.
+
+Will dequeue from the input queue if necessary (e.g. when the
+Reader needs to start reading from a new file since it has finished
+with the previous file).  Once it read a record it stops at the end
+of the current file instead, so it may return fewer than `num_records`
+records, but at least one.
+
+reader_handle: Handle to a Reader.
+queue_handle: Handle to a Queue, with string work items.
+num_records: Number of records to read, a positive scalar.
+keys: A 1-D tensor.
+values: A 1-D tensor, as long as keys.
+)doc");
+
 REGISTER_OP("ReaderNumRecordsProduced")
     .Input("reader_handle: Ref(string)")
     .Output("records_produced: int64")
@@ -273,7 +297,7 @@ REGISTER_OP("ReaderNumRecordsProduced")
 Returns the number of records this Reader has produced.
 
 This is the same as the number of ReaderRead executions that have
-succeeded.
+succeeded, plus the records returned by ReaderReadUpTo.
 
 reader_handle: Handle to a Reader.
 )doc");
@@ -1,11 +1,18 @@
 // Copyright 2015 William Chan <williamchan@cmu.edu>.
 
+#include <algorithm>
+#include <cstring>
+#include <vector>
+
 #include "tensorflow/core/example/example.pb.h"
 #include "tensorflow/core/framework/op.h"
 #include "tensorflow/core/framework/op_kernel.h"
 #include "tensorflow/core/framework/token_model.pb.h"
+#include "tensorflow/core/lib/core/errors.h"
+#include "tensorflow/core/platform/host_info.h"
 #include "tensorflow/core/platform/logging.h"
 #include "tensorflow/core/platform/protobuf.h"
+#include "tensorflow/core/util/work_sharder.h"
 
 using namespace tensorflow;
 
@@ -19,6 +26,7 @@ REGISTER_OP("S4ParseUtterance")
     .Attr("token_model: string = 'speech4/conf/token_model_character_simple.pbtxt'")
     .Attr("frame_stack: int = 1")
     .Attr("frame_skip: int = 1")
+    .Attr("features_dense: bool = false")
     .Input("serialized: string")
     .Output("features: features_len_max * float")
     .Output("alignment: alignment_len_max * int32")
@@ -36,8 +44,26 @@ REGISTER_OP("S4ParseUtterance")
     .Output("tokens_weights: tokens_len_max * float")
     .Output("tokens_pinyin_weights: tokens_len_max * float")
     .Output("uttid: string")
+    .Output("features_time_major: float")
     .Doc(R"doc(
 SPEECH4, parse an utterance!
+
+The batch is parsed in parallel on the intra-op thread pool. Output frame t
+is the concatenation of the input frames [t * frame_skip,
+t * frame_skip + frame_stack), frames past the end of the utterance are zero.
+features_len is ceil(frames / frame_skip), the last output frame may be a
+partial group of input frames.
+
+"tokens_pinyin", if present, holds 7 values per token.
+
+The frames are read from either the float_list "features" or the compact
+"features_raw" bytes, which hold the [features_len, width] matrix as
+little-endian float32 or float16 ("features_encoding", default "float32").
+
+features_dense: If true, features_time_major is the [features_len_max, batch,
+  features_width] tensor backing the features list (the list entries alias
+  its timesteps whenever they are suitably aligned). Otherwise
+  features_time_major is empty.
 )doc");
 
 class S4ParseUtterance : public OpKernel {
@@ -50,8 +76,13 @@ class S4ParseUtterance : public OpKernel {
     OP_REQUIRES_OK(ctx, ctx->GetAttr("eow_weight", &eow_weight_));
     OP_REQUIRES_OK(ctx, ctx->GetAttr("frame_stack", &frame_stack_));
     OP_REQUIRES_OK(ctx, ctx->GetAttr("frame_skip", &frame_skip_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("features_dense", &features_dense_));
     if (frame_stack_ == 0) frame_stack_ = 1;
     if (frame_skip_ == 0) frame_skip_ = 1;
+    OP_REQUIRES(ctx, frame_stack_ > 0 && frame_skip_ > 0,
+                errors::InvalidArgument("frame_stack and frame_skip must be "
+                                        "positive, got: ", frame_stack_, " ",
+                                        frame_skip_));
 
     // Read the TokenModelProto.
     string token_model_pbtxt_path;
@@ -67,261 +98,373 @@ class S4ParseUtterance : public OpKernel {
     auto serialized_t = serialized->vec<string>();
     const int64 batch_size = serialized_t.size();
 
-    OpOutputList output_list_features;
-    OpOutputList output_list_alignment;
-    OpOutputList output_list_alignment_weight;
-    OpOutputList output_list_features_fbank;
+    auto worker_threads = ctx->device()->tensorflow_cpu_worker_threads();
+    // Rough cost of an utterance, dominated by copying its frames.
+    const int64 cost_per_utterance = features_len_max_ * 1000;
+
+    // Parse all the Examples in parallel, the frame width of the batch is
+    // only known once they are parsed.
+    std::vector<Example> examples(batch_size);
+    std::vector<Status> status(batch_size);
+    std::vector<Frames> frames(batch_size);
+    auto parse = [&](int64 start, int64 limit) {
+      for (int64 b = start; b < limit; ++b) {
+        status[b] = ParseExample(serialized_t(b), &examples[b], &frames[b]);
+      }
+    };
+    Shard(worker_threads->num_threads, worker_threads->workers, batch_size,
+          cost_per_utterance, parse);
+    for (int64 b = 0; b < batch_size; ++b) {
+      OP_REQUIRES_OK(ctx, status[b]);
+    }
+
+    // Utterances with no frames carry no width, the batch width is the width
+    // of any other utterance.
+    int64 frame_width = 0;
+    for (int64 b = 0; b < batch_size; ++b) {
+      if (frames[b].width == 0) continue;
+      OP_REQUIRES(ctx, frame_width == 0 || frame_width == frames[b].width,
+                  errors::InvalidArgument(
+                      "Utterances in a batch must have the same frame width: ",
+                      frame_width, " vs ", frames[b].width));
+      frame_width = frames[b].width;
+    }
+    const int64 features_width = frame_width * frame_stack_;
+
+    // All timesteps of the features (and fbanks, weights) are stored in one
+    // zero-initialized [features_len_max, batch_size, width] buffer.
+    Tensor features_time_major;
+    if (features_dense_) {
+      Tensor* output = nullptr;
+      OP_REQUIRES_OK(ctx, ctx->allocate_output(
+          "features_time_major",
+          TensorShape({features_len_max_, batch_size, features_width}), &output));
+      features_time_major = *output;
+    } else {
+      Tensor* output = nullptr;
+      OP_REQUIRES_OK(ctx, ctx->allocate_output(
+          "features_time_major", TensorShape({0, batch_size, features_width}),
+          &output));
+      OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+          DT_FLOAT, TensorShape({features_len_max_, batch_size, features_width}),
+          &features_time_major));
+    }
+    Tensor features_fbank_time_major;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+        DT_FLOAT, TensorShape({features_len_max_, batch_size, features_fbank_dim_}),
+        &features_fbank_time_major));
+    Tensor features_weight_time_major;
+    OP_REQUIRES_OK(ctx, ctx->allocate_temp(
+        DT_FLOAT, TensorShape({features_len_max_, batch_size}),
+        &features_weight_time_major));
+    std::fill_n(features_time_major.flat<float>().data(),
+                features_time_major.NumElements(), 0.0f);
+    std::fill_n(features_fbank_time_major.flat<float>().data(),
+                features_fbank_time_major.NumElements(), 0.0f);
+    std::fill_n(features_weight_time_major.flat<float>().data(),
+                features_weight_time_major.NumElements(), 0.0f);
+
     Tensor* output_tensor_features_len = nullptr;
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("features_len", TensorShape({batch_size}), &output_tensor_features_len));
+
     Tensor* output_tensor_features_width = nullptr;
-    OpOutputList output_list_features_weight;
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("features_width", TensorShape(), &output_tensor_features_width));
+    output_tensor_features_width->flat<int64>().data()[0] = features_width;
+
+    OpOutputList output_list_alignment;
+    OpOutputList output_list_alignment_weight;
+    OP_REQUIRES_OK(ctx, ctx->output_list("alignment", &output_list_alignment));
+    OP_REQUIRES_OK(ctx, ctx->output_list("alignment_weight", &output_list_alignment_weight));
+    for (int64 t = 0; t < alignment_len_max_; ++t) {
+      Tensor* alignment_slice = nullptr;
+      OP_REQUIRES_OK(ctx, output_list_alignment.allocate(t, TensorShape({batch_size}), &alignment_slice));
+      std::fill_n(alignment_slice->flat<int32>().data(), batch_size, 0);
+
+      Tensor* alignment_weight_slice = nullptr;
+      OP_REQUIRES_OK(ctx, output_list_alignment_weight.allocate(t, TensorShape({batch_size}), &alignment_weight_slice));
+      std::fill_n(alignment_weight_slice->flat<float>().data(), batch_size, 0.0f);
+    }
+
     Tensor* output_tensor_s_min = nullptr;
     Tensor* output_tensor_s_max = nullptr;
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("s_min", TensorShape({batch_size}), &output_tensor_s_min));
+    std::fill_n(output_tensor_s_min->flat<int32>().data(), batch_size, 0);
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("s_max", TensorShape({batch_size}), &output_tensor_s_max));
+    std::fill_n(output_tensor_s_max->flat<int32>().data(), batch_size, 0);
+
     Tensor* output_tensor_text = nullptr;
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("text", TensorShape({batch_size}), &output_tensor_text));
+
     OpOutputList output_list_tokens;
-    Tensor* output_tensor_tokens_len = nullptr;
     OpOutputList output_list_tokens_pinyin;
-    Tensor* output_tensor_uttid = nullptr;
     OpOutputList output_list_tokens_weights;
     OpOutputList output_list_tokens_pinyin_weights;
+    OP_REQUIRES_OK(ctx, ctx->output_list("tokens", &output_list_tokens));
+    OP_REQUIRES_OK(ctx, ctx->output_list("tokens_pinyin", &output_list_tokens_pinyin));
+    OP_REQUIRES_OK(ctx, ctx->output_list("tokens_weights", &output_list_tokens_weights));
+    OP_REQUIRES_OK(ctx, ctx->output_list("tokens_pinyin_weights", &output_list_tokens_pinyin_weights));
+    for (int64 s = 0; s < tokens_len_max_; ++s) {
+      Tensor* token_slice = nullptr;
+      OP_REQUIRES_OK(ctx, output_list_tokens.allocate(s, TensorShape({batch_size}), &token_slice));
+      std::fill_n(token_slice->flat<int32>().data(), batch_size, 0);
+
+      Tensor* token_pinyin_slice = nullptr;
+      OP_REQUIRES_OK(ctx, output_list_tokens_pinyin.allocate(s, TensorShape({batch_size * 7}), &token_pinyin_slice));
+      std::fill_n(token_pinyin_slice->flat<int32>().data(), batch_size * 7, 0);
+
+      Tensor* weight_slice = nullptr;
+      OP_REQUIRES_OK(ctx, output_list_tokens_weights.allocate(s, TensorShape({batch_size}), &weight_slice));
+      std::fill_n(weight_slice->flat<float>().data(), batch_size, 0.0f);
+
+      Tensor* pinyin_weight_slice = nullptr;
+      OP_REQUIRES_OK(ctx, output_list_tokens_pinyin_weights.allocate(s, TensorShape({batch_size * 7}), &pinyin_weight_slice));
+      std::fill_n(pinyin_weight_slice->flat<float>().data(), batch_size * 7, 0.0f);
+    }
 
-    for (int64 b = 0; b < batch_size; ++b) {
-      // Parse our serialized string into our Example proto.
-      Example ex;
-      OP_REQUIRES(
-          ctx, ParseProtoUnlimited(&ex, serialized_t(b)),
-          errors::InvalidArgument("Could not parse example input, value: '",
-                                  serialized_t(b), "'"));
-      const auto& feature_dict = ex.features().feature();
-
-      // Extract the features_len.
-      const auto& features_len_iter = feature_dict.find("features_len");
-      CHECK(features_len_iter != feature_dict.end());
-      int64 features_len = features_len_iter->second.int64_list().value(0);
-
-      // Extract the features.
-      const auto& features_iter = feature_dict.find("features");
-      CHECK(features_iter != feature_dict.end());
-      const auto& features = features_iter->second.float_list();
-
-      // The features_width is a function of len(features) and features_len.
-      if (features.value().size()) CHECK_EQ(features.value().size() % features_len, 0);
-      const int64 frame_width =
-          features_len ? features.value().size() / features_len : 0;
-
-      // Adjust for frame_stack and frame_skip.
-      const int64 features_width = frame_width * frame_stack_;
-      const int64 frame_total = features_len;
-      features_len = features_len / frame_skip_;
-
-      if (b == 0) {
-        // Allocate the memory.
-        OP_REQUIRES_OK(ctx, ctx->output_list("features", &output_list_features));
-        OP_REQUIRES_OK(ctx, ctx->output_list("alignment", &output_list_alignment));
-        OP_REQUIRES_OK(ctx, ctx->output_list("alignment_weight", &output_list_alignment_weight));
-        OP_REQUIRES_OK(ctx, ctx->output_list("features_fbank", &output_list_features_fbank));
-        OP_REQUIRES_OK(ctx, ctx->output_list("features_weight", &output_list_features_weight));
-        for (int64 t = 0; t < features_len_max_; ++t) {
-          TensorShape feature_shape({batch_size, features_width});
-          Tensor* feature_slice = nullptr;
-          output_list_features.allocate(t, feature_shape, &feature_slice);
-
-          TensorShape feature_fbank_shape({batch_size, features_fbank_dim_});
-          Tensor* feature_fbank_slice = nullptr;
-          output_list_features_fbank.allocate(t, feature_fbank_shape, &feature_fbank_slice);
-
-          Tensor* feature_weight = nullptr;
-          output_list_features_weight.allocate(t, TensorShape({batch_size}), &feature_weight);
-
-          std::fill_n(feature_slice->flat<float>().data(), feature_shape.num_elements(), 0.0f);
-          std::fill_n(feature_fbank_slice->flat<float>().data(), feature_fbank_shape.num_elements(), 0.0f);
-          std::fill_n(feature_weight->flat<float>().data(), batch_size, 0.0f);
-        }
+    Tensor* output_tensor_tokens_len = nullptr;
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("tokens_len", TensorShape({batch_size}), &output_tensor_tokens_len));
 
-        for (int64 t = 0; t < alignment_len_max_; ++t) {
-          Tensor* alignment_slice = nullptr;
-          output_list_alignment.allocate(t, TensorShape({batch_size}), &alignment_slice);
-          std::fill_n(alignment_slice->flat<int32>().data(), batch_size, 0);
+    Tensor* output_tensor_uttid = nullptr;
+    OP_REQUIRES_OK(
+        ctx, ctx->allocate_output("uttid", TensorShape({batch_size}), &output_tensor_uttid));
+
+    // Fill in the outputs in parallel, every utterance writes its own
+    // column (b) of each output.
+    float* features_data = features_time_major.flat<float>().data();
+    float* features_fbank_data = features_fbank_time_major.flat<float>().data();
+    float* features_weight_data = features_weight_time_major.flat<float>().data();
+    auto fill = [&](int64 start, int64 limit) {
+      for (int64 b = start; b < limit; ++b) {
+        const auto& feature_dict = examples[b].features().feature();
+
+        // Copy the frames straight from the proto's repeated field (or the
+        // raw bytes).
+        const Frames& features = frames[b];
+        const int64 frame_total = features.width ? features.size / features.width : 0;
+        int64 features_len = (frame_total + frame_skip_ - 1) / frame_skip_;
+        output_tensor_features_len->flat<int64>().data()[b] = features_len;
+        if (features_len > features_len_max_) {
+          features_len = features_len_max_;
+        }
+        const int64 fbank_width = std::min(features_fbank_dim_, frame_width);
+        for (int64 t = 0; t < features_len; ++t) {
+          const int64 frame_first = t * frame_skip_;
+          const int64 frames_stacked =
+              std::min(frame_stack_, frame_total - frame_first);
+          CopyFrames(features, frame_first * frame_width,
+                     frames_stacked * frame_width,
+                     features_data + (t * batch_size + b) * features_width);
+          CopyFrames(features, frame_first * frame_width, fbank_width,
+                     features_fbank_data + (t * batch_size + b) * features_fbank_dim_);
+          features_weight_data[t * batch_size + b] = 1.0f;
+        }
 
-          Tensor* alignment_weight_slice = nullptr;
-          output_list_alignment_weight.allocate(t, TensorShape({batch_size}), &alignment_weight_slice);
-          std::fill_n(alignment_weight_slice->flat<float>().data(), batch_size, 0.0f);
+        // See if we have an alignment.
+        const auto& alignment_iter = feature_dict.find("alignment");
+        if (alignment_iter != feature_dict.end()) {
+          const auto& alignment = alignment_iter->second.int64_list();
+          const int64 alignment_len =
+              std::min<int64>(alignment.value().size(), alignment_len_max_);
+          for (int64 t = 0; t < alignment_len; ++t) {
+            int32 phone = alignment.value(t);
+            output_list_alignment[t]->flat<int32>().data()[b] = phone;
+            output_list_alignment_weight[t]->flat<float>().data()[b] =
+                phone == 4 ? 0.1f : 1.0f;
+          }
         }
 
-        TensorShape x({batch_size});
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("features_len", TensorShape({batch_size}), &output_tensor_features_len));
-
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("features_width", TensorShape(), &output_tensor_features_width));
-        output_tensor_features_width->flat<int64>().data()[0] = features_width;
-
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("s_min", TensorShape({batch_size}), &output_tensor_s_min));
-        std::fill_n(output_tensor_s_min->flat<int32>().data(), batch_size, 0);
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("s_max", TensorShape({batch_size}), &output_tensor_s_max));
-        std::fill_n(output_tensor_s_max->flat<int32>().data(), batch_size, 0);
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("text", TensorShape({batch_size}), &output_tensor_text));
-
-        OP_REQUIRES_OK(ctx, ctx->output_list("tokens", &output_list_tokens));
-        OP_REQUIRES_OK(ctx, ctx->output_list("tokens_pinyin", &output_list_tokens_pinyin));
-        for (int64 s = 0; s < tokens_len_max_; ++s) {
-          TensorShape token_shape({batch_size});
-          Tensor* token_slice = nullptr;
-          output_list_tokens.allocate(s, token_shape, &token_slice);
-          std::fill_n(token_slice->flat<int32>().data(), token_shape.num_elements(), 0);
-
-          TensorShape token_pinyin_shape({batch_size * 7});
-          Tensor* token_pinyin_slice = nullptr;
-          output_list_tokens_pinyin.allocate(s, token_pinyin_shape, &token_pinyin_slice);
-          std::fill_n(token_pinyin_slice->flat<int32>().data(), token_pinyin_shape.num_elements(), 0);
+        // Copy the text across.
+        output_tensor_text->flat<string>().data()[b] =
+            feature_dict.find("text")->second.bytes_list().value(0);
+
+        // Copy the tokens.
+        const auto& tokens = feature_dict.find("tokens")->second.int64_list();
+        int64 tokens_len = tokens.value().size();
+        output_tensor_tokens_len->flat<int64>().data()[b] = tokens_len;
+        if (tokens_len > tokens_len_max_) {
+          tokens_len = tokens_len_max_;
+        }
+        for (int64 s = 0; s < tokens_len; ++s) {
+          int32 token = tokens.value(s);
+          output_list_tokens[s]->flat<int32>().data()[b] = token;
+
+          const float weight =
+              token == token_model_proto_.token_eow() ? eow_weight_ : 1.0f;
+          output_list_tokens_weights[s]->flat<float>().data()[b] = weight;
+          float* pinyin_weight =
+              output_list_tokens_pinyin_weights[s]->flat<float>().data();
+          std::fill_n(pinyin_weight + b * 7, 7, weight / 7.0f);
         }
 
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("tokens_len", TensorShape({batch_size}), &output_tensor_tokens_len));
-
-        OP_REQUIRES_OK(ctx, ctx->output_list("tokens_weights", &output_list_tokens_weights));
-        OP_REQUIRES_OK(ctx, ctx->output_list("tokens_pinyin_weights", &output_list_tokens_pinyin_weights));
-        for (int64 s = 0; s < tokens_len_max_; ++s) {
-          {
-            TensorShape weight_shape({batch_size});
-            Tensor* weight_slice = nullptr;
-            output_list_tokens_weights.allocate(s, weight_shape, &weight_slice);
-            std::fill_n(weight_slice->flat<float>().data(), weight_shape.num_elements(), 0.0f);
+        const auto& tokens_pinyin_iter = feature_dict.find("tokens_pinyin");
+        if (tokens_pinyin_iter != feature_dict.end()) {
+          const auto& tokens_pinyin = tokens_pinyin_iter->second.int64_list();
+          for (int64 s = 0; s < tokens_len; ++s) {
+            int32* token_slice = output_list_tokens_pinyin[s]->flat<int32>().data();
+            for (int64 u = 0; u < 7; ++u) {
+              token_slice[b * 7 + u] = tokens_pinyin.value(s * 7 + u);
+            }
           }
+        }  // else it is pre-zeroed.
 
-          {
-            TensorShape pinyin_weight_shape({batch_size * 7});
-            Tensor* pinyin_weight_slice = nullptr;
-            output_list_tokens_pinyin_weights.allocate(s, pinyin_weight_shape, &pinyin_weight_slice);
-            std::fill_n(pinyin_weight_slice->flat<float>().data(), pinyin_weight_shape.num_elements(), 0.0f);
-          }
+        // s_min / s_max
+        const auto& s_min_iter = feature_dict.find("s_min");
+        if (s_min_iter != feature_dict.end()) {
+          const auto& s_max_iter = feature_dict.find("s_max");
+          output_tensor_s_min->flat<int>().data()[b] = s_min_iter->second.int64_list().value(0);
+          output_tensor_s_max->flat<int>().data()[b] = s_max_iter->second.int64_list().value(0);
         }
 
-        OP_REQUIRES_OK(
-            ctx, ctx->allocate_output("uttid", TensorShape({batch_size}), &output_tensor_uttid));
+        // Copy the uttid across.
+        output_tensor_uttid->flat<string>().data()[b] =
+            feature_dict.find("uttid")->second.bytes_list().value(0);
       }
+    };
+    Shard(worker_threads->num_threads, worker_threads->workers, batch_size,
+          cost_per_utterance, fill);
+
+    OP_REQUIRES_OK(ctx, SetOutputList(
+        ctx, "features", features_time_major, features_width));
+    OP_REQUIRES_OK(ctx, SetOutputList(
+        ctx, "features_fbank", features_fbank_time_major, features_fbank_dim_));
+    OP_REQUIRES_OK(ctx, SetOutputList(
+        ctx, "features_weight", features_weight_time_major, 0));
+  }
 
-      // Copy the features across.
-      output_tensor_features_len->flat<int64>().data()[b] = features_len;
-      if (features_len > features_len_max_) {
-        // LOG(WARNING) << "Utterance has feature_len: " << features_len << " but graph maximum is: " << features_len_max_;
-        features_len = features_len_max_;
+ protected:
+  // The frames of an utterance, either a float_list or the raw little-endian
+  // bytes of a compact record. Points into the parsed Example.
+  struct Frames {
+    const float* floats = nullptr;
+    const char* bytes = nullptr;
+    bool half = false;
+    int64 size = 0;
+    int64 width = 0;
+  };
+
+  // Copies (and converts) count values starting at offset into out.
+  static void CopyFrames(const Frames& frames, int64 offset, int64 count,
+                         float* out) {
+    if (frames.floats) {
+      std::copy_n(frames.floats + offset, count, out);
+    } else if (!frames.half) {
+      std::memcpy(out, frames.bytes + offset * sizeof(float),
+                  count * sizeof(float));
+    } else {
+      const char* bytes = frames.bytes + offset * sizeof(Eigen::half);
+      for (int64 i = 0; i < count; ++i) {
+        Eigen::half h;
+        std::memcpy(&h.x, bytes + i * sizeof(Eigen::half), sizeof(Eigen::half));
+        out[i] = static_cast<float>(h);
       }
-      for (int64 t = 0; t < features_len; ++t) {
-        // Copy the features from the proto to our Tensor.
-        const int64 frame_remaining = frame_total - t * frame_skip_;
-        CHECK_GE(frame_remaining, 0);
-        // const int64 copy_width = std::min(features_width, frame_remaining);
-        const int64 copy_width = features_width;
-        CHECK_EQ(frame_skip_, 1);
-        CHECK_EQ(frame_stack_, 1);
-
-        Tensor* feature_slice = output_list_features[t];
-        Tensor* feature_fbank_slice = output_list_features_fbank[t];
-
-        std::copy_n(features.value().data() + t * frame_skip_ * frame_width,
-                    copy_width,
-                    feature_slice->flat<float>().data() + b * features_width);
-        if (frame_stack_ == 1 && frame_skip_ == 1) {
-          std::copy_n(features.value().data() + t * frame_skip_ * frame_width,
-                      features_fbank_dim_,
-                      feature_fbank_slice->flat<float>().data() + b * features_fbank_dim_);
-        }
+    }
+  }
 
-        Tensor* feature_weight = output_list_features_weight[t];
-        feature_weight->flat<float>().data()[b] = 1.0f;
+  // Parses one serialized Example and checks it has the fields we need.
+  Status ParseExample(const string& serialized, Example* ex, Frames* frames) {
+    if (!ParseProtoUnlimited(ex, serialized)) {
+      return errors::InvalidArgument("Could not parse example input, value: '",
+                                     serialized, "'");
+    }
+    const auto& feature_dict = ex->features().feature();
+    for (const char* key : {"features_len", "text", "tokens", "uttid"}) {
+      if (feature_dict.find(key) == feature_dict.end()) {
+        return errors::InvalidArgument("Example is missing feature: ", key);
       }
+    }
 
-      // See if we have an alignment.
-      if (feature_dict.find("alignment") != feature_dict.end()) {
-        const auto& alignment_iter = feature_dict.find("alignment");
-        const auto& alignment = alignment_iter->second.int64_list();
-        for (int64 t = 0; t < alignment.value().size(); ++t) {
-          Tensor* alignment_slice = output_list_alignment[t];
-          int32 phone = alignment.value(t);
-          alignment_slice->flat<int32>().data()[b] = phone;
-
-          Tensor* alignment_weight_slice = output_list_alignment_weight[t];
-          if (phone == 4) {
-            alignment_weight_slice->flat<float>().data()[b] = 0.1f;
-          } else {
-            alignment_weight_slice->flat<float>().data()[b] = 1.0f;
-          }
-        }
+    const auto& raw_iter = feature_dict.find("features_raw");
+    if (raw_iter != feature_dict.end()) {
+      if (!port::kLittleEndian) {
+        return errors::Unimplemented(
+            "features_raw requires a little-endian host");
       }
-
-      // Copy the text across.
-      const auto& text_iter = feature_dict.find("text");
-      CHECK(text_iter != feature_dict.end());
-      const auto& text = text_iter->second.bytes_list().value(0);
-
-      output_tensor_text->flat<string>().data()[b] = text;
-      
-      // Copy the tokens.
-      const auto& tokens_iter = feature_dict.find("tokens");
-      CHECK(tokens_iter != feature_dict.end());
-      const auto& tokens = tokens_iter->second.int64_list();
-      int64 tokens_len = tokens.value().size();
-
-      output_tensor_tokens_len->flat<int64>().data()[b] = tokens_len;
-      if (tokens_len > tokens_len_max_) {
-        // LOG(WARNING) << "Utterance has tokens_len: " << tokens_len << " but graph maximum is: " << tokens_len_max_;
-        tokens_len = tokens_len_max_;
+      string encoding = "float32";
+      const auto& encoding_iter = feature_dict.find("features_encoding");
+      if (encoding_iter != feature_dict.end()) {
+        encoding = encoding_iter->second.bytes_list().value(0);
       }
-      for (int64 s = 0; s < tokens_len; ++s) {
-        Tensor* token_slice = output_list_tokens[s];
-        int32 token = tokens.value(s);
-        token_slice->flat<int32>().data()[b] = token;
-
-        Tensor* weight_slice = output_list_tokens_weights[s];
-        Tensor* pinyin_weight_slice = output_list_tokens_pinyin_weights[s];
-        if (token == token_model_proto_.token_eow()) {
-          weight_slice->flat<float>().data()[b] = eow_weight_;
-          for (int64 u = 0; u < 7; ++u) {
-            pinyin_weight_slice->flat<float>().data()[b * 7 + u] = eow_weight_ / 7.0f;
-          }
-        } else {
-          weight_slice->flat<float>().data()[b] = 1.0f;
-          for (int64 u = 0; u < 7; ++u) {
-            pinyin_weight_slice->flat<float>().data()[b * 7 + u] = 1.0f / 7.0f;
-          }
-        }
+      if (encoding != "float32" && encoding != "float16") {
+        return errors::InvalidArgument("Unknown features_encoding: ", encoding);
       }
-
-      if (feature_dict.find("tokens_pinyin") != feature_dict.end()) {
-        const auto& tokens_pinyin_iter = feature_dict.find("tokens_pinyin");
-        CHECK(tokens_pinyin_iter != feature_dict.end());
-        const auto& tokens_pinyin = tokens_pinyin_iter->second.int64_list();
-        for (int64 s = 0; s < tokens_len; ++s) {
-          Tensor* token_slice = output_list_tokens_pinyin[s];
-          for (int64 u = 0; u < 7; ++u) {
-            int32 token = tokens_pinyin.value(s * 7 + u);
-            token_slice->flat<int32>().data()[b * 7 + u] = token;
-          }
-        }
-      }  // else it is pre-zeroed.
-
-      // s_min / s_max
-      if (feature_dict.find("s_min") != feature_dict.end()) {
-        const auto& s_min_iter = feature_dict.find("s_min");
-        const auto& s_max_iter = feature_dict.find("s_max");
-
-        output_tensor_s_min->flat<int>().data()[b] = s_min_iter->second.int64_list().value(0);
-        output_tensor_s_max->flat<int>().data()[b] = s_max_iter->second.int64_list().value(0);
+      const string& raw = raw_iter->second.bytes_list().value(0);
+      frames->bytes = raw.data();
+      frames->half = encoding == "float16";
+      const int64 value_size = frames->half ? sizeof(Eigen::half) : sizeof(float);
+      if (raw.size() % value_size) {
+        return errors::InvalidArgument("features_raw size ", raw.size(),
+                                       " is not a multiple of ", value_size);
       }
+      frames->size = raw.size() / value_size;
+    } else {
+      const auto& features_iter = feature_dict.find("features");
+      if (features_iter == feature_dict.end()) {
+        return errors::InvalidArgument("Example is missing feature: features");
+      }
+      const auto& features = features_iter->second.float_list().value();
+      frames->floats = features.data();
+      frames->size = features.size();
+    }
 
-      // Copy the uttid across.
-      const auto& uttid_iter = feature_dict.find("uttid");
-      CHECK(uttid_iter != feature_dict.end());
-      const auto& uttid = uttid_iter->second.bytes_list().value(0);
+    // The frame width is a function of len(features) and features_len.
+    const int64 features_len =
+        feature_dict.find("features_len")->second.int64_list().value(0);
+    if (features_len && frames->size % features_len) {
+      return errors::InvalidArgument(
+          "features size ", frames->size, " is not a multiple of features_len ",
+          features_len);
+    }
+    frames->width = features_len ? frames->size / features_len : 0;
+
+    // The tokens_pinyin of every token that is kept must be there.
+    const auto& tokens_pinyin_iter = feature_dict.find("tokens_pinyin");
+    if (tokens_pinyin_iter != feature_dict.end()) {
+      const int64 tokens_len = std::min<int64>(
+          feature_dict.find("tokens")->second.int64_list().value_size(),
+          tokens_len_max_);
+      const int64 tokens_pinyin_size =
+          tokens_pinyin_iter->second.int64_list().value_size();
+      if (tokens_pinyin_size < tokens_len * 7) {
+        return errors::InvalidArgument(
+            "tokens_pinyin size ", tokens_pinyin_size, " is less than 7 * ",
+            tokens_len, " tokens");
+      }
+    }
+    return Status::OK();
+  }
 
-      output_tensor_uttid->flat<string>().data()[b] = uttid;
+  // Emits the timesteps of a [features_len_max, batch_size, (width)] buffer
+  // as the entries of an output list. Aligned timesteps share the buffer,
+  // the others are copied.
+  Status SetOutputList(OpKernelContext* ctx, const string& name,
+                       const Tensor& time_major, int64 width) {
+    OpOutputList output_list;
+    TF_RETURN_IF_ERROR(ctx->output_list(name, &output_list));
+    const int64 batch_size = time_major.dim_size(1);
+    TensorShape shape({batch_size});
+    if (width) shape.AddDim(width);
+    for (int64 t = 0; t < features_len_max_; ++t) {
+      Tensor slice;
+      CHECK(slice.CopyFrom(time_major.Slice(t, t + 1), shape));
+      if (slice.IsAligned()) {
+        output_list.set(t, slice);
+      } else {
+        Tensor* output = nullptr;
+        TF_RETURN_IF_ERROR(output_list.allocate(t, shape, &output));
+        const int64 size = shape.num_elements();
+        std::copy_n(time_major.flat<float>().data() + t * size, size,
+                    output->flat<float>().data());
+      }
     }
+    return Status::OK();
   }
 
- protected:
   int64 features_fbank_dim_;
   int64 features_len_max_;
   int64 alignment_len_max_;
@@ -330,6 +473,7 @@ class S4ParseUtterance : public OpKernel {
   float eow_weight_;
   int64 frame_stack_;
   int64 frame_skip_;
+  bool features_dense_;
 
   speech4::TokenModelProto token_model_proto_;
 };
@@ -68,6 +68,17 @@ def _get_feeds_for_indexed_slices(feed, feed_val):
                   [feed.values, feed.indices, feed.dense_shape], feed_val))
 
 
+def _get_feeds_for_stacked_tensors(feed, feed_val):
+  # The i-th slice along the first dimension of feed_val is fed to feed[i].
+  # Slices of a C-contiguous ndarray are C-contiguous views, not copies.
+  feed_val = np.asarray(feed_val)
+  if feed_val.ndim == 0 or feed_val.shape[0] != len(feed):
+    raise ValueError('Cannot feed value of shape %r for a tuple of %d '
+                     'Tensors, its first dimension must be the number of '
+                     'Tensors.' % (feed_val.shape, len(feed)))
+  return list(zip(feed, feed_val))
+
+
 class BaseSession(SessionInterface):
   """A class for interacting with a TensorFlow computation.
 
@@ -251,6 +262,12 @@ class BaseSession(SessionInterface):
        _get_feeds_for_indexed_slices,
        lambda feed: [feed.values, feed.indices] if feed.dense_shape is None
                     else [feed.values, feed.indices, feed.dense_shape]),
+      # Tuples of Tensors are fed a single value stacking the values of
+      # their Tensors. They are not expanded as fetches.
+      (tuple,
+       lambda fetch: ([fetch], lambda fetched_vals: fetched_vals[0]),
+       _get_feeds_for_stacked_tensors,
+       list),
       # The default catches all types and performs no expansions.
       (object,
        lambda fetch: ([fetch], lambda fetched_vals: fetched_vals[0]),
@@ -299,6 +316,10 @@ class BaseSession(SessionInterface):
       [`SparseTensor`](../../api_docs/python/sparse_ops.md#SparseTensor),
       the value should be a
       [`SparseTensorValue`](../../api_docs/python/sparse_ops.md#SparseTensorValue).
+    * If the key is a tuple of `Tensor`s, the value should be a single
+      numpy ndarray stacking their values, with one element along its first
+      dimension per tensor: the *i*th tensor is fed the *i*th slice. The
+      slices of a C-contiguous ndarray are fed without copying them.
 
     Each value in `feed_dict` must be convertible to a numpy array of the dtype
     of the corresponding key.
@@ -455,6 +476,157 @@ class BaseSession(SessionInterface):
     return self._do_call(_setup_fn, self._session, feed_list, unique_fetches,
                          target_list)
 
+  def make_callable(self, fetches, feed_list=None):
+    """Returns a Python callable that runs a fixed step of the graph.
+
+    `run()` validates its `fetches` and every key of its `feed_dict` on each
+    call. When the same step is run many times with the same fetches and
+    the same feed tensors (e.g. one decoder step per output token), that
+    work can be done once: the returned callable takes the values of the
+    tensors in `feed_list` as positional arguments, in the same order, and
+    returns what `run(fetches, feed_dict)` would.
+
+    ```python
+    a = tf.placeholder(tf.float32, shape=[])
+    b = tf.placeholder(tf.float32, shape=[])
+    c = a * b
+
+    step = sess.make_callable([c], [a, b])
+    print(step(2.0, 3.0))  # ==> [6.0]
+    print(step(4.0, 5.0))  # ==> [20.0]
+    ```
+
+    The graph is extended once when the callable is made. Operations added
+    to the graph afterwards can still be run with `run()`, but they are not
+    needed by the step of the callable.
+
+    Unlike the keys of `feed_dict`, each element of `feed_list` must be a
+    single `Tensor` (or the name of one) or a tuple of them, and each value
+    passed to the callable must be convertible to a numpy ndarray of the
+    dtype of that tensor (or stacked values, as in `run()`, for a tuple).
+    Values that already are C-contiguous ndarrays of the right dtype are
+    passed to the runtime without a copy.
+
+    Args:
+      fetches: A single graph element, or a list of graph elements
+        (described in `run()`).
+      feed_list: (Optional.) A list of `Tensor` objects, tensor names, or
+        tuples of them to feed.
+
+    Returns:
+      A function taking `len(feed_list)` values and returning either a
+      single value if `fetches` is a single graph element, or a list of
+      values if `fetches` is a list (described in `run()`).
+
+    Raises:
+      RuntimeError: If this `Session` is in an invalid state (e.g. has been
+        closed).
+      TypeError: If `fetches` or `feed_list` elements are of an
+        inappropriate type.
+      ValueError: If `fetches` or `feed_list` elements are invalid or refer
+        to a `Tensor` that doesn't exist or may not be fed.
+    """
+    # Check session.
+    if self._closed:
+      raise RuntimeError('Attempted to use a closed Session.')
+    if self.graph.version == 0:
+      raise RuntimeError('The Session graph is empty.  Add operations to the '
+                         'graph before calling make_callable().')
+
+    # Validate and process fetches.
+    unique_fetches, target_list, fetch_info, unique_handles = (
+        self._process_fetches(fetches))
+    is_list_fetch = isinstance(fetches, (list, tuple))
+
+    # The positions in unique_fetches of the tensors of each fetch.
+    fetch_index = dict((name, i) for i, name in enumerate(unique_fetches))
+    fetch_indices = [[fetch_index[name] for name in fetch_names]
+                     for fetch_names, _ in fetch_info]
+    fetch_dtypes = [unique_handles.get(name) for name in unique_fetches]
+    has_handles = any(fetch_dtypes)
+
+    # Validate and process feed_list. A tuple of Tensors is fed a single
+    # stacked value, each element of feed_list maps to a list of Tensors.
+    feed_groups = []
+    for feed in feed_list or []:
+      if isinstance(feed, (ops.SparseTensor, ops.IndexedSlices)):
+        raise TypeError('Feed argument %r has invalid type %r, '
+                        'make_callable() only feeds Tensors.'
+                        % (feed, type(feed)))
+      is_stacked_feed = isinstance(feed, tuple)
+      group = []
+      for subfeed in feed if is_stacked_feed else [feed]:
+        try:
+          subfeed_t = self.graph.as_graph_element(subfeed, allow_tensor=True,
+                                                  allow_operation=False)
+        except Exception as e:
+          raise TypeError('Cannot interpret feed_list key as Tensor: '
+                          + e.args[0])
+        if not self.graph.is_feedable(subfeed_t):
+          raise ValueError('Tensor %s may not be fed.' % subfeed_t)
+        # Fully defined shapes are compared as tuples, the others checked
+        # for compatibility.
+        shape = subfeed_t.get_shape()
+        dims = tuple(shape.as_list()) if shape.is_fully_defined() else None
+        group.append((compat.as_bytes(subfeed_t.name),
+                      subfeed_t.dtype.as_numpy_dtype, shape, dims))
+      feed_groups.append((is_stacked_feed, group))
+    num_feeds = len(feed_groups)
+
+    self._extend_graph()
+    session = self._session
+
+    def _callable(*feed_values):
+      """Runs the step with the given values of the feed_list tensors."""
+      if self._closed:
+        raise RuntimeError('Attempted to use a closed Session.')
+      if len(feed_values) != num_feeds:
+        raise ValueError('Expected %d feed values, got %d.'
+                         % (num_feeds, len(feed_values)))
+
+      feed_dict_string = {}
+      for (is_stacked_feed, group), feed_val in zip(feed_groups, feed_values):
+        if isinstance(feed_val, ops.Tensor):
+          raise TypeError('The value of a feed cannot be a tf.Tensor object. '
+                          'Acceptable feed values include Python scalars, '
+                          'strings, lists, or numpy ndarrays.')
+        if is_stacked_feed:
+          subfeeds = _get_feeds_for_stacked_tensors(group, feed_val)
+        else:
+          subfeeds = [(group[0], feed_val)]
+        for (name, dtype, shape, dims), subfeed_val in subfeeds:
+          np_val = np.asarray(subfeed_val, dtype=dtype)
+          if (np_val.shape != dims if dims is not None
+              else not shape.is_compatible_with(np_val.shape)):
+            raise ValueError(
+                'Cannot feed value of shape %r for Tensor %r, '
+                'which has shape %r'
+                % (np_val.shape, compat.as_text(name), str(shape)))
+          feed_dict_string[name] = np_val
+
+      results = self._do_call(tf_session.TF_Run, session, None,
+                              feed_dict_string, unique_fetches, target_list,
+                              None)
+
+      if has_handles:
+        results = [session_ops.TensorHandle(result, dtype, self) if dtype
+                   else result
+                   for result, dtype in zip(results, fetch_dtypes)]
+      ret = []
+      for indices, (_, fetch_contraction_fn) in zip(fetch_indices,
+                                                    fetch_info):
+        if indices:
+          ret.append(fetch_contraction_fn([results[i] for i in indices]))
+        else:
+          ret.append(None)
+
+      if is_list_fetch:
+        return ret
+      else:
+        return ret[0]
+
+    return _callable
+
   def _process_fetches(self, fetches):
     """Validate and process fetches."""
     def _fetch_fn(fetch):
@@ -548,7 +720,8 @@ class BaseSession(SessionInterface):
             raise TypeError('The value of a feed cannot be a tf.Tensor object. '
                             'Acceptable feed values include Python scalars, '
                             'strings, lists, or numpy ndarrays.')
-          np_val = np.array(subfeed_val, dtype=subfeed_t.dtype.as_numpy_dtype)
+          np_val = np.asarray(subfeed_val,
+                              dtype=subfeed_t.dtype.as_numpy_dtype)
           if not subfeed_t.get_shape().is_compatible_with(np_val.shape):
             raise ValueError(
                 'Cannot feed value of shape %r for Tensor %r, '
@@ -786,6 +959,7 @@ class Session(BaseSession):
 
   @@__init__
   @@run
+  @@make_callable
   @@close
 
   @@graph
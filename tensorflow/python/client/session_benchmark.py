@@ -0,0 +1,91 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Per-call overhead of Session.run() and Session.make_callable()."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+def build_graph(num_feeds, size):
+  """Build a graph summing `num_feeds` placeholders of shape `[size]`.
+
+  Args:
+    num_feeds: number of placeholders to feed.
+    size: number of float32 elements of each placeholder.
+
+  Returns:
+    A tuple of the list of placeholders and the sum tensor.
+  """
+  feeds = [tf.placeholder(tf.float32, shape=[size]) for _ in range(num_feeds)]
+  return feeds, tf.add_n(feeds)
+
+
+class SessionBenchmark(tf.test.Benchmark):
+  """Benchmark the client overhead of running a fixed step."""
+
+  def _run_graph(self, num_feeds, size, mode, num_iters):
+    """Run the graph and print the time per step.
+
+    Args:
+      num_feeds: number of placeholders to feed.
+      size: number of float32 elements of each placeholder.
+      mode: "run" or "callable" depending on the client call.
+      num_iters: number of steps to run.
+
+    Returns:
+      The duration of the run in seconds.
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+      feeds, total = build_graph(num_feeds, size)
+    values = [np.ones([size], dtype=np.float32) for _ in range(num_feeds)]
+    with tf.Session(graph=graph) as session:
+      if mode == "run":
+        feed_dict = dict(zip(feeds, values))
+        step = lambda: session.run(total, feed_dict=feed_dict)
+      else:
+        callable_fn = session.make_callable(total, feeds)
+        step = lambda: callable_fn(*values)
+      step()  # warm up.
+      start_time = time.time()
+      for _ in range(num_iters):
+        step()
+      duration = time.time() - start_time
+    print("feeds:%d size:%d mode:%s - %f secs" %
+          (num_feeds, size, mode, duration / num_iters))
+
+    self.report_benchmark(
+        name="session_feeds_{num_feeds}_size_{size}_mode_{mode}".format(
+            num_feeds=num_feeds, size=size, mode=mode),
+        iters=num_iters, wall_time=duration / num_iters)
+
+    return duration
+
+  def benchmark_session(self):
+    for num_feeds in [1, 100, 500]:
+      for size in [1, 1024]:
+        t1 = self._run_graph(num_feeds, size, "run", 200)
+        t2 = self._run_graph(num_feeds, size, "callable", 200)
+        print("=== feeds:%d size:%d: %.1f%% ===" %
+              (num_feeds, size, (t2 - t1) / t1 * 100.0))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -631,6 +631,100 @@ class SessionTest(test_util.TensorFlowTestCase):
           RuntimeError, lambda e: 'The Session graph is empty.' in str(e)):
         sess.run([])
 
+  def testFeedStackedTensors(self):
+    with session.Session() as sess:
+      xs = [array_ops.placeholder(dtypes.float32, shape=[2, 3])
+            for _ in xrange(4)]
+      y = array_ops.placeholder(dtypes.float32, shape=[2, 3])
+      total = math_ops.add_n(xs + [y])
+      stacked = np.arange(24, dtype=np.float32).reshape([4, 2, 3])
+      y_val = np.ones([2, 3], dtype=np.float32)
+      res = sess.run([total, xs[2]],
+                     feed_dict={tuple(xs): stacked, y: y_val})
+      self.assertAllEqual(stacked.sum(axis=0) + 1.0, res[0])
+      self.assertAllEqual(stacked[2], res[1])
+
+      # Lists are converted and other dtypes cast.
+      res = sess.run(xs[1], feed_dict={tuple(xs): stacked.astype(np.int32)})
+      self.assertAllEqual(stacked[1], res)
+      res = sess.run(xs[3], feed_dict={tuple(xs): stacked.tolist()})
+      self.assertAllEqual(stacked[3], res)
+
+      with self.assertRaisesRegexp(ValueError, 'tuple of 4 Tensors'):
+        sess.run(total, feed_dict={tuple(xs): stacked[:3], y: y_val})
+      with self.assertRaisesRegexp(ValueError, 'Cannot feed value of shape'):
+        sess.run(total, feed_dict={tuple(xs): stacked[:, :1], y: y_val})
+
+  def testMakeCallable(self):
+    with session.Session() as sess:
+      a = array_ops.placeholder(dtypes.float32, shape=[2])
+      b = array_ops.placeholder(dtypes.float32, shape=[None])
+      c = math_ops.mul(a, b)
+      v = variables.Variable(0.0)
+      inc = state_ops.assign_add(v, 1.0)
+      sess.run(v.initializer)
+
+      step = sess.make_callable([c, inc.op, c], [a, b])
+      for i in xrange(3):
+        res = step(np.array([1.0, 2.0], dtype=np.float32), [i, i])
+        self.assertEqual(3, len(res))
+        self.assertAllEqual([i, 2 * i], res[0])
+        self.assertEqual(None, res[1])
+        self.assertAllEqual([i, 2 * i], res[2])
+      self.assertEqual(3.0, v.eval())
+
+      # A single fetch, fed by name.
+      step = sess.make_callable(c, [a.name, b.name])
+      self.assertAllEqual([3.0, 8.0], step([1.0, 2.0], [3.0, 4.0]))
+
+      # Operations added afterwards are run by run().
+      d = math_ops.add(c, 1.0)
+      self.assertAllEqual([2.0, 5.0], step([1.0, 2.0], [2.0, 2.5]))
+      self.assertAllEqual(
+          [4.0, 9.0], sess.run(d, feed_dict={a: [1.0, 2.0], b: [3.0, 4.0]}))
+
+  def testMakeCallableFetchSparseTensor(self):
+    with session.Session() as sess:
+      indices = np.array([[3, 2, 0], [4, 5, 1]]).astype(np.int64)
+      shape = np.array([7, 9, 2]).astype(np.int64)
+      values = array_ops.placeholder(dtypes.float32, shape=[2])
+      sp = ops.SparseTensor(
+          constant_op.constant(indices), values, constant_op.constant(shape))
+      step = sess.make_callable(sp, [values])
+      sp_out = step(np.array([1.0, 2.0], dtype=np.float32))
+      self.assertAllEqual(sp_out.indices, indices)
+      self.assertAllEqual(sp_out.values, [1.0, 2.0])
+      self.assertAllEqual(sp_out.shape, shape)
+
+  def testMakeCallableStackedFeed(self):
+    with session.Session() as sess:
+      xs = [array_ops.placeholder(dtypes.float32, shape=[None])
+            for _ in xrange(3)]
+      y = array_ops.placeholder(dtypes.float32, shape=[])
+      total = math_ops.mul(math_ops.add_n(xs), y)
+      step = sess.make_callable(total, [tuple(xs), y])
+      stacked = np.arange(6, dtype=np.float32).reshape([3, 2])
+      self.assertAllEqual([12.0, 18.0], step(stacked, 2.0))
+      with self.assertRaisesRegexp(ValueError, 'tuple of 3 Tensors'):
+        step(stacked[:2], 2.0)
+
+  def testMakeCallableErrors(self):
+    with session.Session() as sess:
+      a = array_ops.placeholder(dtypes.float32, shape=[2])
+      b = constant_op.constant(1.0, name='b')
+      c = math_ops.mul(a, b)
+      with self.assertRaisesRegexp(TypeError, 'Cannot interpret feed_list'):
+        sess.make_callable(c, ['b'])
+      step = sess.make_callable(c, [a])
+      with self.assertRaisesRegexp(ValueError, 'Expected 1 feed values'):
+        step()
+      with self.assertRaisesRegexp(ValueError, 'Cannot feed value of shape'):
+        step([1.0, 2.0, 3.0])
+      with self.assertRaisesRegexp(TypeError, 'cannot be a tf.Tensor'):
+        step(b)
+    with self.assertRaisesRegexp(RuntimeError, 'closed Session'):
+      step([1.0, 2.0])
+
   def testNotEntered(self):
     # pylint: disable=protected-access
     self.assertEqual(ops._default_session_stack.get_default(), None)
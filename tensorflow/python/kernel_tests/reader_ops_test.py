@@ -381,6 +381,89 @@ class TFRecordReaderTest(tf.test.TestCase):
                                     "\\(requested 1, current size 0\\)"):
         k, v = sess.run([key, value])
 
+  def testReadUpTo(self):
+    files = self._CreateFiles()
+    with self.test_session() as sess:
+      reader = tf.TFRecordReader(name="test_reader")
+      queue = tf.FIFOQueue(99, [tf.string], shapes=())
+      keys, values = reader.read_up_to(queue, 3)
+      self.assertEqual([None], keys.get_shape().as_list())
+      self.assertEqual([None], values.get_shape().as_list())
+
+      queue.enqueue_many([files]).run()
+      queue.close().run()
+      for i in range(self._num_files):
+        # A read stops at the end of a file.
+        for j in range(0, self._num_records, 3):
+          k, v = sess.run([keys, values])
+          expected = [self._Record(i, r) for r in
+                      range(j, min(j + 3, self._num_records))]
+          self.assertAllEqual(expected, v)
+          self.assertEqual(len(expected), len(k))
+          for key in k:
+            self.assertTrue(
+                tf.compat.as_text(key).startswith("%s:" % files[i]))
+
+      with self.assertRaisesOpError("is closed and has insufficient elements "
+                                    "\\(requested 1, current size 0\\)"):
+        sess.run([keys, values])
+      self.assertAllEqual(self._num_files * self._num_records,
+                          reader.num_records_produced().eval())
+
+
+class TFRecordCompressedReaderTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(TFRecordCompressedReaderTest, self).setUp()
+    self._num_files = 2
+    self._num_records = 7
+
+  def _Record(self, f, r):
+    return tf.compat.as_bytes("Record %d of file %d" % (r, f))
+
+  def _CreateFiles(self, options):
+    filenames = []
+    for i in range(self._num_files):
+      fn = os.path.join(self.get_temp_dir(), "tf_record.%d.%d.txt" % (
+          options.compression_type, i))
+      filenames.append(fn)
+      writer = tf.python_io.TFRecordWriter(fn, options=options)
+      for j in range(self._num_records):
+        writer.write(self._Record(i, j))
+      writer.close()
+    return filenames
+
+  def _TestOneEpoch(self, compression_type):
+    options = tf.python_io.TFRecordOptions(compression_type)
+    files = self._CreateFiles(options)
+    for i, fn in enumerate(files):
+      self.assertAllEqual(
+          [self._Record(i, j) for j in range(self._num_records)],
+          list(tf.python_io.tf_record_iterator(fn, options=options)))
+
+    with self.test_session() as sess:
+      reader = tf.TFRecordReader(name="test_reader", options=options)
+      queue = tf.FIFOQueue(99, [tf.string], shapes=())
+      key, value = reader.read(queue)
+
+      queue.enqueue_many([files]).run()
+      queue.close().run()
+      for i in range(self._num_files):
+        for j in range(self._num_records):
+          k, v = sess.run([key, value])
+          self.assertTrue(tf.compat.as_text(k).startswith("%s:" % files[i]))
+          self.assertAllEqual(self._Record(i, j), v)
+
+      with self.assertRaisesOpError("is closed and has insufficient elements "
+                                    "\\(requested 1, current size 0\\)"):
+        k, v = sess.run([key, value])
+
+  def testZlib(self):
+    self._TestOneEpoch(tf.python_io.TFRecordCompressionType.ZLIB)
+
+  def testGzip(self):
+    self._TestOneEpoch(tf.python_io.TFRecordCompressionType.GZIP)
+
 
 class AsyncReaderTest(tf.test.TestCase):
 
@@ -29,16 +29,23 @@ namespace io {
 PyRecordReader::PyRecordReader() {}
 
 PyRecordReader* PyRecordReader::New(const string& filename,
-                                    uint64 start_offset) {
+                                    uint64 start_offset,
+                                    const string& compression_type_string) {
+  RecordReaderOptions options;
+  Status s = RecordReaderOptions::CreateRecordReaderOptions(
+      compression_type_string, &options);
+  if (!s.ok()) {
+    return nullptr;
+  }
   RandomAccessFile* file;
-  Status s = Env::Default()->NewRandomAccessFile(filename, &file);
+  s = Env::Default()->NewRandomAccessFile(filename, &file);
   if (!s.ok()) {
     return nullptr;
   }
   PyRecordReader* reader = new PyRecordReader;
   reader->offset_ = start_offset;
   reader->file_ = file;
-  reader->reader_ = new RecordReader(reader->file_);
+  reader->reader_ = new RecordReader(reader->file_, options);
   return reader;
 }
 
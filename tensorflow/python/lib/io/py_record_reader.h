@@ -34,7 +34,9 @@ class RecordReader;
 // by multiple threads.
 class PyRecordReader {
  public:
-  static PyRecordReader* New(const string& filename, uint64 start_offset);
+  // "compression_type_string" is "" (none), "ZLIB" or "GZIP".
+  static PyRecordReader* New(const string& filename, uint64 start_offset,
+                             const string& compression_type_string);
   ~PyRecordReader();
 
   // Attempt to get the next record at "current_offset()".  If
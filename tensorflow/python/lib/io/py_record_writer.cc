@@ -25,22 +25,26 @@ namespace io {
 
 PyRecordWriter::PyRecordWriter() {}
 
-PyRecordWriter* PyRecordWriter::New(const string& filename) {
+PyRecordWriter* PyRecordWriter::New(const string& filename,
+                                    const string& compression_type_string) {
+  RecordWriterOptions options;
+  Status s = RecordWriterOptions::CreateRecordWriterOptions(
+      compression_type_string, &options);
+  if (!s.ok()) {
+    return nullptr;
+  }
   WritableFile* file;
-  Status s = Env::Default()->NewWritableFile(filename, &file);
+  s = Env::Default()->NewWritableFile(filename, &file);
   if (!s.ok()) {
     return nullptr;
   }
   PyRecordWriter* writer = new PyRecordWriter;
   writer->file_ = file;
-  writer->writer_ = new RecordWriter(writer->file_);
+  writer->writer_ = new RecordWriter(writer->file_, options);
   return writer;
 }
 
-PyRecordWriter::~PyRecordWriter() {
-  delete writer_;
-  delete file_;
-}
+PyRecordWriter::~PyRecordWriter() { Close(); }
 
 bool PyRecordWriter::WriteRecord(tensorflow::StringPiece record) {
   if (writer_ == nullptr) return false;
@@ -48,11 +52,16 @@ bool PyRecordWriter::WriteRecord(tensorflow::StringPiece record) {
   return s.ok();
 }
 
-void PyRecordWriter::Close() {
+bool PyRecordWriter::Close() {
+  if (writer_ == nullptr) return true;
+  // Ends the compressed stream (if any) before the file is closed.
+  Status s = writer_->Close();
   delete writer_;
-  delete file_;
   writer_ = nullptr;
+  s.Update(file_->Close());
+  delete file_;
   file_ = nullptr;
+  return s.ok();
 }
 
 }  // namespace io
@@ -34,11 +34,17 @@ class RecordWriter;
 // by multiple threads.
 class PyRecordWriter {
  public:
-  static PyRecordWriter* New(const string& filename);
+  // "compression_type_string" is "" (none), "ZLIB" or "GZIP".
+  static PyRecordWriter* New(const string& filename,
+                             const string& compression_type_string);
   ~PyRecordWriter();
 
   bool WriteRecord(tensorflow::StringPiece record);
-  void Close();
+
+  // Ends the compressed stream (if any) and closes the file. Returns false if
+  // either fails, the records may then not have been written. Closing a
+  // closed writer returns true.
+  bool Close();
 
  private:
   PyRecordWriter();
@@ -14,6 +14,7 @@ limitations under the License.
 ==============================================================================*/
 
 %nothread tensorflow::io::PyRecordWriter::WriteRecord;
+%nothread tensorflow::io::PyRecordWriter::Close;
 
 %include "tensorflow/python/platform/base.i"
 %include "tensorflow/python/lib/core/strings.i"
@@ -34,6 +35,13 @@ limitations under the License.
   Py_END_ALLOW_THREADS
 }
 
+%feature("except") tensorflow::io::PyRecordWriter::Close {
+  // Let other threads run while we flush and close
+  Py_BEGIN_ALLOW_THREADS
+  $action
+  Py_END_ALLOW_THREADS
+}
+
 %{
 #include "tensorflow/python/lib/io/py_record_writer.h"
 %}
@@ -21,6 +21,8 @@ suitable if fast sharding or other non-sequential access is desired.
 
 @@TFRecordWriter
 @@tf_record_iterator
+@@TFRecordCompressionType
+@@TFRecordOptions
 
 - - -
 
@@ -34,7 +36,9 @@ has the format
     byte   data[length]
     uint32 masked_crc32_of_data
 
-and the records are concatenated together to produce the file.  The CRC32s
+and the records are concatenated together to produce the file.  A file written
+with a `TFRecordOptions` compression type is the zlib (RFC 1950) or gzip
+(RFC 1952) stream of that concatenation.  The CRC32s
 are [described here](https://en.wikipedia.org/wiki/Cyclic_redundancy_check),
 and the mask of a CRC is
 
@@ -23,11 +23,57 @@ from tensorflow.python import pywrap_tensorflow
 from tensorflow.python.util import compat
 
 
-def tf_record_iterator(path):
+class TFRecordCompressionType(object):
+  """The type of compression for the record."""
+  NONE = 0
+  ZLIB = 1
+  GZIP = 2
+
+
+class TFRecordOptions(object):
+  """Options used for manipulating TFRecord files.
+
+  Compressed files are a zlib or gzip stream of the uncompressed records, they
+  can only be read with the same compression type.
+
+  @@__init__
+  @@get_compression_type_string
+  """
+  compression_type_map = {
+      TFRecordCompressionType.ZLIB: "ZLIB",
+      TFRecordCompressionType.GZIP: "GZIP",
+      TFRecordCompressionType.NONE: ""
+  }
+
+  def __init__(self, compression_type):
+    """Creates the options.
+
+    Args:
+      compression_type: A `TFRecordCompressionType`.
+    """
+    self.compression_type = compression_type
+
+  @classmethod
+  def get_compression_type_string(cls, options):
+    """The compression type of `options` as understood by the C++ reader.
+
+    Args:
+      options: A `TFRecordOptions` or None.
+
+    Returns:
+      "" (no compression), "ZLIB" or "GZIP".
+    """
+    if not options:
+      return ""
+    return cls.compression_type_map[options.compression_type]
+
+
+def tf_record_iterator(path, options=None):
   """An iterator that read the records from a TFRecords file.
 
   Args:
     path: The path to the TFRecords file.
+    options: (optional) A TFRecordOptions object.
 
   Yields:
     Strings.
@@ -35,7 +81,9 @@ def tf_record_iterator(path):
   Raises:
     IOError: If `path` cannot be opened for reading.
   """
-  reader = pywrap_tensorflow.PyRecordReader_New(compat.as_bytes(path), 0)
+  compression_type_string = TFRecordOptions.get_compression_type_string(options)
+  reader = pywrap_tensorflow.PyRecordReader_New(
+      compat.as_bytes(path), 0, compat.as_bytes(compression_type_string))
   if reader is None:
     raise IOError("Could not open %s." % path)
   while reader.GetNext():
@@ -54,16 +102,21 @@ class TFRecordWriter(object):
   @@close
   """
   # TODO(josh11b): Support appending?
-  def __init__(self, path):
+  def __init__(self, path, options=None):
     """Opens file `path` and creates a `TFRecordWriter` writing to it.
 
     Args:
       path: The path to the TFRecords file.
+      options: (optional) A TFRecordOptions object.
 
     Raises:
       IOError: If `path` cannot be opened for writing.
     """
-    self._writer = pywrap_tensorflow.PyRecordWriter_New(compat.as_bytes(path))
+    compression_type_string = TFRecordOptions.get_compression_type_string(
+        options)
+    self._path = path
+    self._writer = pywrap_tensorflow.PyRecordWriter_New(
+        compat.as_bytes(path), compat.as_bytes(compression_type_string))
     if self._writer is None:
       raise IOError("Could not write to %s." % path)
 
@@ -84,5 +137,10 @@ class TFRecordWriter(object):
     self._writer.WriteRecord(record)
 
   def close(self):
-    """Close the file."""
-    self._writer.Close()
+    """Close the file.
+
+    Raises:
+      IOError: If ending the compressed stream or closing the file fails.
+    """
+    if not self._writer.Close():
+      raise IOError("Could not close %s." % self._path)
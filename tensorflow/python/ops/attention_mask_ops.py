@@ -10,6 +10,7 @@ from tensorflow.python.ops import common_shapes
 # pylint: disable=wildcard-import
 # 'Constant' gets imported in the module 'array_ops'.
 from tensorflow.python.ops.constant_op import constant
+from tensorflow.python.ops import array_ops
 from tensorflow.python.ops import variable_scope as vs
 from tensorflow.python.ops import gen_attention_mask_ops
 
@@ -99,3 +100,62 @@ def _AttentionMaskWindowGrad(op, *grad):
       attention_states_sequence_len=op.inputs[0], index=op.get_attr("index"),
       input=grad[0], fill_value=0.0)
   return [None] + [attention_mask_grad]
+
+def attention_step(attention_states_sequence_len, encoder_embedding,
+                   encoder_states, decoder_embedding, v, prev=None,
+                   mask="none", index=0, window_l=10, window_r=200, name=None):
+  r"""AttentionStep
+
+  The fused content attention of one decoder step, the same as
+    e = reduce_sum(v * tanh(encoder_embedding + decoder_embedding), [2, 3])
+    alignment = softmax(attention_mask*(e))
+    context = reduce_sum(alignment * encoder_states, [1, 2])
+
+  Args:
+    attention_states_sequence_len: A `Tensor` of type `int64`.
+    encoder_embedding: A `Tensor` [batch_size, attention_len, 1, embedding_size].
+    encoder_states: A `Tensor` [batch_size, attention_len, 1, cell_size].
+    decoder_embedding: A `Tensor` [batch_size, embedding_size].
+    v: A `Tensor` [embedding_size].
+    prev: A `Tensor` [batch_size, attention_len], the previous alignment.
+    mask: "none", "window" or "median". Without prev, median is "none".
+    index: An `int`, the decoder timestep of the window mask.
+    window_l: An `int`, the median mask's window left of the median.
+    window_r: An `int`, the median mask's window right of the median.
+    name: A name for the operation (optional).
+
+  Returns:
+    A tuple of `Tensor` objects (alignment, context).
+  """
+  if mask == "median" and prev is None:
+    mask = "none"
+  if prev is None:
+    prev = array_ops.zeros([encoder_embedding.get_shape()[0].value,
+                            encoder_embedding.get_shape()[1].value])
+  return gen_attention_mask_ops._attention_step(
+      attention_states_sequence_len=attention_states_sequence_len,
+      encoder_embedding=encoder_embedding, encoder_states=encoder_states,
+      decoder_embedding=decoder_embedding, v=v, prev=prev, mask=mask,
+      index=index, window_l=window_l, window_r=window_r, name=name)
+
+@ops.RegisterShape("AttentionStep")
+def _AttentionStepShape(op):
+  encoder_embedding_shape = op.inputs[1].get_shape().with_rank(4)
+  encoder_states_shape = op.inputs[2].get_shape().with_rank(4)
+  return [tensor_shape.TensorShape(
+              [encoder_embedding_shape[0], encoder_embedding_shape[1]]),
+          tensor_shape.TensorShape(
+              [encoder_states_shape[0], encoder_states_shape[3]])]
+
+@ops.RegisterGradient("AttentionStep")
+def _AttentionStepGrad(op, *grad):
+  attention_step_grad = gen_attention_mask_ops._attention_step_grad(
+      encoder_embedding=op.inputs[1], encoder_states=op.inputs[2],
+      decoder_embedding=op.inputs[3], v=op.inputs[4], alignment=op.outputs[0],
+      dalignment=grad[0], dcontext=grad[1])
+  return [None] + list(attention_step_grad) + [None]
+
+@ops.RegisterShape("AttentionStepGrad")
+def _AttentionStepGradShape(op):
+  return [op.inputs[0].get_shape(), op.inputs[1].get_shape(),
+          op.inputs[2].get_shape(), op.inputs[3].get_shape()]
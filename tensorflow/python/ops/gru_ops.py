@@ -16,14 +16,25 @@ from tensorflow.python.ops import gen_gru_ops
 
 
 def token_sample(ground_truth, token_distribution, sample_prob, seed=0, name=None):
+  r"""token_sample
+
+  seed may also be an int32 scalar tensor, e.g. the step of a While loop
+  decoder, which then samples like a TokenSample of that seed (see
+  TokenSampleStep).
+  """
+  if isinstance(seed, ops.Tensor):
+    return gen_gru_ops.token_sample_step(
+        ground_truth, token_distribution, seed, sample_prob, name=name)
   return gen_gru_ops.token_sample(
       ground_truth, token_distribution, sample_prob, seed=seed, name=name)
 
 @ops.RegisterShape("TokenSample")
+@ops.RegisterShape("TokenSampleStep")
 def _TokenSampleShape(op):
   return [op.inputs[0].get_shape()]
 
 ops.NoGradient("TokenSample")
+ops.NoGradient("TokenSampleStep")
 
 
 @ops.RegisterShape("UniformDistributionSampler")
@@ -217,6 +228,174 @@ def _GruGradShape(op):
           tensor_shape.TensorShape([batch_size, input_size])] * ((len(op.inputs) - 10) / 7)
 
 
+def gru_lean(cell_size, sequence_len, xs, segment_len=32, name=None, scope=None):
+  r"""gru_lean
+
+  Same as gru (and the same variables), but only hs is kept for the backward
+  pass, which recomputes the gates segment_len timesteps at a time.
+
+  args:
+    sequence_len: a `tensor` of type `int64`.
+    cell_size: an `int`.
+    xs: a list of at least 1 `tensor` objects of type `float32`.
+    segment_len: an `int`, the timesteps of gates recomputed at once.
+    name: a name for the operation (optional).
+
+  returns:
+    hs: a list with the same number of `tensor` objects as `xs` of `tensor` objects of type `float32`.
+  """
+  with vs.variable_scope(scope or "Gru"):
+    input_size = xs[0].get_shape()[1].value
+
+    wxr = vs.get_variable("wxr", [input_size, cell_size])
+    whr = vs.get_variable("whr", [cell_size, cell_size])
+    wxz = vs.get_variable("wxz", [input_size, cell_size])
+    whz = vs.get_variable("whz", [cell_size, cell_size])
+    wxh = vs.get_variable("wxh", [input_size, cell_size])
+    whh = vs.get_variable("whh", [cell_size, cell_size])
+
+    br = vs.get_variable("br", [cell_size], initializer=init_ops.constant_initializer(1.0))
+    bz = vs.get_variable("bz", [cell_size], initializer=init_ops.constant_initializer(1.0))
+    bh = vs.get_variable("bh", [cell_size], initializer=init_ops.constant_initializer(0.0))
+
+    return gen_gru_ops._gru_lean(cell_size=cell_size, sequence_len=sequence_len,
+        wxr=wxr, whr=whr, wxz=wxz, whz=whz, wxh=wxh, whh=whh, br=br, bz=bz,
+        bh=bh, xs=xs, segment_len=segment_len, name=name)
+
+
+@ops.RegisterShape("GruLean")
+def _GruLeanShape(op):
+  batch_size = op.inputs[0].get_shape()[0].value
+  cell_size = op.get_attr("cell_size")
+
+  return [tensor_shape.TensorShape([batch_size, cell_size])] * (len(op.inputs) - 10)
+
+
+@ops.RegisterGradient("GruLean")
+def _GruLeanGrad(op, *grad):
+  gru_grads = gen_gru_ops._gru_lean_grad(cell_size=op.get_attr("cell_size"),
+      sequence_len=op.inputs[0],
+      wxr=op.inputs[1],
+      whr=op.inputs[2],
+      wxz=op.inputs[3],
+      whz=op.inputs[4],
+      wxh=op.inputs[5],
+      whh=op.inputs[6],
+      br=op.inputs[7],
+      bz=op.inputs[8],
+      bh=op.inputs[9],
+      xs=op.inputs[10:],
+      hs=op.outputs,
+      dhs=grad,
+      segment_len=op.get_attr("segment_len"))
+
+  gru_grads_ = [None]
+  for gru_grad in gru_grads:
+    if isinstance(gru_grad, list):
+      gru_grads_ += gru_grad
+    else:
+      gru_grads_ += [gru_grad]
+  return gru_grads_
+
+
+@ops.RegisterShape("GruLeanGrad")
+def _GruLeanGradShape(op):
+  batch_size = op.inputs[0].get_shape()[0].value
+  input_size = op.inputs[1].get_shape()[0].value
+  cell_size = op.get_attr("cell_size")
+
+  return [tensor_shape.TensorShape([input_size, cell_size]),
+          tensor_shape.TensorShape([cell_size, cell_size])] * 3 + [
+          tensor_shape.TensorShape([cell_size])] * 3 + [
+          tensor_shape.TensorShape([batch_size, input_size])] * ((len(op.inputs) - 10) / 3)
+
+
+def gru_bidirectional(cell_size, sequence_len, xs, segment_len=32, name=None,
+                      scope=None):
+  r"""gru_bidirectional
+
+  A forward and a backward gru (the same variables as gru under fwd/ and bwd/)
+  in a single op. The backward gru runs over each example's sequence_len
+  timesteps in reverse, its hs are returned in the original time order.
+
+  args:
+    sequence_len: a `tensor` of type `int64`.
+    cell_size: an `int`.
+    xs: a list of at least 1 `tensor` objects of type `float32`.
+    segment_len: an `int`, the timesteps of gates recomputed at once.
+    name: a name for the operation (optional).
+
+  returns:
+    hs: a list with the same number of `tensor` objects as `xs` of `tensor` objects of type `float32`, each the concat of the forward and backward h.
+  """
+  input_size = xs[0].get_shape()[1].value
+
+  weights = {}
+  for direction in ["fwd", "bwd"]:
+    with vs.variable_scope(direction):
+      with vs.variable_scope(scope or "Gru"):
+        weights[direction + "_wxr"] = vs.get_variable("wxr", [input_size, cell_size])
+        weights[direction + "_whr"] = vs.get_variable("whr", [cell_size, cell_size])
+        weights[direction + "_wxz"] = vs.get_variable("wxz", [input_size, cell_size])
+        weights[direction + "_whz"] = vs.get_variable("whz", [cell_size, cell_size])
+        weights[direction + "_wxh"] = vs.get_variable("wxh", [input_size, cell_size])
+        weights[direction + "_whh"] = vs.get_variable("whh", [cell_size, cell_size])
+
+        weights[direction + "_br"] = vs.get_variable("br", [cell_size], initializer=init_ops.constant_initializer(1.0))
+        weights[direction + "_bz"] = vs.get_variable("bz", [cell_size], initializer=init_ops.constant_initializer(1.0))
+        weights[direction + "_bh"] = vs.get_variable("bh", [cell_size], initializer=init_ops.constant_initializer(0.0))
+
+  return gen_gru_ops._gru_bidirectional(cell_size=cell_size,
+      sequence_len=sequence_len, xs=xs, segment_len=segment_len, name=name,
+      **weights)
+
+
+@ops.RegisterShape("GruBidirectional")
+def _GruBidirectionalShape(op):
+  batch_size = op.inputs[0].get_shape()[0].value
+  cell_size = op.get_attr("cell_size")
+
+  return [tensor_shape.TensorShape([batch_size, cell_size * 2])] * (len(op.inputs) - 19)
+
+
+@ops.RegisterGradient("GruBidirectional")
+def _GruBidirectionalGrad(op, *grad):
+  weights = {}
+  for direction_idx, direction in enumerate(["fwd", "bwd"]):
+    for weight_idx, weight in enumerate(
+        ["wxr", "whr", "wxz", "whz", "wxh", "whh", "br", "bz", "bh"]):
+      weights[direction + "_" + weight] = op.inputs[
+          1 + direction_idx * 9 + weight_idx]
+  gru_grads = gen_gru_ops._gru_bidirectional_grad(
+      cell_size=op.get_attr("cell_size"),
+      sequence_len=op.inputs[0],
+      xs=op.inputs[19:],
+      hs=op.outputs,
+      dhs=grad,
+      segment_len=op.get_attr("segment_len"),
+      **weights)
+
+  gru_grads_ = [None]
+  for gru_grad in gru_grads:
+    if isinstance(gru_grad, list):
+      gru_grads_ += gru_grad
+    else:
+      gru_grads_ += [gru_grad]
+  return gru_grads_
+
+
+@ops.RegisterShape("GruBidirectionalGrad")
+def _GruBidirectionalGradShape(op):
+  batch_size = op.inputs[0].get_shape()[0].value
+  input_size = op.inputs[1].get_shape()[0].value
+  cell_size = op.get_attr("cell_size")
+
+  return ([tensor_shape.TensorShape([input_size, cell_size]),
+           tensor_shape.TensorShape([cell_size, cell_size])] * 3 + [
+           tensor_shape.TensorShape([cell_size])] * 3) * 2 + [
+           tensor_shape.TensorShape([batch_size, input_size])] * ((len(op.inputs) - 19) / 3)
+
+
 def gru_fused(cell_size, sequence_len, xs, name=None, scope=None):
   r"""gru
 
@@ -98,6 +98,13 @@ The "producer" functions add a queue to the graph and a corresponding
 @@slice_input_producer
 @@string_input_producer
 
+### Reading many files in parallel
+
+A `ParallelReader` runs several readers on the files of a queue, each in its
+own thread, and interleaves their records in a read-ahead queue.
+
+@@ParallelReader
+
 ### Batching at the end of an input pipeline
 
 These functions add a queue to the graph to assemble a batch of
@@ -131,6 +138,7 @@ from __future__ import print_function
 from tensorflow.python.framework import dtypes
 from tensorflow.python.framework import ops
 from tensorflow.python.framework import tensor_shape
+from tensorflow.python.lib.io import python_io
 from tensorflow.python.ops import common_shapes
 from tensorflow.python.ops import gen_io_ops
 # go/tf-wildcard-import
@@ -327,6 +335,36 @@ class ReaderBase(object):
       queue_ref = queue.queue_ref
     return gen_io_ops._reader_read(self._reader_ref, queue_ref, name=name)
 
+  def read_up_to(self, queue, num_records, name=None):
+    """Returns up to num_records (key, value pairs) produced by a reader.
+
+    Will dequeue a work unit from queue if necessary (e.g. when the
+    Reader needs to start reading from a new file since it has
+    finished with the previous file).  Once a record was read, it
+    stops at the end of the current work unit instead, so it may
+    return fewer than num_records records (but at least one).
+
+    Reading many records per run amortizes the cost of running the
+    op, which matters for small records.
+
+    Args:
+      queue: A Queue or a mutable string Tensor representing a handle
+        to a Queue, with string work items.
+      num_records: Number of records to read.
+      name: A name for the operation (optional).
+
+    Returns:
+      A tuple of Tensors (keys, values).
+      keys: A 1-D string Tensor.
+      values: A 1-D string Tensor.
+    """
+    if isinstance(queue, ops.Tensor):
+      queue_ref = queue
+    else:
+      queue_ref = queue.queue_ref
+    return gen_io_ops._reader_read_up_to(self._reader_ref, queue_ref,
+                                         num_records, name=name)
+
   def num_records_produced(self, name=None):
     """Returns the number of records this reader has produced.
 
@@ -402,6 +440,7 @@ class ReaderBase(object):
 
 
 ops.NoGradient("ReaderRead")
+ops.NoGradient("ReaderReadUpTo")
 ops.NoGradient("ReaderNumRecordsProduced")
 ops.NoGradient("ReaderNumWorkUnitsCompleted")
 ops.NoGradient("ReaderSerializeState")
@@ -488,13 +527,17 @@ class TFRecordReader(ReaderBase):
   """
   # TODO(josh11b): Support serializing and restoring state.
 
-  def __init__(self, name=None):
+  def __init__(self, name=None, options=None):
     """Create a TFRecordReader.
 
     Args:
       name: A name for the operation (optional).
+      options: A TFRecordOptions object (optional).
     """
-    rr = gen_io_ops._tf_record_reader(name=name)
+    compression_type = python_io.TFRecordOptions.get_compression_type_string(
+        options)
+    rr = gen_io_ops._tf_record_reader(
+        name=name, compression_type=compression_type)
     super(TFRecordReader, self).__init__(rr)
 
 
@@ -550,6 +593,18 @@ def _ReaderReadShape(op):
   return [tensor_shape.scalar(), tensor_shape.scalar()]
 
 
+@ops.RegisterShape("ReaderReadUpTo")
+def _ReaderReadUpToShape(op):
+  """Shape function for the ReaderBase.ReadUpTo op."""
+  unused_handle_shape = op.inputs[0].get_shape().merge_with(
+      tensor_shape.scalar())
+  unused_queue_shape = op.inputs[1].get_shape().merge_with(
+      tensor_shape.scalar())
+  unused_num_records_shape = op.inputs[2].get_shape().merge_with(
+      tensor_shape.scalar())
+  return [tensor_shape.vector(None), tensor_shape.vector(None)]
+
+
 @ops.RegisterShape("ReaderReset")
 def _ReaderResetShape(op):
   """Shape function for the ReaderBase.Reset op."""
@@ -20,8 +20,10 @@ from __future__ import print_function
 
 import os
 import threading
+import time
 
 import six
+from six.moves import queue
 
 from tensorflow.python.platform import logging
 from tensorflow.python.summary import event_accumulator
@@ -68,6 +70,7 @@ class EventMultiplexer(object):
   @@AddRun
   @@AddRunsFromDirectory
   @@Reload
+  @@ReloadLatencies
   @@Runs
   @@Scalars
   @@Graph
@@ -79,7 +82,8 @@ class EventMultiplexer(object):
   def __init__(self,
                run_path_map=None,
                size_guidance=event_accumulator.DEFAULT_SIZE_GUIDANCE,
-               purge_orphaned_data=True):
+               purge_orphaned_data=True,
+               max_reload_threads=8):
     """Constructor for the `EventMultiplexer`.
 
     Args:
@@ -91,13 +95,18 @@ class EventMultiplexer(object):
         `event_ccumulator.EventAccumulator` for details.
       purge_orphaned_data: Whether to discard any events that were "orphaned" by
         a TensorFlow restart.
+      max_reload_threads: The maximum number of threads `Reload` uses to reload
+        the `EventAccumulator`s in parallel.
     """
     self._accumulators_mutex = threading.Lock()
     self._accumulators = {}
     self._paths = {}
+    self._reload_latencies = {}
     self._reload_called = False
     self._size_guidance = size_guidance
     self.purge_orphaned_data = purge_orphaned_data
+    self._max_reload_threads = max(1, max_reload_threads)
+    self._directory_lister = io_wrapper.CachingDirectoryLister()
     if run_path_map is not None:
       for (run, path) in six.iteritems(run_path_map):
         self.AddRun(path, run)
@@ -122,6 +131,23 @@ class EventMultiplexer(object):
     Returns:
       The `EventMultiplexer`.
     """
+    name, accumulator = self._AddRun(path, name)
+    if accumulator:
+      if self._reload_called:
+        self._ReloadAccumulators([(name, accumulator)])
+    return self
+
+  def _AddRun(self, path, name):
+    """Adds a run without reloading it, see `AddRun`.
+
+    Args:
+      path: Path to the event files (or event directory) for given run.
+      name: Name of the run to add. If not provided, is set to path.
+
+    Returns:
+      A `(name, accumulator)` tuple, where `accumulator` is the newly created
+      `EventAccumulator`, or None if the run was already being watched.
+    """
     if name is None or name is '':
       name = path
     accumulator = None
@@ -139,10 +165,8 @@ class EventMultiplexer(object):
             purge_orphaned_data=self.purge_orphaned_data)
         self._accumulators[name] = accumulator
         self._paths[name] = path
-    if accumulator:
-      if self._reload_called:
-        accumulator.Reload()
-    return self
+        self._reload_latencies.pop(name, None)
+    return name, accumulator
 
   def AddRunsFromDirectory(self, path, name=None):
     """Load runs from a directory; recursively walks subdirectories.
@@ -156,7 +180,10 @@ class EventMultiplexer(object):
       TensorBoard will load them all.
 
     If the `EventMultiplexer` is already loaded this will cause
-    the newly created accumulators to `Reload()`.
+    the newly created accumulators to `Reload()`, in parallel as in `Reload`.
+
+    Directories that did not change since the previous call are not listed
+    again, so calling it periodically on a large tree of runs is cheap.
     Args:
       path: A string path to a directory to load runs from.
       name: Optionally, what name to apply to the runs. If name is provided
@@ -177,28 +204,101 @@ class EventMultiplexer(object):
     # ListRecursively just yields nothing if the path doesn't exist.
     subdirs = [
         subdir
-        for (subdir, files) in io_wrapper.ListRecursively(path)
+        for (subdir, files) in self._directory_lister.ListRecursively(path)
         if list(filter(event_accumulator.IsTensorFlowEventsFile, files))
     ]
 
+    added = []
     for subdir in subdirs:
-      logging.info('Adding events from directory %s', subdir)
       rpath = os.path.relpath(subdir, path)
       subname = os.path.join(name, rpath) if name else rpath
-      self.AddRun(subdir, name=subname)
+      subname, accumulator = self._AddRun(subdir, subname)
+      if accumulator:
+        logging.info('Adding events from directory %s', subdir)
+        added.append((subname, accumulator))
+    if added and self._reload_called:
+      self._ReloadAccumulators(added)
 
     return self
 
   def Reload(self):
-    """Call `Reload` on every `EventAccumulator`."""
+    """Call `Reload` on every `EventAccumulator`.
+
+    The accumulators are reloaded in parallel by up to `max_reload_threads`
+    threads. Each accumulator resumes reading where its previous `Reload`
+    stopped, and one whose event files did not change costs little more than
+    a `stat` of its directory and current event file.
+
+    Raises:
+      Exception: The first exception raised by the `Reload` of an
+        `EventAccumulator`, once all the others are reloaded.
+
+    Returns:
+      The `EventMultiplexer`.
+    """
     self._reload_called = True
     with self._accumulators_mutex:
-      loaders = list(self._accumulators.values())
+      items = list(six.iteritems(self._accumulators))
 
-    for l in loaders:
-      l.Reload()
+    self._ReloadAccumulators(items)
     return self
 
+  def ReloadLatencies(self):
+    """Return how long the latest `Reload` of each run took.
+
+    Returns:
+      A `{runName: seconds}` dictionary, without the runs that have not been
+      reloaded yet.
+    """
+    with self._accumulators_mutex:
+      return dict(self._reload_latencies)
+
+  def _ReloadAccumulators(self, items):
+    """Reloads `(name, accumulator)` pairs with a pool of threads.
+
+    Args:
+      items: A list of `(name, accumulator)` pairs.
+
+    Raises:
+      Exception: The first exception raised by the `Reload` of an accumulator,
+        once all the others are reloaded.
+    """
+    pending = queue.Queue()
+    for item in items:
+      pending.put(item)
+    errors = []
+
+    def _Worker():
+      while True:
+        try:
+          name, accumulator = pending.get_nowait()
+        except queue.Empty:
+          return
+        start = time.time()
+        try:
+          accumulator.Reload()
+        except Exception as e:  # pylint: disable=broad-except
+          logging.error('Unable to reload accumulator %r: %s', name, e)
+          errors.append(e)
+        duration = time.time() - start
+        with self._accumulators_mutex:
+          if self._accumulators.get(name) is accumulator:
+            self._reload_latencies[name] = duration
+
+    num_threads = min(self._max_reload_threads, len(items))
+    if num_threads <= 1:
+      _Worker()
+    else:
+      threads = [threading.Thread(target=_Worker) for _ in range(num_threads)]
+      for thread in threads:
+        thread.daemon = True
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+    if errors:
+      raise errors[0]
+
   def Scalars(self, run, tag):
     """Retrieve the scalar events associated with a run and tag.
 
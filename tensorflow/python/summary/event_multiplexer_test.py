@@ -74,6 +74,8 @@ class _FakeAccumulator(object):
     return ['%s/%s' % (self._path, tag_name)]
 
   def Reload(self):
+    if self._path.startswith('bad'):
+      raise IOError('Cannot reload %s' % self._path)
     self.reload_called = True
 
 
@@ -264,6 +266,41 @@ class EventMultiplexerTest(test_util.TensorFlowTestCase):
     self.assertTrue(x._GetAccumulator('run1').reload_called)
     self.assertTrue(x._GetAccumulator('run2').reload_called)
 
+  def testReloadInParallel(self):
+    paths = dict(('run%d' % i, 'path%d' % i) for i in range(20))
+    x = event_multiplexer.EventMultiplexer(paths, max_reload_threads=4)
+    self.assertEqual(x.ReloadLatencies(), {})
+    x.Reload()
+    for run in paths:
+      self.assertTrue(x._GetAccumulator(run).reload_called)
+    self.assertItemsEqual(x.ReloadLatencies().keys(), paths.keys())
+
+  def testReloadRaisesAfterReloadingOtherRuns(self):
+    x = event_multiplexer.EventMultiplexer(
+        {'run1': 'path1', 'run2': 'bad_path', 'run3': 'path3'},
+        max_reload_threads=2)
+    with self.assertRaises(IOError):
+      x.Reload()
+    self.assertTrue(x._GetAccumulator('run1').reload_called)
+    self.assertTrue(x._GetAccumulator('run3').reload_called)
+    self.assertItemsEqual(x.ReloadLatencies().keys(), ['run1', 'run2', 'run3'])
+
+  def testAddRunsFromDirectoryAfterReload(self):
+    x = event_multiplexer.EventMultiplexer()
+    x.Reload()
+    realdir = os.path.join(self.get_temp_dir(), 'reloaded_directory')
+    _CreateCleanDirectory(realdir)
+    _AddEvents(os.path.join(realdir, 'run1'))
+    _AddEvents(os.path.join(realdir, 'run2'))
+    x.AddRunsFromDirectory(realdir)
+    self.assertItemsEqual(x.Runs(), ['run1', 'run2'])
+    self.assertTrue(x._GetAccumulator('run1').reload_called)
+    self.assertTrue(x._GetAccumulator('run2').reload_called)
+
+    _AddEvents(os.path.join(realdir, 'run3'))
+    x.AddRunsFromDirectory(realdir)
+    self.assertItemsEqual(x.Runs(), ['run1', 'run2', 'run3'])
+
 
 if __name__ == '__main__':
   googletest.main()
@@ -135,7 +135,8 @@ def SequentialFileProvider(directory, path_filter=lambda x: True):
   """Provides the files in a directory that match the given filter.
 
   Each time the provider is called, it returns the next path (in alphabetical
-  ordering) in the directory that satisfies the filter.
+  ordering) in the directory that satisfies the filter. The directory is only
+  listed again once it changed (see `io_wrapper.CachingDirectoryLister`).
 
   Args:
     directory: The directory to look for paths under.
@@ -146,9 +147,11 @@ def SequentialFileProvider(directory, path_filter=lambda x: True):
     at (or None if there are no more paths).
   """
 
+  lister = io_wrapper.CachingDirectoryLister()
+
   def _Provider(current_path):
     filtered_paths = (path
-                      for path in io_wrapper.ListDirectoryAbsolute(directory)
+                      for path in lister.ListDirectoryAbsolute(directory)
                       if path_filter(path))
     next_paths = list(path
                       for path in filtered_paths
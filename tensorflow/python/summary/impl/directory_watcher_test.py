@@ -121,6 +121,17 @@ class DirectoryWatcherTest(test_util.TensorFlowTestCase):
     self._WriteToFile('c', 'c')
     self.assertWatcherYields(['a', 'c'])
 
+  def testNewFileInUnchangedDirectory(self):
+    self._WriteToFile('a', 'a')
+    # Make the listing of the directory cacheable.
+    mtime = os.stat(self._directory).st_mtime - 10
+    os.utime(self._directory, (mtime, mtime))
+    self.assertWatcherYields(['a'])
+    self._WriteToFile('a', 'b')
+    self.assertWatcherYields(['b'])
+    self._WriteToFile('b', 'c')
+    self.assertWatcherYields(['c'])
+
 
 if __name__ == '__main__':
   googletest.main()
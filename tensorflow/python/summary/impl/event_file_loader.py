@@ -18,6 +18,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+
 from tensorflow.core.util import event_pb2
 from tensorflow.python import pywrap_tensorflow
 from tensorflow.python.platform import app
@@ -35,7 +37,7 @@ class EventFileLoader(object):
     file_path = resource_loader.readahead_file_path(file_path)
     logging.debug('Opening a record reader pointing at %s', file_path)
     self._reader = pywrap_tensorflow.PyRecordReader_New(
-        compat.as_bytes(file_path), 0)
+        compat.as_bytes(file_path), 0, compat.as_bytes(''))
     # Store it for logging purposes.
     self._file_path = file_path
     if not self._reader:
@@ -45,11 +47,20 @@ class EventFileLoader(object):
     """Loads all new values from disk.
 
     Calling Load multiple times in a row will not 'drop' events as long as the
-    return value is not iterated over.
+    return value is not iterated over. Each call resumes reading at the byte
+    offset after the last event yielded, and does not read at all if the file
+    did not grow past that offset.
 
     Yields:
       All values that were written to disk that have not been yielded yet.
     """
+    try:
+      if os.path.getsize(self._file_path) <= self._reader.offset():
+        logging.debug('No new events in %s', self._file_path)
+        return
+    except OSError:
+      # Leave it to the reader if the file can't be stat'ed.
+      pass
     while self._reader.GetNext():
       event = event_pb2.Event()
       event.ParseFromString(self._reader.record())
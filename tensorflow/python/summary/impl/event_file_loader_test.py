@@ -78,6 +78,16 @@ class EventFileLoaderTest(test_util.TensorFlowTestCase):
     loader = self._LoaderForTestFile(filename)
     self.assertEqual(len(list(loader.Load())), 2)
 
+  def testPartialWrite(self):
+    filename = tempfile.NamedTemporaryFile().name
+    record = EventFileLoaderTest.RECORD
+    self._WriteToFile(filename, record + record[:10])
+    loader = self._LoaderForTestFile(filename)
+    self.assertEqual(len(list(loader.Load())), 1)
+    self.assertEqual(len(list(loader.Load())), 0)
+    self._WriteToFile(filename, record[10:])
+    self.assertEqual(len(list(loader.Load())), 1)
+
 
 if __name__ == '__main__':
   googletest.main()
@@ -23,7 +23,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import os
+import threading
+import time
 
 from tensorflow.python.platform import gfile
 from tensorflow.python.summary.impl import event_file_loader
@@ -59,8 +62,9 @@ def ListRecursively(top):
 
   For each of `top` and its subdirectories, yields a tuple containing the path
   to the directory and the path to each of the contained files.  Note that
-  unlike os.Walk()/gfile.Walk(), this does not list subdirectories and the file
-  paths are all absolute.
+  unlike os.Walk()/gfile.Walk(), this does not list subdirectories, skips
+  dotfiles like `ListDirectoryAbsolute` does and the file paths are all
+  absolute.
 
   If the directory does not exist, this yields nothing.
 
@@ -75,7 +79,8 @@ def ListRecursively(top):
   else:
     for dir_path, _, filenames in gfile.Walk(top):
       yield (dir_path, (os.path.join(dir_path, filename)
-                        for filename in filenames))
+                        for filename in filenames
+                        if not filename.startswith('.')))
 
 
 def IsDirectory(path):
@@ -91,3 +96,96 @@ def Exists(path):
     return gcs.Exists(path)
   else:
     return gfile.Exists(path)
+
+
+# Modification times of some file systems only have a one second granularity,
+# so a directory modified less than that before it was listed is listed again.
+_MTIME_GRANULARITY_SECS = 1.0
+
+_Listing = collections.namedtuple(
+    '_Listing', ['mtime', 'listed_at', 'paths', 'subdirs', 'files'])
+
+
+class CachingDirectoryLister(object):
+  """Lists directories, reusing the listings of unchanged local directories.
+
+  Adding, removing or renaming an entry of a directory changes its
+  modification time, so the listing of a local directory stays valid as long
+  as a `stat` of the directory returns the same modification time. Listing an
+  unchanged directory costs one `stat` rather than a `listdir` and a `stat`
+  per entry. GCS paths are always listed.
+
+  The methods have the same contracts as the functions of this module.
+  """
+
+  def __init__(self):
+    self._listings = {}
+    self._lock = threading.Lock()
+
+  def ListDirectoryAbsolute(self, directory):
+    """Yields all files in the given directory. The paths are absolute."""
+    if gcs.IsGCSPath(directory):
+      return ListDirectoryAbsolute(directory)
+    listing = self._List(directory)
+    if listing is None:
+      return ListDirectoryAbsolute(directory)
+    return iter(listing.paths)
+
+  def ListRecursively(self, top):
+    """Walks a directory tree, yielding (dir_path, file_paths) tuples.
+
+    Like `os.walk()`, this does not follow symbolic links to directories.
+
+    Args:
+      top: A path to a directory.
+    Yields:
+      A list of (dir_path, file_paths) tuples.
+    """
+    if gcs.IsGCSPath(top):
+      for x in gcs.ListRecursively(top):
+        yield x
+      return
+    directories = [top]
+    while directories:
+      directory = directories.pop()
+      listing = self._List(directory)
+      if listing is None:
+        continue
+      yield (directory, iter(listing.files))
+      directories.extend(reversed(listing.subdirs))
+
+  def _List(self, directory):
+    """Returns the `_Listing` of a local directory, or None if it can't be."""
+    try:
+      mtime = os.stat(directory).st_mtime
+    except OSError:
+      with self._lock:
+        self._listings.pop(directory, None)
+      return None
+    with self._lock:
+      listing = self._listings.get(directory)
+    if (listing is not None and listing.mtime == mtime and
+        mtime < listing.listed_at - _MTIME_GRANULARITY_SECS):
+      return listing
+
+    listed_at = time.time()
+    try:
+      names = os.listdir(directory)
+    except OSError:
+      return None
+    paths = []
+    subdirs = []
+    files = []
+    for name in names:
+      path = os.path.join(directory, name)
+      if os.path.isdir(path):
+        if not os.path.islink(path):
+          subdirs.append(path)
+      elif not name.startswith('.'):
+        files.append(path)
+      if not name.startswith('.'):
+        paths.append(path)
+    listing = _Listing(mtime, listed_at, paths, subdirs, files)
+    with self._lock:
+      self._listings[directory] = listing
+    return listing
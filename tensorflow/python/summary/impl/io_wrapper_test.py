@@ -0,0 +1,77 @@
+# Copyright 2015 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for io_wrapper."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import time
+
+from tensorflow.python.framework import test_util
+from tensorflow.python.platform import googletest
+from tensorflow.python.summary.impl import io_wrapper
+
+
+class CachingDirectoryListerTest(test_util.TensorFlowTestCase):
+
+  def setUp(self):
+    self._directory = os.path.join(self.get_temp_dir(), 'lister_dir')
+    os.makedirs(os.path.join(self._directory, 'run'))
+    for path in ['a', '.hidden', os.path.join('run', 'b'),
+                 os.path.join('run', '.b.tmp')]:
+      with open(os.path.join(self._directory, path), 'w') as f:
+        f.write('x')
+    # Age the directories past the mtime granularity so that the second
+    # listing is served from the cache.
+    old = time.time() - 10
+    for path in [self._directory, os.path.join(self._directory, 'run')]:
+      os.utime(path, (old, old))
+    self._lister = io_wrapper.CachingDirectoryLister()
+
+  def tearDown(self):
+    shutil.rmtree(self._directory)
+
+  def _Recursively(self, list_recursively):
+    return sorted((dir_path, sorted(paths))
+                  for dir_path, paths in list_recursively(self._directory))
+
+  def assertSameAsUncached(self):
+    self.assertEqual(
+        sorted(self._lister.ListDirectoryAbsolute(self._directory)),
+        sorted(io_wrapper.ListDirectoryAbsolute(self._directory)))
+    self.assertEqual(self._Recursively(self._lister.ListRecursively),
+                     self._Recursively(io_wrapper.ListRecursively))
+
+  def testSkipsDotfiles(self):
+    join = os.path.join
+    self.assertEqual(
+        sorted(self._lister.ListDirectoryAbsolute(self._directory)),
+        [join(self._directory, 'a'), join(self._directory, 'run')])
+    self.assertEqual(
+        self._Recursively(self._lister.ListRecursively),
+        [(self._directory, [join(self._directory, 'a')]),
+         (join(self._directory, 'run'), [join(self._directory, 'run', 'b')])])
+
+  def testCachedListingsMatchUncached(self):
+    self.assertSameAsUncached()
+    self.assertSameAsUncached()
+
+
+if __name__ == '__main__':
+  googletest.main()
@@ -267,6 +267,185 @@ def slice_input_producer(tensor_list, num_epochs=None, shuffle=True, seed=None,
     return output
 
 
+class ParallelReader(object):
+  """Reads the work units (e.g. files) of a queue with several readers.
+
+  `read(queue)` creates `num_readers` readers of `reader_class` which all take
+  their work from `queue`, so up to `num_readers` files are read at the same
+  time.  A `QueueRunner` runs every reader in its own thread, each run reads
+  up to `records_per_read` records (see `ReaderBase.read_up_to`), and enqueues
+  the records into a common queue holding up to `read_ahead` records.  The
+  records of the files come out of the common queue interleaved, shuffled if
+  `shuffle` is true.
+
+  A `ParallelReader` can be used in place of a single reader, e.g.
+
+  ```python
+  filename_queue = tf.train.string_input_producer(filenames)
+  reader = tf.train.ParallelReader(tf.TFRecordReader, num_readers=4)
+  _, serialized = reader.read(filename_queue)
+  ```
+
+  @@__init__
+  @@read
+  @@read_up_to
+  @@num_records_produced
+  @@num_work_units_completed
+  """
+
+  def __init__(self, reader_class, num_readers=4, read_ahead=1024,
+               records_per_read=16, shuffle=False, min_after_dequeue=None,
+               seed=None, reader_kwargs=None):
+    """Creates a `ParallelReader`.
+
+    Args:
+      reader_class: A `ReaderBase` subclass, e.g. `TFRecordReader`.
+      num_readers: An integer. The number of readers, and of work units read
+        at the same time.
+      read_ahead: An integer. The capacity of the common queue, in records.
+      records_per_read: An integer. The number of records a reader reads per
+        run.
+      shuffle: Boolean. If true, the common queue is a `RandomShuffleQueue`.
+      min_after_dequeue: An integer (optional). The `min_after_dequeue` of the
+        common queue if `shuffle` is true, `read_ahead // 2` by default.
+      seed: An integer (optional). Seed used if shuffle == True.
+      reader_kwargs: A dict (optional). The keyword arguments of
+        `reader_class`.
+
+    Raises:
+      ValueError: If `num_readers`, `read_ahead` or `records_per_read` is not
+        positive.
+    """
+    if num_readers < 1:
+      raise ValueError("num_readers must be positive: %d" % num_readers)
+    if read_ahead < 1:
+      raise ValueError("read_ahead must be positive: %d" % read_ahead)
+    if records_per_read < 1:
+      raise ValueError(
+          "records_per_read must be positive: %d" % records_per_read)
+    self._reader_class = reader_class
+    self._num_readers = num_readers
+    self._read_ahead = read_ahead
+    self._records_per_read = records_per_read
+    self._shuffle = shuffle
+    if min_after_dequeue is None:
+      min_after_dequeue = read_ahead // 2
+    self._min_after_dequeue = min_after_dequeue
+    self._seed = seed
+    self._reader_kwargs = reader_kwargs or {}
+    self._readers = []
+
+  def _common_queue(self, queue, name):
+    """Creates the readers of `queue` and the queue of their records."""
+    with ops.op_scope([], name, "parallel_read"):
+      types = [dtypes.string, dtypes.string]
+      shapes = [tensor_shape.scalar(), tensor_shape.scalar()]
+      if self._shuffle:
+        common_queue = data_flow_ops.RandomShuffleQueue(
+            capacity=self._read_ahead,
+            min_after_dequeue=self._min_after_dequeue, dtypes=types,
+            shapes=shapes, seed=self._seed)
+      else:
+        common_queue = data_flow_ops.FIFOQueue(
+            capacity=self._read_ahead, dtypes=types, shapes=shapes)
+
+      enqueue_ops = []
+      for _ in xrange(self._num_readers):
+        reader = self._reader_class(**self._reader_kwargs)
+        self._readers.append(reader)
+        if self._records_per_read > 1:
+          keys, values = reader.read_up_to(queue, self._records_per_read)
+          enqueue_ops.append(common_queue.enqueue_many([keys, values]))
+        else:
+          key, value = reader.read(queue)
+          enqueue_ops.append(common_queue.enqueue([key, value]))
+      queue_runner.add_queue_runner(
+          queue_runner.QueueRunner(common_queue, enqueue_ops))
+      logging_ops.scalar_summary(
+          "queue/%s/fraction_of_%d_full" % (common_queue.name,
+                                            self._read_ahead),
+          math_ops.cast(common_queue.size(), dtypes.float32) *
+          (1. / self._read_ahead))
+      return common_queue
+
+  def read(self, queue, name=None):
+    """Returns the next record (key, value pair) read from `queue`'s files.
+
+    Every call creates its own readers and common queue.
+
+    Args:
+      queue: A Queue or a mutable string Tensor representing a handle
+        to a Queue, with string work items.
+      name: A name for the operations (optional).
+
+    Returns:
+      A tuple of Tensors (key, value).
+      key: A string scalar Tensor.
+      value: A string scalar Tensor.
+    """
+    key, value = self._common_queue(queue, name).dequeue()
+    return key, value
+
+  def read_up_to(self, queue, num_records, name=None):
+    """Returns the next `num_records` records read from `queue`'s files.
+
+    Unlike `ReaderBase.read_up_to` this always returns `num_records` records,
+    the last records of the files are dropped if there are fewer.  Every call
+    creates its own readers and common queue.
+
+    Args:
+      queue: A Queue or a mutable string Tensor representing a handle
+        to a Queue, with string work items.
+      num_records: Number of records to read.
+      name: A name for the operations (optional).
+
+    Returns:
+      A tuple of Tensors (keys, values).
+      keys: A 1-D string Tensor.
+      values: A 1-D string Tensor.
+    """
+    keys, values = self._common_queue(queue, name).dequeue_many(num_records)
+    return keys, values
+
+  def num_records_produced(self, name=None):
+    """Returns the number of records the readers have produced.
+
+    Records still in the common queue are counted.
+
+    Args:
+      name: A name for the operation (optional).
+
+    Returns:
+      An int64 Tensor.
+
+    Raises:
+      ValueError: If `read` or `read_up_to` was not called yet.
+    """
+    if not self._readers:
+      raise ValueError("ParallelReader has no readers yet.")
+    return math_ops.add_n(
+        [reader.num_records_produced() for reader in self._readers],
+        name=name)
+
+  def num_work_units_completed(self, name=None):
+    """Returns the number of work units the readers have finished processing.
+
+    Args:
+      name: A name for the operation (optional).
+
+    Returns:
+      An int64 Tensor.
+
+    Raises:
+      ValueError: If `read` or `read_up_to` was not called yet.
+    """
+    if not self._readers:
+      raise ValueError("ParallelReader has no readers yet.")
+    return math_ops.add_n(
+        [reader.num_work_units_completed() for reader in self._readers],
+        name=name)
+
+
 # Helpers for the batching functions ------------------------------------------
 
 
@@ -842,8 +1021,8 @@ def shuffle_bucket_batch(tensor_list, batch_size, buckets, capacity,
     # dequeued = _deserialize_sparse_tensors(dequeued, sparse_info)
 
     bucketed_queue = data_flow_ops.FIFOBucketedQueue(
-        buckets=buckets, capacity=capacity, dtypes=types, shapes=shapes,
-        shared_name=shared_name)
+        buckets=buckets, batch_size=batch_size, capacity=capacity,
+        dtypes=types, shapes=shapes, shared_name=shared_name)
     _enqueue(bucketed_queue, dequeued, num_threads, batch_size)
 
     dequeued = bucketed_queue.dequeue_many(batch_size, name=name)
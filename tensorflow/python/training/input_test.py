@@ -363,6 +363,92 @@ class SliceInputProducerTest(tf.test.TestCase):
           "s: 'SHARED_NAME_XYZ'",
           slices[0].op.inputs[1].op.inputs[0].op.node_def.attr["shared_name"])
 
+class ParallelReaderTest(tf.test.TestCase):
+
+  def _CreateFiles(self, num_files, num_records):
+    filenames = []
+    for i in range(num_files):
+      fn = os.path.join(self.get_temp_dir(), "parallel_reader.%d.tfrecord" % i)
+      filenames.append(fn)
+      writer = tf.python_io.TFRecordWriter(fn)
+      for j in range(num_records):
+        writer.write(tf.compat.as_bytes("Record %d of file %d" % (j, i)))
+      writer.close()
+    return filenames
+
+  def _testReadAll(self, records_per_read, shuffle):
+    num_files = 5
+    num_records = 13
+    files = self._CreateFiles(num_files, num_records)
+    with self.test_session() as sess:
+      filename_queue = tf.train.string_input_producer(
+          files, num_epochs=1, shuffle=False)
+      reader = tf.train.ParallelReader(
+          tf.TFRecordReader, num_readers=3, read_ahead=16,
+          records_per_read=records_per_read, shuffle=shuffle, seed=1)
+      key, value = reader.read(filename_queue)
+      num_records_produced = reader.num_records_produced()
+      self.assertEqual([], key.get_shape())
+      self.assertEqual([], value.get_shape())
+
+      tf.initialize_all_variables().run()
+      threads = tf.train.start_queue_runners()
+
+      values = []
+      for _ in range(num_files * num_records):
+        values.append(tf.compat.as_text(sess.run(value)))
+      self.assertItemsEqual(
+          ["Record %d of file %d" % (j, i)
+           for i in range(num_files) for j in range(num_records)], values)
+      if not shuffle:
+        # The records of a file are read in order.
+        for i in range(num_files):
+          self.assertEqual(
+              ["Record %d of file %d" % (j, i) for j in range(num_records)],
+              [v for v in values if v.endswith("of file %d" % i)])
+
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(value)
+      self.assertEqual(num_files * num_records, num_records_produced.eval())
+      for thread in threads:
+        thread.join()
+
+  def testReadOneRecordPerRun(self):
+    self._testReadAll(records_per_read=1, shuffle=False)
+
+  def testReadUpTo(self):
+    self._testReadAll(records_per_read=4, shuffle=False)
+
+  def testShuffle(self):
+    self._testReadAll(records_per_read=4, shuffle=True)
+
+  def testReadUpToDequeuesFullBatches(self):
+    files = self._CreateFiles(2, 5)
+    with self.test_session() as sess:
+      filename_queue = tf.train.string_input_producer(
+          files, num_epochs=1, shuffle=False)
+      reader = tf.train.ParallelReader(tf.TFRecordReader, num_readers=2)
+      keys, values = reader.read_up_to(filename_queue, 4)
+      self.assertEqual([4], keys.get_shape())
+      self.assertEqual([4], values.get_shape())
+
+      tf.initialize_all_variables().run()
+      threads = tf.train.start_queue_runners()
+      self.assertEqual(4, len(sess.run(values)))
+      self.assertEqual(4, len(sess.run(values)))
+      # The last 2 records do not make a batch.
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(values)
+      for thread in threads:
+        thread.join()
+
+  def testInvalidArguments(self):
+    with self.assertRaises(ValueError):
+      tf.train.ParallelReader(tf.TFRecordReader, num_readers=0)
+    with self.assertRaises(ValueError):
+      tf.train.ParallelReader(tf.TFRecordReader, records_per_read=0)
+
+
 class BatchTest(tf.test.TestCase):
 
   def testOneThread(self):
@@ -102,6 +102,11 @@ def ReloadMultiplexer(multiplexer, path_to_run):
   multiplexer.Reload()
   duration = time.time() - start
   logging.info('Multiplexer done loading. Load took %0.1f secs', duration)
+  latencies = multiplexer.ReloadLatencies()
+  if latencies:
+    slowest = max(latencies, key=latencies.get)
+    logging.info('Slowest run to reload: %s (%0.1f secs)', slowest,
+                 latencies[slowest])
 
 
 def StartMultiplexerReloadingThread(multiplexer, path_to_run, load_interval):